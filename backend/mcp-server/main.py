@@ -5,13 +5,17 @@ FastAPI + MCP Protocol for AI Agent Integration
 
 import os
 import json
+import asyncio
 import logging
+import time
+from collections import OrderedDict
 from contextlib import asynccontextmanager
 from typing import Any, List, Optional
 
+import httpx
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse
-from openai import OpenAI
+from openai import AsyncOpenAI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings
@@ -49,6 +53,10 @@ class Settings(BaseSettings):
 
     # AI - OpenRouter API
     openrouter_api_key: str = ""
+    openrouter_base_url: str = "https://openrouter.ai/api/v1"
+    llm_timeout: float = 120.0               # 單次 chat completion timeout（秒）
+    llm_max_concurrency: int = 8             # 同時進行的 chat completion 上限
+    intent_classifier_timeout: float = 10.0  # 意圖分類 timeout（秒）
 
     class Config:
         env_file = ".env"
@@ -61,10 +69,18 @@ settings = Settings()
 # 資料庫連接
 # ============================================================================
 
-import httpx
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from tools.postgrest_client import (
+    init_http_client,
+    close_http_client,
+    get_http_client,
+    get_pool_stats,
+    set_postgrest_request as set_shared_postgrest
+)
+from tools.batch_worker import BATCH_WORKER_ENABLED, batch_worker
+
 
 def get_db_connection():
     """取得 PostgreSQL 直連"""
@@ -95,27 +111,26 @@ async def postgrest_request(
     if headers:
         default_headers.update(headers)
 
-    async with httpx.AsyncClient() as client:
-        response = await client.request(
-            method=method,
-            url=url,
-            params=params,
-            json=data,
-            headers=default_headers,
-            timeout=30.0
-        )
+    client = get_http_client()
+    response = await client.request(
+        method=method,
+        url=url,
+        params=params,
+        json=data,
+        headers=default_headers
+    )
 
-        if response.status_code >= 400:
-            logger.error(f"PostgREST error: {response.status_code} - {response.text}")
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.text
-            )
+    if response.status_code >= 400:
+        logger.error(f"PostgREST error: {response.status_code} - {response.text}")
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=response.text
+        )
 
-        if response.status_code == 204:
-            return None
+    if response.status_code == 204:
+        return None
 
-        return response.json()
+    return response.json()
 
 
 async def postgrest_rpc(
@@ -129,31 +144,30 @@ async def postgrest_rpc(
     """
     url = f"{settings.postgrest_url}/rpc/{function_name}"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            url=url,
-            json=params or {},
-            headers={
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            },
-            timeout=30.0
-        )
+    client = get_http_client()
+    response = await client.post(
+        url=url,
+        json=params or {},
+        headers={
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+    )
 
-        if response.status_code >= 400:
-            logger.error(f"PostgREST RPC error: {response.status_code} - {response.text}")
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.text
-            )
+    if response.status_code >= 400:
+        logger.error(f"PostgREST RPC error: {response.status_code} - {response.text}")
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=response.text
+        )
 
-        result = response.json()
+    result = response.json()
 
-        # PostgreSQL Function 回傳的 JSONB 會被包在陣列中
-        if isinstance(result, list) and len(result) == 1:
-            return result[0]
+    # PostgreSQL Function 回傳的 JSONB 會被包在陣列中
+    if isinstance(result, list) and len(result) == 1:
+        return result[0]
 
-        return result
+    return result
 
 
 # ============================================================================
@@ -186,7 +200,8 @@ from tools.line_tools import (
 from tools.report_tools import (
     get_revenue_summary,
     get_overdue_list,
-    get_commission_due
+    get_commission_due,
+    refresh_revenue_snapshot
 )
 
 from tools.renewal_tools import (
@@ -308,6 +323,8 @@ from tools.legal_letter_tools import (
 from tools.booking_tools import (
     booking_list_rooms,
     booking_check_availability,
+    booking_search_availability,
+    booking_availability_heatmap,
     booking_create,
     booking_cancel,
     booking_update,
@@ -324,6 +341,8 @@ from tools.floor_plan_tools import (
     floor_plan_preview_html
 )
 
+from tools.pdf_batch_tools import pdf_generate_batch
+
 from tools.line_webhook import (
     handle_line_event,
     verify_signature
@@ -347,6 +366,12 @@ from tools.brain_tools import (
     brain_save_customer_traits
 )
 
+from tools.knowledge_cache import knowledge_cache
+from tools.reference_cache import reference_cache
+from tools.availability_cache import availability_cache
+from tools.cloud_clients import get_cloud_clients_stats
+from tools.google_calendar import get_async_calendar_service, shutdown_calendar_service
+
 from tools.calendar_tools import (
     calendar_create,
     calendar_share,
@@ -566,7 +591,8 @@ MCP_TOOLS = {
         "description": "營收摘要報表",
         "parameters": {
             "branch_id": {"type": "integer", "description": "場館ID", "optional": True},
-            "period": {"type": "string", "description": "期間 (this_month/last_month/this_year)", "default": "this_month"}
+            "period": {"type": "string", "description": "期間 (this_month/last_month/this_year)", "default": "this_month"},
+            "source": {"type": "string", "description": "資料來源 (live=即時 / snapshot=快照，較快但可能延遲數分鐘)", "default": "live"}
         },
         "handler": get_revenue_summary
     },
@@ -1447,6 +1473,27 @@ MCP_TOOLS = {
         },
         "handler": booking_check_availability
     },
+    "booking_search_availability": {
+        "description": "查詢多個會議室、多天的可用時段（例如整週或整月），一次回傳每個會議室每天的可預約時段",
+        "parameters": {
+            "date_from": {"type": "string", "description": "開始日期 (YYYY-MM-DD)", "required": True},
+            "date_to": {"type": "string", "description": "結束日期 (YYYY-MM-DD)，預設同開始日期", "optional": True},
+            "room_ids": {"type": "array", "items": {"type": "integer"}, "description": "會議室ID列表，預設全部", "optional": True},
+            "branch_id": {"type": "integer", "description": "場館ID", "optional": True},
+            "duration_minutes": {"type": "integer", "description": "預約長度（分鐘），只列出可連續預約這麼久的開始時間", "optional": True},
+            "slot_minutes": {"type": "integer", "description": "時段長度（分鐘），預設使用會議室設定", "optional": True}
+        },
+        "handler": booking_search_availability
+    },
+    "booking_availability_heatmap": {
+        "description": "未來 N 天各會議室剩餘可預約時段數（熱圖），用於日期選單標示額滿日期",
+        "parameters": {
+            "branch_id": {"type": "integer", "description": "場館ID", "optional": True},
+            "days": {"type": "integer", "description": "天數，預設 7", "optional": True},
+            "date_from": {"type": "string", "description": "開始日期 (YYYY-MM-DD)，預設今天", "optional": True}
+        },
+        "handler": booking_availability_heatmap
+    },
     "booking_create": {
         "description": "建立會議室預約",
         "parameters": {
@@ -1536,6 +1583,15 @@ MCP_TOOLS = {
         },
         "handler": floor_plan_generate
     },
+    "pdf_generate_batch": {
+        "description": "批次生成合約 / 報價單 / 存證信函 PDF，可回傳每份連結，或合併為一份 PDF / 打包為 ZIP",
+        "parameters": {
+            "doc_type": {"type": "string", "description": "文件類型 (contract, quote, legal_letter)", "required": True},
+            "ids": {"type": "array", "items": {"type": "integer"}, "description": "文件ID列表（最多 100 份）", "required": True},
+            "output": {"type": "string", "description": "輸出方式 (urls=每份連結, merged=合併 PDF, zip=ZIP 壓縮檔)", "default": "urls"}
+        },
+        "handler": pdf_generate_batch
+    },
     "floor_plan_preview_html": {
         "description": "預覽平面圖 HTML（不生成 PDF）",
         "parameters": {
@@ -1803,6 +1859,14 @@ from datetime import datetime, timedelta
 # 排程器
 scheduler = AsyncIOScheduler()
 
+# 營收快照增量更新間隔（分鐘，0 = 停用）
+REVENUE_SNAPSHOT_REFRESH_MINUTES = int(os.getenv("REVENUE_SNAPSHOT_REFRESH_MINUTES", "5"))
+
+# 每日維護（產生應收、更新逾期、更新過期合約）
+# 間隔 24 小時以上時每天 MAINTENANCE_RUN_HOUR 點（伺服器時區，需與資料庫一致）執行；0 = 停用
+MAINTENANCE_INTERVAL_HOURS = int(os.getenv("MAINTENANCE_INTERVAL_HOURS", "24"))
+MAINTENANCE_RUN_HOUR = int(os.getenv("MAINTENANCE_RUN_HOUR", "0"))
+
 
 async def send_booking_reminders():
     """每 10 分鐘檢查並發送預約提醒（1 小時前）"""
@@ -1839,11 +1903,53 @@ async def send_booking_reminders():
         logger.error(f"send_booking_reminders error: {e}")
 
 
+async def refresh_revenue_snapshot_job():
+    """定期增量更新營收快照（只重算 payments 有異動的月份）"""
+    try:
+        result = await refresh_revenue_snapshot()
+        if result.get("months_refreshed"):
+            logger.info(
+                f"Revenue snapshot refreshed: {result.get('months_refreshed')} months, "
+                f"{result.get('duration_ms')} ms"
+            )
+    except Exception as e:
+        logger.error(f"refresh_revenue_snapshot_job error: {e}")
+
+
+async def run_daily_maintenance_job():
+    """每日維護（run_scheduled_maintenance 以執行紀錄確保同一時段只跑一次）"""
+    try:
+        result = await postgrest_rpc("run_scheduled_maintenance", {
+            "p_interval_hours": MAINTENANCE_INTERVAL_HOURS,
+            "p_triggered_by": "scheduler"
+        })
+        if not result.get("executed"):
+            logger.info(f"Daily maintenance skipped ({result.get('run_key')}: {result.get('reason')})")
+        elif result.get("success"):
+            logger.info(
+                f"Daily maintenance completed ({result.get('run_key')}, "
+                f"{result.get('duration_ms')} ms): {result.get('result')}"
+            )
+        else:
+            logger.error(f"Daily maintenance failed ({result.get('run_key')}): {result.get('error')}")
+    except Exception as e:
+        logger.error(f"run_daily_maintenance_job error: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """應用生命週期"""
     logger.info("MCP Server starting...")
 
+    # 建立共用 PostgREST 連線池（所有工具模組共用）
+    init_http_client()
+    set_shared_postgrest(postgrest_request)
+    logger.info("PostgREST connection pool initialized")
+
+    # 建立共用的非同步 LLM client
+    if init_openrouter_client():
+        logger.info(f"OpenRouter client initialized (max concurrency {settings.llm_max_concurrency})")
+
     # 設置續約工具的 postgrest_request
     set_renewal_postgrest(postgrest_request)
     logger.info("Renewal tools initialized")
@@ -1879,8 +1985,41 @@ async def lifespan(app: FastAPI):
 
     # 啟動排程器
     scheduler.add_job(send_booking_reminders, 'interval', minutes=10)
+    if REVENUE_SNAPSHOT_REFRESH_MINUTES > 0:
+        scheduler.add_job(
+            refresh_revenue_snapshot_job, 'interval',
+            minutes=REVENUE_SNAPSHOT_REFRESH_MINUTES,
+            next_run_time=datetime.now(),
+            max_instances=1,
+            coalesce=True
+        )
+    if MAINTENANCE_INTERVAL_HOURS > 0:
+        # 啟動時先補跑一次（本時段已執行過會直接略過）
+        if MAINTENANCE_INTERVAL_HOURS >= 24:
+            maintenance_trigger = {"trigger": "cron", "hour": MAINTENANCE_RUN_HOUR, "minute": 5}
+        else:
+            maintenance_trigger = {"trigger": "interval", "hours": MAINTENANCE_INTERVAL_HOURS}
+        scheduler.add_job(
+            run_daily_maintenance_job,
+            **maintenance_trigger,
+            next_run_time=datetime.now(),
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=3600
+        )
     scheduler.start()
-    logger.info("Scheduler started (booking reminders every 10 min)")
+    logger.info(
+        f"Scheduler started (booking reminders every 10 min, "
+        f"revenue snapshot every {REVENUE_SNAPSHOT_REFRESH_MINUTES} min, "
+        f"maintenance every {MAINTENANCE_INTERVAL_HOURS} h)"
+    )
+
+    # 啟動 batch_tasks 背景 worker（重啟後會接續處理未完成的項目）
+    if BATCH_WORKER_ENABLED:
+        batch_worker.start()
+
+    # 參考資料快取：訂閱其他 instance 的失效通知（REFERENCE_CACHE_REDIS=true 時）
+    reference_cache.start_listener()
 
     # 測試資料庫連接
     try:
@@ -1892,8 +2031,17 @@ async def lifespan(app: FastAPI):
 
     yield
 
-    # 關閉排程器
+    # 關閉排程器與 batch worker（未完成的項目歸還佇列）
     scheduler.shutdown()
+    await batch_worker.stop()
+    await reference_cache.stop_listener()
+    await availability_cache.close()
+    shutdown_calendar_service()
+
+    # 關閉 PostgREST 連線池、LLM 與 Brain API client
+    await close_http_client()
+    await close_openrouter_client()
+    await close_brain_client()
     logger.info("MCP Server shutting down...")
 
 
@@ -1924,10 +2072,35 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "mcp-server",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "postgrest_pool": get_pool_stats()
     }
 
 
+@app.get("/reference-cache/stats")
+async def get_reference_cache_stats():
+    """參考資料快取（場館、會議室、服務方案、系統設定）命中率統計"""
+    return reference_cache.get_stats()
+
+
+@app.get("/calendar/stats")
+async def get_calendar_stats():
+    """Google Calendar thread pool 與忙碌時段快取統計"""
+    return get_async_calendar_service().get_stats()
+
+
+@app.get("/availability-cache/stats")
+async def get_availability_cache_stats():
+    """會議室可用性熱圖快取命中率統計"""
+    return availability_cache.get_stats()
+
+
+@app.get("/cloud-clients/stats")
+async def get_cloud_clients_stats_endpoint():
+    """共用 client（R2）與 Cloud Run ID Token 快取統計"""
+    return get_cloud_clients_stats()
+
+
 @app.get("/tools")
 async def list_tools():
     """列出所有可用工具"""
@@ -1978,6 +2151,77 @@ async def call_tool(request: ToolCallRequest):
         }
 
 
+# 單次批次調用的工具數上限
+TOOL_BATCH_MAX_CALLS = int(os.getenv("TOOL_BATCH_MAX_CALLS", "20"))
+
+
+class ToolBatchCall(BaseModel):
+    """批次中的單一工具調用"""
+    tool: str
+    parameters: dict = {}
+
+
+class ToolBatchRequest(BaseModel):
+    """批次工具調用請求"""
+    calls: List[ToolBatchCall]
+    stop_on_error: bool = False
+    concurrency: Optional[int] = None
+
+
+@app.post("/tools/batch")
+async def call_tools_batch(request: ToolBatchRequest):
+    """
+    批次調用工具（一個畫面需要的多個工具一次取得）
+
+    - 結果依 calls 順序回傳
+    - 連續的唯讀工具併發執行（上限 TOOL_CALL_CONCURRENCY），寫入工具依序執行
+    - stop_on_error=true 時，第一個失敗之後尚未開始的工具不執行（skipped）
+    - 每個工具附 duration_ms
+    """
+    if not request.calls:
+        raise HTTPException(status_code=400, detail="calls 不可為空")
+    if len(request.calls) > TOOL_BATCH_MAX_CALLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"calls 最多 {TOOL_BATCH_MAX_CALLS} 個"
+        )
+
+    concurrency = min(request.concurrency or TOOL_CALL_CONCURRENCY, TOOL_CALL_CONCURRENCY)
+    calls = [(call.tool, call.parameters) for call in request.calls]
+
+    started = time.perf_counter()
+    outcomes = await execute_tool_calls(
+        calls,
+        concurrency=concurrency,
+        stop_on_error=request.stop_on_error
+    )
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    results = []
+    for index, ((tool_name, _), outcome) in enumerate(zip(calls, outcomes)):
+        item = {
+            "index": index,
+            "tool": tool_name,
+            "success": not outcome.get("skipped") and not tool_call_failed(outcome),
+            "duration_ms": outcome["duration_ms"]
+        }
+        if outcome.get("skipped"):
+            item["skipped"] = True
+        elif not outcome["found"]:
+            item["error"] = f"Tool '{tool_name}' not found"
+        elif outcome["error"] is not None:
+            item["error"] = outcome["error"]
+        else:
+            item["result"] = outcome["result"]
+        results.append(item)
+
+    return {
+        "success": all(item["success"] for item in results),
+        "results": results,
+        "duration_ms": duration_ms
+    }
+
+
 # ============================================================================
 # Dev Tools (開發者工具 - 僅限開發環境)
 # ============================================================================
@@ -2248,6 +2492,29 @@ async def api_list_bookings(
     return result
 
 
+@app.get("/api/bookings/availability")
+async def api_search_availability(
+    date_from: str,
+    date_to: str = None,
+    room_ids: str = None,
+    branch_id: int = None,
+    duration_minutes: int = None
+):
+    """查詢多個會議室 × 日期區間可用時段 API（room_ids 以逗號分隔）"""
+    ids = [int(x) for x in room_ids.split(",") if x.strip()] if room_ids else None
+    return await booking_search_availability(date_from, date_to, ids, branch_id, duration_minutes)
+
+
+@app.get("/api/bookings/availability/heatmap")
+async def api_availability_heatmap(
+    branch_id: int = None,
+    days: int = 7,
+    date_from: str = None
+):
+    """未來 N 天會議室可用性熱圖 API"""
+    return await booking_availability_heatmap(branch_id, days, date_from)
+
+
 @app.get("/api/bookings/{booking_id}")
 async def api_get_booking(booking_id: int):
     """預約詳情 API"""
@@ -2478,13 +2745,11 @@ async def classify_intent(message_text: str) -> str:
         return "other"
 
     try:
-        client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=settings.openrouter_api_key
-        )
+        client = get_openrouter_client()
 
         # 使用快速模型進行意圖分類（成本低、速度快）
-        response = client.chat.completions.create(
+        # 不佔用 chat 的併發名額，只用較短的 timeout 保護
+        response = await client.chat.completions.create(
             model="google/gemini-2.0-flash-001",  # 快速便宜的模型
             max_tokens=20,
             messages=[
@@ -2493,7 +2758,8 @@ async def classify_intent(message_text: str) -> str:
             extra_headers={
                 "HTTP-Referer": "https://hj.yourspce.org",
                 "X-Title": "Hour Jungle CRM - Intent Classifier"
-            }
+            },
+            timeout=settings.intent_classifier_timeout
         )
 
         intent = response.choices[0].message.content.strip().lower()
@@ -2599,61 +2865,324 @@ AVAILABLE_MODELS = {
 DEFAULT_MODEL = "claude-sonnet-4"
 
 
-def get_openrouter_client():
+# 共用的非同步 OpenRouter client（lifespan 建立，所有請求共用連線池）
+_openrouter_client: Optional[AsyncOpenAI] = None
+
+# 限制同時進行的 chat completion 數量，避免大量長回應耗盡連線與配額
+_llm_semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+
+
+def init_openrouter_client() -> Optional[AsyncOpenAI]:
+    """建立共用的 AsyncOpenAI client（未設定 API key 時略過）"""
+    global _openrouter_client
+    if not settings.openrouter_api_key:
+        return None
+    if _openrouter_client is None:
+        _openrouter_client = AsyncOpenAI(
+            base_url=settings.openrouter_base_url,
+            api_key=settings.openrouter_api_key,
+            timeout=settings.llm_timeout,
+            max_retries=1
+        )
+    return _openrouter_client
+
+
+async def close_openrouter_client():
+    """關閉共用的 OpenRouter client"""
+    global _openrouter_client
+    if _openrouter_client is not None:
+        await _openrouter_client.close()
+        _openrouter_client = None
+
+
+def get_openrouter_client() -> AsyncOpenAI:
     """取得 OpenRouter 客戶端"""
     if not settings.openrouter_api_key:
         raise HTTPException(
             status_code=500,
             detail="OPENROUTER_API_KEY not configured"
         )
-    return OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=settings.openrouter_api_key
-    )
+    return init_openrouter_client()
 
 
-def convert_tools_for_openai():
-    """將 MCP_TOOLS 轉換為 OpenAI 格式"""
-    tools = []
-    for name, tool in MCP_TOOLS.items():
-        properties = {}
-        required = []
+async def create_chat_completion(client: AsyncOpenAI, **kwargs):
+    """
+    呼叫 chat completion（非串流）
 
-        for param_name, param_info in tool["parameters"].items():
-            param_type = param_info["type"]
-            if param_type == "integer":
-                param_type = "integer"
-            elif param_type == "number":
-                param_type = "number"
-            elif param_type == "object":
-                param_type = "object"
-            else:
-                param_type = "string"
+    透過 semaphore 限制併發數量，並套用 per-call timeout
+    """
+    kwargs.setdefault("timeout", settings.llm_timeout)
+    async with _llm_semaphore:
+        return await client.chat.completions.create(**kwargs)
+
+
+# 工具分類：預設取名稱第一段（crm_/quote_/booking_...），以下為例外
+_TOOL_CATEGORY_OVERRIDES = {
+    "set_renewal_intent": "renewal",
+    "batch_set_renewal_intent": "renewal",
+    "get_renewal_intent": "renewal",
+    "list_pending_intents": "renewal",
+    "contract_renew": "renewal",
+    "sync_prices_to_brain": "service_plan",
+}
+_TWO_WORD_CATEGORIES = ("service_plan", "floor_plan")
+
+# OpenAI 格式工具清單快取：{(categories, tool_names): [tool, ...]}（LRU）
+# key 只含已知的分類與工具名稱；MCP_TOOLS 變動時（簽章不同）自動清空
+OPENAI_TOOLS_CACHE_SIZE = int(os.getenv("OPENAI_TOOLS_CACHE_SIZE", "64"))
+_openai_tools_cache: "OrderedDict[tuple, List[dict]]" = OrderedDict()
+_openai_tools_signature: Optional[tuple] = None
+_openai_tool_categories: frozenset = frozenset()
+
+
+def get_tool_category(tool_name: str) -> str:
+    """取得工具分類（供 AI chat 依意圖/分類挑選工具子集）"""
+    if tool_name in _TOOL_CATEGORY_OVERRIDES:
+        return _TOOL_CATEGORY_OVERRIDES[tool_name]
+    for category in _TWO_WORD_CATEGORIES:
+        if tool_name.startswith(category + "_"):
+            return category
+    return tool_name.split("_", 1)[0]
+
+
+def _convert_tool_for_openai(name: str, tool: dict) -> dict:
+    """將單一 MCP 工具轉換為 OpenAI function 格式"""
+    properties = {}
+    required = []
+
+    for param_name, param_info in tool["parameters"].items():
+        param_type = param_info["type"]
+        if param_type == "integer":
+            param_type = "integer"
+        elif param_type == "number":
+            param_type = "number"
+        elif param_type == "object":
+            param_type = "object"
+        else:
+            param_type = "string"
 
-            properties[param_name] = {
-                "type": param_type,
-                "description": param_info.get("description", "")
-            }
+        properties[param_name] = {
+            "type": param_type,
+            "description": param_info.get("description", "")
+        }
 
-            if param_info.get("required"):
-                required.append(param_name)
+        if param_info.get("required"):
+            required.append(param_name)
 
-        tools.append({
-            "type": "function",
-            "function": {
-                "name": name,
-                "description": tool["description"],
-                "parameters": {
-                    "type": "object",
-                    "properties": properties,
-                    "required": required
-                }
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": tool["description"],
+            "parameters": {
+                "type": "object",
+                "properties": properties,
+                "required": required
             }
-        })
+        }
+    }
+
 
+def invalidate_openai_tools_cache():
+    """清除 OpenAI 工具清單快取（動態增減 MCP_TOOLS 後呼叫）"""
+    global _openai_tools_signature, _openai_tool_categories
+    _openai_tools_cache.clear()
+    _openai_tools_signature = None
+    _openai_tool_categories = frozenset()
+
+
+def convert_tools_for_openai(
+    categories: Optional[List[str]] = None,
+    tool_names: Optional[List[str]] = None
+) -> List[dict]:
+    """
+    將 MCP_TOOLS 轉換為 OpenAI 格式（結果快取）
+
+    Args:
+        categories: 只包含這些分類的工具（見 get_tool_category）
+        tool_names: 額外指定要包含的工具名稱
+
+    Returns:
+        OpenAI tools 列表；未指定篩選條件，或篩選結果為空時回傳全部工具
+    """
+    global _openai_tools_signature, _openai_tool_categories
+
+    signature = tuple((name, id(tool)) for name, tool in MCP_TOOLS.items())
+    if signature != _openai_tools_signature:
+        _openai_tools_cache.clear()
+        _openai_tools_signature = signature
+        _openai_tool_categories = frozenset(get_tool_category(name) for name in MCP_TOOLS)
+
+    # 篩選條件來自請求內容，先去掉未知的分類與工具名稱再作為 key
+    wanted_categories = frozenset(categories or ()) & _openai_tool_categories
+    wanted_names = frozenset(name for name in tool_names or () if name in MCP_TOOLS)
+    if (categories or tool_names) and not (wanted_categories or wanted_names):
+        logger.warning(f"No tools matched categories={categories} tool_names={tool_names}, using all tools")
+
+    key = (wanted_categories or None, wanted_names or None)
+    tools = _openai_tools_cache.get(key)
+    if tools is not None:
+        _openai_tools_cache.move_to_end(key)
+        return tools
+
+    if key == (None, None):
+        tools = [_convert_tool_for_openai(name, tool) for name, tool in MCP_TOOLS.items()]
+    else:
+        tools = [
+            _convert_tool_for_openai(name, tool)
+            for name, tool in MCP_TOOLS.items()
+            if name in wanted_names or get_tool_category(name) in wanted_categories
+        ]
+
+    _openai_tools_cache[key] = tools
+    while len(_openai_tools_cache) > OPENAI_TOOLS_CACHE_SIZE:
+        _openai_tools_cache.popitem(last=False)
     return tools
 
 
+# ============================================================================
+# 工具執行（同一輪多個 tool_calls）
+# ============================================================================
+
+# 唯讀工具：同一輪內可併發執行
+# 其餘工具（包含 CRM_SYSTEM_PROMPT 中需確認的寫入操作）一律依序執行
+READ_ONLY_TOOLS = frozenset({
+    "crm_search_customers",
+    "crm_get_customer_detail",
+    "crm_list_payments_due",
+    "crm_list_renewals_due",
+    "report_revenue_summary",
+    "report_overdue_list",
+    "report_commission_due",
+    "renewal_get_summary",
+    "get_renewal_intent",
+    "list_pending_intents",
+    "quote_list",
+    "quote_get",
+    "service_plan_list",
+    "service_plan_get",
+    "invoice_query",
+    "contract_preview",
+    "contract_get_timeline",
+    "file_list",
+    "renewal_check_draft",
+    "termination_get_cases",
+    "termination_get_case",
+    "settings_get",
+    "settings_get_all",
+    "legal_list_candidates",
+    "legal_list_pending",
+    "booking_list_rooms",
+    "booking_check_availability",
+    "booking_search_availability",
+    "booking_availability_heatmap",
+    "booking_list",
+    "booking_get",
+    "floor_plan_get_positions",
+    "floor_plan_preview_html",
+    "brain_search_knowledge",
+    "brain_list_categories",
+    "feedback_list",
+    "ai_get_refinement_history",
+    "ai_get_feedback_stats",
+    "ai_get_training_stats",
+    "ai_list_conversations",
+    "calendar_list_signing_appointments",
+})
+
+# 同一輪唯讀工具的併發上限
+TOOL_CALL_CONCURRENCY = int(os.getenv("TOOL_CALL_CONCURRENCY", "5"))
+
+
+async def execute_tool(tool_name: str, tool_args: dict) -> dict:
+    """
+    執行單一 MCP 工具
+
+    Returns:
+        {"found": bool, "result": Any, "error": Optional[str], "duration_ms": float}
+    """
+    if tool_name not in MCP_TOOLS:
+        return {"found": False, "result": None, "error": None, "duration_ms": 0.0}
+
+    handler = MCP_TOOLS[tool_name]["handler"]
+    started = time.perf_counter()
+    try:
+        result = await handler(**tool_args)
+        outcome = {"found": True, "result": result, "error": None}
+    except Exception as e:
+        logger.error(f"Tool {tool_name} error: {e}")
+        outcome = {"found": True, "result": None, "error": str(e)}
+    outcome["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return outcome
+
+
+def tool_call_failed(outcome: dict) -> bool:
+    """工具不存在、拋出例外，或回傳 {"success": false} 都視為失敗"""
+    if not outcome["found"] or outcome["error"] is not None:
+        return True
+    result = outcome["result"]
+    return isinstance(result, dict) and result.get("success") is False
+
+
+async def execute_tool_calls(
+    calls: List[tuple],
+    concurrency: int = TOOL_CALL_CONCURRENCY,
+    stop_on_error: bool = False
+) -> List[dict]:
+    """
+    執行同一輪的多個工具調用，結果依原始順序回傳
+
+    連續的唯讀工具以 semaphore 限制併發同時執行；
+    寫入工具視為屏障，等前面的工具完成後單獨執行，確保寫入順序不變
+
+    Args:
+        calls: [(tool_name, tool_args), ...]
+        concurrency: 唯讀工具併發上限
+        stop_on_error: 有工具失敗後，尚未開始的工具不再執行（結果標記 skipped）
+
+    Returns:
+        與 calls 同順序的 execute_tool 結果列表
+    """
+    results: List[Optional[dict]] = [None] * len(calls)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    pending: List[int] = []
+    failed = False
+
+    async def run_one(index: int):
+        nonlocal failed
+        if stop_on_error and failed:
+            results[index] = {
+                "found": calls[index][0] in MCP_TOOLS,
+                "result": None,
+                "error": None,
+                "duration_ms": 0.0,
+                "skipped": True
+            }
+            return
+        results[index] = await execute_tool(*calls[index])
+        if tool_call_failed(results[index]):
+            failed = True
+
+    async def run_bounded(index: int):
+        async with semaphore:
+            await run_one(index)
+
+    async def flush_pending():
+        if pending:
+            await asyncio.gather(*(run_bounded(i) for i in pending))
+            pending.clear()
+
+    for index, (tool_name, _) in enumerate(calls):
+        if tool_name in READ_ONLY_TOOLS:
+            pending.append(index)
+            continue
+        await flush_pending()
+        await run_one(index)
+
+    await flush_pending()
+    return results
+
+
 class ChatMessage(BaseModel):
     """聊天訊息"""
     role: str  # 'user' or 'assistant'
@@ -2665,6 +3194,8 @@ class AIChatRequest(BaseModel):
     messages: List[ChatMessage]
     model: str = DEFAULT_MODEL
     stream: bool = False
+    tool_categories: Optional[List[str]] = None  # 只提供這些分類的工具（如 ["crm", "billing"]）
+    tool_names: Optional[List[str]] = None       # 額外指定要提供的工具
 
 
 class AIChatResponse(BaseModel):
@@ -2681,30 +3212,69 @@ class AIChatResponse(BaseModel):
 # ============================================================================
 
 BRAIN_API_URL = os.getenv("BRAIN_API_URL", "https://brain.yourspce.org")
+BRAIN_API_TIMEOUT = float(os.getenv("BRAIN_API_TIMEOUT", "10"))
+BRAIN_MAX_CONNECTIONS = int(os.getenv("BRAIN_MAX_CONNECTIONS", "10"))
+
+# Brain API 專用 client（外部服務，不與 PostgREST 連線池共用 base URL / headers / 連線上限）
+_brain_client: Optional[httpx.AsyncClient] = None
+
+
+def get_brain_client() -> httpx.AsyncClient:
+    """取得 Brain API 的共用 client（lazy 建立，lifespan 結束時關閉）"""
+    global _brain_client
+    if _brain_client is None or _brain_client.is_closed:
+        _brain_client = httpx.AsyncClient(
+            base_url=BRAIN_API_URL,
+            timeout=BRAIN_API_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=BRAIN_MAX_CONNECTIONS,
+                max_keepalive_connections=BRAIN_MAX_CONNECTIONS
+            )
+        )
+    return _brain_client
+
+
+async def close_brain_client():
+    """關閉 Brain API client"""
+    global _brain_client
+    if _brain_client is not None:
+        await _brain_client.aclose()
+        _brain_client = None
+
+
+async def fetch_brain_knowledge(query: str, top_k: int = 3) -> str:
+    """
+    呼叫 Brain 知識搜尋 API（不經快取）
+
+    失敗時拋出例外，避免錯誤結果被快取
+    """
+    client = get_brain_client()
+    response = await client.post(
+        "/api/knowledge/search",
+        json={"query": query, "top_k": top_k}
+    )
+    response.raise_for_status()
+
+    results = response.json()
+    if results:
+        knowledge_text = "\n".join([
+            f"- {r.get('content', '')}"
+            for r in results
+            if r.get('similarity', 0) > 0.5
+        ])
+        if knowledge_text:
+            return f"\n\n## 相關知識參考\n{knowledge_text}"
+    return ""
+
 
 async def search_brain_knowledge(query: str, top_k: int = 3) -> str:
     """
     搜尋 Brain 知識庫，回傳相關知識作為 context
+
+    結果經 knowledge_cache 快取（TTL + LRU，選用 Redis 第二層）
     """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{BRAIN_API_URL}/api/knowledge/search",
-                json={"query": query, "top_k": top_k},
-                timeout=10.0
-            )
-
-            if response.status_code == 200:
-                results = response.json()
-                if results:
-                    knowledge_text = "\n".join([
-                        f"- {r.get('content', '')}"
-                        for r in results
-                        if r.get('similarity', 0) > 0.5
-                    ])
-                    if knowledge_text:
-                        return f"\n\n## 相關知識參考\n{knowledge_text}"
-            return ""
+        return await knowledge_cache.get_or_fetch(query, top_k, fetch_brain_knowledge)
     except Exception as e:
         logger.warning(f"Brain knowledge search failed: {e}")
         return ""
@@ -2816,6 +3386,7 @@ CRM_SYSTEM_PROMPT = """你是 Hour Jungle CRM 的智能助手，專門協助員
 - invoice_void（作廢發票）
 - invoice_allowance（開立折讓單）
 - contract_generate_pdf（生成合約 PDF）
+- pdf_generate_batch（批次生成 PDF）
 
 執行寫入操作前，你必須：
 1. 先說明你將要執行的操作內容（工具名稱、關鍵參數）
@@ -2835,6 +3406,9 @@ CRM_SYSTEM_PROMPT = """你是 Hour Jungle CRM 的智能助手，專門協助員
 
 回覆時請使用繁體中文，保持簡潔專業。"""
 
+# 固定的 system prompt（啟動時組合一次，每次請求只需附加 RAG context）
+CRM_BASE_PROMPT = CRM_SYSTEM_PROMPT + CRM_USAGE_GUIDE
+
 
 @app.get("/ai/models")
 async def list_ai_models():
@@ -2847,12 +3421,18 @@ async def list_ai_models():
     }
 
 
+@app.get("/ai/knowledge-cache/stats")
+async def get_knowledge_cache_stats():
+    """RAG 知識快取命中率統計"""
+    return knowledge_cache.get_stats()
+
+
 @app.post("/ai/chat")
 async def ai_chat(request: AIChatRequest):
     """AI 聊天端點 - 使用 OpenRouter + RAG"""
     try:
         client = get_openrouter_client()
-        tools = convert_tools_for_openai()
+        tools = convert_tools_for_openai(request.tool_categories, request.tool_names)
 
         # 取得模型 ID
         model_key = request.model if request.model in AVAILABLE_MODELS else DEFAULT_MODEL
@@ -2871,7 +3451,7 @@ async def ai_chat(request: AIChatRequest):
             rag_context = await search_brain_knowledge(last_user_message, top_k=3)
 
         # 組合 system prompt（包含 RAG 知識 + CRM 使用指南）
-        enhanced_prompt = CRM_SYSTEM_PROMPT + CRM_USAGE_GUIDE + rag_context
+        enhanced_prompt = CRM_BASE_PROMPT + rag_context
 
         # 轉換訊息格式
         messages = [
@@ -2881,7 +3461,8 @@ async def ai_chat(request: AIChatRequest):
             messages.append({"role": m.role, "content": m.content})
 
         # 呼叫 OpenRouter API
-        response = client.chat.completions.create(
+        response = await create_chat_completion(
+            client,
             model=model_id,
             max_tokens=4096,
             tools=tools,
@@ -2900,34 +3481,34 @@ async def ai_chat(request: AIChatRequest):
             # 收集工具調用結果
             tool_messages = []
 
+            calls = []
             for tool_call in assistant_message.tool_calls:
                 tool_name = tool_call.function.name
                 # 防止 arguments 為 None 導致 json.loads 錯誤
                 tool_args = json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
-                tool_id = tool_call.id
-
                 logger.info(f"AI calling tool: {tool_name} with {tool_args}")
+                calls.append((tool_name, tool_args))
 
-                # 執行工具
-                if tool_name in MCP_TOOLS:
-                    handler = MCP_TOOLS[tool_name]["handler"]
-                    try:
-                        result = await handler(**tool_args)
-                        tool_result = json.dumps(result, ensure_ascii=False, default=str)
-                        tool_calls_made.append({
-                            "tool": tool_name,
-                            "input": tool_args,
-                            "result": result
-                        })
-                    except Exception as e:
-                        logger.error(f"Tool {tool_name} error: {e}")
-                        tool_result = f"Error: {str(e)}"
-                else:
+            # 執行工具（唯讀工具併發，寫入工具依序）
+            outcomes = await execute_tool_calls(calls)
+
+            for tool_call, (tool_name, tool_args), outcome in zip(assistant_message.tool_calls, calls, outcomes):
+                if not outcome["found"]:
                     tool_result = f"Tool '{tool_name}' not found"
+                elif outcome["error"] is not None:
+                    tool_result = f"Error: {outcome['error']}"
+                else:
+                    result = outcome["result"]
+                    tool_result = json.dumps(result, ensure_ascii=False, default=str)
+                    tool_calls_made.append({
+                        "tool": tool_name,
+                        "input": tool_args,
+                        "result": result
+                    })
 
                 tool_messages.append({
                     "role": "tool",
-                    "tool_call_id": tool_id,
+                    "tool_call_id": tool_call.id,
                     "content": tool_result
                 })
 
@@ -2949,7 +3530,8 @@ async def ai_chat(request: AIChatRequest):
             messages.extend(tool_messages)
 
             # 再次呼叫 API
-            response = client.chat.completions.create(
+            response = await create_chat_completion(
+                client,
                 model=model_id,
                 max_tokens=4096,
                 tools=tools,
@@ -3120,12 +3702,12 @@ async def ai_chat_stream(request: AIChatRequest):
         rag_context = await search_brain_knowledge(last_user_message, top_k=3)
 
     # 組合 system prompt
-    enhanced_prompt = CRM_SYSTEM_PROMPT + CRM_USAGE_GUIDE + rag_context
+    enhanced_prompt = CRM_BASE_PROMPT + rag_context
 
     async def generate():
         try:
             client = get_openrouter_client()
-            tools = convert_tools_for_openai()
+            tools = convert_tools_for_openai(request.tool_categories, request.tool_names)
 
             model_key = request.model if request.model in AVAILABLE_MODELS else DEFAULT_MODEL
             model_id = AVAILABLE_MODELS[model_key]["id"]
@@ -3135,7 +3717,8 @@ async def ai_chat_stream(request: AIChatRequest):
                 messages.append({"role": m.role, "content": m.content})
 
             # 第一次調用（可能有工具調用）
-            response = client.chat.completions.create(
+            response = await create_chat_completion(
+                client,
                 model=model_id,
                 max_tokens=4096,
                 tools=tools,
@@ -3157,25 +3740,27 @@ async def ai_chat_stream(request: AIChatRequest):
                     yield f"data: {json.dumps({'type': 'tool', 'name': tool_name}, ensure_ascii=False)}\n\n"
 
                 tool_messages = []
-                for tool_call in assistant_message.tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_args = json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
-                    tool_id = tool_call.id
-
-                    if tool_name in MCP_TOOLS:
-                        handler = MCP_TOOLS[tool_name]["handler"]
-                        try:
-                            result = await handler(**tool_args)
-                            tool_result = json.dumps(result, ensure_ascii=False, default=str)
-                            tool_calls_made.append({"tool": tool_name, "input": tool_args})
-                        except Exception as e:
-                            tool_result = f"Error: {str(e)}"
-                    else:
+                calls = [
+                    (
+                        tool_call.function.name,
+                        json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
+                    )
+                    for tool_call in assistant_message.tool_calls
+                ]
+                outcomes = await execute_tool_calls(calls)
+
+                for tool_call, (tool_name, tool_args), outcome in zip(assistant_message.tool_calls, calls, outcomes):
+                    if not outcome["found"]:
                         tool_result = f"Tool '{tool_name}' not found"
+                    elif outcome["error"] is not None:
+                        tool_result = f"Error: {outcome['error']}"
+                    else:
+                        tool_result = json.dumps(outcome["result"], ensure_ascii=False, default=str)
+                        tool_calls_made.append({"tool": tool_name, "input": tool_args})
 
                     tool_messages.append({
                         "role": "tool",
-                        "tool_call_id": tool_id,
+                        "tool_call_id": tool_call.id,
                         "content": tool_result
                     })
 
@@ -3195,7 +3780,8 @@ async def ai_chat_stream(request: AIChatRequest):
                 })
                 messages.extend(tool_messages)
 
-                response = client.chat.completions.create(
+                response = await create_chat_completion(
+                    client,
                     model=model_id,
                     max_tokens=4096,
                     tools=tools,
@@ -3207,18 +3793,6 @@ async def ai_chat_stream(request: AIChatRequest):
                 )
                 assistant_message = response.choices[0].message
 
-            # 最終回應使用串流
-            stream = client.chat.completions.create(
-                model=model_id,
-                max_tokens=4096,
-                messages=messages + [{"role": "assistant", "content": ""}] if not assistant_message.content else messages,
-                stream=True,
-                extra_headers={
-                    "HTTP-Referer": "https://hj.yourspce.org",
-                    "X-Title": "Hour Jungle CRM"
-                }
-            )
-
             # 收集完整回應內容
             full_content = ""
 
@@ -3227,12 +3801,25 @@ async def ai_chat_stream(request: AIChatRequest):
                 full_content = assistant_message.content
                 yield f"data: {json.dumps({'type': 'content', 'text': assistant_message.content}, ensure_ascii=False)}\n\n"
             else:
-                # 串流輸出
-                for chunk in stream:
-                    if chunk.choices[0].delta.content:
-                        chunk_text = chunk.choices[0].delta.content
-                        full_content += chunk_text
-                        yield f"data: {json.dumps({'type': 'content', 'text': chunk_text}, ensure_ascii=False)}\n\n"
+                # 最終回應使用串流（串流期間持續佔用併發名額）
+                async with _llm_semaphore:
+                    stream = await client.chat.completions.create(
+                        model=model_id,
+                        max_tokens=4096,
+                        messages=messages + [{"role": "assistant", "content": ""}],
+                        stream=True,
+                        extra_headers={
+                            "HTTP-Referer": "https://hj.yourspce.org",
+                            "X-Title": "Hour Jungle CRM"
+                        },
+                        timeout=settings.llm_timeout
+                    )
+
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            chunk_text = chunk.choices[0].delta.content
+                            full_content += chunk_text
+                            yield f"data: {json.dumps({'type': 'content', 'text': chunk_text}, ensure_ascii=False)}\n\n"
 
             # 儲存對話記錄
             conversation_id = None
@@ -0,0 +1,176 @@
+"""
+Hour Jungle CRM - Availability Engine
+會議室可用時段計算
+
+所有時間轉成「當天第幾分鐘」的整數區間 [start, end)：
+- 資料庫預約與 Google Calendar 忙碌時段先各自轉換，每個會議室每天只排序、合併一次
+- 可用時段 = 營業時間扣掉合併後的忙碌區間，再依會議室的時段長度切格
+- 單一時段檢查用 bisect，不需逐一比對所有忙碌區間
+
+營業時間與時段長度取自 meeting_rooms.open_time / close_time / slot_minutes（Migration 118），
+欄位不存在或為空時使用 09:00–18:00、30 分鐘
+"""
+
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+Interval = Tuple[int, int]
+
+DEFAULT_OPEN_MINUTE = 9 * 60
+DEFAULT_CLOSE_MINUTE = 18 * 60
+DEFAULT_SLOT_MINUTES = 30
+
+
+def to_minutes(value: str) -> int:
+    """'HH:MM' 或 'HH:MM:SS' 轉成當天第幾分鐘"""
+    hour, minute = value.split(":")[:2]
+    return int(hour) * 60 + int(minute)
+
+
+def format_minutes(minutes: int) -> str:
+    """當天第幾分鐘轉回 'HH:MM'"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+@dataclass(frozen=True)
+class RoomHours:
+    """會議室營業時間與時段長度（分鐘）"""
+    open_minute: int = DEFAULT_OPEN_MINUTE
+    close_minute: int = DEFAULT_CLOSE_MINUTE
+    slot_minutes: int = DEFAULT_SLOT_MINUTES
+
+    @classmethod
+    def from_room(cls, room: Dict[str, Any], slot_minutes: int = None) -> "RoomHours":
+        """由 meeting_rooms 資料列建立，slot_minutes 可覆寫會議室設定"""
+        return cls(
+            open_minute=to_minutes(room["open_time"]) if room.get("open_time") else DEFAULT_OPEN_MINUTE,
+            close_minute=to_minutes(room["close_time"]) if room.get("close_time") else DEFAULT_CLOSE_MINUTE,
+            slot_minutes=slot_minutes or room.get("slot_minutes") or DEFAULT_SLOT_MINUTES
+        )
+
+    @property
+    def open_time(self) -> str:
+        return format_minutes(self.open_minute)
+
+    @property
+    def close_time(self) -> str:
+        return format_minutes(self.close_minute)
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """排序並合併重疊或相鄰的區間"""
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def _first_overlap_index(busy: List[Interval], start: int) -> int:
+    """第一個結束時間晚於 start 的區間位置（busy 已合併，開始與結束時間皆遞增）"""
+    i = bisect_right(busy, (start, float("inf")))
+    if i > 0 and busy[i - 1][1] > start:
+        return i - 1
+    return i
+
+
+def find_conflicts(busy: List[Interval], start: int, end: int) -> List[Interval]:
+    """回傳與 [start, end) 重疊的區間（busy 必須已合併排序）"""
+    i = _first_overlap_index(busy, start)
+    conflicts = []
+    while i < len(busy) and busy[i][0] < end:
+        conflicts.append(busy[i])
+        i += 1
+    return conflicts
+
+
+def is_free(busy: List[Interval], start: int, end: int) -> bool:
+    """[start, end) 是否完全沒有忙碌區間（busy 必須已合併排序）"""
+    i = _first_overlap_index(busy, start)
+    return i >= len(busy) or busy[i][0] >= end
+
+
+def free_intervals(busy: List[Interval], open_minute: int, close_minute: int) -> List[Interval]:
+    """營業時間扣掉忙碌區間後的空檔（busy 必須已合併排序）"""
+    free = []
+    cursor = open_minute
+    for start, end in busy:
+        if end <= cursor:
+            continue
+        if start >= close_minute:
+            break
+        if start > cursor:
+            free.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < close_minute:
+        free.append((cursor, close_minute))
+    return free
+
+
+def slot_starts(
+    free: List[Interval],
+    hours: RoomHours,
+    duration: int = None,
+    not_before: int = None
+) -> List[int]:
+    """
+    可預約的時段開始時間
+
+    時段從開門時間起每 slot_minutes 一格；時段 [s, s + duration) 必須完整落在某個空檔內
+
+    Args:
+        free: free_intervals() 的結果
+        hours: 營業時間與時段長度
+        duration: 預約長度（分鐘），預設等於時段長度
+        not_before: 只回傳開始時間晚於此分鐘的時段（今天過濾已過去的時段）
+    """
+    step = hours.slot_minutes
+    duration = duration or step
+    starts = []
+    for free_start, free_end in free:
+        # 對齊到時段格線（向上取整）
+        offset = free_start - hours.open_minute
+        s = hours.open_minute + -(-offset // step) * step
+        while s + duration <= free_end:
+            if not_before is None or s > not_before:
+                starts.append(s)
+            s += step
+    return starts
+
+
+def day_availability(
+    busy: List[Interval],
+    hours: RoomHours,
+    day: date,
+    duration: int = None,
+    now: datetime = None
+) -> List[Dict[str, str]]:
+    """
+    單一會議室單日的可用時段
+
+    Args:
+        busy: 當天忙碌區間（未合併也可以）
+        hours: 營業時間與時段長度
+        day: 日期（今天會過濾已過去的時段）
+        duration: 預約長度（分鐘），預設等於時段長度
+        now: 目前時間（預設 datetime.now()）
+
+    Returns:
+        [{"start": "HH:MM", "end": "HH:MM"}]
+    """
+    now = now or datetime.now()
+    not_before = now.hour * 60 + now.minute if day == now.date() else None
+
+    duration = duration or hours.slot_minutes
+    free = free_intervals(merge_intervals(busy), hours.open_minute, hours.close_minute)
+    return [
+        {"start": format_minutes(s), "end": format_minutes(s + duration)}
+        for s in slot_starts(free, hours, duration, not_before)
+    ]
@@ -0,0 +1,152 @@
+"""
+Hour Jungle CRM - Availability Cache
+會議室可用性熱圖快取（Redis）
+
+用途：LINE 預約流程的日期選單每次都要查未來 N 天 × 場館所有會議室的可用時段
+（預約 + Google Calendar），同一場館短時間內被多位客戶重複查詢
+
+- 結果存在 Redis（多個 instance 共用），短 TTL（AVAILABILITY_CACHE_TTL，預設 60 秒）
+- booking_create / booking_cancel / booking_update 寫入後呼叫 invalidate_availability_cache()，
+  遞增 Redis generation，所有熱圖立即失效
+- 相同 key 的併發請求共用同一次計算
+- Redis 無法連線時直接計算（只記 log），不影響預約流程
+- 直接改資料庫或 Google Calendar 的變更最晚在 TTL 後生效
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+AVAILABILITY_CACHE_TTL = int(os.getenv("AVAILABILITY_CACHE_TTL", "60"))  # 秒，0 表示停用
+AVAILABILITY_CACHE_REDIS = os.getenv("AVAILABILITY_CACHE_REDIS", "true").lower() == "true"
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+REDIS_KEY_PREFIX = "availability_heatmap"
+REDIS_GENERATION_KEY = f"{REDIS_KEY_PREFIX}:generation"
+
+Computer = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class AvailabilityCache:
+    """可用性熱圖快取（只存 Redis，不在 process 內保留副本，確保跨 instance 失效一致）"""
+
+    def __init__(self, ttl: int = AVAILABILITY_CACHE_TTL, use_redis: bool = AVAILABILITY_CACHE_REDIS):
+        self.ttl = ttl
+        self.use_redis = use_redis and ttl > 0
+        self._redis = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "errors": 0,
+            "invalidations": 0,
+        }
+
+    async def _get_redis(self):
+        if not self.use_redis:
+            return None
+        if self._redis is None:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return self._redis
+
+    async def _redis_key(self, key: str) -> Optional[str]:
+        """含目前 generation 的 Redis key，Redis 無法使用時回傳 None"""
+        try:
+            r = await self._get_redis()
+            if r is None:
+                return None
+            generation = await r.get(REDIS_GENERATION_KEY) or "0"
+            return f"{REDIS_KEY_PREFIX}:{generation}:{key}"
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Availability cache Redis read failed: {e}")
+            return None
+
+    async def _compute_and_store(self, redis_key: Optional[str], compute: Computer) -> Dict[str, Any]:
+        result = await compute()
+        # 失敗結果不快取；計算期間若已 invalidate，generation 已變，舊 key 不會再被讀到
+        if redis_key and result.get("success"):
+            try:
+                await self._redis.set(redis_key, json.dumps(result, ensure_ascii=False), ex=self.ttl)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Availability cache Redis write failed: {e}")
+        return result
+
+    async def get_or_compute(self, key: str, compute: Computer) -> Dict[str, Any]:
+        """
+        取得快取的熱圖，未命中時呼叫 compute 計算並寫入
+
+        Args:
+            key: 查詢條件（場館、起始日、天數）
+            compute: 實際計算函數
+
+        Returns:
+            compute 回傳的結果，另加 cached 欄位
+        """
+        redis_key = await self._redis_key(key)
+        if redis_key:
+            try:
+                raw = await self._redis.get(redis_key)
+                if raw:
+                    self.stats["hits"] += 1
+                    return {**json.loads(raw), "cached": True}
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Availability cache Redis read failed: {e}")
+                redis_key = None
+
+        self.stats["misses"] += 1
+        inflight_key = redis_key or key
+        future = self._inflight.get(inflight_key)
+        if future is None:
+            future = asyncio.ensure_future(self._compute_and_store(redis_key, compute))
+            self._inflight[inflight_key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+        result = await asyncio.shield(future)
+        return {**result, "cached": False}
+
+    async def invalidate(self):
+        """預約異動後呼叫，所有熱圖失效"""
+        self.stats["invalidations"] += 1
+        try:
+            r = await self._get_redis()
+            if r is not None:
+                await r.incr(REDIS_GENERATION_KEY)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Availability cache Redis invalidation failed: {e}")
+
+    async def close(self):
+        """關閉 Redis 連線（lifespan 結束時呼叫）"""
+        if self._redis is not None:
+            try:
+                await self._redis.aclose()
+            except Exception as e:
+                logger.warning(f"Availability cache Redis close failed: {e}")
+            self._redis = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得命中率統計"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "ttl": self.ttl,
+            "redis_enabled": self.use_redis
+        }
+
+
+# 全域快取實例
+availability_cache = AvailabilityCache()
+
+
+async def invalidate_availability_cache():
+    """預約建立、取消、改期後呼叫"""
+    await availability_cache.invalidate()
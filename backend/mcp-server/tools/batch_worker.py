@@ -0,0 +1,226 @@
+"""
+Hour Jungle CRM - Batch Task Worker
+batch_tasks 背景任務執行器
+
+用途：批量催繳等任務原本在 HTTP 請求內逐筆處理，請求要等全部跑完，
+服務重啟時處理到一半的任務就中斷（Migration 113）
+
+- enqueue_batch_task()：一個 RPC 建立任務 + 全部項目，立即回傳 task_id
+- BatchTaskWorker：背景輪詢 claim_batch_task_items()（FOR UPDATE SKIP LOCKED），
+  多個 instance 同時執行也不會重複處理；有上限的併發
+- 領取後逾時未回報的項目（worker 當機、重啟）會被重新領取，超過次數上限標記失敗
+- 只領取 enqueue_batch_task() 建立的任務（batch_tasks.queued，Migration 120）；
+  bulk_sender.run_bulk 建立後自行處理的任務不會被領取
+- 任務處理函數以 register_batch_handler(task_type, handler) 註冊
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from .postgrest_client import postgrest_session
+
+logger = logging.getLogger(__name__)
+
+POSTGREST_URL = os.getenv("POSTGREST_URL", "http://postgrest:3000")
+
+# Worker 設定
+BATCH_WORKER_ENABLED = os.getenv("BATCH_WORKER_ENABLED", "true").lower() == "true"
+BATCH_WORKER_CONCURRENCY = int(os.getenv("BATCH_WORKER_CONCURRENCY", "10"))
+BATCH_WORKER_POLL_INTERVAL = float(os.getenv("BATCH_WORKER_POLL_INTERVAL", "5"))
+BATCH_WORKER_SHUTDOWN_TIMEOUT = float(os.getenv("BATCH_WORKER_SHUTDOWN_TIMEOUT", "10"))
+BATCH_ITEM_LOCK_TIMEOUT = int(os.getenv("BATCH_ITEM_LOCK_TIMEOUT", "300"))      # 秒
+BATCH_ITEM_MAX_ATTEMPTS = int(os.getenv("BATCH_ITEM_MAX_ATTEMPTS", "3"))
+
+BatchHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+# task_type -> 單筆處理函數（收到 claim_batch_task_items 回傳的項目）
+_handlers: Dict[str, BatchHandler] = {}
+
+
+def register_batch_handler(task_type: str, handler: BatchHandler):
+    """註冊任務類型的單筆處理函數，回傳 {"success": bool, "error": ..., "code": ...}"""
+    _handlers[task_type] = handler
+
+
+async def _rpc(function_name: str, params: dict) -> Any:
+    """PostgREST RPC 呼叫"""
+    url = f"{POSTGREST_URL}/rpc/{function_name}"
+    headers = {"Content-Type": "application/json"}
+    async with postgrest_session() as client:
+        response = await client.post(url, json=params, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+
+# ============================================================================
+# Worker
+# ============================================================================
+
+class BatchTaskWorker:
+    """背景處理 batch_task_items 佇列"""
+
+    def __init__(
+        self,
+        concurrency: int = BATCH_WORKER_CONCURRENCY,
+        poll_interval: float = BATCH_WORKER_POLL_INTERVAL,
+        worker_id: Optional[str] = None
+    ):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._wake = asyncio.Event()
+        self._inflight: Set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._loop_task is not None and not self._loop_task.done()
+
+    def start(self):
+        """啟動輪詢迴圈（需在 event loop 內呼叫）"""
+        if self.running:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._run())
+        logger.info(
+            f"Batch worker {self.worker_id} started "
+            f"(concurrency {self.concurrency}, poll every {self.poll_interval}s)"
+        )
+
+    def notify(self):
+        """有新任務時喚醒迴圈，不必等下一次輪詢"""
+        self._wake.set()
+
+    async def stop(self, timeout: float = BATCH_WORKER_SHUTDOWN_TIMEOUT):
+        """停止領取新項目，等待處理中的項目完成，逾時則取消並歸還佇列"""
+        if self._loop_task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._loop_task
+        self._loop_task = None
+
+        if self._inflight:
+            _, pending = await asyncio.wait(set(self._inflight), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        try:
+            released = await _rpc("release_batch_task_items", {"p_worker_id": self.worker_id})
+            if released:
+                logger.info(f"Batch worker released {released} unfinished items")
+        except Exception as e:
+            # 未歸還的項目會在鎖逾時後被重新領取
+            logger.warning(f"歸還任務項目失敗: {e}")
+
+        logger.info(f"Batch worker {self.worker_id} stopped")
+
+    async def _run(self):
+        while not self._stopping:
+            self._wake.clear()
+
+            free = self.concurrency - len(self._inflight)
+            if free > 0:
+                for item in await self._claim(free):
+                    task = asyncio.create_task(self._process(item))
+                    self._inflight.add(task)
+                    task.add_done_callback(self._inflight.discard)
+
+            # 有空位釋出或新任務進來時提早醒來
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, limit: int) -> List[Dict[str, Any]]:
+        try:
+            return await _rpc("claim_batch_task_items", {
+                "p_worker_id": self.worker_id,
+                "p_limit": limit,
+                "p_lock_timeout_seconds": BATCH_ITEM_LOCK_TIMEOUT,
+                "p_max_attempts": BATCH_ITEM_MAX_ATTEMPTS
+            }) or []
+        except Exception as e:
+            logger.error(f"領取批量任務項目失敗: {e}")
+            return []
+
+    async def _process(self, item: Dict[str, Any]):
+        try:
+            result = await self._handle(item)
+            try:
+                await _rpc("complete_batch_task_item", {
+                    "p_item_id": item["item_id"],
+                    "p_worker_id": self.worker_id,
+                    "p_success": bool(result.get("success")),
+                    "p_error_code": None if result.get("success") else result.get("code", "UNKNOWN"),
+                    "p_error_message": None if result.get("success") else result.get("error")
+                })
+            except Exception as e:
+                # 回報失敗的項目維持 processing，鎖逾時後會被重新領取
+                logger.error(f"回報任務項目 {item['item_id']} 失敗: {e}")
+        finally:
+            self._wake.set()
+
+    async def _handle(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """執行單筆，例外轉為失敗結果（單筆失敗不影響其他項目）"""
+        handler = _handlers.get(item["task_type"])
+        if handler is None:
+            return {
+                "success": False,
+                "error": f"未註冊的任務類型: {item['task_type']}",
+                "code": "UNKNOWN_TASK_TYPE"
+            }
+        try:
+            result = await handler(item)
+            if not isinstance(result, dict):
+                return {"success": bool(result)}
+            return result
+        except Exception as e:
+            logger.error(f"Batch item {item['item_id']} failed: {e}")
+            return {"success": False, "error": str(e), "code": "EXCEPTION"}
+
+
+# 每個 process 一個 worker（由 main.lifespan 啟動 / 停止）
+batch_worker = BatchTaskWorker()
+
+
+# ============================================================================
+# 建立任務
+# ============================================================================
+
+async def enqueue_batch_task(
+    task_type: str,
+    target_type: str,
+    target_ids: List[int],
+    payload: Optional[Dict[str, Any]] = None,
+    created_by: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    建立批量任務並排入背景處理
+
+    Args:
+        task_type: 任務類型（需已 register_batch_handler）
+        target_type: 目標類型（payment 等）
+        target_ids: 目標 ID 列表
+        payload: 任務參數（handler 可從 item["payload"] 取得）
+        created_by: 建立者
+
+    Returns:
+        {"task_id", "task_type", "status", "total_count"}
+    """
+    result = await _rpc("enqueue_batch_task", {
+        "p_task_type": task_type,
+        "p_target_type": target_type,
+        "p_target_ids": [int(target_id) for target_id in target_ids],
+        "p_payload": payload or {},
+        "p_created_by": created_by
+    })
+    batch_worker.notify()
+    return result
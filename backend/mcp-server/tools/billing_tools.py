@@ -14,12 +14,15 @@ Commands:
 
 import logging
 import os
-import uuid
 from datetime import datetime
 from typing import Dict, Any, Optional
 
 import httpx
 
+from .batch_worker import enqueue_batch_task, register_batch_handler
+from .bulk_sender import line_push_bucket, request_with_retry
+from .postgrest_client import postgrest_session
+
 logger = logging.getLogger(__name__)
 
 POSTGREST_URL = os.getenv("POSTGREST_URL", "http://postgrest:3000")
@@ -29,8 +32,8 @@ BRAIN_API_URL = os.getenv("BRAIN_API_URL", "https://brain.yourspce.org")
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -42,8 +45,8 @@ async def postgrest_post(endpoint: str, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.post(url, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -55,8 +58,8 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, params=params, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.patch(url, params=params, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -696,20 +699,24 @@ async def billing_send_reminder(
 
     # 4. 透過 Brain 發送（或直接 LINE API）
     try:
-        # 嘗試透過 Brain 發送
+        # 嘗試透過 Brain 發送（與 LINE push 共用限速；Brain 無冪等 key，只重試 429 / 503）
         async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{BRAIN_API_URL}/api/integration/send",
-                json={
-                    "line_user_id": line_user_id,
-                    "message": message,
-                    "source": "billing_reminder",
-                    "metadata": {
-                        "payment_id": payment_id,
-                        "customer_name": customer_name
-                    }
-                },
-                timeout=30.0
+            response = await request_with_retry(
+                lambda: client.post(
+                    f"{BRAIN_API_URL}/api/integration/send",
+                    json={
+                        "line_user_id": line_user_id,
+                        "message": message,
+                        "source": "billing_reminder",
+                        "metadata": {
+                            "payment_id": payment_id,
+                            "customer_name": customer_name
+                        }
+                    },
+                    timeout=30.0
+                ),
+                bucket=line_push_bucket,
+                retry_on=frozenset({429, 503})
             )
 
             if response.status_code == 200:
@@ -757,6 +764,14 @@ async def billing_send_reminder(
             }
 
 
+async def _send_reminder_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """背景任務 send_reminder 的單筆處理"""
+    return await billing_send_reminder(item["target_id"])
+
+
+register_batch_handler("send_reminder", _send_reminder_item)
+
+
 async def billing_batch_remind(
     payment_ids: list,
     created_by: str = None
@@ -769,7 +784,7 @@ async def billing_batch_remind(
         created_by: 建立者
 
     Returns:
-        批量任務資訊（可用 PostgREST embed 查詢進度）
+        批量任務資訊（立即回傳，可用 query_url 查詢進度）
     """
     if not payment_ids:
         return {
@@ -778,86 +793,26 @@ async def billing_batch_remind(
             "code": "INVALID_PARAMS"
         }
 
-    # 1. 創建批量任務
-    task_id = str(uuid.uuid4())
-
+    # 建立任務並排入背景處理（batch_worker 領取發送，進度寫入 batch_task_items）
     try:
-        await postgrest_post("batch_tasks", {
-            "id": task_id,
-            "task_type": "send_reminder",
-            "status": "processing",
-            "total_count": len(payment_ids),
-            "created_by": created_by,
-            "started_at": datetime.now().isoformat()
-        })
-
-        # 2. 創建任務項目
-        for pid in payment_ids:
-            await postgrest_post("batch_task_items", {
-                "task_id": task_id,
-                "target_id": pid,
-                "target_type": "payment",
-                "status": "pending"
-            })
-
+        task = await enqueue_batch_task(
+            "send_reminder",
+            "payment",
+            payment_ids,
+            created_by=created_by
+        )
     except Exception as e:
         logger.error(f"創建批量任務失敗: {e}")
         raise
 
-    # 3. 背景執行（同步處理，實際應用應改為非同步）
-    success_count = 0
-    failed_count = 0
-
-    for pid in payment_ids:
-        result = await billing_send_reminder(pid)
-
-        if result.get("success"):
-            success_count += 1
-            item_status = "success"
-            error_code = None
-            error_message = None
-        else:
-            failed_count += 1
-            item_status = "failed"
-            error_code = result.get("code", "UNKNOWN")
-            error_message = result.get("error")
-
-        # 更新項目狀態
-        try:
-            await postgrest_patch(
-                "batch_task_items",
-                {"task_id": f"eq.{task_id}", "target_id": f"eq.{pid}"},
-                {
-                    "status": item_status,
-                    "error_code": error_code,
-                    "error_message": error_message,
-                    "processed_at": datetime.now().isoformat()
-                }
-            )
-        except Exception as update_err:
-            logger.warning(f"更新任務項目失敗: {update_err}")
-
-    # 4. 更新任務狀態
-    final_status = "completed" if failed_count == 0 else ("partial_success" if success_count > 0 else "failed")
-
-    await postgrest_patch(
-        "batch_tasks",
-        {"id": f"eq.{task_id}"},
-        {
-            "status": final_status,
-            "success_count": success_count,
-            "failed_count": failed_count,
-            "completed_at": datetime.now().isoformat()
-        }
-    )
+    task_id = task["task_id"]
 
     return {
         "success": True,
         "task_id": task_id,
-        "status": final_status,
-        "total_count": len(payment_ids),
-        "success_count": success_count,
-        "failed_count": failed_count,
+        "status": task["status"],
+        "total_count": task["total_count"],
+        "message": f"已排入背景處理，共 {task['total_count']} 筆",
         "query_url": f"/api/db/batch_tasks?id=eq.{task_id}&select=*,items:batch_task_items(*)"
     }
 
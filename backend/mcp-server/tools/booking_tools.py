@@ -3,15 +3,19 @@ Hour Jungle CRM - Booking Tools
 會議室預約相關工具
 """
 
+import asyncio
+import json
 import logging
 import os
 from datetime import datetime, date, time, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union
 
-import httpx
-
-from .google_calendar import get_calendar_service
+from .availability import RoomHours, day_availability, is_free, merge_intervals, to_minutes
+from .availability_cache import availability_cache, invalidate_availability_cache
+from .google_calendar import get_async_calendar_service
 from .line_tools import send_line_push
+from .postgrest_client import postgrest_session
+from .reference_cache import get_reference_row, get_reference_rows
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +27,9 @@ DEFAULT_MEETING_CALENDAR_ID = os.getenv(
     os.getenv("SIGNING_CALENDAR_ID", "primary")  # 共用簽約行事曆
 )
 
+# 多天可用時段查詢的最大天數
+AVAILABILITY_MAX_DAYS = int(os.getenv("BOOKING_AVAILABILITY_MAX_DAYS", "62"))
+
 # PostgREST 請求函數（供此模組使用）
 _postgrest_request = None
 
@@ -39,8 +46,8 @@ async def postgrest_get(endpoint: str, params: dict = None) -> Any:
         return await _postgrest_request("GET", endpoint, params=params)
 
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -58,8 +65,8 @@ async def postgrest_post(endpoint: str, data: dict, headers: dict = None) -> Any
     default_headers = {"Content-Type": "application/json", "Prefer": "return=representation"}
     if headers:
         default_headers.update(headers)
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=data, headers=default_headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.post(url, json=data, headers=default_headers)
         response.raise_for_status()
         return response.json()
 
@@ -71,12 +78,35 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
 
     url = f"{POSTGREST_URL}/{endpoint}"
     headers = {"Content-Type": "application/json", "Prefer": "return=representation"}
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, params=params, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.patch(url, params=params, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
 
+def _same_id(a: Any, b: Any) -> bool:
+    """比對 ID：參數可能是字串（AI / 前端傳入），資料列是整數，統一轉 int 再比"""
+    return a is not None and b is not None and int(a) == int(b)
+
+
+def _parse_ids(ids: Union[List[int], str, int, None]) -> Optional[List[int]]:
+    """
+    解析ID列表：AI 工具呼叫時 array 參數以字串傳入（JSON 陣列或逗號分隔），
+    與 REST API 相同方式解析，格式錯誤時拋出 ValueError；未提供時回傳 None
+    """
+    try:
+        if isinstance(ids, str):
+            text = ids.strip()
+            values = json.loads(text) if text.startswith("[") else [x for x in text.split(",") if x.strip()]
+        elif isinstance(ids, int):
+            values = [ids]
+        else:
+            values = ids or []
+        return [int(i) for i in values] or None
+    except (TypeError, ValueError):
+        raise ValueError(f"ID格式錯誤: {ids}（請提供ID陣列或以逗號分隔）")
+
+
 # ============================================================================
 # 會議室預約工具
 # ============================================================================
@@ -92,18 +122,19 @@ async def booking_list_rooms(branch_id: int = None) -> Dict[str, Any]:
         會議室列表
     """
     try:
-        params = {"is_active": "eq.true", "order": "branch_id,name"}
-        if branch_id:
-            params["branch_id"] = f"eq.{branch_id}"
-
-        rooms = await postgrest_get("meeting_rooms", params)
-
-        # 加入場館資訊
-        branches = await postgrest_get("branches", {"select": "id,name"})
-        branch_map = {b["id"]: b["name"] for b in branches}
+        # 會議室與場館皆為參考資料快取（已依 branch_id, name 排序）
+        all_rooms, branches = await asyncio.gather(
+            get_reference_rows("meeting_rooms"),
+            get_reference_rows("branches")
+        )
+        branch_names = {b["id"]: b.get("name", "") for b in branches}
 
+        rooms = [
+            room for room in all_rooms
+            if room.get("is_active") and (not branch_id or _same_id(room.get("branch_id"), branch_id))
+        ]
         for room in rooms:
-            room["branch_name"] = branch_map.get(room["branch_id"], "")
+            room["branch_name"] = branch_names.get(room.get("branch_id"), "")
 
         return {
             "success": True,
@@ -115,6 +146,76 @@ async def booking_list_rooms(branch_id: int = None) -> Dict[str, Any]:
         raise Exception(f"取得會議室列表失敗: {e}")
 
 
+async def _collect_busy_times(
+    rooms: List[Dict[str, Any]],
+    date_from: date,
+    date_to: date
+) -> Dict[tuple, List[Dict[str, Any]]]:
+    """
+    一次取得多個會議室 × 日期區間的忙碌時段
+
+    資料庫預約一次查詢，Google Calendar 以 freebusy 批次查詢，兩者同時進行
+
+    Returns:
+        {(room_id, YYYY-MM-DD): [{"start": "HH:MM", "end": "HH:MM", "source": "database"|"calendar"}]}
+    """
+    dates = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+    room_ids = ",".join(str(room["id"]) for room in rooms)
+    calendar_rooms = [room for room in rooms if room.get("google_calendar_id")]
+
+    async def fetch_calendar():
+        if not calendar_rooms:
+            return {}
+        # 依最寬的營業時間查詢，超出各會議室營業時間的部分由可用時段計算裁掉
+        hours = [RoomHours.from_room(room) for room in calendar_rooms]
+        try:
+            result = await get_async_calendar_service().get_busy_times_batch(
+                [room["google_calendar_id"] for room in calendar_rooms],
+                dates,
+                time(*divmod(min(h.open_minute for h in hours), 60)),
+                time(*divmod(max(h.close_minute for h in hours), 60))
+            )
+        except Exception as e:
+            logger.warning(f"Failed to get calendar busy times: {e}")
+            return {}
+        if not result.get("success"):
+            logger.warning(f"Failed to get calendar busy times: {result.get('error')}")
+            return {}
+        for calendar_id, reason in result["errors"].items():
+            logger.warning(f"Failed to get calendar busy times for {calendar_id}: {reason}")
+        return result["busy_times"]
+
+    bookings, calendar_busy = await asyncio.gather(
+        postgrest_get("meeting_room_bookings", {
+            "meeting_room_id": f"in.({room_ids})",
+            "and": f"(booking_date.gte.{date_from.isoformat()},booking_date.lte.{date_to.isoformat()})",
+            "status": "eq.confirmed",
+            "select": "meeting_room_id,booking_date,start_time,end_time",
+            "order": "booking_date,start_time"
+        }),
+        fetch_calendar()
+    )
+
+    busy: Dict[tuple, List[Dict[str, Any]]] = {}
+    for b in bookings:
+        busy.setdefault((b["meeting_room_id"], b["booking_date"]), []).append({
+            "start": b["start_time"][:5],  # HH:MM
+            "end": b["end_time"][:5],
+            "source": "database"
+        })
+    for room in calendar_rooms:
+        for day, slots in calendar_busy.get(room["google_calendar_id"], {}).items():
+            busy.setdefault((room["id"], day), []).extend(
+                {"start": slot["start"], "end": slot["end"], "source": "calendar"}
+                for slot in slots
+            )
+    return busy
+
+
+def _to_intervals(busy: List[Dict[str, Any]]) -> List[tuple]:
+    return [(to_minutes(b["start"]), to_minutes(b["end"])) for b in busy]
+
+
 async def booking_check_availability(
     room_id: int,
     date_str: str,
@@ -135,59 +236,21 @@ async def booking_check_availability(
     """
     try:
         # 取得會議室資訊
-        rooms = await postgrest_get("meeting_rooms", {"id": f"eq.{room_id}"})
-        if not rooms:
+        room = await get_reference_row("meeting_rooms", room_id)
+        if not room:
             return {"success": False, "error": "會議室不存在"}
 
-        room = rooms[0]
         check_date = datetime.strptime(date_str, "%Y-%m-%d").date()
 
-        # 取得該日已有預約
-        bookings = await postgrest_get("meeting_room_bookings", {
-            "meeting_room_id": f"eq.{room_id}",
-            "booking_date": f"eq.{date_str}",
-            "status": "eq.confirmed",
-            "select": "id,start_time,end_time,customer_id"
-        })
-
-        # 如果有 Google Calendar ID，也從 Calendar 取得
-        busy_times = []
-        if room.get("google_calendar_id"):
-            try:
-                calendar_service = get_calendar_service()
-                busy_result = calendar_service.get_busy_times(
-                    room["google_calendar_id"],
-                    check_date
-                )
-                if busy_result.get("success"):
-                    busy_times = busy_result.get("busy_times", [])
-            except Exception as e:
-                logger.warning(f"Failed to get calendar busy times: {e}")
-
-        # 合併資料庫預約和 Calendar 忙碌時段
-        all_busy = []
-        for b in bookings:
-            all_busy.append({
-                "start": b["start_time"][:5],  # HH:MM
-                "end": b["end_time"][:5],
-                "source": "database"
-            })
-        for bt in busy_times:
-            all_busy.append({
-                "start": bt["start"],
-                "end": bt["end"],
-                "source": "calendar"
-            })
+        # 資料庫預約 + Google Calendar 忙碌時段
+        # 忙碌時段以 YYYY-MM-DD 為 key，date_str 可能未補零（例：2026-1-5）
+        busy = await _collect_busy_times([room], check_date, check_date)
+        all_busy = busy.get((room["id"], check_date.isoformat()), [])
+        merged = merge_intervals(_to_intervals(all_busy))
 
         # 如果要檢查特定時段
         if start_time and end_time:
-            is_available = True
-            for busy in all_busy:
-                # 時段重疊檢查
-                if not (end_time <= busy["start"] or start_time >= busy["end"]):
-                    is_available = False
-                    break
-
+            start_minute, end_minute = to_minutes(start_time), to_minutes(end_time)
             return {
                 "success": True,
                 "room_id": room_id,
@@ -195,44 +258,25 @@ async def booking_check_availability(
                 "date": date_str,
                 "start_time": start_time,
                 "end_time": end_time,
-                "is_available": is_available,
-                "conflicts": [b for b in all_busy if not (end_time <= b["start"] or start_time >= b["end"])]
+                "is_available": is_free(merged, start_minute, end_minute),
+                "conflicts": [
+                    b for b in all_busy
+                    if to_minutes(b["start"]) < end_minute and to_minutes(b["end"]) > start_minute
+                ]
             }
 
-        # 生成所有可用時段（30分鐘為單位）
-        available_slots = []
-        current = datetime.combine(check_date, time(9, 0))
-        end_of_day = datetime.combine(check_date, time(18, 0))
-
-        while current < end_of_day:
-            slot_start = current.strftime("%H:%M")
-            slot_end = (current + timedelta(minutes=30)).strftime("%H:%M")
-
-            # 檢查是否可用
-            is_slot_available = True
-            for busy in all_busy:
-                if not (slot_end <= busy["start"] or slot_start >= busy["end"]):
-                    is_slot_available = False
-                    break
-
-            if is_slot_available:
-                available_slots.append({
-                    "start": slot_start,
-                    "end": slot_end
-                })
-
-            current += timedelta(minutes=30)
-
-        # 過濾已過去的時段（如果是今天）
-        if check_date == date.today():
-            now_str = datetime.now().strftime("%H:%M")
-            available_slots = [s for s in available_slots if s["start"] > now_str]
+        # 營業時間內依會議室時段長度切格
+        hours = RoomHours.from_room(room)
+        available_slots = day_availability(merged, hours, check_date)
 
         return {
             "success": True,
             "room_id": room_id,
             "room_name": room["name"],
             "date": date_str,
+            "open_time": hours.open_time,
+            "close_time": hours.close_time,
+            "slot_minutes": hours.slot_minutes,
             "available_slots": available_slots,
             "total_available": len(available_slots),
             "busy_times": all_busy
@@ -242,6 +286,148 @@ async def booking_check_availability(
         raise Exception(f"查詢可用時段失敗: {e}")
 
 
+async def booking_search_availability(
+    date_from: str,
+    date_to: str = None,
+    room_ids: List[int] = None,
+    branch_id: int = None,
+    duration_minutes: int = None,
+    slot_minutes: int = None
+) -> Dict[str, Any]:
+    """
+    查詢多個會議室 × 日期區間的可用時段（一次查詢預約與 Calendar）
+
+    Args:
+        date_from: 開始日期 (YYYY-MM-DD)
+        date_to: 結束日期 (YYYY-MM-DD)，預設同 date_from
+        room_ids: 會議室ID列表（可選，預設所有啟用中的會議室；JSON 陣列或逗號分隔字串亦可）
+        branch_id: 場館ID（可選）
+        duration_minutes: 預約長度（分鐘），只回傳可連續預約這麼久的開始時間，預設為一個時段
+        slot_minutes: 時段長度（分鐘），預設使用各會議室設定
+
+    Returns:
+        各會議室每天的可用時段
+    """
+    try:
+        start_date = datetime.strptime(date_from, "%Y-%m-%d").date()
+        end_date = datetime.strptime(date_to, "%Y-%m-%d").date() if date_to else start_date
+        if end_date < start_date:
+            return {"success": False, "error": "結束日期不可早於開始日期"}
+        days = (end_date - start_date).days + 1
+        if days > AVAILABILITY_MAX_DAYS:
+            return {"success": False, "error": f"日期區間最多 {AVAILABILITY_MAX_DAYS} 天"}
+        try:
+            room_ids = _parse_ids(room_ids)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+
+        rooms = [
+            room for room in await get_reference_rows("meeting_rooms")
+            if room.get("is_active")
+            and (not branch_id or _same_id(room.get("branch_id"), branch_id))
+            and (not room_ids or any(_same_id(room["id"], room_id) for room_id in room_ids))
+        ]
+        if not rooms:
+            return {"success": False, "error": "找不到符合條件的會議室"}
+
+        busy = await _collect_busy_times(rooms, start_date, end_date)
+
+        now = datetime.now()
+        dates = [start_date + timedelta(days=i) for i in range(days)]
+        results = []
+        for room in rooms:
+            hours = RoomHours.from_room(room, slot_minutes)
+            availability = {}
+            total = 0
+            for d in dates:
+                slots = day_availability(
+                    _to_intervals(busy.get((room["id"], d.isoformat()), [])),
+                    hours, d, duration_minutes, now
+                )
+                availability[d.isoformat()] = slots
+                total += len(slots)
+            results.append({
+                "room_id": room["id"],
+                "room_name": room["name"],
+                "branch_id": room.get("branch_id"),
+                "open_time": hours.open_time,
+                "close_time": hours.close_time,
+                "slot_minutes": hours.slot_minutes,
+                "availability": availability,
+                "total_available": total
+            })
+
+        return {
+            "success": True,
+            "date_from": start_date.isoformat(),
+            "date_to": end_date.isoformat(),
+            "duration_minutes": duration_minutes,
+            "rooms": results
+        }
+    except Exception as e:
+        logger.error(f"booking_search_availability error: {e}")
+        raise Exception(f"查詢可用時段失敗: {e}")
+
+
+async def booking_availability_heatmap(
+    branch_id: int = None,
+    days: int = 7,
+    date_from: str = None
+) -> Dict[str, Any]:
+    """
+    未來 N 天 × 會議室的可用時段數量（日期選單用，Redis 短 TTL 快取）
+
+    Args:
+        branch_id: 場館ID（可選，預設所有場館）
+        days: 天數，預設 7
+        date_from: 開始日期 (YYYY-MM-DD)，預設今天
+
+    Returns:
+        dates 與各會議室每天剩餘時段數（free 與 dates 同順序）、
+        每天有空的會議室數（available_rooms）、全部額滿的日期（full_dates）
+    """
+    try:
+        start_date = datetime.strptime(date_from, "%Y-%m-%d").date() if date_from else date.today()
+    except ValueError:
+        return {"success": False, "error": "日期格式錯誤，請使用 YYYY-MM-DD"}
+    if not 1 <= days <= AVAILABILITY_MAX_DAYS:
+        return {"success": False, "error": f"天數需介於 1 到 {AVAILABILITY_MAX_DAYS} 天"}
+    end_date = start_date + timedelta(days=days - 1)
+
+    async def compute() -> Dict[str, Any]:
+        result = await booking_search_availability(
+            start_date.isoformat(), end_date.isoformat(), branch_id=branch_id
+        )
+        if not result.get("success"):
+            return result
+
+        dates = [(start_date + timedelta(days=i)).isoformat() for i in range(days)]
+        rooms = []
+        for room in result["rooms"]:
+            rooms.append({
+                "room_id": room["room_id"],
+                "room_name": room["room_name"],
+                "branch_id": room["branch_id"],
+                "slots_per_day": (to_minutes(room["close_time"]) - to_minutes(room["open_time"])) // room["slot_minutes"],
+                "free": [len(room["availability"][d]) for d in dates]
+            })
+        available_rooms = [sum(1 for room in rooms if room["free"][i]) for i in range(days)]
+        return {
+            "success": True,
+            "branch_id": branch_id,
+            "date_from": dates[0],
+            "date_to": dates[-1],
+            "dates": dates,
+            "rooms": rooms,
+            "available_rooms": available_rooms,
+            "full_dates": [d for d, count in zip(dates, available_rooms) if not count],
+            "generated_at": datetime.now().isoformat(timespec="seconds")
+        }
+
+    cache_key = f"{branch_id or 'all'}:{start_date.isoformat()}:{days}"
+    return await availability_cache.get_or_compute(cache_key, compute)
+
+
 async def booking_create(
     room_id: int,
     customer_id: int,
@@ -281,10 +467,9 @@ async def booking_create(
             }
 
         # 2. 取得會議室資訊
-        rooms = await postgrest_get("meeting_rooms", {"id": f"eq.{room_id}"})
-        if not rooms:
+        room = await get_reference_row("meeting_rooms", room_id)
+        if not room:
             return {"success": False, "error": "會議室不存在"}
-        room = rooms[0]
 
         # 3. 取得客戶資訊
         customers = await postgrest_get("customers", {"id": f"eq.{customer_id}"})
@@ -327,19 +512,20 @@ async def booking_create(
             return {"success": False, "error": "建立預約失敗"}
 
         booking = result[0] if isinstance(result, list) else result
+        await invalidate_availability_cache()
 
         # 6. 建立 Google Calendar 事件
         google_event_id = None
         calendar_id = room.get("google_calendar_id") or DEFAULT_MEETING_CALENDAR_ID
         try:
-            calendar_service = get_calendar_service()
+            calendar_service = get_async_calendar_service()
             check_date = datetime.strptime(date_str, "%Y-%m-%d").date()
             start_dt = datetime.combine(check_date, datetime.strptime(start_time, "%H:%M").time())
             end_dt = datetime.combine(check_date, datetime.strptime(end_time, "%H:%M").time())
 
             # 取得場館資訊
-            branches = await postgrest_get("branches", {"id": f"eq.{room['branch_id']}"})
-            branch_name = branches[0]["name"] if branches else ""
+            branch = await get_reference_row("branches", room["branch_id"])
+            branch_name = branch["name"] if branch else ""
 
             event_title = f"【會議室】{customer.get('company_name') or customer['name']} ({booking_number})"
             event_desc = f"預約編號: {booking_number}\n"
@@ -351,7 +537,7 @@ async def booking_create(
             if attendees_count:
                 event_desc += f"人數: {attendees_count}\n"
 
-            cal_result = calendar_service.create_event(
+            cal_result = await calendar_service.create_event(
                 calendar_id,
                 event_title,
                 start_dt,
@@ -473,14 +659,15 @@ async def booking_cancel(
                 "cancel_reason": reason
             }
         )
+        await invalidate_availability_cache()
 
         # 3. 刪除 Google Calendar 事件
         if booking.get("google_event_id"):
             try:
-                rooms = await postgrest_get("meeting_rooms", {"id": f"eq.{booking['meeting_room_id']}"})
-                calendar_id = (rooms[0].get("google_calendar_id") if rooms else None) or DEFAULT_MEETING_CALENDAR_ID
-                calendar_service = get_calendar_service()
-                calendar_service.delete_event(calendar_id, booking["google_event_id"])
+                room = await get_reference_row("meeting_rooms", booking["meeting_room_id"])
+                calendar_id = (room.get("google_calendar_id") if room else None) or DEFAULT_MEETING_CALENDAR_ID
+                calendar_service = get_async_calendar_service()
+                await calendar_service.delete_event(calendar_id, booking["google_event_id"])
                 logger.info(f"Deleted calendar event for booking {booking['booking_number']}")
             except Exception as e:
                 logger.warning(f"Failed to delete calendar event: {e}")
@@ -584,18 +771,20 @@ async def booking_update(
             {"id": f"eq.{booking_id}"},
             update_data
         )
+        if time_changed:
+            await invalidate_availability_cache()
 
         # 5. 更新 Google Calendar（如果時間有變更）
         if time_changed and booking.get("google_event_id"):
             try:
-                rooms = await postgrest_get("meeting_rooms", {"id": f"eq.{booking['meeting_room_id']}"})
-                calendar_id = (rooms[0].get("google_calendar_id") if rooms else None) or DEFAULT_MEETING_CALENDAR_ID
-                calendar_service = get_calendar_service()
+                room = await get_reference_row("meeting_rooms", booking["meeting_room_id"])
+                calendar_id = (room.get("google_calendar_id") if room else None) or DEFAULT_MEETING_CALENDAR_ID
+                calendar_service = get_async_calendar_service()
                 check_date = datetime.strptime(new_date, "%Y-%m-%d").date()
                 start_dt = datetime.combine(check_date, datetime.strptime(new_start, "%H:%M").time())
                 end_dt = datetime.combine(check_date, datetime.strptime(new_end, "%H:%M").time())
 
-                calendar_service.update_event(
+                await calendar_service.update_event(
                     calendar_id,
                     booking["google_event_id"],
                     start_datetime=start_dt,
@@ -11,6 +11,8 @@ from typing import Dict, Any, Optional, List
 
 import httpx
 
+from .knowledge_cache import invalidate_knowledge_cache
+
 logger = logging.getLogger(__name__)
 
 # Brain API URL
@@ -106,6 +108,7 @@ async def brain_save_knowledge(
 
             if response.status_code == 200:
                 result = response.json()
+                await invalidate_knowledge_cache()
                 return {
                     "success": True,
                     "message": f"知識已儲存到 {KNOWLEDGE_CATEGORIES.get(category, category)} 分類",
@@ -310,6 +313,7 @@ async def brain_save_customer_traits(
 
             if response.status_code == 200:
                 result = response.json()
+                await invalidate_knowledge_cache()
                 return {
                     "success": True,
                     "message": f"已將 {customer_name} 的客戶特性同步到 AI 客服",
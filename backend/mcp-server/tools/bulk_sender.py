@@ -0,0 +1,349 @@
+"""
+Hour Jungle CRM - Bulk Sender
+批次發送引擎（LINE 提醒 / 批次寫入共用）
+
+用途：月底批次催繳、續約提醒一次要處理上百筆，原本逐筆 await（LINE push + PostgREST 寫入），
+整個 HTTP 請求要跑好幾分鐘
+
+- 有上限的併發（asyncio.Semaphore）
+- Token bucket 限速，對齊 LINE Messaging API 配額（所有 push 共用同一個 bucket）
+- 429 / 5xx / 連線錯誤自動重試（指數退避 + jitter，優先採用 Retry-After）
+- 進度寫入 batch_tasks / batch_task_items（任務項目一次 bulk insert）
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .postgrest_client import postgrest_session
+
+logger = logging.getLogger(__name__)
+
+POSTGREST_URL = os.getenv("POSTGREST_URL", "http://postgrest:3000")
+
+# 併發與限速設定
+BULK_SEND_CONCURRENCY = int(os.getenv("BULK_SEND_CONCURRENCY", "10"))
+LINE_PUSH_RATE = float(os.getenv("LINE_PUSH_RATE", "50"))        # 每秒補充 token 數
+LINE_PUSH_BURST = float(os.getenv("LINE_PUSH_BURST", "50"))      # bucket 容量（瞬間可發送數）
+
+# 重試設定
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "4"))
+SEND_RETRY_BASE_DELAY = float(os.getenv("SEND_RETRY_BASE_DELAY", "0.5"))
+SEND_RETRY_MAX_DELAY = float(os.getenv("SEND_RETRY_MAX_DELAY", "30"))
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# batch_tasks 進度更新間隔（秒），避免每筆都 PATCH 主表
+PROGRESS_UPDATE_INTERVAL = float(os.getenv("BATCH_PROGRESS_UPDATE_INTERVAL", "1"))
+
+ItemHandler = Callable[[Any], Awaitable[Dict[str, Any]]]
+TargetOf = Callable[[Any], Tuple[int, str]]
+
+
+# ============================================================================
+# Token Bucket
+# ============================================================================
+
+class TokenBucket:
+    """非同步 token bucket 限速器"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1):
+        """取得 token，不足時等待（依 FIFO 順序）"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+# 所有 LINE push 共用（同一個 channel 的配額是共用的）
+line_push_bucket = TokenBucket(LINE_PUSH_RATE, LINE_PUSH_BURST)
+
+
+# ============================================================================
+# 重試
+# ============================================================================
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """計算重試等待秒數（Retry-After 優先，否則指數退避 + jitter）"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), SEND_RETRY_MAX_DELAY)
+            except ValueError:
+                pass
+    delay = min(SEND_RETRY_BASE_DELAY * (2 ** attempt), SEND_RETRY_MAX_DELAY)
+    return delay * (0.5 + random.random() / 2)
+
+
+async def request_with_retry(
+    send: Callable[[], Awaitable[httpx.Response]],
+    bucket: Optional[TokenBucket] = None,
+    max_retries: int = SEND_MAX_RETRIES,
+    retry_on: frozenset = RETRYABLE_STATUS_CODES
+) -> httpx.Response:
+    """
+    發送 HTTP 請求，429 / 5xx / 連線錯誤時重試
+
+    Args:
+        send: 實際發送的 coroutine factory（每次重試都會重新呼叫）
+        bucket: 限速器，每次嘗試前都會取 token
+        max_retries: 最多重試次數
+        retry_on: 需要重試的 HTTP 狀態碼（非冪等的 API 應只重試 429 / 503）
+
+    Returns:
+        最後一次的 response（重試用盡仍為 429/5xx 時照樣回傳，由呼叫端判斷）
+    """
+    for attempt in range(max_retries + 1):
+        if bucket is not None:
+            await bucket.acquire()
+
+        try:
+            response = await send()
+        except httpx.TransportError as e:
+            if attempt >= max_retries:
+                raise
+            delay = _retry_delay(attempt)
+            logger.warning(f"Request failed ({e!r}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if response.status_code not in retry_on or attempt >= max_retries:
+            return response
+
+        delay = _retry_delay(attempt, response)
+        logger.warning(
+            f"Request got {response.status_code}, retry {attempt + 1}/{max_retries} in {delay:.1f}s"
+        )
+        await asyncio.sleep(delay)
+
+    return response
+
+
+# ============================================================================
+# batch_tasks 進度
+# ============================================================================
+
+async def _postgrest_post(endpoint: str, data: Any) -> Any:
+    url = f"{POSTGREST_URL}/{endpoint}"
+    headers = {
+        "Content-Type": "application/json",
+        "Prefer": "return=representation"
+    }
+    async with postgrest_session() as client:
+        response = await client.post(url, json=data, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+
+async def _postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
+    url = f"{POSTGREST_URL}/{endpoint}"
+    headers = {"Content-Type": "application/json"}
+    async with postgrest_session() as client:
+        response = await client.patch(url, params=params, json=data, headers=headers)
+        response.raise_for_status()
+
+
+async def create_batch_task(
+    task_type: str,
+    targets: List[Tuple[int, str]],
+    created_by: Optional[str] = None,
+    status: str = "processing"
+) -> Tuple[str, List[int]]:
+    """
+    建立批量任務與任務項目（項目一次 bulk insert）
+
+    任務由呼叫端自行處理（batch_tasks.queued 為預設 false，背景 worker 不會領取）
+
+    Args:
+        task_type: 任務類型（send_reminder 等）
+        targets: [(target_id, target_type), ...]
+        created_by: 建立者
+        status: 初始狀態
+
+    Returns:
+        (task_id, 依 targets 順序的 batch_task_items.id 列表)
+    """
+    task_id = str(uuid.uuid4())
+
+    await _postgrest_post("batch_tasks", {
+        "id": task_id,
+        "task_type": task_type,
+        "status": status,
+        "total_count": len(targets),
+        "created_by": created_by,
+        "started_at": datetime.now().isoformat() if status == "processing" else None
+    })
+
+    item_ids: List[int] = []
+    if targets:
+        rows = await _postgrest_post("batch_task_items", [
+            {
+                "task_id": task_id,
+                "target_id": target_id,
+                "target_type": target_type,
+                "status": "pending"
+            }
+            for target_id, target_type in targets
+        ])
+        # PostgREST bulk insert 依輸入順序回傳
+        item_ids = [row["id"] for row in rows]
+
+    return task_id, item_ids
+
+
+def final_task_status(success_count: int, failed_count: int) -> str:
+    """依成功 / 失敗數決定任務最終狀態"""
+    if failed_count == 0:
+        return "completed"
+    return "partial_success" if success_count > 0 else "failed"
+
+
+class BatchProgress:
+    """追蹤批次進度，定期回寫 batch_tasks"""
+
+    def __init__(self, task_id: Optional[str], total: int):
+        self.task_id = task_id
+        self.total = total
+        self.success_count = 0
+        self.failed_count = 0
+        self._last_flush = time.monotonic()
+        self._flush_lock = asyncio.Lock()
+
+    async def record_item(self, item_id: Optional[int], result: Dict[str, Any]):
+        if result.get("success"):
+            self.success_count += 1
+        else:
+            self.failed_count += 1
+
+        if not self.task_id or item_id is None:
+            return
+
+        try:
+            await _postgrest_patch(
+                "batch_task_items",
+                {"id": f"eq.{item_id}"},
+                {
+                    "status": "success" if result.get("success") else "failed",
+                    "error_code": None if result.get("success") else result.get("code", "UNKNOWN"),
+                    "error_message": None if result.get("success") else result.get("error"),
+                    "processed_at": datetime.now().isoformat()
+                }
+            )
+        except Exception as e:
+            logger.warning(f"更新任務項目失敗: {e}")
+
+        if time.monotonic() - self._last_flush >= PROGRESS_UPDATE_INTERVAL:
+            await self.flush()
+
+    async def flush(self, final: bool = False):
+        """回寫目前的成功 / 失敗數（final=True 時一併寫入最終狀態）"""
+        if not self.task_id:
+            return
+        async with self._flush_lock:
+            self._last_flush = time.monotonic()
+            data = {
+                "success_count": self.success_count,
+                "failed_count": self.failed_count
+            }
+            if final:
+                data["status"] = final_task_status(self.success_count, self.failed_count)
+                data["completed_at"] = datetime.now().isoformat()
+            try:
+                await _postgrest_patch("batch_tasks", {"id": f"eq.{self.task_id}"}, data)
+            except Exception as e:
+                logger.warning(f"更新批量任務進度失敗: {e}")
+
+
+# ============================================================================
+# 批次執行
+# ============================================================================
+
+async def _run_item(handler: ItemHandler, item: Any) -> Dict[str, Any]:
+    """執行單筆，例外轉為失敗結果（單筆失敗不影響其他項目）"""
+    try:
+        result = await handler(item)
+        if not isinstance(result, dict):
+            return {"success": bool(result)}
+        return result
+    except Exception as e:
+        logger.error(f"Bulk item failed: {e}")
+        return {"success": False, "error": str(e), "code": "EXCEPTION"}
+
+
+async def run_bulk(
+    items: List[Any],
+    handler: ItemHandler,
+    concurrency: int = BULK_SEND_CONCURRENCY,
+    task_type: Optional[str] = None,
+    target_of: Optional[TargetOf] = None,
+    created_by: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    以有限併發處理一批項目
+
+    Args:
+        items: 要處理的項目
+        handler: 單筆處理函數，回傳 {"success": bool, "error": ..., "code": ...}
+        concurrency: 同時處理的最大筆數
+        task_type: 指定時建立 batch_tasks 記錄並回寫進度
+        target_of: item -> (target_id, target_type)，task_type 有值時必填
+        created_by: 建立者
+
+    Returns:
+        {"task_id", "status", "total_count", "success_count", "failed_count",
+         "results": [依 items 順序的 handler 結果]}
+    """
+    task_id = None
+    item_ids: List[Optional[int]] = [None] * len(items)
+
+    if task_type and items:
+        if target_of is None:
+            raise ValueError("task_type 需搭配 target_of")
+        task_id, created_ids = await create_batch_task(
+            task_type, [target_of(item) for item in items], created_by
+        )
+        item_ids = list(created_ids) or item_ids
+
+    progress = BatchProgress(task_id, len(items))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(index: int, item: Any) -> Dict[str, Any]:
+        async with semaphore:
+            result = await _run_item(handler, item)
+            await progress.record_item(item_ids[index], result)
+            return result
+
+    results = await asyncio.gather(*(run_one(i, item) for i, item in enumerate(items)))
+    await progress.flush(final=True)
+
+    return {
+        "task_id": task_id,
+        "status": final_task_status(progress.success_count, progress.failed_count),
+        "total_count": len(items),
+        "success_count": progress.success_count,
+        "failed_count": progress.failed_count,
+        "results": list(results)
+    }
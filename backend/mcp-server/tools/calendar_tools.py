@@ -3,11 +3,12 @@ Hour Jungle CRM - Calendar MCP Tools
 簽約行程 Google Calendar 整合
 """
 
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import Optional
 
-from tools.google_calendar import get_calendar_service
+from tools.google_calendar import get_async_calendar_service
 
 logger = logging.getLogger(__name__)
 
@@ -178,13 +179,13 @@ async def calendar_create_signing_appointment(
         description = "\n".join(description_parts)
 
         # 建立行事曆事件
-        calendar_service = get_calendar_service()
+        calendar_service = get_async_calendar_service()
 
         attendees = []
         if customer_email:
             attendees.append(customer_email)
 
-        result = calendar_service.create_event(
+        result = await calendar_service.create_event(
             calendar_id=SIGNING_CALENDAR_ID,
             title=title,
             start_datetime=start_dt,
@@ -269,8 +270,8 @@ calendar_create_schema = {
 async def calendar_create(name: str, description: str = None) -> dict:
     """建立新的 Google Calendar"""
     try:
-        calendar_service = get_calendar_service()
-        result = calendar_service.create_calendar(
+        calendar_service = get_async_calendar_service()
+        result = await calendar_service.create_calendar(
             summary=name,
             description=description
         )
@@ -335,21 +336,26 @@ async def calendar_share(
 ) -> dict:
     """分享行事曆給指定使用者"""
     try:
-        calendar_service = get_calendar_service()
+        calendar_service = get_async_calendar_service()
         target_calendar_id = calendar_id or SIGNING_CALENDAR_ID
 
-        results = []
-        for email in emails:
-            result = calendar_service.share_calendar(
+        # 每位使用者各一次 ACL 請求，同時送出
+        shared = await asyncio.gather(*[
+            calendar_service.share_calendar(
                 calendar_id=target_calendar_id,
                 email=email,
                 role=role
             )
-            results.append({
+            for email in emails
+        ])
+        results = [
+            {
                 "email": email,
                 "success": result.get("success"),
                 "error": result.get("error")
-            })
+            }
+            for email, result in zip(emails, shared)
+        ]
 
         success_count = sum(1 for r in results if r["success"])
         failed = [r for r in results if not r["success"]]
@@ -391,11 +397,11 @@ async def calendar_list_signing_appointments(days_ahead: int = 7) -> dict:
     try:
         from datetime import date
 
-        calendar_service = get_calendar_service()
+        calendar_service = get_async_calendar_service()
         today = date.today()
         end_date = today + timedelta(days=days_ahead)
 
-        result = calendar_service.list_events(
+        result = await calendar_service.list_events(
             calendar_id=SIGNING_CALENDAR_ID,
             date_from=today,
             date_to=end_date,
@@ -0,0 +1,211 @@
+"""
+Hour Jungle CRM - Cloud Clients
+外部服務 client 與認證的共用實例（process 內建立一次，之後重用）
+
+原本每次呼叫都重新建立：
+- 呼叫 PDF 服務（Cloud Run）前都重新取得 Google ID Token（metadata server / OAuth 來回一次）
+- 上傳檔案、產生下載連結前都重新建立 boto3 R2 client（載入 botocore 服務定義，數十毫秒）
+
+- client_registry：依名稱保存 client，第一次使用時以 factory 建立；建立失敗不保存，下次重試
+- id_token_cache：依 audience 快取 ID Token，到期前 ID_TOKEN_REFRESH_MARGIN 秒才重新取得；
+  取得失敗（本機無服務帳號）時 ID_TOKEN_RETRY_INTERVAL 秒內不再重試，直接不帶認證呼叫
+- 皆為 blocking 且 thread-safe
+"""
+
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ID_TOKEN_REFRESH_MARGIN = float(os.getenv("ID_TOKEN_REFRESH_MARGIN", "300"))  # 秒
+ID_TOKEN_RETRY_INTERVAL = float(os.getenv("ID_TOKEN_RETRY_INTERVAL", "60"))  # 秒
+
+# Google ID Token 有效期為 1 小時，無法解析 exp 時以此估計
+ID_TOKEN_DEFAULT_LIFETIME = 3600
+
+
+# ============================================================================
+# Client registry
+# ============================================================================
+
+class ClientRegistry:
+    """依名稱保存共用 client"""
+
+    def __init__(self):
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    def get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """
+        取得 client，尚未建立時呼叫 factory 建立
+
+        Raises:
+            factory 的例外（不保存，下次呼叫重試）
+        """
+        client = self._clients.get(name)
+        if client is not None:
+            self.stats[name]["reused"] += 1
+            return client
+
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                started = time.perf_counter()
+                client = factory()
+                self._clients[name] = client
+                self.stats[name] = {
+                    "reused": 0,
+                    "created_at": time.time(),
+                    "create_ms": round((time.perf_counter() - started) * 1000, 1),
+                }
+                logger.info(f"Created shared client: {name} ({self.stats[name]['create_ms']} ms)")
+            else:
+                self.stats[name]["reused"] += 1
+            return client
+
+    def reset(self, name: Optional[str] = None):
+        """移除 client（設定變更、連線異常時），下次使用時重新建立"""
+        with self._lock:
+            if name is None:
+                self._clients.clear()
+            else:
+                self._clients.pop(name, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各 client 的建立耗時與重用次數"""
+        return {name: dict(stats) for name, stats in self.stats.items() if name in self._clients}
+
+
+# ============================================================================
+# ID Token
+# ============================================================================
+
+def _token_expiry(token: str) -> float:
+    """讀取 JWT 的 exp（不驗證簽章，僅用於決定何時更新）"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return time.time() + ID_TOKEN_DEFAULT_LIFETIME
+
+
+def _fetch_id_token(audience: str) -> str:
+    from google.auth.transport.requests import Request
+    from google.oauth2 import id_token
+
+    # 在 GCP 環境（VM/Cloud Run）會自動使用服務帳號
+    return id_token.fetch_id_token(Request(), audience)
+
+
+class IdTokenCache:
+    """Google ID Token 快取（依 audience）"""
+
+    def __init__(
+        self,
+        refresh_margin: float = ID_TOKEN_REFRESH_MARGIN,
+        retry_interval: float = ID_TOKEN_RETRY_INTERVAL
+    ):
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+
+        # audience -> (token, expires_at)；token 為 None 表示取得失敗，expires_at 為可重試時間
+        self._tokens: Dict[str, Tuple[Optional[str], float]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+        self.stats = {
+            "hits": 0,
+            "fetches": 0,
+            "failures": 0,
+            "fetch_ms_total": 0.0,
+        }
+
+    def _valid(self, audience: str) -> Optional[Tuple[Optional[str], float]]:
+        entry = self._tokens.get(audience)
+        if entry is None:
+            return None
+        token, expires_at = entry
+        if token is None:
+            return entry if time.time() < expires_at else None
+        return entry if time.time() < expires_at - self.refresh_margin else None
+
+    def _lock_for(self, audience: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(audience, threading.Lock())
+
+    def get(self, audience: str) -> Optional[str]:
+        """取得 ID Token，取得失敗回傳 None（呼叫端不帶認證）"""
+        entry = self._valid(audience)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry[0]
+
+        # 同一 audience 同時只取得一次
+        with self._lock_for(audience):
+            entry = self._valid(audience)
+            if entry is not None:
+                self.stats["hits"] += 1
+                return entry[0]
+
+            started = time.perf_counter()
+            self.stats["fetches"] += 1
+            try:
+                token = _fetch_id_token(audience)
+            except Exception as e:
+                self.stats["failures"] += 1
+                logger.warning(f"無法取得 ID Token: {e}，嘗試不帶認證呼叫")
+                self._tokens[audience] = (None, time.time() + self.retry_interval)
+                return None
+            finally:
+                self.stats["fetch_ms_total"] += (time.perf_counter() - started) * 1000
+
+            self._tokens[audience] = (token, _token_expiry(token))
+            return token
+
+    def invalidate(self, audience: Optional[str] = None):
+        """清除快取（例如服務回應 401 時）"""
+        if audience is None:
+            self._tokens.clear()
+        else:
+            self._tokens.pop(audience, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得命中率統計"""
+        lookups = self.stats["hits"] + self.stats["fetches"]
+        return {
+            "hits": self.stats["hits"],
+            "fetches": self.stats["fetches"],
+            "failures": self.stats["failures"],
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "avg_fetch_ms": round(self.stats["fetch_ms_total"] / self.stats["fetches"], 1)
+            if self.stats["fetches"] else 0.0,
+            "audiences": {
+                audience: {"valid": token is not None, "expires_in": round(expires_at - time.time())}
+                for audience, (token, expires_at) in self._tokens.items()
+            }
+        }
+
+
+# 全域實例
+client_registry = ClientRegistry()
+id_token_cache = IdTokenCache()
+
+
+def get_id_token_for_cloud_run(target_url: str) -> Optional[str]:
+    """取得 Cloud Run 的 ID Token（快取至到期前）"""
+    return id_token_cache.get(target_url)
+
+
+def get_cloud_clients_stats() -> Dict[str, Any]:
+    """client 與 ID Token 快取狀態"""
+    return {
+        "clients": client_registry.get_stats(),
+        "id_tokens": id_token_cache.get_stats()
+    }
@@ -11,9 +11,10 @@ from datetime import datetime
 from typing import Dict, Any, Optional
 
 import httpx
-import google.auth
-from google.auth.transport.requests import Request
-from google.oauth2 import id_token
+
+from .cloud_clients import get_id_token_for_cloud_run, id_token_cache
+from .postgrest_client import postgrest_session
+from .reference_cache import get_reference_row
 
 logger = logging.getLogger(__name__)
 
@@ -46,15 +47,14 @@ async def contract_get_timeline(contract_id: int) -> Dict[str, Any]:
     try:
         url = f"{POSTGREST_URL}/rpc/get_contract_timeline"
 
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             response = await client.post(
                 url,
                 json={"p_contract_id": contract_id},
                 headers={
                     "Content-Type": "application/json",
                     "Accept": "application/json"
-                },
-                timeout=30.0
+                }
             )
 
             if response.status_code >= 400:
@@ -86,8 +86,8 @@ PDF_GENERATOR_URL = os.getenv(
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -118,88 +118,47 @@ def format_currency(amount: float) -> str:
 # 合約生成工具
 # ============================================================================
 
-def get_id_token_for_cloud_run(target_url: str) -> str:
-    """取得 Cloud Run 的 ID Token"""
-    try:
-        # 在 GCP 環境（VM/Cloud Run）會自動使用服務帳號
-        credentials, project = google.auth.default()
-        auth_req = Request()
-
-        # 取得 ID Token
-        token = id_token.fetch_id_token(auth_req, target_url)
-        return token
-    except Exception as e:
-        logger.warning(f"無法取得 ID Token: {e}，嘗試不帶認證呼叫")
-        return None
+# 分館法人資訊（合約甲方）
+BRANCH_INFO = {
+    1: {
+        "company_name": "你的空間有限公司",
+        "tax_id": "83772050",
+        "representative": "戴豪廷",
+        "address": "台中市西區大忠南街55號7F-5",
+        "court": "台南地方法院"
+    },
+    2: {
+        "company_name": "樞紐前沿股份有限公司",
+        "tax_id": "60710368",
+        "representative": "戴豪廷",
+        "address": "臺中市西區台灣大道二段181號4樓之1",
+        "court": "台中地方法院"
+    }
+}
 
 
-async def contract_generate_pdf(
-    contract_id: int,
-    template: str = None
+def build_contract_pdf_data(
+    contract: Dict[str, Any],
+    customer: Dict[str, Any],
+    branch: Dict[str, Any]
 ) -> Dict[str, Any]:
     """
-    生成合約 PDF（呼叫 Cloud Run 服務）
+    組合 PDF 服務的 contract_data（contract_generate_pdf 與 pdf_generate_batch 共用）
 
     Args:
-        contract_id: 合約ID
-        template: 模板名稱（可選，會根據合約類型自動選擇）
-
-    Returns:
-        包含 GCS Signed URL 的結果
+        contract: contracts 資料列
+        customer: customers 資料列（乙方欄位的 fallback）
+        branch: branches 資料列
     """
-    # 1. 取得合約資料
-    try:
-        contracts = await postgrest_get("contracts", {"id": f"eq.{contract_id}"})
-        if not contracts:
-            return {"success": False, "message": "找不到合約"}
-
-        contract = contracts[0]
-
-        # 取得客戶資料（作為 fallback）
-        customer_id = contract.get("customer_id")
-        customers = await postgrest_get("customers", {"id": f"eq.{customer_id}"})
-        customer = customers[0] if customers else {}
-
-        # 取得場館資料
-        branch_id = contract.get("branch_id", 1)
-        branches = await postgrest_get("branches", {"id": f"eq.{branch_id}"})
-        branch = branches[0] if branches else {}
-
-    except Exception as e:
-        logger.error(f"取得合約資料失敗: {e}")
-        return {"success": False, "message": f"取得合約資料失敗: {e}"}
-
-    # 2. 準備 Cloud Run 請求資料
+    contract_id = contract.get("id")
     contract_type = contract.get("contract_type", "virtual_office")
-
-    # 自動選擇模板（如果未指定）
-    if not template:
-        template = get_template_for_contract_type(contract_type)
-
-    # 分館法人資訊
-    BRANCH_INFO = {
-        1: {
-            "company_name": "你的空間有限公司",
-            "tax_id": "83772050",
-            "representative": "戴豪廷",
-            "address": "台中市西區大忠南街55號7F-5",
-            "court": "台南地方法院"
-        },
-        2: {
-            "company_name": "樞紐前沿股份有限公司",
-            "tax_id": "60710368",
-            "representative": "戴豪廷",
-            "address": "臺中市西區台灣大道二段181號4樓之1",
-            "court": "台中地方法院"
-        }
-    }
+    branch_id = contract.get("branch_id", 1)
     branch_info = BRANCH_INFO.get(branch_id, BRANCH_INFO[1])
 
     # 計算合約月數
     periods = 12
     try:
         if contract.get("start_date") and contract.get("end_date"):
-            from datetime import datetime
             start = datetime.fromisoformat(str(contract["start_date"]))
             end = datetime.fromisoformat(str(contract["end_date"]))
             periods = (end.year - start.year) * 12 + (end.month - start.month) + 1
@@ -208,7 +167,7 @@ async def contract_generate_pdf(
     except Exception:
         pass
 
-    contract_data = {
+    return {
         "contract_id": contract_id,
         "contract_number": contract.get("contract_number") or f"HJ-{contract_id}",
         "contract_type": contract_type,
@@ -245,6 +204,51 @@ async def contract_generate_pdf(
         "show_stamp": True
     }
 
+
+async def contract_generate_pdf(
+    contract_id: int,
+    template: str = None
+) -> Dict[str, Any]:
+    """
+    生成合約 PDF（呼叫 Cloud Run 服務）
+
+    Args:
+        contract_id: 合約ID
+        template: 模板名稱（可選，會根據合約類型自動選擇）
+
+    Returns:
+        包含 GCS Signed URL 的結果
+    """
+    # 1. 取得合約資料
+    try:
+        contracts = await postgrest_get("contracts", {"id": f"eq.{contract_id}"})
+        if not contracts:
+            return {"success": False, "message": "找不到合約"}
+
+        contract = contracts[0]
+
+        # 取得客戶資料（作為 fallback）
+        customer_id = contract.get("customer_id")
+        customers = await postgrest_get("customers", {"id": f"eq.{customer_id}"})
+        customer = customers[0] if customers else {}
+
+        # 取得場館資料
+        branch_id = contract.get("branch_id", 1)
+        branch = await get_reference_row("branches", branch_id) or {}
+
+    except Exception as e:
+        logger.error(f"取得合約資料失敗: {e}")
+        return {"success": False, "message": f"取得合約資料失敗: {e}"}
+
+    # 2. 準備 Cloud Run 請求資料
+    contract_type = contract.get("contract_type", "virtual_office")
+
+    # 自動選擇模板（如果未指定）
+    if not template:
+        template = get_template_for_contract_type(contract_type)
+
+    contract_data = build_contract_pdf_data(contract, customer, branch)
+
     # 3. 呼叫 Cloud Run 服務
     try:
         # 取得認證 Token
@@ -269,6 +273,8 @@ async def contract_generate_pdf(
             )
 
             if response.status_code == 401:
+                # token 可能已失效，下次重新取得
+                id_token_cache.invalidate(PDF_GENERATOR_URL)
                 return {
                     "success": False,
                     "message": "Cloud Run 認證失敗，請確認服務帳號權限"
@@ -632,7 +638,6 @@ async def contract_terminate(
     Returns:
         終止結果
     """
-    import httpx
     from datetime import datetime
 
     if not reason or not reason.strip():
@@ -671,7 +676,7 @@ async def contract_terminate(
             "Prefer": "return=representation"
         }
 
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             response = await client.patch(
                 url,
                 params={"id": f"eq.{contract_id}"},
@@ -679,8 +684,7 @@ async def contract_terminate(
                     "status": "terminated",
                     "notes": f"{contract.get('notes', '')}\n[終止] {now[:10]} - {reason.strip()} (by {terminated_by or 'system'})".strip()
                 },
-                headers=headers,
-                timeout=30.0
+                headers=headers
             )
             response.raise_for_status()
 
@@ -697,7 +701,7 @@ async def contract_terminate(
             payment_period = payment.get("payment_period", "")
             # 比較期間（格式：YYYY-MM）
             if payment_period >= effective_date[:7]:
-                async with httpx.AsyncClient() as client:
+                async with postgrest_session() as client:
                     await client.patch(
                         f"{POSTGREST_URL}/payments",
                         params={"id": f"eq.{payment['id']}"},
@@ -706,8 +710,7 @@ async def contract_terminate(
                             "cancelled_at": now,
                             "cancel_reason": "合約終止"
                         },
-                        headers=headers,
-                        timeout=30.0
+                        headers=headers
                     )
                     cancelled_count += 1
 
@@ -720,7 +723,7 @@ async def contract_terminate(
             })
 
             for renewal in renewals:
-                async with httpx.AsyncClient() as client:
+                async with postgrest_session() as client:
                     await client.patch(
                         f"{POSTGREST_URL}/renewal_cases",
                         params={"id": f"eq.{renewal['id']}"},
@@ -729,8 +732,7 @@ async def contract_terminate(
                             "cancelled_at": now,
                             "cancel_reason": "合約終止"
                         },
-                        headers=headers,
-                        timeout=30.0
+                        headers=headers
                     )
                     renewal_cancelled = True
         except Exception as renewal_err:
@@ -738,7 +740,7 @@ async def contract_terminate(
 
         # 6. 記錄審計日誌
         try:
-            async with httpx.AsyncClient() as client:
+            async with postgrest_session() as client:
                 await client.post(
                     f"{POSTGREST_URL}/audit_logs",
                     json={
@@ -754,8 +756,7 @@ async def contract_terminate(
                         },
                         "changed_fields": ["status"]
                     },
-                    headers={"Content-Type": "application/json"},
-                    timeout=30.0
+                    headers={"Content-Type": "application/json"}
                 )
         except Exception as audit_err:
             logger.warning(f"審計日誌記錄失敗: {audit_err}")
@@ -3,16 +3,17 @@ Hour Jungle CRM - CRM Tools
 客戶、合約、付款相關工具
 """
 
+import asyncio
 import logging
 import calendar
-import re
 from datetime import datetime, date
 from typing import Optional, List, Dict, Any
 
-import httpx
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from .postgrest_client import postgrest_session
+
 logger = logging.getLogger(__name__)
 
 # 取得設定（從 main.py 導入）
@@ -25,6 +26,10 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "hourjungle")
 POSTGRES_USER = os.getenv("POSTGRES_USER", "hjadmin")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "")
 
+# 客戶搜尋改用 search_customers() RPC（migration 115）；尚未在有 pg_trgm 的資料庫量測，
+# 預設仍查詢 v_customer_summary，bench_customer_search.sql 確認較快後再開啟
+CUSTOMER_SEARCH_RPC = os.getenv("CUSTOMER_SEARCH_RPC", "false").lower() == "true"
+
 
 def get_db_connection():
     """取得資料庫連接"""
@@ -54,8 +59,8 @@ async def postgrest_get(endpoint: str, params: dict = None) -> Any:
         query_parts = [f"{k}={encode_value(v)}" for k, v in params.items()]
         url = f"{url}?{'&'.join(query_parts)}"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url)
         response.raise_for_status()
         return response.json()
 
@@ -67,8 +72,8 @@ async def postgrest_post(endpoint: str, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.post(url, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -80,8 +85,18 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, params=params, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.patch(url, params=params, json=data, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+
+async def postgrest_rpc(function_name: str, params: dict) -> Any:
+    """PostgREST RPC 呼叫（用於調用 PostgreSQL 函數）"""
+    url = f"{POSTGREST_URL}/rpc/{function_name}"
+    headers = {"Content-Type": "application/json"}
+    async with postgrest_session() as client:
+        response = await client.post(url, json=params, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -108,18 +123,25 @@ async def search_customers(
     Returns:
         客戶列表（含活動合約詳情）
     """
-    params = {"limit": limit}
-
-    if branch_id:
-        params["branch_id"] = f"eq.{branch_id}"
-    if status:
-        params["status"] = f"eq.{status}"
-    if query:
-        # 模糊搜尋姓名、電話、公司名
-        params["or"] = f"(name.ilike.*{query}*,phone.ilike.*{query}*,company_name.ilike.*{query}*)"
-
     try:
-        customers = await postgrest_get("v_customer_summary", params)
+        if CUSTOMER_SEARCH_RPC:
+            # search_customers() 以 trigram 索引搜尋，只計算回傳客戶的統計（另含 match_score）
+            customers = await postgrest_rpc("search_customers", {
+                "p_query": query,
+                "p_branch_id": branch_id,
+                "p_status": status,
+                "p_limit": limit
+            })
+        else:
+            params = {"limit": limit}
+            if branch_id:
+                params["branch_id"] = f"eq.{branch_id}"
+            if status:
+                params["status"] = f"eq.{status}"
+            if query:
+                # 模糊搜尋姓名、電話、公司名
+                params["or"] = f"(name.ilike.*{query}*,phone.ilike.*{query}*,company_name.ilike.*{query}*)"
+            customers = await postgrest_get("v_customer_summary", params)
 
         # 為每個客戶查詢活動合約詳情
         customer_ids = [c["id"] for c in customers if c.get("active_contracts", 0) > 0]
@@ -178,25 +200,38 @@ async def get_customer_detail(
     elif line_user_id:
         params["line_user_id"] = f"eq.{line_user_id}"
 
-    try:
-        customers = await postgrest_get("v_customer_summary", params)
-        if not customers:
-            return {"found": False, "message": "找不到客戶"}
-
-        customer = customers[0]
-
-        # 取得合約資料
-        contracts = await postgrest_get("contracts", {
-            "customer_id": f"eq.{customer['id']}",
-            "order": "start_date.desc"
-        })
+    def related_queries(cid: int):
+        return (
+            # 合約資料
+            postgrest_get("contracts", {
+                "customer_id": f"eq.{cid}",
+                "order": "start_date.desc"
+            }),
+            # 付款記錄
+            postgrest_get("payments", {
+                "customer_id": f"eq.{cid}",
+                "order": "due_date.desc",
+                "limit": 10
+            })
+        )
 
-        # 取得付款記錄
-        payments = await postgrest_get("payments", {
-            "customer_id": f"eq.{customer['id']}",
-            "order": "due_date.desc",
-            "limit": 10
-        })
+    try:
+        if customer_id:
+            # 已知客戶 ID：三個查詢同時送出
+            customers, contracts, payments = await asyncio.gather(
+                postgrest_get("v_customer_summary", params),
+                *related_queries(customer_id)
+            )
+            if not customers:
+                return {"found": False, "message": "找不到客戶"}
+            customer = customers[0]
+        else:
+            # 以 LINE ID 查詢：先取得客戶 ID，合約與付款再同時查
+            customers = await postgrest_get("v_customer_summary", params)
+            if not customers:
+                return {"found": False, "message": "找不到客戶"}
+            customer = customers[0]
+            contracts, payments = await asyncio.gather(*related_queries(customer["id"]))
 
         return {
             "found": True,
@@ -762,65 +797,19 @@ async def generate_contract_number(branch_id: int) -> str:
     """
     根據分館產生下一個合約編號
 
+    由資料庫 allocate_contract_number() 原子取號（migration 112），
+    併發轉換報價單 / 建立合約不會拿到重複編號
+
     Args:
         branch_id: 分館 ID
             - 1: 大忠館 → DZ-XXX（3位數）
             - 2: 環瑞館 → HR-VXX（2位數）
+            - 其他: HJ-YYYYMMDD-{branch_id}
 
     Returns:
         新的合約編號
     """
-    if branch_id == 1:
-        # 大忠館：DZ-XXX 格式
-        contracts = await postgrest_get(
-            "contracts",
-            {
-                "select": "contract_number",
-                "contract_number": "like.DZ-%",
-                "limit": "2000"
-            }
-        )
-
-        max_num = 0
-        for c in contracts:
-            cn = c.get("contract_number", "")
-            # 匹配 DZ-XXX 格式（可能有 -E 後綴表示已結束）
-            match = re.match(r"DZ-E?(\d+)", cn)
-            if match:
-                num = int(match.group(1))
-                if num > max_num:
-                    max_num = num
-
-        next_num = max_num + 1
-        return f"DZ-{next_num:03d}"
-
-    elif branch_id == 2:
-        # 環瑞館：HR-VXX 格式
-        contracts = await postgrest_get(
-            "contracts",
-            {
-                "select": "contract_number",
-                "contract_number": "like.HR-V%",
-                "order": "contract_number.desc",
-                "limit": "50"
-            }
-        )
-
-        max_num = 0
-        for c in contracts:
-            cn = c.get("contract_number", "")
-            match = re.match(r"HR-V(\d+)", cn)
-            if match:
-                num = int(match.group(1))
-                if num > max_num:
-                    max_num = num
-
-        next_num = max_num + 1
-        return f"HR-V{next_num:02d}"
-
-    else:
-        # 未知分館，使用通用格式
-        return f"HJ-{datetime.now().strftime('%Y%m%d')}-{branch_id}"
+    return await postgrest_rpc("allocate_contract_number", {"p_branch_id": branch_id})
 
 
 async def create_contract(
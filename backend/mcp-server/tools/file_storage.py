@@ -16,7 +16,8 @@ from datetime import datetime
 from typing import Dict, Any, Optional
 import base64
 
-import httpx
+from .cloud_clients import client_registry
+from .postgrest_client import postgrest_session
 
 logger = logging.getLogger(__name__)
 
@@ -36,25 +37,28 @@ R2_ENDPOINT = f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com" if R2_ACCOUNT_
 DEFAULT_URL_EXPIRY = 1209600  # 2 週（14 天）
 
 
+def _create_r2_client():
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        's3',
+        endpoint_url=R2_ENDPOINT,
+        aws_access_key_id=R2_ACCESS_KEY_ID,
+        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+        config=Config(signature_version='s3v4'),
+        region_name='auto'  # R2 使用 'auto'
+    )
+
+
 def get_r2_client():
-    """取得 R2 客戶端（boto3 S3 client）"""
+    """取得 R2 客戶端（boto3 S3 client，process 內共用；boto3 client 為 thread-safe）"""
     if not R2_ACCOUNT_ID or not R2_ACCESS_KEY_ID or not R2_SECRET_ACCESS_KEY:
         logger.warning("R2 credentials not configured")
         return None
 
     try:
-        import boto3
-        from botocore.config import Config
-
-        client = boto3.client(
-            's3',
-            endpoint_url=R2_ENDPOINT,
-            aws_access_key_id=R2_ACCESS_KEY_ID,
-            aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-            config=Config(signature_version='s3v4'),
-            region_name='auto'  # R2 使用 'auto'
-        )
-        return client
+        return client_registry.get("r2", _create_r2_client)
     except Exception as e:
         logger.error(f"Failed to create R2 client: {e}")
         return None
@@ -63,8 +67,8 @@ def get_r2_client():
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -76,8 +80,8 @@ async def postgrest_post(endpoint: str, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.post(url, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -89,8 +93,8 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, params=params, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.patch(url, params=params, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
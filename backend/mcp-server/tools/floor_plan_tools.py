@@ -12,9 +12,9 @@ from datetime import datetime
 from typing import Dict, Any, List, Optional
 
 import httpx
-import google.auth
-from google.auth.transport.requests import Request
-from google.oauth2 import id_token
+
+from .cloud_clients import get_id_token_for_cloud_run, id_token_cache
+from .postgrest_client import postgrest_session
 
 logger = logging.getLogger(__name__)
 
@@ -35,24 +35,12 @@ FLOOR_PLAN_IMAGE_BASE = f"https://storage.googleapis.com/{GCS_BUCKET}"
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
 
-def get_id_token_for_cloud_run(target_url: str) -> Optional[str]:
-    """取得 Cloud Run 的 ID Token"""
-    try:
-        credentials, project = google.auth.default()
-        auth_req = Request()
-        token = id_token.fetch_id_token(auth_req, target_url)
-        return token
-    except Exception as e:
-        logger.warning(f"無法取得 ID Token: {e}，嘗試不帶認證呼叫")
-        return None
-
-
 # ============================================================================
 # 平面圖工具
 # ============================================================================
@@ -130,7 +118,7 @@ async def floor_plan_update_position(
     try:
         if contract_id:
             # 設定合約的 position_number
-            async with httpx.AsyncClient() as client:
+            async with postgrest_session() as client:
                 # 先清除該位置的其他合約
                 await client.patch(
                     f"{POSTGREST_URL}/contracts",
@@ -139,8 +127,7 @@ async def floor_plan_update_position(
                         "branch_id": f"eq.{branch_id}"
                     },
                     json={"position_number": None},
-                    headers={"Content-Type": "application/json", "Prefer": "return=minimal"},
-                    timeout=30.0
+                    headers={"Content-Type": "application/json", "Prefer": "return=minimal"}
                 )
 
                 # 設定新合約的位置
@@ -148,8 +135,7 @@ async def floor_plan_update_position(
                     f"{POSTGREST_URL}/contracts",
                     params={"id": f"eq.{contract_id}"},
                     json={"position_number": position_number},
-                    headers={"Content-Type": "application/json", "Prefer": "return=representation"},
-                    timeout=30.0
+                    headers={"Content-Type": "application/json", "Prefer": "return=representation"}
                 )
                 response.raise_for_status()
 
@@ -161,7 +147,7 @@ async def floor_plan_update_position(
             }
         else:
             # 清空位置
-            async with httpx.AsyncClient() as client:
+            async with postgrest_session() as client:
                 response = await client.patch(
                     f"{POSTGREST_URL}/contracts",
                     params={
@@ -169,8 +155,7 @@ async def floor_plan_update_position(
                         "branch_id": f"eq.{branch_id}"
                     },
                     json={"position_number": None},
-                    headers={"Content-Type": "application/json", "Prefer": "return=minimal"},
-                    timeout=30.0
+                    headers={"Content-Type": "application/json", "Prefer": "return=minimal"}
                 )
                 response.raise_for_status()
 
@@ -244,6 +229,8 @@ async def floor_plan_generate(
             )
 
             if response.status_code == 401:
+                # token 可能已失效，下次重新取得
+                id_token_cache.invalidate(PDF_GENERATOR_URL)
                 return {
                     "success": False,
                     "message": "Cloud Run 認證失敗，請確認服務帳號權限"
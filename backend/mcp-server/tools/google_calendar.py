@@ -1,13 +1,28 @@
 """
 Hour Jungle CRM - Google Calendar Service
 會議室預約 Google Calendar 整合服務
+
+- GoogleCalendarService：同步呼叫（googleapiclient .execute() 會阻塞）
+- AsyncGoogleCalendarService：給 async 工具使用，API 呼叫在有上限的 thread pool 執行，
+  不阻塞 event loop；忙碌時段以 freebusy 批次查詢（多個會議室 × 多天一次查），
+  結果依「行事曆 + 日期」短暫快取，建立/更新/刪除事件時清除該行事曆的快取
+
+整個 process 共用一個已授權的 service 物件；httplib2 不是 thread-safe，
+每個 worker thread 各自持有一個 AuthorizedHttp 執行請求
 """
 
+import asyncio
+import functools
 import os
 import logging
-from datetime import datetime, date, time, timedelta
-from typing import Dict, Any, Optional, List
-
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, time, timedelta, timezone
+from time import monotonic
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+
+import google_auth_httplib2
+import httplib2
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
@@ -23,6 +38,112 @@ GOOGLE_CALENDAR_CREDENTIALS = os.getenv(
 # Calendar API 權限範圍
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+# Thread pool 與快取設定
+GOOGLE_CALENDAR_MAX_WORKERS = int(os.getenv("GOOGLE_CALENDAR_MAX_WORKERS", "8"))
+GOOGLE_CALENDAR_TIMEOUT = float(os.getenv("GOOGLE_CALENDAR_TIMEOUT", "15"))            # 單次 API 請求（秒）
+GOOGLE_CALENDAR_FREEBUSY_TTL = float(os.getenv("GOOGLE_CALENDAR_FREEBUSY_TTL", "30"))  # 忙碌時段快取（秒）
+
+# freebusy API 單次查詢上限
+FREEBUSY_MAX_CALENDARS = 50
+FREEBUSY_MAX_DAYS = 31
+
+TAIPEI_TZ = timezone(timedelta(hours=8))
+
+# 預設營業時間
+BUSINESS_START = time(9, 0)
+BUSINESS_END = time(18, 0)
+
+
+def _date_chunks(dates: Iterable[date]) -> List[List[date]]:
+    """排序後切成跨度不超過 FREEBUSY_MAX_DAYS 的區段（每段一次 freebusy 查詢）"""
+    chunks: List[List[date]] = []
+    for d in sorted(set(dates)):
+        if chunks and (d - chunks[-1][0]).days < FREEBUSY_MAX_DAYS:
+            chunks[-1].append(d)
+        else:
+            chunks.append([d])
+    return chunks
+
+
+def _split_busy_by_day(
+    busy: List[Dict[str, str]],
+    days: List[date],
+    time_min: time,
+    time_max: time
+) -> Dict[str, List[Dict[str, str]]]:
+    """把跨多天的 freebusy 忙碌區間切回每天營業時間內的 HH:MM 時段"""
+    intervals = [
+        (
+            datetime.fromisoformat(slot['start'].replace('Z', '+00:00')).astimezone(TAIPEI_TZ),
+            datetime.fromisoformat(slot['end'].replace('Z', '+00:00')).astimezone(TAIPEI_TZ)
+        )
+        for slot in busy
+    ]
+
+    result = {}
+    for day in days:
+        window_start = datetime.combine(day, time_min, tzinfo=TAIPEI_TZ)
+        window_end = datetime.combine(day, time_max, tzinfo=TAIPEI_TZ)
+        slots = []
+        for start, end in intervals:
+            if start < window_end and end > window_start:
+                slots.append({
+                    'start': max(start, window_start).strftime('%H:%M'),
+                    'end': min(end, window_end).strftime('%H:%M')
+                })
+        result[day.isoformat()] = slots
+    return result
+
+
+def build_available_slots(
+    date_to_check: date,
+    busy_times: List[Dict[str, str]],
+    slot_duration: int = 30,
+    business_start: time = None,
+    business_end: time = None
+) -> List[Dict[str, str]]:
+    """依忙碌時段產生可用時段（今天會過濾掉已過去的時段）"""
+    if business_start is None:
+        business_start = BUSINESS_START
+    if business_end is None:
+        business_end = BUSINESS_END
+
+    # 生成所有時段
+    available_slots = []
+    current_time = datetime.combine(date_to_check, business_start)
+    end_time = datetime.combine(date_to_check, business_end)
+
+    while current_time < end_time:
+        slot_start = current_time.strftime('%H:%M')
+        slot_end = (current_time + timedelta(minutes=slot_duration)).strftime('%H:%M')
+
+        # 檢查是否與忙碌時段衝突
+        is_available = True
+        for busy in busy_times:
+            # 簡單重疊檢查
+            if not (slot_end <= busy['start'] or slot_start >= busy['end']):
+                is_available = False
+                break
+
+        if is_available:
+            available_slots.append({
+                'start': slot_start,
+                'end': slot_end
+            })
+
+        current_time += timedelta(minutes=slot_duration)
+
+    # 如果是今天，過濾掉已過去的時段
+    if date_to_check == date.today():
+        now = datetime.now()
+        current_time_str = now.strftime('%H:%M')
+        available_slots = [
+            slot for slot in available_slots
+            if slot['start'] > current_time_str
+        ]
+
+    return available_slots
+
 
 class GoogleCalendarService:
     """Google Calendar 服務類別"""
@@ -37,27 +158,52 @@ class GoogleCalendarService:
         self.credentials_path = credentials_path or GOOGLE_CALENDAR_CREDENTIALS
         self._service = None
         self._credentials = None
+        self._init_lock = threading.Lock()
+        self._thread_local = threading.local()
 
     def _get_credentials(self):
         """取得服務帳號憑證"""
         if not self._credentials:
-            if not os.path.exists(self.credentials_path):
-                raise FileNotFoundError(
-                    f"Google Calendar credentials not found: {self.credentials_path}"
-                )
-            self._credentials = service_account.Credentials.from_service_account_file(
-                self.credentials_path,
-                scopes=SCOPES
-            )
+            with self._init_lock:
+                if not self._credentials:
+                    if not os.path.exists(self.credentials_path):
+                        raise FileNotFoundError(
+                            f"Google Calendar credentials not found: {self.credentials_path}"
+                        )
+                    self._credentials = service_account.Credentials.from_service_account_file(
+                        self.credentials_path,
+                        scopes=SCOPES
+                    )
         return self._credentials
 
     def _get_service(self):
-        """取得 Calendar API 服務"""
+        """取得 Calendar API 服務（process 內共用，只建立一次）"""
         if not self._service:
             credentials = self._get_credentials()
-            self._service = build('calendar', 'v3', credentials=credentials)
+            with self._init_lock:
+                if not self._service:
+                    self._service = build(
+                        'calendar', 'v3',
+                        credentials=credentials,
+                        cache_discovery=False
+                    )
         return self._service
 
+    def _get_http(self) -> google_auth_httplib2.AuthorizedHttp:
+        """取得目前 thread 專用的已授權 HTTP 連線（httplib2 不可跨 thread 共用）"""
+        http = getattr(self._thread_local, 'http', None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(
+                self._get_credentials(),
+                http=httplib2.Http(timeout=GOOGLE_CALENDAR_TIMEOUT)
+            )
+            self._thread_local.http = http
+        return http
+
+    def _execute(self, request):
+        """以目前 thread 的連線執行 API 請求"""
+        return request.execute(http=self._get_http())
+
     def create_calendar(self, summary: str, description: str = None) -> Dict[str, Any]:
         """
         建立新的 Calendar
@@ -79,7 +225,7 @@ class GoogleCalendarService:
             calendar_body['description'] = description
 
         try:
-            calendar = service.calendars().insert(body=calendar_body).execute()
+            calendar = self._execute(service.calendars().insert(body=calendar_body))
             logger.info(f"Created calendar: {calendar['id']}")
             return {
                 'success': True,
@@ -121,10 +267,10 @@ class GoogleCalendarService:
         }
 
         try:
-            created_rule = service.acl().insert(
+            created_rule = self._execute(service.acl().insert(
                 calendarId=calendar_id,
                 body=rule
-            ).execute()
+            ))
 
             logger.info(f"Shared calendar {calendar_id} with {email} as {role}")
             return {
@@ -187,10 +333,10 @@ class GoogleCalendarService:
             event_body['attendees'] = [{'email': email} for email in attendees]
 
         try:
-            event = service.events().insert(
+            event = self._execute(service.events().insert(
                 calendarId=calendar_id,
                 body=event_body
-            ).execute()
+            ))
 
             logger.info(f"Created event: {event['id']} in calendar {calendar_id}")
             return {
@@ -230,10 +376,10 @@ class GoogleCalendarService:
 
         try:
             # 先取得現有事件
-            event = service.events().get(
+            event = self._execute(service.events().get(
                 calendarId=calendar_id,
                 eventId=event_id
-            ).execute()
+            ))
 
             # 更新欄位
             if title:
@@ -253,11 +399,11 @@ class GoogleCalendarService:
             if location is not None:
                 event['location'] = location
 
-            updated_event = service.events().update(
+            updated_event = self._execute(service.events().update(
                 calendarId=calendar_id,
                 eventId=event_id,
                 body=event
-            ).execute()
+            ))
 
             logger.info(f"Updated event: {event_id}")
             return {
@@ -285,10 +431,10 @@ class GoogleCalendarService:
         service = self._get_service()
 
         try:
-            service.events().delete(
+            self._execute(service.events().delete(
                 calendarId=calendar_id,
                 eventId=event_id
-            ).execute()
+            ))
 
             logger.info(f"Deleted event: {event_id}")
             return {'success': True}
@@ -299,6 +445,69 @@ class GoogleCalendarService:
                 'error': str(e)
             }
 
+    def query_freebusy(
+        self,
+        calendar_ids: List[str],
+        dates: List[date],
+        time_min: time = None,
+        time_max: time = None
+    ) -> Tuple[Dict[str, Dict[str, List[Dict[str, str]]]], Dict[str, str]]:
+        """
+        批次查詢多個行事曆、多天的忙碌時段
+
+        每 50 個行事曆 × 31 天以內的日期區段合併為一次 freebusy 請求
+
+        Args:
+            calendar_ids: Calendar ID 列表
+            dates: 要查詢的日期
+            time_min: 每天查詢開始時間（預設 09:00）
+            time_max: 每天查詢結束時間（預設 18:00）
+
+        Returns:
+            (busy, errors)
+            busy: {calendar_id: {YYYY-MM-DD: [{'start': 'HH:MM', 'end': 'HH:MM'}]}}
+            errors: {calendar_id: 錯誤原因}（查詢失敗的行事曆不會出現在 busy）
+
+        Raises:
+            HttpError: 整批請求失敗
+        """
+        service = self._get_service()
+
+        if time_min is None:
+            time_min = BUSINESS_START
+        if time_max is None:
+            time_max = BUSINESS_END
+
+        calendar_ids = list(dict.fromkeys(calendar_ids))
+        busy: Dict[str, Dict[str, List[Dict[str, str]]]] = {}
+        errors: Dict[str, str] = {}
+
+        for days in _date_chunks(dates):
+            start_dt = datetime.combine(days[0], time_min)
+            end_dt = datetime.combine(days[-1], time_max)
+
+            for i in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS):
+                batch = calendar_ids[i:i + FREEBUSY_MAX_CALENDARS]
+                body = {
+                    'timeMin': start_dt.isoformat() + '+08:00',
+                    'timeMax': end_dt.isoformat() + '+08:00',
+                    'items': [{'id': calendar_id} for calendar_id in batch],
+                    'timeZone': 'Asia/Taipei'
+                }
+                result = self._execute(service.freebusy().query(body=body))
+                calendars = result.get('calendars', {})
+
+                for calendar_id in batch:
+                    info = calendars.get(calendar_id, {})
+                    if info.get('errors'):
+                        errors[calendar_id] = info['errors'][0].get('reason', 'unknown')
+                        continue
+                    busy.setdefault(calendar_id, {}).update(
+                        _split_busy_by_day(info.get('busy', []), days, time_min, time_max)
+                    )
+
+        return busy, errors
+
     def get_busy_times(
         self,
         calendar_id: str,
@@ -318,45 +527,18 @@ class GoogleCalendarService:
         Returns:
             忙碌時段列表
         """
-        service = self._get_service()
-
-        # 預設營業時間
-        if time_min is None:
-            time_min = time(9, 0)
-        if time_max is None:
-            time_max = time(18, 0)
-
-        # 建立時間範圍
-        start_dt = datetime.combine(date_to_check, time_min)
-        end_dt = datetime.combine(date_to_check, time_max)
-
         try:
-            # 使用 freebusy API
-            body = {
-                'timeMin': start_dt.isoformat() + '+08:00',
-                'timeMax': end_dt.isoformat() + '+08:00',
-                'items': [{'id': calendar_id}],
-                'timeZone': 'Asia/Taipei'
-            }
-
-            result = service.freebusy().query(body=body).execute()
-            calendars = result.get('calendars', {})
-            busy_times = calendars.get(calendar_id, {}).get('busy', [])
-
-            # 轉換格式
-            busy_slots = []
-            for slot in busy_times:
-                start = datetime.fromisoformat(slot['start'].replace('Z', '+00:00'))
-                end = datetime.fromisoformat(slot['end'].replace('Z', '+00:00'))
-                busy_slots.append({
-                    'start': start.strftime('%H:%M'),
-                    'end': end.strftime('%H:%M')
-                })
+            busy, errors = self.query_freebusy([calendar_id], [date_to_check], time_min, time_max)
+            if calendar_id in errors:
+                return {
+                    'success': False,
+                    'error': errors[calendar_id]
+                }
 
             return {
                 'success': True,
                 'date': date_to_check.isoformat(),
-                'busy_times': busy_slots
+                'busy_times': busy[calendar_id][date_to_check.isoformat()]
             }
         except HttpError as e:
             logger.error(f"Failed to get busy times: {e}")
@@ -386,11 +568,6 @@ class GoogleCalendarService:
         Returns:
             可用時段列表
         """
-        if business_start is None:
-            business_start = time(9, 0)
-        if business_end is None:
-            business_end = time(18, 0)
-
         # 取得忙碌時段
         busy_result = self.get_busy_times(
             calendar_id,
@@ -402,41 +579,13 @@ class GoogleCalendarService:
         if not busy_result.get('success'):
             return busy_result
 
-        busy_times = busy_result.get('busy_times', [])
-
-        # 生成所有時段
-        available_slots = []
-        current_time = datetime.combine(date_to_check, business_start)
-        end_time = datetime.combine(date_to_check, business_end)
-
-        while current_time < end_time:
-            slot_start = current_time.strftime('%H:%M')
-            slot_end = (current_time + timedelta(minutes=slot_duration)).strftime('%H:%M')
-
-            # 檢查是否與忙碌時段衝突
-            is_available = True
-            for busy in busy_times:
-                # 簡單重疊檢查
-                if not (slot_end <= busy['start'] or slot_start >= busy['end']):
-                    is_available = False
-                    break
-
-            if is_available:
-                available_slots.append({
-                    'start': slot_start,
-                    'end': slot_end
-                })
-
-            current_time += timedelta(minutes=slot_duration)
-
-        # 如果是今天，過濾掉已過去的時段
-        if date_to_check == date.today():
-            now = datetime.now()
-            current_time_str = now.strftime('%H:%M')
-            available_slots = [
-                slot for slot in available_slots
-                if slot['start'] > current_time_str
-            ]
+        available_slots = build_available_slots(
+            date_to_check,
+            busy_result.get('busy_times', []),
+            slot_duration,
+            business_start,
+            business_end
+        )
 
         return {
             'success': True,
@@ -475,14 +624,14 @@ class GoogleCalendarService:
         time_max = datetime.combine(date_to, time(23, 59)).isoformat() + '+08:00'
 
         try:
-            events_result = service.events().list(
+            events_result = self._execute(service.events().list(
                 calendarId=calendar_id,
                 timeMin=time_min,
                 timeMax=time_max,
                 maxResults=max_results,
                 singleEvents=True,
                 orderBy='startTime'
-            ).execute()
+            ))
 
             events = events_result.get('items', [])
 
@@ -517,3 +666,267 @@ def get_calendar_service() -> GoogleCalendarService:
     if _calendar_service is None:
         _calendar_service = GoogleCalendarService()
     return _calendar_service
+
+
+class AsyncGoogleCalendarService:
+    """
+    GoogleCalendarService 的非同步介面
+
+    阻塞的 API 呼叫交給有上限的 thread pool，event loop 不會被 Calendar 往返卡住；
+    忙碌時段依 (行事曆, 日期, 時間範圍) 快取 GOOGLE_CALENDAR_FREEBUSY_TTL 秒
+    """
+
+    def __init__(
+        self,
+        service: GoogleCalendarService = None,
+        max_workers: int = GOOGLE_CALENDAR_MAX_WORKERS,
+        freebusy_ttl: float = GOOGLE_CALENDAR_FREEBUSY_TTL
+    ):
+        self.service = service or get_calendar_service()
+        self.max_workers = max_workers
+        self.freebusy_ttl = freebusy_ttl
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # (calendar_id, YYYY-MM-DD, HH:MM, HH:MM) -> (busy_slots, stored_at)
+        self._busy_cache: Dict[tuple, tuple] = {}
+        # 每次 invalidate 遞增：calendar_id -> generation，全部清除時遞增 _all_generation
+        self._generations: Dict[str, int] = {}
+        self._all_generation = 0
+
+        self.stats = {
+            "api_calls": 0,
+            "freebusy_requests": 0,
+            "freebusy_hits": 0,
+            "freebusy_misses": 0,
+        }
+
+    async def _run(self, func, *args, **kwargs):
+        """在 thread pool 執行同步呼叫"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="gcal"
+            )
+        self.stats["api_calls"] += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    # ------------------------------------------------------------------
+    # 行事曆 / 事件（寫入成功後清除該行事曆的忙碌時段快取）
+    # ------------------------------------------------------------------
+
+    async def create_calendar(self, summary: str, description: str = None) -> Dict[str, Any]:
+        """建立新的 Calendar"""
+        return await self._run(self.service.create_calendar, summary, description)
+
+    async def share_calendar(self, calendar_id: str, email: str, role: str = "reader") -> Dict[str, Any]:
+        """分享行事曆給指定使用者"""
+        return await self._run(self.service.share_calendar, calendar_id, email, role)
+
+    async def create_event(self, calendar_id: str, *args, **kwargs) -> Dict[str, Any]:
+        """建立 Calendar 事件（參數同 GoogleCalendarService.create_event）"""
+        result = await self._run(self.service.create_event, calendar_id, *args, **kwargs)
+        self.invalidate_busy_times(calendar_id)
+        return result
+
+    async def update_event(self, calendar_id: str, event_id: str, **kwargs) -> Dict[str, Any]:
+        """更新 Calendar 事件（參數同 GoogleCalendarService.update_event）"""
+        result = await self._run(self.service.update_event, calendar_id, event_id, **kwargs)
+        self.invalidate_busy_times(calendar_id)
+        return result
+
+    async def delete_event(self, calendar_id: str, event_id: str) -> Dict[str, Any]:
+        """刪除 Calendar 事件"""
+        result = await self._run(self.service.delete_event, calendar_id, event_id)
+        self.invalidate_busy_times(calendar_id)
+        return result
+
+    async def list_events(self, calendar_id: str, **kwargs) -> Dict[str, Any]:
+        """列出 Calendar 事件（參數同 GoogleCalendarService.list_events）"""
+        return await self._run(self.service.list_events, calendar_id, **kwargs)
+
+    # ------------------------------------------------------------------
+    # 忙碌時段
+    # ------------------------------------------------------------------
+
+    async def get_busy_times_batch(
+        self,
+        calendar_ids: List[str],
+        dates: List[date],
+        time_min: time = None,
+        time_max: time = None
+    ) -> Dict[str, Any]:
+        """
+        批次取得多個行事曆、多天的忙碌時段
+
+        快取未命中的部分合併為 freebusy 批次查詢（同一批日期的行事曆一起查）
+
+        Args:
+            calendar_ids: Calendar ID 列表
+            dates: 要查詢的日期
+            time_min: 每天查詢開始時間（預設 09:00）
+            time_max: 每天查詢結束時間（預設 18:00）
+
+        Returns:
+            {'success': True, 'busy_times': {calendar_id: {YYYY-MM-DD: [...]}}, 'errors': {calendar_id: 原因}}
+        """
+        time_min = time_min or BUSINESS_START
+        time_max = time_max or BUSINESS_END
+        window = (time_min.strftime('%H:%M'), time_max.strftime('%H:%M'))
+        now = monotonic()
+
+        busy_times: Dict[str, Dict[str, List[Dict[str, str]]]] = {}
+        missing: Dict[str, List[date]] = {}
+        for calendar_id in dict.fromkeys(calendar_ids):
+            busy_times[calendar_id] = {}
+            for d in dates:
+                cached = self._busy_cache.get((calendar_id, d.isoformat()) + window)
+                if cached is not None and now - cached[1] < self.freebusy_ttl:
+                    self.stats["freebusy_hits"] += 1
+                    busy_times[calendar_id][d.isoformat()] = [dict(slot) for slot in cached[0]]
+                else:
+                    self.stats["freebusy_misses"] += 1
+                    missing.setdefault(calendar_id, []).append(d)
+
+        # 缺少相同日期組合的行事曆合併成一次查詢
+        groups: Dict[tuple, List[str]] = {}
+        for calendar_id, missing_dates in missing.items():
+            groups.setdefault(tuple(sorted(set(missing_dates))), []).append(calendar_id)
+
+        errors: Dict[str, str] = {}
+        generations = {calendar_id: self._busy_generation(calendar_id) for calendar_id in missing}
+        try:
+            results = await asyncio.gather(*[
+                self._run(self.service.query_freebusy, group_ids, list(group_dates), time_min, time_max)
+                for group_dates, group_ids in groups.items()
+            ])
+        except HttpError as e:
+            logger.error(f"Failed to query freebusy: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+        stored_at = monotonic()
+        if results:
+            self._prune_busy_cache(stored_at)
+        for busy, group_errors in results:
+            self.stats["freebusy_requests"] += 1
+            errors.update(group_errors)
+            for calendar_id, by_day in busy.items():
+                # 查詢期間該行事曆有寫入（已被 invalidate），結果不寫回快取
+                cacheable = generations[calendar_id] == self._busy_generation(calendar_id)
+                for day, slots in by_day.items():
+                    if cacheable:
+                        self._busy_cache[(calendar_id, day) + window] = (slots, stored_at)
+                    busy_times[calendar_id][day] = [dict(slot) for slot in slots]
+
+        for calendar_id in errors:
+            busy_times.pop(calendar_id, None)
+
+        return {
+            'success': True,
+            'busy_times': busy_times,
+            'errors': errors
+        }
+
+    async def get_busy_times(
+        self,
+        calendar_id: str,
+        date_to_check: date,
+        time_min: time = None,
+        time_max: time = None
+    ) -> Dict[str, Any]:
+        """取得指定日期的忙碌時段（回傳格式同 GoogleCalendarService.get_busy_times）"""
+        result = await self.get_busy_times_batch([calendar_id], [date_to_check], time_min, time_max)
+        if not result.get('success'):
+            return result
+        if calendar_id in result['errors']:
+            return {
+                'success': False,
+                'error': result['errors'][calendar_id]
+            }
+        return {
+            'success': True,
+            'date': date_to_check.isoformat(),
+            'busy_times': result['busy_times'][calendar_id][date_to_check.isoformat()]
+        }
+
+    async def get_available_slots(
+        self,
+        calendar_id: str,
+        date_to_check: date,
+        slot_duration: int = 30,
+        business_start: time = None,
+        business_end: time = None
+    ) -> Dict[str, Any]:
+        """取得指定日期的可用時段（回傳格式同 GoogleCalendarService.get_available_slots）"""
+        busy_result = await self.get_busy_times(calendar_id, date_to_check, business_start, business_end)
+        if not busy_result.get('success'):
+            return busy_result
+
+        available_slots = build_available_slots(
+            date_to_check,
+            busy_result.get('busy_times', []),
+            slot_duration,
+            business_start,
+            business_end
+        )
+        return {
+            'success': True,
+            'date': date_to_check.isoformat(),
+            'available_slots': available_slots,
+            'total_slots': len(available_slots)
+        }
+
+    def _prune_busy_cache(self, now: float):
+        """移除已過期的忙碌時段快取"""
+        for key in [k for k, (_, stored_at) in self._busy_cache.items() if now - stored_at >= self.freebusy_ttl]:
+            del self._busy_cache[key]
+
+    def _busy_generation(self, calendar_id: str) -> tuple:
+        return self._all_generation, self._generations.get(calendar_id, 0)
+
+    def invalidate_busy_times(self, calendar_id: str = None):
+        """清除忙碌時段快取（calendar_id 為 None 時全部清除）"""
+        if calendar_id is None:
+            self._all_generation += 1
+            self._busy_cache.clear()
+            return
+        self._generations[calendar_id] = self._generations.get(calendar_id, 0) + 1
+        for key in [k for k in self._busy_cache if k[0] == calendar_id]:
+            del self._busy_cache[key]
+
+    def shutdown(self):
+        """關閉 thread pool（lifespan shutdown 時呼叫）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得 API 呼叫與快取統計"""
+        lookups = self.stats["freebusy_hits"] + self.stats["freebusy_misses"]
+        return {
+            **self.stats,
+            "freebusy_hit_rate": round(self.stats["freebusy_hits"] / lookups, 4) if lookups else 0.0,
+            "freebusy_cached": len(self._busy_cache),
+            "freebusy_ttl": self.freebusy_ttl,
+            "max_workers": self.max_workers
+        }
+
+
+_async_calendar_service = None
+
+
+def get_async_calendar_service() -> AsyncGoogleCalendarService:
+    """取得非同步 Calendar 服務實例（共用同一個 GoogleCalendarService）"""
+    global _async_calendar_service
+    if _async_calendar_service is None:
+        _async_calendar_service = AsyncGoogleCalendarService()
+    return _async_calendar_service
+
+
+def shutdown_calendar_service():
+    """關閉 Calendar thread pool"""
+    if _async_calendar_service is not None:
+        _async_calendar_service.shutdown()
@@ -19,6 +19,7 @@ Date: 2025-12-31
 
 from datetime import datetime
 from typing import Optional
+from .bulk_sender import run_bulk
 from .postgrest_client import postgrest_request
 
 
@@ -172,28 +173,26 @@ async def batch_set_renewal_intent(
             "results": [...]
         }
     """
-    results = []
-    succeeded = 0
-    failed = 0
+    # 各合約互不相依，以有限併發執行（結果依輸入順序）
+    summary = await run_bulk(
+        contract_ids,
+        lambda contract_id: set_renewal_intent(contract_id, intent_type, value, notes)
+    )
 
-    for contract_id in contract_ids:
-        result = await set_renewal_intent(contract_id, intent_type, value, notes)
-        results.append({
+    results = [
+        {
             "contract_id": contract_id,
             "success": result.get("success", False),
             "message": result.get("message") or result.get("error")
-        })
-
-        if result.get("success"):
-            succeeded += 1
-        else:
-            failed += 1
+        }
+        for contract_id, result in zip(contract_ids, summary["results"])
+    ]
 
     return {
-        "success": failed == 0,
+        "success": summary["failed_count"] == 0,
         "total": len(contract_ids),
-        "succeeded": succeeded,
-        "failed": failed,
+        "succeeded": summary["success_count"],
+        "failed": summary["failed_count"],
         "results": results
     }
 
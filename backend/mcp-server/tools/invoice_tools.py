@@ -16,6 +16,8 @@ from typing import Optional, Dict, Any
 
 import httpx
 
+from .postgrest_client import postgrest_session
+
 logger = logging.getLogger(__name__)
 
 # 環境變數設定
@@ -59,8 +61,8 @@ def generate_amego_signature(json_data: str, timestamp: int, app_key: str) -> st
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -72,8 +74,8 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, params=params, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.patch(url, params=params, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -22,6 +22,8 @@ import math
 
 import httpx
 
+from .postgrest_client import postgrest_session
+
 logger = logging.getLogger(__name__)
 
 # 環境變數設定
@@ -64,8 +66,8 @@ def generate_amego_signature(json_data: str, timestamp: int, app_key: str) -> st
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -0,0 +1,280 @@
+"""
+Hour Jungle CRM - Knowledge Cache
+Brain RAG 知識搜尋快取
+
+用途：AI 助手每次對話前都會呼叫 Brain 知識搜尋，員工常重複問相似問題，
+以快取減少 Brain API 往返時間
+
+- 第一層：process 內 TTL + LRU（OrderedDict）
+- 第二層：Redis（選用，KNOWLEDGE_CACHE_REDIS=true 時啟用，多個 instance 共用）
+  第一層項目記錄寫入時的 Redis generation，回傳前與 Redis 目前的 generation 比對，
+  其他 instance invalidate 後不會再回傳舊值
+- Stale-while-revalidate：過期但仍在 stale 期限內的結果先回傳，背景重新查詢
+- 知識庫寫入（brain_save_knowledge / sync_prices_to_brain）時呼叫 invalidate_knowledge_cache()
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Any, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_CACHE_TTL = float(os.getenv("KNOWLEDGE_CACHE_TTL", "600"))              # 新鮮期（秒）
+KNOWLEDGE_CACHE_STALE_TTL = float(os.getenv("KNOWLEDGE_CACHE_STALE_TTL", "3600"))  # 可回傳舊值的期限（秒）
+KNOWLEDGE_CACHE_MAX_ENTRIES = int(os.getenv("KNOWLEDGE_CACHE_MAX_ENTRIES", "500"))
+KNOWLEDGE_CACHE_REDIS = os.getenv("KNOWLEDGE_CACHE_REDIS", "false").lower() == "true"
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+REDIS_KEY_PREFIX = "knowledge_cache"
+REDIS_GENERATION_KEY = f"{REDIS_KEY_PREFIX}:generation"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT = " ?？!！。.,，~～"
+
+Fetcher = Callable[[str, int], Awaitable[str]]
+
+
+def normalize_query(query: str) -> str:
+    """正規化查詢字串（大小寫、空白、句尾標點），讓相似問題共用快取"""
+    normalized = _WHITESPACE_RE.sub(" ", query.strip().lower())
+    return normalized.strip(_TRAILING_PUNCT)
+
+
+class KnowledgeCache:
+    """Brain 知識搜尋結果快取"""
+
+    def __init__(
+        self,
+        ttl: float = KNOWLEDGE_CACHE_TTL,
+        stale_ttl: float = KNOWLEDGE_CACHE_STALE_TTL,
+        max_entries: int = KNOWLEDGE_CACHE_MAX_ENTRIES,
+        use_redis: bool = KNOWLEDGE_CACHE_REDIS
+    ):
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.max_entries = max_entries
+        self.use_redis = use_redis
+
+        # key -> (value, stored_at, generation, redis_generation)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generation = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: set = set()
+        self._background: Set[asyncio.Task] = set()
+        self._redis = None
+
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "errors": 0,
+            "invalidations": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Redis（第二層，失敗時直接略過）
+    # ------------------------------------------------------------------
+
+    async def _get_redis(self):
+        if not self.use_redis:
+            return None
+        if self._redis is None:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return self._redis
+
+    async def _redis_generation(self) -> Optional[str]:
+        """Redis 目前的 generation（未啟用或讀取失敗時為 None）"""
+        try:
+            r = await self._get_redis()
+            if r is None:
+                return None
+            return await r.get(REDIS_GENERATION_KEY) or "0"
+        except Exception as e:
+            logger.warning(f"Knowledge cache Redis generation read failed: {e}")
+            return None
+
+    @staticmethod
+    def _redis_key(generation: str, key: str) -> str:
+        return f"{REDIS_KEY_PREFIX}:{generation}:{key}"
+
+    async def _redis_get(self, key: str, generation: Optional[str]) -> Optional[tuple]:
+        if generation is None:
+            return None
+        try:
+            r = await self._get_redis()
+            raw = await r.get(self._redis_key(generation, key))
+            if not raw:
+                return None
+            data = json.loads(raw)
+            return data["value"], data["stored_at"]
+        except Exception as e:
+            logger.warning(f"Knowledge cache Redis read failed: {e}")
+            return None
+
+    async def _redis_set(self, key: str, value: str, stored_at: float, generation: Optional[str]):
+        if generation is None:
+            return
+        try:
+            r = await self._get_redis()
+            await r.set(
+                self._redis_key(generation, key),
+                json.dumps({"value": value, "stored_at": stored_at}, ensure_ascii=False),
+                ex=int(self.stale_ttl)
+            )
+        except Exception as e:
+            logger.warning(f"Knowledge cache Redis write failed: {e}")
+
+    # ------------------------------------------------------------------
+    # 第一層（process 內 LRU）
+    # ------------------------------------------------------------------
+
+    def _local_get(self, key: str, redis_generation: Optional[str]) -> Optional[tuple]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at, generation, entry_redis_generation = entry
+        if (
+            generation != self._generation
+            # Redis 無法讀取時（None）只依本地 generation 判斷
+            or (redis_generation is not None and entry_redis_generation != redis_generation)
+            or time.time() - stored_at >= self.stale_ttl
+        ):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value, stored_at
+
+    def _local_set(self, key: str, value: str, stored_at: float, redis_generation: Optional[str]):
+        self._entries[key] = (value, stored_at, self._generation, redis_generation)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+
+    async def _fetch_and_store(
+        self, key: str, query: str, top_k: int, fetcher: Fetcher, redis_generation: Optional[str]
+    ) -> str:
+        generation = self._generation
+        value = await fetcher(query, top_k)
+        # 查詢期間若已被 invalidate，結果不寫回快取
+        # （其他 instance 的 invalidate：寫入查詢前的 Redis generation，下次比對時即失效）
+        if generation == self._generation:
+            stored_at = time.time()
+            self._local_set(key, value, stored_at, redis_generation)
+            await self._redis_set(key, value, stored_at, redis_generation)
+        return value
+
+    async def _refresh(
+        self, key: str, query: str, top_k: int, fetcher: Fetcher, redis_generation: Optional[str]
+    ):
+        try:
+            self.stats["refreshes"] += 1
+            await self._fetch_and_store(key, query, top_k, fetcher, redis_generation)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Knowledge cache background refresh failed: {e}")
+        finally:
+            self._refreshing.discard(key)
+
+    async def get_or_fetch(self, query: str, top_k: int, fetcher: Fetcher) -> str:
+        """
+        取得快取結果，必要時呼叫 fetcher 查詢
+
+        Args:
+            query: 使用者問題
+            top_k: 回傳筆數
+            fetcher: 實際查詢函數，失敗時應拋出例外（失敗結果不會被快取）
+
+        Returns:
+            fetcher 回傳的知識文字
+        """
+        key = f"{top_k}:{normalize_query(query)}"
+
+        redis_generation = await self._redis_generation()
+
+        source = "hits"
+        cached = self._local_get(key, redis_generation)
+        if cached is None:
+            cached = await self._redis_get(key, redis_generation)
+            if cached is not None:
+                source = "redis_hits"
+                self._local_set(key, cached[0], cached[1], redis_generation)
+
+        if cached is not None:
+            value, stored_at = cached
+            if time.time() - stored_at < self.ttl:
+                self.stats[source] += 1
+                return value
+
+            # 過期但在 stale 期限內：先回傳舊值，背景更新
+            self.stats["stale_hits"] += 1
+            if key not in self._refreshing:
+                self._refreshing.add(key)
+                # 保留 task 參考，避免執行中被 GC
+                task = asyncio.create_task(self._refresh(key, query, top_k, fetcher, redis_generation))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            return value
+
+        # 完全未命中：相同 key 的併發請求共用同一次查詢
+        self.stats["misses"] += 1
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.ensure_future(self._fetch_and_store(key, query, top_k, fetcher, redis_generation))
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            if future.done():
+                self._inflight.pop(key, None)
+            else:
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+    async def invalidate(self):
+        """清除所有快取（知識庫有新資料時呼叫）"""
+        self._generation += 1
+        self._entries.clear()
+        self.stats["invalidations"] += 1
+        try:
+            r = await self._get_redis()
+            if r is not None:
+                await r.incr(REDIS_GENERATION_KEY)
+        except Exception as e:
+            logger.warning(f"Knowledge cache Redis invalidation failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得命中率統計"""
+        served = self.stats["hits"] + self.stats["stale_hits"] + self.stats["redis_hits"]
+        lookups = served + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "redis_enabled": self.use_redis
+        }
+
+
+# 全域快取實例
+knowledge_cache = KnowledgeCache()
+
+
+async def invalidate_knowledge_cache():
+    """知識庫寫入後呼叫，清除搜尋快取"""
+    await knowledge_cache.invalidate()
@@ -14,6 +14,8 @@ from typing import Dict, Any, Optional, List
 
 import httpx
 
+from .postgrest_client import postgrest_session
+
 logger = logging.getLogger(__name__)
 
 # Brain API URL
@@ -116,15 +118,14 @@ async def ai_save_conversation(
         payload["rag_context"] = rag_context
 
     try:
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             response = await client.post(
                 f"{POSTGREST_URL}/ai_conversations",
                 json=payload,
                 headers={
                     "Content-Type": "application/json",
                     "Prefer": "return=representation"
-                },
-                timeout=30.0
+                }
             )
 
             if response.status_code in [200, 201]:
@@ -162,11 +163,10 @@ async def ai_get_conversation(conversation_id: int) -> Dict[str, Any]:
         對話詳情
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             response = await client.get(
                 f"{POSTGREST_URL}/ai_conversations",
-                params={"id": f"eq.{conversation_id}"},
-                timeout=30.0
+                params={"id": f"eq.{conversation_id}"}
             )
 
             if response.status_code == 200:
@@ -257,12 +257,11 @@ async def ai_submit_feedback(
         payload["submitted_by"] = submitted_by
 
     try:
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             # 先檢查是否已有回饋
             check_response = await client.get(
                 f"{POSTGREST_URL}/ai_feedback",
-                params={"conversation_id": f"eq.{conversation_id}"},
-                timeout=30.0
+                params={"conversation_id": f"eq.{conversation_id}"}
             )
 
             if check_response.status_code == 200 and check_response.json():
@@ -275,8 +274,7 @@ async def ai_submit_feedback(
                     headers={
                         "Content-Type": "application/json",
                         "Prefer": "return=representation"
-                    },
-                    timeout=30.0
+                    }
                 )
             else:
                 # 新增回饋
@@ -286,8 +284,7 @@ async def ai_submit_feedback(
                     headers={
                         "Content-Type": "application/json",
                         "Prefer": "return=representation"
-                    },
-                    timeout=30.0
+                    }
                 )
 
             if response.status_code in [200, 201]:
@@ -324,11 +321,10 @@ async def ai_get_feedback_stats(days: int = 30) -> Dict[str, Any]:
         回饋統計資料
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             response = await client.get(
                 f"{POSTGREST_URL}/v_ai_feedback_stats",
-                params={"limit": days, "order": "date.desc"},
-                timeout=30.0
+                params={"limit": days, "order": "date.desc"}
             )
 
             if response.status_code == 200:
@@ -398,15 +394,14 @@ async def ai_refine_response(
 
     # 取得目前的修正輪次
     try:
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             ref_response = await client.get(
                 f"{POSTGREST_URL}/ai_refinements",
                 params={
                     "conversation_id": f"eq.{conversation_id}",
                     "order": "round_number.desc",
                     "limit": 1
-                },
-                timeout=30.0
+                }
             )
 
             if ref_response.status_code == 200 and ref_response.json():
@@ -593,13 +588,12 @@ async def ai_accept_refinement(refinement_id: int) -> Dict[str, Any]:
         執行結果
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             response = await client.patch(
                 f"{POSTGREST_URL}/ai_refinements",
                 params={"id": f"eq.{refinement_id}"},
                 json={"is_accepted": True},
-                headers={"Content-Type": "application/json"},
-                timeout=30.0
+                headers={"Content-Type": "application/json"}
             )
 
             if response.status_code in [200, 204]:
@@ -632,13 +626,12 @@ async def ai_reject_refinement(refinement_id: int) -> Dict[str, Any]:
         執行結果
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             response = await client.patch(
                 f"{POSTGREST_URL}/ai_refinements",
                 params={"id": f"eq.{refinement_id}"},
                 json={"is_accepted": False},
-                headers={"Content-Type": "application/json"},
-                timeout=30.0
+                headers={"Content-Type": "application/json"}
             )
 
             if response.status_code in [200, 204]:
@@ -671,14 +664,13 @@ async def ai_get_refinement_history(conversation_id: int) -> Dict[str, Any]:
         修正歷史列表
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             response = await client.get(
                 f"{POSTGREST_URL}/ai_refinements",
                 params={
                     "conversation_id": f"eq.{conversation_id}",
                     "order": "round_number.asc"
-                },
-                timeout=30.0
+                }
             )
 
             if response.status_code == 200:
@@ -735,7 +727,7 @@ async def ai_export_training_data(
         }
 
     try:
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             # 建構查詢參數
             params = {}
 
@@ -860,8 +852,7 @@ async def ai_export_training_data(
             await client.post(
                 f"{POSTGREST_URL}/ai_training_exports",
                 json=export_record,
-                headers={"Content-Type": "application/json"},
-                timeout=30.0
+                headers={"Content-Type": "application/json"}
             )
 
             return {
@@ -887,10 +878,9 @@ async def ai_get_training_stats() -> Dict[str, Any]:
         可匯出的訓練資料統計
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             response = await client.get(
-                f"{POSTGREST_URL}/v_ai_training_ready",
-                timeout=30.0
+                f"{POSTGREST_URL}/v_ai_training_ready"
             )
 
             if response.status_code == 200:
@@ -928,15 +918,14 @@ async def ai_get_learning_patterns(min_count: int = 3) -> Dict[str, Any]:
         學習模式列表
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             response = await client.get(
                 f"{POSTGREST_URL}/ai_learning_patterns",
                 params={
                     "occurrence_count": f"gte.{min_count}",
                     "is_active": "eq.true",
                     "order": "occurrence_count.desc"
-                },
-                timeout=30.0
+                }
             )
 
             if response.status_code == 200:
@@ -988,11 +977,10 @@ async def ai_list_conversations(
         if model:
             params["model_used"] = f"eq.{model}"
 
-        async with httpx.AsyncClient() as client:
+        async with postgrest_session() as client:
             response = await client.get(
                 f"{POSTGREST_URL}/ai_conversations",
-                params=params,
-                timeout=30.0
+                params=params
             )
 
             if response.status_code == 200:
@@ -10,9 +10,9 @@ from datetime import datetime, date
 from typing import Dict, Any, Optional, List
 
 import httpx
-import google.auth
-from google.auth.transport.requests import Request
-from google.oauth2 import id_token
+
+from .cloud_clients import get_id_token_for_cloud_run, id_token_cache
+from .postgrest_client import postgrest_session
 
 logger = logging.getLogger(__name__)
 
@@ -39,8 +39,8 @@ OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -52,8 +52,8 @@ async def postgrest_post(endpoint: str, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.post(url, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -65,24 +65,12 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, params=params, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.patch(url, params=params, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
 
-def get_id_token_for_cloud_run(target_url: str) -> str:
-    """取得 Cloud Run 的 ID Token"""
-    try:
-        credentials, project = google.auth.default()
-        auth_req = Request()
-        token = id_token.fetch_id_token(auth_req, target_url)
-        return token
-    except Exception as e:
-        logger.warning(f"無法取得 ID Token: {e}")
-        return None
-
-
 # ============================================================================
 # 存證信函工具
 # ============================================================================
@@ -463,6 +451,24 @@ async def legal_create_letter(
         raise Exception(f"建立存證信函失敗: {e}")
 
 
+def build_legal_letter_pdf_data(letter: Dict[str, Any]) -> Dict[str, Any]:
+    """組合 PDF 服務的 legal_letter_data（legal_generate_pdf 與 pdf_generate_batch 共用）"""
+    return {
+        "letter_id": letter.get("id"),
+        "letter_number": letter.get("letter_number"),
+        "recipient_name": letter.get("recipient_name"),
+        "recipient_address": letter.get("recipient_address"),
+        "content": letter.get("content", ""),
+        "overdue_amount": float(letter.get("overdue_amount", 0)),
+        "overdue_days": letter.get("overdue_days", 0),
+        "contract_number": letter.get("contract_number"),
+        "branch_name": letter.get("branch_name"),
+        "created_at": letter.get("created_at"),
+        "sender_name": "你的空間有限公司",
+        "sender_address": "台中市西區大忠南街 118 號 8 樓"
+    }
+
+
 async def legal_generate_pdf(letter_id: int) -> Dict[str, Any]:
     """
     生成存證信函 PDF（呼叫 Cloud Run 服務）
@@ -482,23 +488,8 @@ async def legal_generate_pdf(letter_id: int) -> Dict[str, Any]:
         if not letters:
             return {"success": False, "message": "找不到存證信函"}
 
-        letter = letters[0]
-
         # 準備資料
-        letter_data = {
-            "letter_id": letter_id,
-            "letter_number": letter.get("letter_number"),
-            "recipient_name": letter.get("recipient_name"),
-            "recipient_address": letter.get("recipient_address"),
-            "content": letter.get("content", ""),
-            "overdue_amount": float(letter.get("overdue_amount", 0)),
-            "overdue_days": letter.get("overdue_days", 0),
-            "contract_number": letter.get("contract_number"),
-            "branch_name": letter.get("branch_name"),
-            "created_at": letter.get("created_at"),
-            "sender_name": "你的空間有限公司",
-            "sender_address": "台中市西區大忠南街 118 號 8 樓"
-        }
+        letter_data = build_legal_letter_pdf_data(letters[0])
 
         # 呼叫 Cloud Run 服務
         token = get_id_token_for_cloud_run(PDF_GENERATOR_URL)
@@ -522,6 +513,8 @@ async def legal_generate_pdf(letter_id: int) -> Dict[str, Any]:
             )
 
             if response.status_code == 401:
+                # token 可能已失效，下次重新取得
+                id_token_cache.invalidate(PDF_GENERATOR_URL)
                 return {
                     "success": False,
                     "message": "Cloud Run 認證失敗"
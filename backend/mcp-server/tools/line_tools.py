@@ -6,26 +6,41 @@ LINE 訊息發送相關工具
 import logging
 import os
 import json
+import uuid
 from typing import Dict, Any, Optional
 
 import httpx
 
+from .bulk_sender import line_push_bucket, request_with_retry, run_bulk
+from .postgrest_client import postgrest_session
+
 logger = logging.getLogger(__name__)
 
 LINE_CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN", "")
-LINE_API_URL = "https://api.line.me/v2/bot/message/push"
+LINE_API_URL = os.getenv("LINE_PUSH_API_URL", "https://api.line.me/v2/bot/message/push")
 
 POSTGREST_URL = os.getenv("POSTGREST_URL", "http://postgrest:3000")
 
 # Brain API URL (用於同步訊息記錄)
 BRAIN_API_URL = os.getenv("BRAIN_API_URL", "http://brain.yourspce.org")
 
+# LINE API 共用 client（批次發送時重複使用連線）
+_line_client: Optional[httpx.AsyncClient] = None
+
+
+def get_line_client() -> httpx.AsyncClient:
+    """取得 LINE API 共用 client"""
+    global _line_client
+    if _line_client is None or _line_client.is_closed:
+        _line_client = httpx.AsyncClient(timeout=30.0)
+    return _line_client
+
 
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -143,7 +158,9 @@ async def send_line_push(
 
     headers = {
         "Content-Type": "application/json",
-        "Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}"
+        "Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}",
+        # 重試時帶相同 key，LINE 端會去重，避免客戶收到兩次
+        "X-Line-Retry-Key": str(uuid.uuid4())
     }
 
     payload = {
@@ -152,37 +169,37 @@ async def send_line_push(
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                LINE_API_URL,
-                json=payload,
-                headers=headers,
-                timeout=30.0
-            )
+        client = get_line_client()
+        # 共用 token bucket 限速，429 / 5xx 自動重試
+        response = await request_with_retry(
+            lambda: client.post(LINE_API_URL, json=payload, headers=headers, timeout=30.0),
+            bucket=line_push_bucket
+        )
 
-            if response.status_code == 200:
-                # 發送成功後，同步到 Brain（背景執行）
-                if log_to_brain_enabled and BRAIN_API_URL:
-                    content = extract_message_content(messages)
-                    # 使用 asyncio.create_task 背景執行，不阻塞
-                    import asyncio
-                    asyncio.create_task(
-                        log_to_brain(
-                            sender_id=line_user_id,
-                            sender_name=sender_name,
-                            content=content,
-                            message_type="bot_reply",
-                            timestamp=send_timestamp
-                        )
+        # 409 = 相同 retry key 已成功送出過（先前的嘗試其實已送達）
+        if response.status_code in (200, 409):
+            # 發送成功後，同步到 Brain（背景執行）
+            if log_to_brain_enabled and BRAIN_API_URL:
+                content = extract_message_content(messages)
+                # 使用 asyncio.create_task 背景執行，不阻塞
+                import asyncio
+                asyncio.create_task(
+                    log_to_brain(
+                        sender_id=line_user_id,
+                        sender_name=sender_name,
+                        content=content,
+                        message_type="bot_reply",
+                        timestamp=send_timestamp
                     )
+                )
 
-                return {"success": True}
-            else:
-                logger.error(f"LINE API error: {response.status_code} - {response.text}")
-                return {
-                    "success": False,
-                    "error": f"LINE API 錯誤: {response.status_code}"
-                }
+            return {"success": True}
+        else:
+            logger.error(f"LINE API error: {response.status_code} - {response.text}")
+            return {
+                "success": False,
+                "error": f"LINE API 錯誤: {response.status_code}"
+            }
     except Exception as e:
         logger.error(f"LINE send error: {e}")
         return {
@@ -472,29 +489,33 @@ async def send_bulk_payment_reminders(
                 "total_amount": sum(p.get("total_due", 0) for p in payments_with_line)
             }
 
-        # 實際發送
-        sent_count = 0
-        failed_count = 0
-        errors = []
-
-        for payment in payments_with_line:
+        # 實際發送（併發 + 限速，進度寫入 batch_tasks）
+        async def send_one(payment: dict) -> Dict[str, Any]:
             reminder_type = "overdue" if payment.get("payment_status") == "overdue" else "upcoming"
-            result = await send_payment_reminder(payment["id"], reminder_type)
+            return await send_payment_reminder(payment["id"], reminder_type)
 
-            if result.get("success"):
-                sent_count += 1
-            else:
-                failed_count += 1
-                errors.append({
-                    "payment_id": payment["id"],
-                    "customer": payment["customer_name"],
-                    "error": result.get("error")
-                })
+        summary = await run_bulk(
+            payments_with_line,
+            send_one,
+            task_type="send_reminder",
+            target_of=lambda p: (p["id"], "payment")
+        )
+
+        errors = [
+            {
+                "payment_id": payment["id"],
+                "customer": payment["customer_name"],
+                "error": result.get("error")
+            }
+            for payment, result in zip(payments_with_line, summary["results"])
+            if not result.get("success")
+        ]
 
         return {
             "dry_run": False,
-            "sent_count": sent_count,
-            "failed_count": failed_count,
+            "task_id": summary["task_id"],
+            "sent_count": summary["success_count"],
+            "failed_count": summary["failed_count"],
             "errors": errors if errors else None
         }
 
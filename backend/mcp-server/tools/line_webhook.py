@@ -16,10 +16,13 @@ from urllib.parse import parse_qs
 import httpx
 import redis.asyncio as redis
 
+from .availability import RoomHours
 from .line_tools import send_line_push, log_to_brain
+from .reference_cache import get_reference_row
 from .booking_tools import (
     booking_list_rooms,
     booking_check_availability,
+    booking_availability_heatmap,
     booking_create,
     booking_cancel,
     booking_get_by_line_user
@@ -134,8 +137,13 @@ def create_room_selection_flex(rooms: list) -> Dict:
     }
 
 
-def create_date_selection_flex() -> Dict:
-    """建立日期選擇 Flex Message"""
+def create_date_selection_flex(available_counts: Dict[str, int] = None) -> Dict:
+    """
+    建立日期選擇 Flex Message
+
+    Args:
+        available_counts: {YYYY-MM-DD: 可預約時段數}，提供時已額滿的日期會標示且不可選
+    """
     today = date.today()
     buttons = []
 
@@ -151,6 +159,20 @@ def create_date_selection_flex() -> Dict:
         else:
             label = f"{d.month}/{d.day}（{weekday}）"
 
+        if available_counts is not None and not available_counts.get(d.isoformat()):
+            buttons.append({
+                "type": "button",
+                "action": {
+                    "type": "message",
+                    "label": f"{label} 已額滿",
+                    "text": f"抱歉，{d.month}/{d.day} 已無可預約時段，請選擇其他日期"
+                },
+                "style": "secondary",
+                "color": "#DDDDDD",
+                "margin": "sm"
+            })
+            continue
+
         buttons.append({
             "type": "button",
             "action": {
@@ -183,13 +205,19 @@ def create_date_selection_flex() -> Dict:
     }
 
 
-def create_time_selection_flex(available_slots: list, selected_date: str, all_busy_times: list = None) -> Dict:
+def create_time_selection_flex(
+    available_slots: list,
+    selected_date: str,
+    all_busy_times: list = None,
+    open_time: str = "09:00",
+    close_time: str = "18:00"
+) -> Dict:
     """建立時段選擇 Flex Message（顯示可預約和已被訂的時段）"""
-    from datetime import datetime, time, timedelta
-
-    # 生成所有時段（09:00 ~ 18:00，每小時一格）
+    # 生成所有時段（會議室營業時間內，每小時一格）
+    open_hour = int(open_time.split(":")[0])
+    close_hour, close_min = map(int, close_time.split(":")[:2])
     all_slots = []
-    for hour in range(9, 18):
+    for hour in range(open_hour, close_hour if close_min == 0 else close_hour + 1):
         slot_start = f"{hour:02d}:00"
         all_slots.append(slot_start)
 
@@ -290,10 +318,11 @@ def create_time_selection_flex(available_slots: list, selected_date: str, all_bu
     }
 
 
-def create_duration_selection_flex(start_time: str) -> Dict:
+def create_duration_selection_flex(start_time: str, close_time: str = "18:00") -> Dict:
     """建立預約時長選擇"""
-    # 計算可選的結束時間（最多到 18:00）
+    # 計算可選的結束時間（最多到會議室結束時間）
     start_hour, start_min = map(int, start_time.split(":"))
+    close_hour, close_min = map(int, close_time.split(":")[:2])
     durations = [30, 60, 90, 120, 150, 180]  # 30分到3小時
 
     buttons = []
@@ -302,7 +331,7 @@ def create_duration_selection_flex(start_time: str) -> Dict:
         end_min = (start_min + dur) % 60
         end_time = f"{end_hour:02d}:{end_min:02d}"
 
-        if end_hour > 18 or (end_hour == 18 and end_min > 0):
+        if (end_hour, end_min) > (close_hour, close_min):
             break
 
         if dur < 60:
@@ -778,7 +807,6 @@ async def start_booking_flow(line_user_id: str) -> Dict[str, Any]:
 async def handle_booking_postback(line_user_id: str, step: str, params: Dict) -> Dict[str, Any]:
     """處理預約流程 Postback"""
     import asyncio
-    from .booking_tools import postgrest_get
 
     state = await get_user_state(line_user_id)
     if not state:
@@ -800,8 +828,8 @@ async def handle_booking_postback(line_user_id: str, step: str, params: Dict) ->
         await set_user_state(line_user_id, state)
 
         # 記錄用戶操作到 Brain（取得會議室名稱）
-        rooms = await postgrest_get("meeting_rooms", {"id": f"eq.{room_id}"})
-        room_name = rooms[0]["name"] if rooms else f"會議室{room_id}"
+        room = await get_reference_row("meeting_rooms", room_id)
+        room_name = room["name"] if room else f"會議室{room_id}"
         asyncio.create_task(log_to_brain(
             sender_id=line_user_id,
             sender_name=customer_name,
@@ -810,8 +838,22 @@ async def handle_booking_postback(line_user_id: str, step: str, params: Dict) ->
             timestamp=action_timestamp
         ))
 
-        # 發送日期選擇
-        flex_message = create_date_selection_flex()
+        # 發送日期選擇（場館未來 7 天熱圖，Redis 快取，已額滿的日期不可選）
+        available_counts = None
+        try:
+            heatmap = await booking_availability_heatmap(
+                branch_id=room.get("branch_id") if room else None,
+                days=7
+            )
+            room_heat = next(
+                (r for r in heatmap.get("rooms", []) if r["room_id"] == room_id), None
+            )
+            if heatmap.get("success") and room_heat:
+                available_counts = dict(zip(heatmap["dates"], room_heat["free"]))
+        except Exception as e:
+            logger.warning(f"Failed to load 7-day availability: {e}")
+
+        flex_message = create_date_selection_flex(available_counts)
         await send_line_push(line_user_id, [flex_message])
 
     elif step == "date":
@@ -842,7 +884,9 @@ async def handle_booking_postback(line_user_id: str, step: str, params: Dict) ->
         # 發送時段選擇
         flex_message = create_time_selection_flex(
             availability.get("available_slots", []),
-            selected_date
+            selected_date,
+            open_time=availability.get("open_time", "09:00"),
+            close_time=availability.get("close_time", "18:00")
         )
         await send_line_push(line_user_id, [flex_message])
 
@@ -863,7 +907,11 @@ async def handle_booking_postback(line_user_id: str, step: str, params: Dict) ->
         ))
 
         # 發送時長選擇
-        flex_message = create_duration_selection_flex(start_time)
+        room = await get_reference_row("meeting_rooms", state["room_id"])
+        flex_message = create_duration_selection_flex(
+            start_time,
+            RoomHours.from_room(room).close_time if room else "18:00"
+        )
         await send_line_push(line_user_id, [flex_message])
 
     elif step == "end_time":
@@ -918,19 +966,15 @@ async def handle_booking_postback(line_user_id: str, step: str, params: Dict) ->
 
 async def show_confirm_booking(line_user_id: str, state: Dict) -> Dict[str, Any]:
     """顯示預約確認"""
-    from .booking_tools import postgrest_get
-
     # 取得會議室資訊
-    rooms = await postgrest_get("meeting_rooms", {"id": f"eq.{state['room_id']}"})
-    if not rooms:
+    room = await get_reference_row("meeting_rooms", state["room_id"])
+    if not room:
         await send_line_push(line_user_id, [{"type": "text", "text": "會議室資訊錯誤"}])
         return {"handled": True}
 
-    room = rooms[0]
-
     # 取得場館名稱
-    branches = await postgrest_get("branches", {"id": f"eq.{room['branch_id']}"})
-    room["branch_name"] = branches[0]["name"] if branches else ""
+    branch = await get_reference_row("branches", room["branch_id"])
+    room["branch_name"] = branch["name"] if branch else ""
 
     flex_message = create_confirm_booking_flex(state, room, state["customer_name"])
     await send_line_push(line_user_id, [flex_message])
@@ -7,6 +7,9 @@ import logging
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 
+from .bulk_sender import run_bulk
+from .reference_cache import get_reference_rows, invalidate_reference_data
+
 logger = logging.getLogger(__name__)
 
 # 導入資料庫連接（將在 main.py 中設置）
@@ -158,14 +161,14 @@ async def get_notification_settings() -> Dict[str, Any]:
         通知設定
     """
     try:
-        params = {
-            "setting_key": "in.(auto_payment_reminder,auto_renewal_reminder,reminder_time,overdue_reminder_days)"
-        }
-        result = await postgrest_request("GET", "system_settings", params=params)
+        keys = ("auto_payment_reminder", "auto_renewal_reminder", "reminder_time", "overdue_reminder_days")
+        result = await get_reference_rows("system_settings")
 
         settings = {}
-        for item in (result or []):
+        for item in result:
             key = item.get("setting_key")
+            if key not in keys:
+                continue
             value = item.get("setting_value")
             # 轉換布林值
             if value in ("true", "false"):
@@ -215,6 +218,7 @@ async def update_notification_setting(
             data={"setting_value": value, "updated_at": datetime.now().isoformat()},
             headers={"Prefer": "return=representation"}
         )
+        await invalidate_reference_data("system_settings")
 
         return {
             "success": True,
@@ -265,6 +269,9 @@ async def trigger_daily_reminders(
                 "results": results
             }
 
+        # 收集要發送的項目：(類型, 資料)
+        targets = []
+
         # 處理繳費提醒
         if auto_payment:
             overdue_days_str = settings.get("overdue_reminder_days", "3,7,14,30")
@@ -278,31 +285,9 @@ async def trigger_daily_reminders(
             )
 
             for item in (overdue_result or []):
-                days = item.get("days_overdue", 0)
-                payment_id = item.get("payment_id")
-                line_user_id = item.get("line_user_id")
-
                 # 只有符合天數且有 LINE ID 才發送
-                if days in overdue_days and line_user_id:
-                    if dry_run:
-                        results["payment_reminders"]["skipped"] += 1
-                    else:
-                        try:
-                            await send_payment_reminder(payment_id, "overdue")
-                            # 記錄通知
-                            await log_notification(
-                                notification_type="payment_reminder",
-                                customer_id=item.get("customer_id"),
-                                payment_id=payment_id,
-                                recipient_name=item.get("customer_name"),
-                                recipient_line_id=line_user_id,
-                                message_content=f"逾期 {days} 天催繳提醒",
-                                triggered_by="scheduler"
-                            )
-                            results["payment_reminders"]["sent"] += 1
-                        except Exception as e:
-                            logger.error(f"發送繳費提醒失敗: {e}")
-                            results["payment_reminders"]["failed"] += 1
+                if item.get("days_overdue", 0) in overdue_days and item.get("line_user_id"):
+                    targets.append(("payment", item))
 
         # 處理續約提醒
         if auto_renewal:
@@ -313,30 +298,69 @@ async def trigger_daily_reminders(
             )
 
             for item in (renewal_result or []):
-                contract_id = item.get("contract_id")
-                line_user_id = item.get("line_user_id")
+                # 只有有 LINE ID 且尚未通知的才發送
+                if item.get("line_user_id") and not item.get("renewal_notified_at"):
+                    targets.append(("renewal", item))
+
+        if dry_run:
+            for kind, _ in targets:
+                results[f"{kind}_reminders"]["skipped"] += 1
+            return {
+                "success": True,
+                "message": "排程執行完成",
+                "results": results
+            }
+
+        async def send_one(target) -> Dict[str, Any]:
+            kind, item = target
+            if kind == "payment":
+                days = item.get("days_overdue", 0)
+                result = await send_payment_reminder(item.get("payment_id"), "overdue")
+                if result.get("success"):
+                    await log_notification(
+                        notification_type="payment_reminder",
+                        customer_id=item.get("customer_id"),
+                        payment_id=item.get("payment_id"),
+                        recipient_name=item.get("customer_name"),
+                        recipient_line_id=item.get("line_user_id"),
+                        message_content=f"逾期 {days} 天催繳提醒",
+                        triggered_by="scheduler"
+                    )
+            else:
                 days_remaining = item.get("days_remaining", 0)
+                result = await send_renewal_reminder(item.get("contract_id"))
+                if result.get("success"):
+                    await log_notification(
+                        notification_type="renewal_reminder",
+                        customer_id=item.get("customer_id"),
+                        contract_id=item.get("contract_id"),
+                        recipient_name=item.get("customer_name"),
+                        recipient_line_id=item.get("line_user_id"),
+                        message_content=f"合約 {days_remaining} 天後到期",
+                        triggered_by="scheduler"
+                    )
+            return result
+
+        # 併發 + 限速發送，進度寫入 batch_tasks
+        summary = await run_bulk(
+            targets,
+            send_one,
+            task_type="daily_reminders",
+            target_of=lambda t: (
+                (t[1].get("payment_id"), "payment") if t[0] == "payment"
+                else (t[1].get("contract_id"), "contract")
+            ),
+            created_by="scheduler"
+        )
 
-                # 只有有 LINE ID 且尚未通知的才發送
-                if line_user_id and not item.get("renewal_notified_at"):
-                    if dry_run:
-                        results["renewal_reminders"]["skipped"] += 1
-                    else:
-                        try:
-                            await send_renewal_reminder(contract_id)
-                            await log_notification(
-                                notification_type="renewal_reminder",
-                                customer_id=item.get("customer_id"),
-                                contract_id=contract_id,
-                                recipient_name=item.get("customer_name"),
-                                recipient_line_id=line_user_id,
-                                message_content=f"合約 {days_remaining} 天後到期",
-                                triggered_by="scheduler"
-                            )
-                            results["renewal_reminders"]["sent"] += 1
-                        except Exception as e:
-                            logger.error(f"發送續約提醒失敗: {e}")
-                            results["renewal_reminders"]["failed"] += 1
+        for (kind, item), result in zip(targets, summary["results"]):
+            if result.get("success"):
+                results[f"{kind}_reminders"]["sent"] += 1
+            else:
+                logger.error(f"發送{'繳費' if kind == 'payment' else '續約'}提醒失敗: {result.get('error')}")
+                results[f"{kind}_reminders"]["failed"] += 1
+
+        results["task_id"] = summary["task_id"]
 
         return {
             "success": True,
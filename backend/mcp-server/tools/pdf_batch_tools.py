@@ -0,0 +1,249 @@
+"""
+Hour Jungle CRM - PDF Batch Tools
+批次生成 PDF（合約 / 報價單 / 存證信函）
+
+逐份呼叫 contract_generate_pdf 等工具時，每份都要各自查詢 PostgREST、取得 ID Token、
+呼叫一次 PDF 服務並等待渲染完成
+
+- 一次 PostgREST 查詢（id=in.(...)）取得所有文件資料，合約以 embedding 一併帶出客戶資料
+- 分館資料由 reference_cache 提供，不另外查詢
+- payload 與單份工具共用 build_*_pdf_data，內容相同時 PDF 服務的快取可以互相命中
+- 一次呼叫 PDF 服務 /generate-batch，由服務端同時交給渲染 pool，
+  回傳每份的連結，或合併為一份 PDF / 打包為 ZIP 的連結
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Union
+
+import httpx
+
+from .cloud_clients import get_id_token_for_cloud_run, id_token_cache
+from .contract_tools import (
+    PDF_GENERATOR_URL,
+    build_contract_pdf_data,
+    get_template_for_contract_type,
+)
+from .legal_letter_tools import build_legal_letter_pdf_data, postgrest_patch
+from .postgrest_client import postgrest_session
+from .quote_tools import build_quote_pdf_data
+from .reference_cache import get_reference_row
+
+logger = logging.getLogger(__name__)
+
+# PostgREST URL
+POSTGREST_URL = os.getenv("POSTGREST_URL", "http://postgrest:3000")
+
+# 單次批次上限（需與 PDF 服務的 PDF_BATCH_MAX_ITEMS 一致）
+PDF_BATCH_MAX_ITEMS = int(os.getenv("PDF_BATCH_MAX_ITEMS", "100"))
+
+# 文件類型 → 資料來源
+BATCH_SOURCES = {
+    "contract": {
+        "label": "合約",
+        "table": "contracts",
+        "select": "*,customers(name,company_name,address,id_number,company_tax_id,phone,email)",
+        "number_field": "contract_number",
+    },
+    "quote": {
+        "label": "報價單",
+        "table": "v_quotes",
+        "select": "*",
+        "number_field": "quote_number",
+    },
+    "legal_letter": {
+        "label": "存證信函",
+        "table": "v_pending_legal_letters",
+        "select": "*",
+        "number_field": "letter_number",
+    },
+}
+
+BATCH_OUTPUTS = ("urls", "merged", "zip")
+
+
+async def postgrest_get(endpoint: str, params: dict = None) -> Any:
+    """PostgREST GET 請求"""
+    url = f"{POSTGREST_URL}/{endpoint}"
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+
+def parse_batch_ids(ids: Union[List[int], str, int, None]) -> List[int]:
+    """
+    解析文件ID列表（去除重複，保留順序）
+
+    AI 工具呼叫時 array 參數會以字串傳入（_convert_tool_for_openai），
+    接受 JSON 陣列（"[1, 2]"）或逗號分隔（"1,2"），格式錯誤時拋出 ValueError
+    """
+    try:
+        if isinstance(ids, str):
+            text = ids.strip()
+            values = json.loads(text) if text.startswith("[") else [x for x in text.split(",") if x.strip()]
+        elif isinstance(ids, int):
+            values = [ids]
+        else:
+            values = ids or []
+        return list(dict.fromkeys(int(i) for i in values))
+    except (TypeError, ValueError):
+        raise ValueError(f"文件ID格式錯誤: {ids}（請提供ID陣列或以逗號分隔）")
+
+
+async def build_batch_item(doc_type: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    """將一筆資料列組合為 /generate-batch 的 item"""
+    if doc_type == "contract":
+        branch = await get_reference_row("branches", row.get("branch_id", 1)) or {}
+        return {
+            "contract_data": build_contract_pdf_data(row, row.get("customers") or {}, branch),
+            "template": get_template_for_contract_type(row.get("contract_type", "virtual_office"))
+        }
+    if doc_type == "quote":
+        branch = await get_reference_row("branches", row.get("branch_id", 1)) or {}
+        return {"quote_data": build_quote_pdf_data(row, branch), "template": "quote"}
+    return {"legal_letter_data": build_legal_letter_pdf_data(row), "template": "legal_letter"}
+
+
+async def pdf_generate_batch(
+    doc_type: str,
+    ids: List[int],
+    output: str = "urls"
+) -> Dict[str, Any]:
+    """
+    批次生成 PDF（呼叫 Cloud Run 服務 /generate-batch）
+
+    Args:
+        doc_type: 文件類型 (contract / quote / legal_letter)
+        ids: 文件ID列表（JSON 陣列或逗號分隔字串亦可）
+        output: 輸出方式 (urls=每份各自的連結, merged=合併為一份 PDF, zip=打包為 ZIP)
+
+    Returns:
+        每份文件的結果；merged / zip 時另含合併檔的 pdf_url
+    """
+    source = BATCH_SOURCES.get(doc_type)
+    if not source:
+        return {"success": False, "message": f"不支援的文件類型: {doc_type}（可用: {', '.join(BATCH_SOURCES)}）"}
+    if output not in BATCH_OUTPUTS:
+        return {"success": False, "message": f"不支援的輸出方式: {output}（可用: {', '.join(BATCH_OUTPUTS)}）"}
+
+    try:
+        ids = parse_batch_ids(ids)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    if not ids:
+        return {"success": False, "message": "請提供文件ID"}
+    if len(ids) > PDF_BATCH_MAX_ITEMS:
+        return {"success": False, "message": f"單次最多 {PDF_BATCH_MAX_ITEMS} 份文件"}
+
+    # 1. 一次取得所有文件資料
+    try:
+        rows = await postgrest_get(source["table"], {
+            "id": f"in.({','.join(str(i) for i in ids)})",
+            "select": source["select"]
+        })
+    except Exception as e:
+        logger.error(f"取得{source['label']}資料失敗: {e}")
+        return {"success": False, "message": f"取得{source['label']}資料失敗: {e}"}
+
+    rows_by_id = {row["id"]: row for row in rows}
+    found = [rows_by_id[i] for i in ids if i in rows_by_id]
+    missing_ids = [i for i in ids if i not in rows_by_id]
+    if not found:
+        return {"success": False, "message": f"找不到{source['label']}", "missing_ids": missing_ids}
+
+    # 2. 準備 Cloud Run 請求資料（依請求順序）
+    items = [await build_batch_item(doc_type, row) for row in found]
+
+    # 3. 呼叫 Cloud Run 服務
+    try:
+        token = get_id_token_for_cloud_run(PDF_GENERATOR_URL)
+
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+
+        logger.info(f"呼叫 Cloud Run PDF 服務批次生成{source['label']}: {len(items)} 份 ({output})")
+
+        async with httpx.AsyncClient(timeout=300.0) as client:
+            response = await client.post(
+                f"{PDF_GENERATOR_URL}/generate-batch",
+                json={"items": items, "output": output},
+                headers=headers
+            )
+
+            if response.status_code == 401:
+                # token 可能已失效，下次重新取得
+                id_token_cache.invalidate(PDF_GENERATOR_URL)
+                return {
+                    "success": False,
+                    "message": "Cloud Run 認證失敗，請確認服務帳號權限"
+                }
+
+            response.raise_for_status()
+            result = response.json()
+
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Cloud Run HTTP 錯誤: {e}")
+        return {
+            "success": False,
+            "message": f"PDF 服務錯誤: {e.response.status_code}"
+        }
+    except Exception as e:
+        logger.error(f"呼叫 Cloud Run 失敗: {e}")
+        return {
+            "success": False,
+            "message": f"PDF 生成失敗: {e}"
+        }
+
+    documents = []
+    for row, item in zip(found, result.get("items", [])):
+        documents.append({
+            "id": row["id"],
+            "number": row.get(source["number_field"]),
+            "success": item.get("success", False),
+            "pdf_url": item.get("pdf_url"),
+            "pdf_path": item.get("pdf_path"),
+            "error": item.get("error")
+        })
+
+    # 4. 存證信函：更新 PDF 路徑
+    if doc_type == "legal_letter":
+        generated_at = datetime.now().isoformat()
+        updates = [
+            postgrest_patch(
+                "legal_letters",
+                {"id": f"eq.{doc['id']}"},
+                {"pdf_path": doc["pdf_path"], "pdf_generated_at": generated_at}
+            )
+            for doc in documents if doc["success"]
+        ]
+        for doc, error in zip(
+            [doc for doc in documents if doc["success"]],
+            await asyncio.gather(*updates, return_exceptions=True)
+        ):
+            if isinstance(error, Exception):
+                logger.error(f"更新存證信函 {doc['id']} PDF 路徑失敗: {error}")
+
+    generated = sum(1 for doc in documents if doc["success"])
+    message = result.get("message", f"批次生成完成：成功 {generated} 份")
+    if missing_ids:
+        message = f"{message}；找不到 {len(missing_ids)} 份"
+
+    return {
+        "success": bool(result.get("success")) and not missing_ids,
+        "message": message,
+        "doc_type": doc_type,
+        "output": output,
+        "total": len(ids),
+        "generated": generated,
+        "failed": len(documents) - generated,
+        "missing_ids": missing_ids,
+        "documents": documents,
+        "pdf_url": result.get("pdf_url"),
+        "pdf_path": result.get("pdf_path"),
+        "expires_at": result.get("expires_at")
+    }
@@ -4,20 +4,47 @@ postgrest_client.py - PostgREST 客戶端
 提供統一的 PostgREST API 介面
 支援 dependency injection 模式，可在 main.py 注入共用的請求函數
 
+共用連線池：
+- 整個 process 共用一個長連線 httpx.AsyncClient（keep-alive + 可選 HTTP/2）
+- 由 main.lifespan 呼叫 init_http_client() / close_http_client() 管理生命週期
+- 各工具模組透過 postgrest_session() 取得共用 client，不再每次呼叫都建立新連線
+
 Date: 2025-12-31
 """
 
 import os
+import time
+from contextlib import asynccontextmanager
 from typing import Any, Optional
 
 import httpx
 
 POSTGREST_URL = os.getenv("POSTGREST_URL", "http://postgrest:3000")
 
+# 連線池設定（可由環境變數調整）
+POSTGREST_HTTP2 = os.getenv("POSTGREST_HTTP2", "false").lower() == "true"
+POSTGREST_MAX_CONNECTIONS = int(os.getenv("POSTGREST_MAX_CONNECTIONS", "100"))
+POSTGREST_MAX_KEEPALIVE = int(os.getenv("POSTGREST_MAX_KEEPALIVE", "20"))
+POSTGREST_KEEPALIVE_EXPIRY = float(os.getenv("POSTGREST_KEEPALIVE_EXPIRY", "30"))
+POSTGREST_CONNECT_TIMEOUT = float(os.getenv("POSTGREST_CONNECT_TIMEOUT", "5"))
+POSTGREST_TIMEOUT = float(os.getenv("POSTGREST_TIMEOUT", "30"))
+POSTGREST_POOL_TIMEOUT = float(os.getenv("POSTGREST_POOL_TIMEOUT", "10"))
+
 
 # Dependency injection pattern
 _injected_request = None
 
+# 共用 httpx client（lazy 建立，lifespan 結束時關閉）
+_http_client: Optional[httpx.AsyncClient] = None
+
+# 連線池統計
+_pool_stats = {
+    "requests_total": 0,
+    "responses_total": 0,
+    "http_errors_total": 0,
+    "created_at": None,
+}
+
 
 def set_postgrest_request(func):
     """
@@ -28,6 +55,114 @@ def set_postgrest_request(func):
     _injected_request = func
 
 
+async def _on_request(request: httpx.Request):
+    _pool_stats["requests_total"] += 1
+
+
+async def _on_response(response: httpx.Response):
+    _pool_stats["responses_total"] += 1
+    if response.status_code >= 400:
+        _pool_stats["http_errors_total"] += 1
+
+
+def init_http_client(
+    max_connections: int = POSTGREST_MAX_CONNECTIONS,
+    max_keepalive_connections: int = POSTGREST_MAX_KEEPALIVE,
+    keepalive_expiry: float = POSTGREST_KEEPALIVE_EXPIRY,
+    timeout: float = POSTGREST_TIMEOUT,
+    http2: bool = POSTGREST_HTTP2
+) -> httpx.AsyncClient:
+    """
+    建立共用的 httpx.AsyncClient（連線池）
+
+    Args:
+        max_connections: 連線池最大連線數
+        max_keepalive_connections: 保持 keep-alive 的最大閒置連線數
+        keepalive_expiry: 閒置連線保留秒數
+        timeout: 預設讀寫 timeout（秒）
+        http2: 是否啟用 HTTP/2（需安裝 httpx[http2]）
+
+    Returns:
+        共用的 httpx.AsyncClient
+    """
+    global _http_client
+
+    if _http_client is not None and not _http_client.is_closed:
+        return _http_client
+
+    _http_client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        ),
+        timeout=httpx.Timeout(
+            timeout,
+            connect=POSTGREST_CONNECT_TIMEOUT,
+            pool=POSTGREST_POOL_TIMEOUT
+        ),
+        event_hooks={
+            "request": [_on_request],
+            "response": [_on_response]
+        }
+    )
+    _pool_stats["created_at"] = time.time()
+    return _http_client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """取得共用 client（尚未初始化時自動建立，方便 script / 測試直接呼叫工具）"""
+    if _http_client is None or _http_client.is_closed:
+        return init_http_client()
+    return _http_client
+
+
+async def close_http_client():
+    """關閉共用 client（lifespan shutdown 時呼叫）"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+@asynccontextmanager
+async def postgrest_session():
+    """
+    取得共用 client 的 context manager
+
+    用法與 `async with httpx.AsyncClient() as client:` 相同，
+    但離開區塊時不會關閉連線，連線會回到連線池重複使用
+    """
+    yield get_http_client()
+
+
+def get_pool_stats() -> dict:
+    """
+    取得連線池統計
+
+    Returns:
+        請求數、回應數、HTTP 錯誤數，以及目前連線池中的連線狀態
+        （requests_total - responses_total = 進行中 + 連線失敗的請求）
+    """
+    stats = dict(_pool_stats)
+    stats["http2"] = POSTGREST_HTTP2
+    stats["max_connections"] = POSTGREST_MAX_CONNECTIONS
+    stats["max_keepalive_connections"] = POSTGREST_MAX_KEEPALIVE
+
+    # httpx 未公開連線池 API，讀取 transport 內部狀態（僅供觀測）
+    connections = []
+    if _http_client is not None and not _http_client.is_closed:
+        pool = getattr(getattr(_http_client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+
+    stats["connections"] = len(connections)
+    stats["idle_connections"] = sum(
+        1 for conn in connections if getattr(conn, "is_idle", lambda: False)()
+    )
+    return stats
+
+
 async def postgrest_request(
     method: str,
     endpoint: str,
@@ -63,22 +198,22 @@ async def postgrest_request(
     if headers:
         default_headers.update(headers)
 
-    async with httpx.AsyncClient() as client:
-        if method.upper() == "GET":
-            response = await client.get(url, params=params, headers=default_headers)
-        elif method.upper() == "POST":
-            response = await client.post(url, json=data, params=params, headers=default_headers)
-        elif method.upper() == "PATCH":
-            response = await client.patch(url, json=data, params=params, headers=default_headers)
-        elif method.upper() == "DELETE":
-            response = await client.delete(url, params=params, headers=default_headers)
-        else:
-            raise ValueError(f"不支援的 HTTP 方法: {method}")
-
-        response.raise_for_status()
-
-        # 處理空回應
-        if response.status_code == 204 or not response.content:
-            return []
-
-        return response.json()
+    if method.upper() not in ("GET", "POST", "PATCH", "DELETE"):
+        raise ValueError(f"不支援的 HTTP 方法: {method}")
+
+    client = get_http_client()
+    response = await client.request(
+        method.upper(),
+        url,
+        params=params,
+        json=data if method.upper() in ("POST", "PATCH") else None,
+        headers=default_headers
+    )
+
+    response.raise_for_status()
+
+    # 處理空回應
+    if response.status_code == 204 or not response.content:
+        return []
+
+    return response.json()
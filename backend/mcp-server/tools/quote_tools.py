@@ -10,9 +10,10 @@ from datetime import datetime, date, timedelta
 from typing import Optional, List, Dict, Any
 
 import httpx
-import google.auth
-from google.auth.transport.requests import Request
-from google.oauth2 import id_token
+
+from .cloud_clients import get_id_token_for_cloud_run, id_token_cache
+from .postgrest_client import postgrest_session
+from .reference_cache import get_reference_row, get_reference_rows
 
 logger = logging.getLogger(__name__)
 
@@ -30,8 +31,8 @@ PDF_GENERATOR_URL = os.getenv(
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -43,8 +44,8 @@ async def postgrest_post(endpoint: str, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.post(url, json=data, headers=headers)
         if response.status_code >= 400:
             logger.error(f"PostgREST POST error: {response.status_code} - {response.text}")
             logger.error(f"Request data: {data}")
@@ -59,8 +60,8 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, params=params, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.patch(url, params=params, json=data, headers=headers)
         if response.status_code >= 400:
             logger.error(f"PostgREST PATCH error: {response.status_code} - {response.text}")
             logger.error(f"Request params: {params}, data: {data}")
@@ -71,12 +72,22 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
 async def postgrest_delete(endpoint: str, params: dict) -> bool:
     """PostgREST DELETE 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.delete(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.delete(url, params=params)
         response.raise_for_status()
         return True
 
 
+async def postgrest_rpc(function_name: str, params: dict) -> Any:
+    """PostgREST RPC 呼叫（用於調用 PostgreSQL 函數）"""
+    url = f"{POSTGREST_URL}/rpc/{function_name}"
+    headers = {"Content-Type": "application/json"}
+    async with postgrest_session() as client:
+        response = await client.post(url, json=params, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+
 # ============================================================================
 # 合約編號產生器
 # ============================================================================
@@ -85,71 +96,19 @@ async def generate_contract_number(branch_id: int) -> str:
     """
     根據分館產生下一個合約編號
 
+    由資料庫 allocate_contract_number() 原子取號（migration 112），
+    併發轉換報價單 / 建立合約不會拿到重複編號
+
     Args:
         branch_id: 分館 ID
             - 1: 大忠館 → DZ-XXX（3位數）
             - 2: 環瑞館 → HR-VXX（2位數）
+            - 其他: HJ-YYYYMMDD-{branch_id}
 
     Returns:
         新的合約編號
     """
-    import re
-
-    if branch_id == 1:
-        # 大忠館：DZ-XXX 格式
-        prefix = "DZ-"
-        # 查詢現有最大編號（取全部，因為字串排序無法正確取得最大數字編號）
-        contracts = await postgrest_get(
-            "contracts",
-            {
-                "select": "contract_number",
-                "contract_number": "like.DZ-%",
-                "limit": "2000"  # 取全部後在程式碼中找最大值
-            }
-        )
-
-        max_num = 0
-        for c in contracts:
-            cn = c.get("contract_number", "")
-            # 匹配 DZ-XXX 格式（可能有 -E 後綴表示已結束）
-            match = re.match(r"DZ-E?(\d+)", cn)
-            if match:
-                num = int(match.group(1))
-                if num > max_num:
-                    max_num = num
-
-        next_num = max_num + 1
-        return f"DZ-{next_num:03d}"
-
-    elif branch_id == 2:
-        # 環瑞館：HR-VXX 格式
-        prefix = "HR-V"
-        contracts = await postgrest_get(
-            "contracts",
-            {
-                "select": "contract_number",
-                "contract_number": "like.HR-V%",
-                "order": "contract_number.desc",
-                "limit": "50"
-            }
-        )
-
-        max_num = 0
-        for c in contracts:
-            cn = c.get("contract_number", "")
-            # 匹配 HR-VXX 格式
-            match = re.match(r"HR-V(\d+)", cn)
-            if match:
-                num = int(match.group(1))
-                if num > max_num:
-                    max_num = num
-
-        next_num = max_num + 1
-        return f"HR-V{next_num:02d}"
-
-    else:
-        # 未知分館，使用通用格式
-        return f"HJ-{datetime.now().strftime('%Y%m%d')}-{branch_id}"
+    return await postgrest_rpc("allocate_contract_number", {"p_branch_id": branch_id})
 
 
 # ============================================================================
@@ -174,15 +133,13 @@ async def list_service_plans(
     Returns:
         服務列表，按分類和排序
     """
-    params = {"order": "sort_order.asc"}
-
-    if category:
-        params["category"] = f"eq.{category}"
-    if is_active is not None:
-        params["is_active"] = f"eq.{is_active}"
-
     try:
-        plans = await postgrest_get("service_plans", params)
+        # 參考資料快取（已依 sort_order 排序），在本機篩選
+        plans = [
+            plan for plan in await get_reference_rows("service_plans")
+            if (not category or plan.get("category") == category)
+            and (is_active is None or plan.get("is_active") == is_active)
+        ]
 
         # 按分類分組
         by_category = {}
@@ -213,13 +170,16 @@ async def get_service_plan(code: str) -> Dict[str, Any]:
         服務方案詳情
     """
     try:
-        plans = await postgrest_get("service_plans", {"code": f"eq.{code}"})
-        if not plans:
+        plan = next(
+            (p for p in await get_reference_rows("service_plans") if p.get("code") == code),
+            None
+        )
+        if not plan:
             return {"found": False, "message": f"找不到服務代碼: {code}"}
 
         return {
             "found": True,
-            "plan": plans[0]
+            "plan": plan
         }
     except Exception as e:
         logger.error(f"get_service_plan error: {e}")
@@ -987,18 +947,6 @@ async def convert_quote_to_contract(
         raise Exception(f"報價單轉換失敗: {e}")
 
 
-def get_id_token_for_cloud_run(target_url: str) -> str:
-    """取得 Cloud Run 的 ID Token"""
-    try:
-        credentials, project = google.auth.default()
-        auth_req = Request()
-        token = id_token.fetch_id_token(auth_req, target_url)
-        return token
-    except Exception as e:
-        logger.warning(f"無法取得 ID Token: {e}，嘗試不帶認證呼叫")
-        return None
-
-
 # 分館銀行帳戶設定
 BRANCH_BANK_INFO = {
     1: {  # 大忠館
@@ -1020,6 +968,48 @@ BRANCH_BANK_INFO = {
 }
 
 
+def build_quote_pdf_data(quote: Dict[str, Any], branch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    組合 PDF 服務的 quote_data（quote_generate_pdf 與 pdf_generate_batch 共用）
+
+    Args:
+        quote: v_quotes 資料列
+        branch: branches 資料列
+    """
+    quote_id = quote.get("id")
+    branch_id = quote.get("branch_id", 1)
+
+    # 解析項目
+    items_raw = quote.get("items", [])
+    if isinstance(items_raw, str):
+        items_raw = json.loads(items_raw)
+
+    items = []
+    for item in items_raw:
+        items.append({
+            "name": item.get("name", ""),
+            "quantity": item.get("quantity", 1),
+            "unit_price": float(item.get("unit_price", 0)),
+            "amount": float(item.get("amount", 0))
+        })
+
+    # 銀行資訊
+    bank_info = BRANCH_BANK_INFO.get(branch_id, BRANCH_BANK_INFO[1])
+
+    return {
+        "quote_id": quote_id,
+        "quote_number": quote.get("quote_number", f"Q-{quote_id}"),
+        "quote_date": quote.get("valid_from", date.today().isoformat()),
+        "valid_until": quote.get("valid_until", ""),
+        "branch_name": branch.get("name", "台中館"),
+        "section_title": f"{quote.get('plan_name', '')}（依合約內指定付款時間點）" if quote.get('plan_name') else "",
+        "items": items,
+        "deposit_amount": float(quote.get("deposit_amount", 0)),
+        "total_amount": float(quote.get("total_amount", 0)) + float(quote.get("deposit_amount", 0)),
+        **bank_info
+    }
+
+
 async def quote_generate_pdf(quote_id: int) -> Dict[str, Any]:
     """
     生成報價單 PDF（呼叫 Cloud Run 服務）
@@ -1039,42 +1029,12 @@ async def quote_generate_pdf(quote_id: int) -> Dict[str, Any]:
         quote = quotes[0]
 
         # 2. 取得分館資訊
-        branch_id = quote.get("branch_id", 1)
-        branches = await postgrest_get("branches", {"id": f"eq.{branch_id}"})
-        branch = branches[0] if branches else {}
-
-        # 3. 解析項目
-        items_raw = quote.get("items", [])
-        if isinstance(items_raw, str):
-            items_raw = json.loads(items_raw)
+        branch = await get_reference_row("branches", quote.get("branch_id", 1)) or {}
 
-        items = []
-        for item in items_raw:
-            items.append({
-                "name": item.get("name", ""),
-                "quantity": item.get("quantity", 1),
-                "unit_price": float(item.get("unit_price", 0)),
-                "amount": float(item.get("amount", 0))
-            })
-
-        # 4. 取得銀行資訊
-        bank_info = BRANCH_BANK_INFO.get(branch_id, BRANCH_BANK_INFO[1])
-
-        # 5. 準備報價單資料
-        quote_data = {
-            "quote_id": quote_id,
-            "quote_number": quote.get("quote_number", f"Q-{quote_id}"),
-            "quote_date": quote.get("valid_from", date.today().isoformat()),
-            "valid_until": quote.get("valid_until", ""),
-            "branch_name": branch.get("name", "台中館"),
-            "section_title": f"{quote.get('plan_name', '')}（依合約內指定付款時間點）" if quote.get('plan_name') else "",
-            "items": items,
-            "deposit_amount": float(quote.get("deposit_amount", 0)),
-            "total_amount": float(quote.get("total_amount", 0)) + float(quote.get("deposit_amount", 0)),
-            **bank_info
-        }
+        # 3. 準備報價單資料（項目、銀行資訊）
+        quote_data = build_quote_pdf_data(quote, branch)
 
-        # 6. 呼叫 Cloud Run 服務
+        # 4. 呼叫 Cloud Run 服務
         token = get_id_token_for_cloud_run(PDF_GENERATOR_URL)
 
         headers = {"Content-Type": "application/json"}
@@ -1096,6 +1056,8 @@ async def quote_generate_pdf(quote_id: int) -> Dict[str, Any]:
             )
 
             if response.status_code == 401:
+                # token 可能已失效，下次重新取得
+                id_token_cache.invalidate(PDF_GENERATOR_URL)
                 return {
                     "success": False,
                     "message": "Cloud Run 認證失敗，請確認服務帳號權限"
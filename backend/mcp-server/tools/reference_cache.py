@@ -0,0 +1,267 @@
+"""
+Hour Jungle CRM - Reference Data Cache
+參考資料快取（場館、會議室、服務方案、系統設定）
+
+用途：這幾張表一個月改不到幾次，但會議室列表、預約檢查、報價、設定查詢
+每次都向 PostgREST 讀取同樣的資料
+
+- 每種資料整表快取一份（process 內 TTL，到期後下次讀取時重新查詢）
+- 相同種類的併發讀取共用同一次查詢（invalidate 之後的讀取另外查詢，不共用之前開始的查詢）
+- 回傳 deepcopy，呼叫端可以自由修改（例如加上 branch_name）
+- 透過工具寫入（settings_update / update_service_plan / reorder_service_plans 等）時
+  呼叫 invalidate_reference_data(kind)
+- 跨 instance：REFERENCE_CACHE_REDIS=true 時透過 Redis pub/sub 廣播清除
+- 直接改資料庫（前端 /api/db、SQL）的變更最晚在 TTL 後生效
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Literal, Optional
+
+from .postgrest_client import postgrest_session
+
+logger = logging.getLogger(__name__)
+
+POSTGREST_URL = os.getenv("POSTGREST_URL", "http://postgrest:3000")
+REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "300"))  # 秒
+REFERENCE_CACHE_REDIS = os.getenv("REFERENCE_CACHE_REDIS", "false").lower() == "true"
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+REDIS_CHANNEL = "reference_cache:invalidate"
+LISTENER_RETRY_SECONDS = 5
+
+ReferenceKind = Literal["branches", "meeting_rooms", "service_plans", "system_settings"]
+
+
+@dataclass(frozen=True)
+class ReferenceSource:
+    """一種參考資料的 PostgREST 來源（整表讀取）"""
+    table: str
+    params: Dict[str, str] = field(default_factory=dict)
+
+
+# system_settings 不排序：各模組使用的欄位名稱不同（key / setting_key），由呼叫端自行過濾
+REFERENCE_SOURCES: Dict[str, ReferenceSource] = {
+    "branches": ReferenceSource("branches", {"order": "id.asc"}),
+    "meeting_rooms": ReferenceSource("meeting_rooms", {"order": "branch_id.asc,name.asc"}),
+    "service_plans": ReferenceSource("service_plans", {"order": "sort_order.asc,id.asc"}),
+    "system_settings": ReferenceSource("system_settings"),
+}
+
+
+class ReferenceDataCache:
+    """參考資料整表快取"""
+
+    def __init__(self, ttl: float = REFERENCE_CACHE_TTL, use_redis: bool = REFERENCE_CACHE_REDIS):
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.instance_id = uuid.uuid4().hex
+
+        # kind -> (rows, stored_at, generation)
+        self._entries: Dict[str, tuple] = {}
+        self._generations: Dict[str, int] = {kind: 0 for kind in REFERENCE_SOURCES}
+        # (kind, generation) -> 查詢中的 future；invalidate 後的請求不會共用之前開始的查詢
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "errors": 0,
+            "invalidations": 0,
+            "remote_invalidations": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+
+    async def _fetch(self, kind: str, generation: int) -> List[Dict[str, Any]]:
+        source = REFERENCE_SOURCES[kind]
+        async with postgrest_session() as client:
+            response = await client.get(f"{POSTGREST_URL}/{source.table}", params=source.params)
+            response.raise_for_status()
+            rows = response.json()
+        # 查詢期間若已被 invalidate，結果不寫回快取
+        if generation == self._generations[kind]:
+            self._entries[kind] = (rows, time.time(), generation)
+        return rows
+
+    async def get(self, kind: ReferenceKind) -> List[Dict[str, Any]]:
+        """
+        取得整表資料（複本）
+
+        Args:
+            kind: branches / meeting_rooms / service_plans / system_settings
+
+        Returns:
+            資料列清單，順序依 REFERENCE_SOURCES 的 order
+        """
+        if kind not in REFERENCE_SOURCES:
+            raise ValueError(f"未知的參考資料類型: {kind}")
+
+        entry = self._entries.get(kind)
+        if entry is not None:
+            rows, stored_at, generation = entry
+            if generation == self._generations[kind] and time.time() - stored_at < self.ttl:
+                self.stats["hits"] += 1
+                return copy.deepcopy(rows)
+
+        # 未命中：相同種類、相同 generation 的併發請求共用同一次查詢
+        self.stats["misses"] += 1
+        key = (kind, self._generations[kind])
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(*key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        try:
+            rows = await asyncio.shield(future)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        return copy.deepcopy(rows)
+
+    async def get_by_id(self, kind: ReferenceKind, record_id: Any) -> Optional[Dict[str, Any]]:
+        """依 id 取得單筆資料，找不到回傳 None"""
+        for row in await self.get(kind):
+            if str(row.get("id")) == str(record_id):
+                return row
+        return None
+
+    # ------------------------------------------------------------------
+    # 失效
+    # ------------------------------------------------------------------
+
+    def _invalidate_local(self, kind: Optional[str] = None):
+        kinds = [kind] if kind else list(REFERENCE_SOURCES)
+        for k in kinds:
+            if k in self._generations:
+                self._generations[k] += 1
+                self._entries.pop(k, None)
+
+    async def invalidate(self, kind: Optional[ReferenceKind] = None):
+        """
+        清除快取並通知其他 instance
+
+        Args:
+            kind: 要清除的種類，None 表示全部
+        """
+        self._invalidate_local(kind)
+        self.stats["invalidations"] += 1
+        try:
+            r = await self._get_redis()
+            if r is not None:
+                await r.publish(REDIS_CHANNEL, json.dumps({"kind": kind, "origin": self.instance_id}))
+        except Exception as e:
+            logger.warning(f"Reference cache Redis publish failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Redis pub/sub（跨 instance 失效通知，失敗時只記 log）
+    # ------------------------------------------------------------------
+
+    async def _get_redis(self):
+        if not self.use_redis:
+            return None
+        if self._redis is None:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return self._redis
+
+    def _handle_message(self, data: str):
+        try:
+            payload = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if payload.get("origin") == self.instance_id:
+            return
+        self._invalidate_local(payload.get("kind"))
+        self.stats["remote_invalidations"] += 1
+
+    async def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                r = await self._get_redis()
+                pubsub = r.pubsub()
+                await pubsub.subscribe(REDIS_CHANNEL)
+                # 訂閱前可能漏掉通知，重新連線後一律清空
+                self._invalidate_local()
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._handle_message(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Reference cache listener error: {e}")
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+            await asyncio.sleep(LISTENER_RETRY_SECONDS)
+
+    def start_listener(self):
+        """啟動 Redis 失效通知訂閱（lifespan 呼叫，未啟用 Redis 時不動作）"""
+        if self.use_redis and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+            logger.info("Reference cache listener started")
+
+    async def stop_listener(self):
+        """停止訂閱並關閉 Redis 連線"""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis is not None:
+            try:
+                await self._redis.aclose()
+            except Exception as e:
+                logger.warning(f"Reference cache Redis close failed: {e}")
+            self._redis = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得命中率統計"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        now = time.time()
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": {
+                kind: {"rows": len(rows), "age_seconds": round(now - stored_at, 1)}
+                for kind, (rows, stored_at, _) in self._entries.items()
+            },
+            "ttl": self.ttl,
+            "redis_enabled": self.use_redis,
+            "listening": self._listener is not None and not self._listener.done()
+        }
+
+
+# 全域快取實例
+reference_cache = ReferenceDataCache()
+
+
+async def get_reference_rows(kind: ReferenceKind) -> List[Dict[str, Any]]:
+    """取得參考資料整表（複本）"""
+    return await reference_cache.get(kind)
+
+
+async def get_reference_row(kind: ReferenceKind, record_id: Any) -> Optional[Dict[str, Any]]:
+    """依 id 取得單筆參考資料"""
+    return await reference_cache.get_by_id(kind, record_id)
+
+
+async def invalidate_reference_data(kind: Optional[ReferenceKind] = None):
+    """參考資料寫入後呼叫，清除本機快取並通知其他 instance"""
+    await reference_cache.invalidate(kind)
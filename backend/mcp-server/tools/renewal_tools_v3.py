@@ -22,7 +22,8 @@ import uuid
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
-import httpx
+from .postgrest_client import postgrest_session
+from .reference_cache import get_reference_rows
 
 logger = logging.getLogger(__name__)
 
@@ -32,8 +33,8 @@ POSTGREST_URL = os.getenv("POSTGREST_URL", "http://postgrest:3000")
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -47,8 +48,8 @@ async def postgrest_post(endpoint: str, data: dict, headers: dict = None) -> Any
     }
     if headers:
         default_headers.update(headers)
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=data, headers=default_headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.post(url, json=data, headers=default_headers)
         response.raise_for_status()
         return response.json()
 
@@ -60,8 +61,8 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, params=params, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.patch(url, params=params, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -70,8 +71,8 @@ async def postgrest_rpc(function_name: str, params: dict) -> Any:
     """PostgREST RPC 呼叫（用於調用 PostgreSQL 函數）"""
     url = f"{POSTGREST_URL}/rpc/{function_name}"
     headers = {"Content-Type": "application/json"}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=params, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.post(url, json=params, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -715,7 +716,7 @@ async def renewal_send_sign_reminder(
         # 3. 檢查節流（從 notification_logs 查詢上次催簽時間）
         if not force:
             # 取得設定的節流天數（預設 3 天）
-            settings = await postgrest_get("system_settings", {"key": "eq.automation"})
+            settings = [s for s in await get_reference_rows("system_settings") if s.get("key") == "automation"]
             throttle_days = 3
             if settings:
                 automation = settings[0].get("value", {})
@@ -3,27 +3,52 @@ Hour Jungle CRM - Report Tools
 報表生成相關工具
 """
 
+import asyncio
 import logging
 import os
 from datetime import datetime, date, timedelta
 from typing import Dict, Any, Optional
 
-import httpx
+from .postgrest_client import postgrest_session
 
 logger = logging.getLogger(__name__)
 
 POSTGREST_URL = os.getenv("POSTGREST_URL", "http://postgrest:3000")
 
+# 報表資料來源：live = 即時視圖 / snapshot = 營收快照（migration 111，由排程增量更新）
+REPORT_SOURCES = ("live", "snapshot")
+
 
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+
+async def postgrest_rpc(function_name: str, params: dict) -> Any:
+    """PostgREST RPC 呼叫（用於調用 PostgreSQL 函數）"""
+    url = f"{POSTGREST_URL}/rpc/{function_name}"
+    headers = {"Content-Type": "application/json"}
+    async with postgrest_session() as client:
+        response = await client.post(url, json=params, headers=headers)
         response.raise_for_status()
         return response.json()
 
 
+def get_overdue_level(days_overdue: int) -> str:
+    """逾期等級（與 report_overdue_summary 相同門檻）"""
+    if days_overdue > 60:
+        return "severe"
+    if days_overdue > 30:
+        return "high"
+    if days_overdue >= 15:
+        return "medium"
+    return "low"
+
+
 def get_period_dates(period: str) -> tuple:
     """
     根據期間字串取得開始和結束日期
@@ -73,7 +98,8 @@ def get_period_dates(period: str) -> tuple:
 
 async def get_revenue_summary(
     branch_id: int = None,
-    period: str = "this_month"
+    period: str = "this_month",
+    source: str = "live"
 ) -> Dict[str, Any]:
     """
     營收摘要報表
@@ -81,45 +107,49 @@ async def get_revenue_summary(
     Args:
         branch_id: 場館ID (可選)
         period: 期間 (this_month/last_month/this_year)
+        source: 資料來源 (live=即時計算 / snapshot=營收快照，較快但可能有數分鐘延遲)
 
     Returns:
         營收摘要
     """
+    if source not in REPORT_SOURCES:
+        raise ValueError(f"不支援的資料來源: {source}（可用 {'/'.join(REPORT_SOURCES)}）")
+
     start_date, end_date = get_period_dates(period)
 
+    if source == "snapshot":
+        return await _get_revenue_summary_snapshot(branch_id, period, start_date, end_date)
+
     try:
-        # 取得場館摘要
-        summary = await postgrest_get("v_branch_revenue_summary", {
-            **({"branch_id": f"eq.{branch_id}"} if branch_id else {})
-        })
+        # 場館摘要 + 期間內付款彙總（資料庫端 GROUP BY，見 migration 110）
+        summary, aggregates = await asyncio.gather(
+            postgrest_get("v_branch_revenue_summary", {
+                **({"branch_id": f"eq.{branch_id}"} if branch_id else {})
+            }),
+            postgrest_rpc("report_payment_aggregates", {
+                "p_start_date": str(start_date),
+                "p_end_date": str(end_date),
+                "p_branch_id": branch_id,
+                "p_period_grain": "month"
+            })
+        )
 
-        # 取得期間內的付款記錄統計
-        params = {
-            "due_date": f"gte.{start_date}",
-            "due_date": f"lte.{end_date}"
-        }
-        if branch_id:
-            params["branch_id"] = f"eq.{branch_id}"
+        # 依狀態加總（逾期判斷同 v_monthly_revenue 與快照：pending 且已過 due_date 算逾期，見 migration 119）
+        totals = {}
+        for row in aggregates:
+            status = row["payment_status"]
+            bucket = totals.setdefault(status, {"count": 0, "amount": 0})
+            bucket["count"] += row["payment_count"]
+            bucket["amount"] += row["total_amount"]
 
-        payments = await postgrest_get("payments", params)
+        empty = {"count": 0, "amount": 0}
+        total_revenue = totals.get("paid", empty)["amount"]
+        total_pending = totals.get("pending", empty)["amount"]
+        total_overdue = totals.get("overdue", empty)["amount"]
 
-        # 計算統計
-        total_revenue = sum(
-            p["amount"] for p in payments
-            if p.get("payment_status") == "paid"
-        )
-        total_pending = sum(
-            p["amount"] for p in payments
-            if p.get("payment_status") == "pending"
-        )
-        total_overdue = sum(
-            p["amount"] for p in payments
-            if p.get("payment_status") == "overdue"
-        )
-
-        paid_count = len([p for p in payments if p.get("payment_status") == "paid"])
-        pending_count = len([p for p in payments if p.get("payment_status") == "pending"])
-        overdue_count = len([p for p in payments if p.get("payment_status") == "overdue"])
+        paid_count = totals.get("paid", empty)["count"]
+        pending_count = totals.get("pending", empty)["count"]
+        overdue_count = totals.get("overdue", empty)["count"]
 
         collection_rate = 0
         if paid_count + pending_count + overdue_count > 0:
@@ -132,6 +162,7 @@ async def get_revenue_summary(
             "start_date": str(start_date),
             "end_date": str(end_date),
             "branch_id": branch_id,
+            "source": "live",
             "summary": {
                 "total_revenue": total_revenue,
                 "total_pending": total_pending,
@@ -141,6 +172,7 @@ async def get_revenue_summary(
                 "overdue_count": overdue_count,
                 "collection_rate": collection_rate
             },
+            "breakdown": aggregates,
             "branch_summary": summary
         }
 
@@ -149,6 +181,88 @@ async def get_revenue_summary(
         raise Exception(f"取得營收摘要失敗: {e}")
 
 
+async def _get_revenue_summary_snapshot(
+    branch_id: Optional[int],
+    period: str,
+    start_date: date,
+    end_date: date
+) -> Dict[str, Any]:
+    """
+    營收摘要（快照版）
+
+    讀取 v_monthly_revenue_snapshot / v_branch_revenue_summary_snapshot，不掃 payments。
+    快照的逾期判斷與 v_monthly_revenue 相同：pending 且已過 due_date 也算逾期。
+    """
+    try:
+        branch_filter = {"branch_id": f"eq.{branch_id}"} if branch_id else {}
+        summary, months = await asyncio.gather(
+            postgrest_get("v_branch_revenue_summary_snapshot", branch_filter),
+            postgrest_get("v_monthly_revenue_snapshot", {
+                **branch_filter,
+                "and": f"(period_start.gte.{start_date.replace(day=1)},period_start.lte.{end_date})"
+            })
+        )
+
+        def total(field: str):
+            return sum(m.get(field) or 0 for m in months)
+
+        paid_count = total("paid_count")
+        pending_count = total("pending_count")
+        overdue_count = total("overdue_count")
+
+        collection_rate = 0
+        if paid_count + pending_count + overdue_count > 0:
+            collection_rate = round(
+                paid_count / (paid_count + pending_count + overdue_count) * 100, 2
+            )
+
+        refreshed = [m["refreshed_at"] for m in months if m.get("refreshed_at")]
+
+        return {
+            "period": period,
+            "start_date": str(start_date),
+            "end_date": str(end_date),
+            "branch_id": branch_id,
+            "source": "snapshot",
+            "refreshed_at": min(refreshed) if refreshed else None,
+            "summary": {
+                "total_revenue": total("revenue"),
+                "total_pending": total("pending"),
+                "total_overdue": total("overdue"),
+                "paid_count": paid_count,
+                "pending_count": pending_count,
+                "overdue_count": overdue_count,
+                "collection_rate": collection_rate
+            },
+            "breakdown": months,
+            "branch_summary": summary
+        }
+
+    except Exception as e:
+        logger.error(f"get_revenue_summary (snapshot) error: {e}")
+        raise Exception(f"取得營收摘要失敗: {e}")
+
+
+async def refresh_revenue_snapshot(full: bool = False) -> Dict[str, Any]:
+    """
+    增量更新營收快照（只重算有異動的月份）
+
+    Args:
+        full: 是否全部重算
+
+    Returns:
+        refresh 結果（重算月份數、寫入列數、耗時）
+    """
+    try:
+        result = await postgrest_rpc("refresh_revenue_snapshot", {"p_full": full})
+        if isinstance(result, list):
+            result = result[0] if result else {}
+        return result
+    except Exception as e:
+        logger.error(f"refresh_revenue_snapshot error: {e}")
+        raise Exception(f"更新營收快照失敗: {e}")
+
+
 async def get_overdue_list(
     branch_id: int = None,
     min_days: int = 0
@@ -172,41 +286,26 @@ async def get_overdue_list(
         if min_days > 0:
             params["days_overdue"] = f"gte.{min_days}"
 
-        overdue = await postgrest_get("v_overdue_details", params)
-
-        # 計算統計
-        total_amount = sum(p.get("total_due", 0) for p in overdue)
-        customer_count = len(set(p["customer_id"] for p in overdue))
-
-        # 按逾期等級分類
-        by_level = {
-            "severe": [],  # >60天
-            "high": [],    # 31-60天
-            "medium": [],  # 15-30天
-            "low": []      # <15天
-        }
+        # 明細與統計同時查詢，統計由資料庫計算
+        overdue, statistics = await asyncio.gather(
+            postgrest_get("v_overdue_details", params),
+            postgrest_rpc("report_overdue_summary", {
+                "p_branch_id": branch_id,
+                "p_min_days": min_days
+            })
+        )
 
-        for p in overdue:
-            level = p.get("overdue_level", "low")
-            by_level[level].append(p)
+        # 嚴重個案 / 高優先（列表已依逾期天數排序）
+        severe_cases = [p for p in overdue if get_overdue_level(p.get("days_overdue", 0)) == "severe"]
+        high_priority = [p for p in overdue if get_overdue_level(p.get("days_overdue", 0)) == "high"]
 
         return {
             "branch_id": branch_id,
             "min_days": min_days,
-            "statistics": {
-                "total_count": len(overdue),
-                "total_amount": total_amount,
-                "customer_count": customer_count,
-                "by_level": {
-                    "severe": len(by_level["severe"]),
-                    "high": len(by_level["high"]),
-                    "medium": len(by_level["medium"]),
-                    "low": len(by_level["low"])
-                }
-            },
+            "statistics": statistics,
             "overdue_list": overdue,
-            "severe_cases": by_level["severe"][:10],  # 嚴重個案前10
-            "high_priority": by_level["high"][:10]    # 高優先前10
+            "severe_cases": severe_cases[:10],   # 嚴重個案前10
+            "high_priority": high_priority[:10]  # 高優先前10
         }
 
     except Exception as e:
@@ -235,38 +334,36 @@ async def get_commission_due(
             params["commission_status"] = "eq.pending"
         # all 則不加篩選
 
-        commissions = await postgrest_get("v_commission_tracker", params)
+        # 明細與介紹所彙總同時查詢，金額由資料庫加總
+        commissions, firm_totals = await asyncio.gather(
+            postgrest_get("v_commission_tracker", params),
+            postgrest_rpc("report_commission_summary", {"p_status": status})
+        )
 
         # 按會計事務所分組
         by_firm = {}
+        for f in firm_totals:
+            by_firm[f["firm_name"]] = {
+                "firm_name": f["firm_name"],
+                "firm_contact": f.get("firm_contact"),
+                "firm_phone": f.get("firm_phone"),
+                "commissions": [],
+                "total_amount": f["total_amount"],
+                "count": f["commission_count"]
+            }
         for c in commissions:
-            firm_name = c.get("firm_name") or "無介紹所"
-            if firm_name not in by_firm:
-                by_firm[firm_name] = {
-                    "firm_name": firm_name,
-                    "firm_contact": c.get("firm_contact"),
-                    "firm_phone": c.get("firm_phone"),
-                    "commissions": [],
-                    "total_amount": 0,
-                    "count": 0
-                }
-            by_firm[firm_name]["commissions"].append(c)
-            by_firm[firm_name]["total_amount"] += c.get("commission_amount", 0)
-            by_firm[firm_name]["count"] += 1
-
-        # 計算總計
-        total_amount = sum(c.get("commission_amount", 0) for c in commissions)
-        eligible_now = [c for c in commissions if c.get("is_eligible_now")]
-        eligible_amount = sum(c.get("commission_amount", 0) for c in eligible_now)
+            firm = by_firm.get(c.get("firm_name") or "無介紹所")
+            if firm:
+                firm["commissions"].append(c)
 
         return {
             "status_filter": status,
             "statistics": {
-                "total_count": len(commissions),
-                "total_amount": total_amount,
-                "eligible_now_count": len(eligible_now),
-                "eligible_now_amount": eligible_amount,
-                "firm_count": len(by_firm)
+                "total_count": sum(f["commission_count"] for f in firm_totals),
+                "total_amount": sum(f["total_amount"] for f in firm_totals),
+                "eligible_now_count": sum(f["eligible_now_count"] for f in firm_totals),
+                "eligible_now_amount": sum(f["eligible_now_amount"] for f in firm_totals),
+                "firm_count": len(firm_totals)
             },
             "by_firm": list(by_firm.values()),
             "all_commissions": commissions
@@ -8,6 +8,10 @@ import logging
 import httpx
 from typing import Dict, Any, List, Optional
 
+from .knowledge_cache import invalidate_knowledge_cache
+from .postgrest_client import postgrest_session
+from .reference_cache import get_reference_row, get_reference_rows, invalidate_reference_data
+
 logger = logging.getLogger(__name__)
 
 # PostgREST 設定
@@ -18,8 +22,8 @@ BRAIN_API_URL = os.getenv("BRAIN_API_URL", "https://brain.yourspce.org")
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """查詢 PostgREST"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -31,8 +35,8 @@ async def postgrest_post(endpoint: str, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.post(url, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -44,8 +48,8 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, params=params, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.patch(url, params=params, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -53,8 +57,8 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
 async def postgrest_delete(endpoint: str, params: dict) -> bool:
     """刪除資料"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.delete(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.delete(url, params=params)
         response.raise_for_status()
         return True
 
@@ -77,15 +81,13 @@ async def list_service_plans(
     Returns:
         按分類分組的服務方案列表
     """
-    params = {"order": "sort_order.asc,id.asc"}
-
-    if category:
-        params["category"] = f"eq.{category}"
-    if is_active is not None:
-        params["is_active"] = f"eq.{is_active}"
-
     try:
-        plans = await postgrest_get("service_plans", params)
+        # 參考資料快取（已依 sort_order, id 排序），在本機篩選
+        plans = [
+            plan for plan in await get_reference_rows("service_plans")
+            if (not category or plan.get("category") == category)
+            and (is_active is None or plan.get("is_active") == is_active)
+        ]
 
         # 按分類分組
         grouped = {}
@@ -109,10 +111,10 @@ async def list_service_plans(
 async def get_service_plan(plan_id: int) -> Dict[str, Any]:
     """取得單一服務方案"""
     try:
-        plans = await postgrest_get("service_plans", {"id": f"eq.{plan_id}"})
-        if not plans:
+        plan = await get_reference_row("service_plans", plan_id)
+        if not plan:
             return {"success": False, "error": "找不到服務方案"}
-        return {"success": True, "plan": plans[0]}
+        return {"success": True, "plan": plan}
     except Exception as e:
         logger.error(f"get_service_plan error: {e}")
         return {"success": False, "error": str(e)}
@@ -173,6 +175,7 @@ async def create_service_plan(
 
     try:
         result = await postgrest_post("service_plans", data)
+        await invalidate_reference_data("service_plans")
         plan = result[0] if isinstance(result, list) else result
         return {
             "success": True,
@@ -215,6 +218,7 @@ async def update_service_plan(
             {"id": f"eq.{plan_id}"},
             filtered_updates
         )
+        await invalidate_reference_data("service_plans")
         plan = result[0] if isinstance(result, list) and result else None
         return {
             "success": True,
@@ -236,6 +240,7 @@ async def delete_service_plan(plan_id: int) -> Dict[str, Any]:
 
         plan = plans[0]
         await postgrest_delete("service_plans", {"id": f"eq.{plan_id}"})
+        await invalidate_reference_data("service_plans")
 
         return {
             "success": True,
@@ -253,8 +258,8 @@ async def reorder_service_plans(orders: List[Dict[str, int]]) -> Dict[str, Any]:
     Args:
         orders: [{"id": 1, "sort_order": 10}, {"id": 2, "sort_order": 20}, ...]
     """
+    updated = 0
     try:
-        updated = 0
         for order in orders:
             plan_id = order.get("id")
             sort_order = order.get("sort_order")
@@ -273,6 +278,10 @@ async def reorder_service_plans(orders: List[Dict[str, int]]) -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"reorder_service_plans error: {e}")
         return {"success": False, "error": str(e)}
+    finally:
+        # 部分失敗時前面已更新的排序仍需生效
+        if updated:
+            await invalidate_reference_data("service_plans")
 
 
 # ============================================================================
@@ -399,6 +408,9 @@ async def sync_prices_to_brain() -> Dict[str, Any]:
             response.raise_for_status()
             result = response.json()
 
+        # 價格知識已更新，清除 RAG 搜尋快取
+        await invalidate_knowledge_cache()
+
         imported = result.get("imported", 0)
         errors = result.get("errors", [])
 
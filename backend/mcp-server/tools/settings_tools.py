@@ -7,7 +7,8 @@ import logging
 import json
 from typing import Dict, Any, Optional
 
-import httpx
+from .postgrest_client import postgrest_session
+from .reference_cache import get_reference_rows, invalidate_reference_data
 
 logger = logging.getLogger(__name__)
 
@@ -19,8 +20,8 @@ POSTGREST_URL = os.getenv("POSTGREST_URL", "http://postgrest:3000")
 async def postgrest_get(endpoint: str, params: dict = None) -> Any:
     """PostgREST GET 請求"""
     url = f"{POSTGREST_URL}/{endpoint}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.get(url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -32,8 +33,8 @@ async def postgrest_patch(endpoint: str, params: dict, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, params=params, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.patch(url, params=params, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -45,8 +46,8 @@ async def postgrest_post(endpoint: str, data: dict) -> Any:
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=data, headers=headers, timeout=30.0)
+    async with postgrest_session() as client:
+        response = await client.post(url, json=data, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -69,15 +70,13 @@ async def settings_get(
     Returns:
         設定值
     """
-    params = {}
-
-    if key:
-        params["key"] = f"eq.{key}"
-    if category:
-        params["category"] = f"eq.{category}"
-
     try:
-        settings = await postgrest_get("system_settings", params)
+        # 參考資料快取，在本機篩選
+        settings = [
+            s for s in await get_reference_rows("system_settings")
+            if (not key or s.get("key") == key)
+            and (not category or s.get("category") == category)
+        ]
 
         if key:
             # 單一設定
@@ -126,7 +125,7 @@ async def settings_update(
         raise ValueError("必須指定設定 key")
 
     try:
-        # 先取得現有設定
+        # 先取得現有設定（不走快取，合併必須以資料庫現值為準）
         existing = await postgrest_get("system_settings", {"key": f"eq.{key}"})
 
         if existing:
@@ -144,6 +143,7 @@ async def settings_update(
                 {"key": f"eq.{key}"},
                 {"value": merged_value}
             )
+            await invalidate_reference_data("system_settings")
 
             setting = result[0] if result else None
 
@@ -163,6 +163,7 @@ async def settings_update(
                     "category": "custom"
                 }
             )
+            await invalidate_reference_data("system_settings")
 
             setting = result[0] if isinstance(result, list) else result
 
@@ -186,7 +187,10 @@ async def settings_get_all() -> Dict[str, Any]:
         所有設定值
     """
     try:
-        settings = await postgrest_get("system_settings", {"order": "category,key"})
+        settings = sorted(
+            await get_reference_rows("system_settings"),
+            key=lambda s: (s.get("category") or "", s.get("key") or "")
+        )
 
         # 按分類整理
         by_category = {}
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+AI chat 長回應期間其他端點的回應時間
+
+以本機假 OpenRouter（每次 completion 延遲 --llm-delay 秒）代替真實 API，
+同時送出 --chats 個 /ai/chat，期間每 --probe-interval 秒打一次 /health，
+比較：
+- 舊做法：async handler 內呼叫同步 openai.OpenAI（本檔內保留的對照實作）
+- 現行：共用 AsyncOpenAI client（main.create_chat_completion）
+
+輸出 /health 的 p50 / p95 / 最大延遲（自預定送出時間起算），以及 chat 全部完成的時間
+（受 LLM_MAX_CONCURRENCY 限制，超過上限的 chat 會排隊）
+
+Brain 知識搜尋與對話記錄（PostgREST）也指向假服務，不需要外部連線：
+    cd backend
+    python scripts/bench_ai_chat_load.py --chats 8 --llm-delay 3
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mcp-server"))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ============================================================================
+# 假 OpenRouter / Brain / PostgREST（獨立 thread 與 event loop）
+# ============================================================================
+
+def start_stand_in(port: int, llm_delay: float):
+    stand_in = FastAPI()
+
+    @stand_in.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(llm_delay)
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "bench"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "好的，已為您查詢。"},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20}
+        }
+
+    @stand_in.api_route("/{path:path}", methods=["GET", "POST", "PATCH"])
+    async def anything(path: str):
+        return [{"id": 1}]
+
+    server = uvicorn.Server(uvicorn.Config(stand_in, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+# ============================================================================
+# 量測
+# ============================================================================
+
+async def probe_health(client, stop: asyncio.Event, interval: float):
+    """從預定送出時間起算到收到回應（event loop 被卡住時，等待時間也算在內）"""
+    samples = []
+    while not stop.is_set():
+        due = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        response = await client.get("/health")
+        response.raise_for_status()
+        samples.append((time.perf_counter() - due) * 1000)
+    return samples
+
+
+async def run_load(label, client, chat, chats, interval):
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_health(client, stop, interval))
+    await asyncio.sleep(interval * 2)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(i) for i in range(chats)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    samples = await probe
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(
+        f"{label:<28}{statistics.median(samples):>10.1f}{p95:>10.1f}"
+        f"{samples[-1]:>10.1f}{len(samples):>8}{elapsed:>12.2f}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="AI chat 長回應期間的 event loop 回應性")
+    parser.add_argument("--chats", type=int, default=8, help="同時送出的 /ai/chat 數")
+    parser.add_argument("--llm-delay", type=float, default=3.0, help="假 OpenRouter 每次回應延遲（秒）")
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="/health 探測間隔（秒）")
+    args = parser.parse_args()
+
+    port = free_port()
+    stand_in_url = f"http://127.0.0.1:{port}"
+    os.environ["OPENROUTER_API_KEY"] = "bench"
+    os.environ["OPENROUTER_BASE_URL"] = f"{stand_in_url}/v1"
+    os.environ["BRAIN_API_URL"] = stand_in_url
+    os.environ["POSTGREST_URL"] = stand_in_url
+    server = start_stand_in(port, args.llm_delay)
+
+    import httpx
+    import openai
+
+    import main as mcp_main
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    transport = httpx.ASGITransport(app=mcp_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://mcp", timeout=None) as client:
+
+        async def shared_client_chat(i):
+            response = await client.post("/ai/chat", json={
+                "messages": [{"role": "user", "content": f"查詢客戶 {i} 的繳費狀況"}],
+                "tool_categories": ["crm"]
+            })
+            assert response.json()["success"], response.text
+
+        async def sync_client_chat(i):
+            # 舊做法：每次請求建立同步 client，在 async handler 內直接呼叫
+            legacy = openai.OpenAI(base_url=f"{stand_in_url}/v1", api_key="bench")
+            legacy.chat.completions.create(
+                model="bench",
+                messages=[{"role": "user", "content": f"查詢客戶 {i} 的繳費狀況"}]
+            )
+
+        print(
+            f"{args.chats} chats, llm delay {args.llm_delay}s, "
+            f"LLM_MAX_CONCURRENCY={mcp_main.settings.llm_max_concurrency}"
+        )
+        print(f"{'/health (ms)':<28}{'p50':>10}{'p95':>10}{'max':>10}{'probes':>8}{'chats (s)':>12}")
+        await run_load("同步 OpenAI（舊）", client, sync_client_chat, args.chats, args.probe_interval)
+        await run_load("共用 AsyncOpenAI", client, shared_client_chat, args.chats, args.probe_interval)
+
+    await mcp_main.close_openrouter_client()
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+AI chat 每次請求的前置處理時間（工具清單 + system prompt）
+
+比較：
+- 舊做法：每次請求由 MCP_TOOLS 重建完整 OpenAI 工具清單，並重新組合 system prompt
+  （本檔內保留的對照實作）
+- 現行：main.convert_tools_for_openai（快取）+ main.CRM_BASE_PROMPT（import 時組合）
+- 依分類 / 工具名稱挑選子集時的工具數與 JSON 大小（送給模型的 token 量）
+
+另以大量隨機篩選條件呼叫，確認快取大小不超過 OPENAI_TOOLS_CACHE_SIZE
+
+用法：
+    cd backend
+    python scripts/bench_ai_request_prep.py -n 2000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mcp-server"))
+
+import main as mcp_main  # noqa: E402
+
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1_000_000)
+    return statistics.median(samples)
+
+
+def legacy_prepare():
+    # 舊做法：每次請求重建工具清單並組合 prompt
+    tools = [mcp_main._convert_tool_for_openai(name, tool) for name, tool in mcp_main.MCP_TOOLS.items()]
+    prompt = mcp_main.CRM_SYSTEM_PROMPT + mcp_main.CRM_USAGE_GUIDE
+    return tools, prompt
+
+
+def cached_prepare(categories=None, tool_names=None):
+    return mcp_main.convert_tools_for_openai(categories, tool_names), mcp_main.CRM_BASE_PROMPT
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI chat 請求前置處理時間")
+    parser.add_argument("-n", "--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"MCP_TOOLS: {len(mcp_main.MCP_TOOLS)} 個工具")
+    print(f"{'':<32}{'us/request':>12}{'tools':>8}{'JSON KB':>10}")
+
+    subsets = [
+        ("舊做法（每次重建）", legacy_prepare),
+        ("快取：全部工具", cached_prepare),
+        ("快取：crm + billing", lambda: cached_prepare(["crm", "billing"])),
+        ("快取：booking", lambda: cached_prepare(["booking"])),
+    ]
+    for label, fn in subsets:
+        tools, _ = fn()
+        size_kb = len(json.dumps(tools, ensure_ascii=False).encode()) / 1024
+        print(f"{label:<32}{timed(fn, args.iterations):>12.1f}{len(tools):>8}{size_kb:>10.1f}")
+
+    # 篩選條件來自請求內容：未知名稱不進入 key，快取不會無限成長
+    rng = random.Random(0)
+    names = list(mcp_main.MCP_TOOLS)
+    for _ in range(args.iterations):
+        junk = ["".join(rng.choices(string.ascii_lowercase, k=8))]
+        cached_prepare(junk + rng.sample(["crm", "billing", "booking", "quote"], 1), rng.sample(names, 2) + junk)
+    print(
+        f"\n{args.iterations} 組隨機篩選條件後快取筆數: "
+        f"{len(mcp_main._openai_tools_cache)}（上限 {mcp_main.OPENAI_TOOLS_CACHE_SIZE}）"
+    )
+
+
+if __name__ == "__main__":
+    main()
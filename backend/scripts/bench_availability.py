@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+會議室可用時段計算量測
+
+1. 離線（預設）：以模擬資料比較計算成本
+   - 舊做法：每個會議室、每天各產生 30 分鐘時段，逐一以 "HH:MM" 字串比對所有忙碌時段
+     （本檔內保留的對照實作，同 booking_check_availability 原本的迴圈）
+   - 新做法：tools.availability 整數分鐘區間，每天合併一次後切格
+   同時確認兩者結果一致
+
+2. --live：對實際 PostgREST 比較
+   - 舊做法：每個會議室、每天呼叫一次 booking_check_availability
+   - 新做法：一次 booking_search_availability
+   輸出耗時與 PostgREST 請求數（Calendar 依環境設定，未設定憑證時略過）
+
+用法：
+    python bench_availability.py --rooms 12 --days 30
+    POSTGREST_URL=http://localhost:3000 python bench_availability.py --live --days 30
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mcp-server"))
+
+from tools.availability import RoomHours, day_availability, format_minutes, to_minutes  # noqa: E402
+
+
+# ============================================================================
+# 舊做法（對照組）
+# ============================================================================
+
+def legacy_day_slots(all_busy, check_date):
+    available_slots = []
+    current = datetime.combine(check_date, datetime.min.time()).replace(hour=9)
+    end_of_day = current.replace(hour=18)
+
+    while current < end_of_day:
+        slot_start = current.strftime("%H:%M")
+        slot_end = (current + timedelta(minutes=30)).strftime("%H:%M")
+
+        is_slot_available = True
+        for busy in all_busy:
+            if not (slot_end <= busy["start"] or slot_start >= busy["end"]):
+                is_slot_available = False
+                break
+
+        if is_slot_available:
+            available_slots.append({"start": slot_start, "end": slot_end})
+
+        current += timedelta(minutes=30)
+    return available_slots
+
+
+# ============================================================================
+# 模擬資料
+# ============================================================================
+
+def dense_month(rooms, days, start, seed=42):
+    """
+    每個會議室每天約 70% 時段有預約（30/60/90 分鐘，部分重疊），
+    另有 Calendar 忙碌時段（與資料庫預約部分重複）
+    """
+    rng = random.Random(seed)
+    busy = {}
+    for room_id in range(1, rooms + 1):
+        for i in range(days):
+            day = (start + timedelta(days=i)).isoformat()
+            entries = []
+            minute = 9 * 60
+            while minute < 18 * 60:
+                length = rng.choice((30, 60, 90))
+                if rng.random() < 0.7:
+                    entries.append({
+                        "start": format_minutes(minute),
+                        "end": format_minutes(min(minute + length, 18 * 60)),
+                        "source": "database"
+                    })
+                    if rng.random() < 0.3:
+                        entries.append({
+                            "start": format_minutes(minute + 15),
+                            "end": format_minutes(min(minute + length + 15, 18 * 60)),
+                            "source": "calendar"
+                        })
+                minute += length
+            busy[(room_id, day)] = entries
+    return busy
+
+
+def run_offline(args):
+    start = date.today() + timedelta(days=1)
+    busy = dense_month(args.rooms, args.days, start)
+    hours = RoomHours()
+    keys = list(busy)
+    print(f"{args.rooms} 會議室 × {args.days} 天，忙碌時段 {sum(len(v) for v in busy.values())} 筆")
+
+    def legacy():
+        return {k: legacy_day_slots(busy[k], date.fromisoformat(k[1])) for k in keys}
+
+    def engine():
+        return {
+            k: day_availability(
+                [(to_minutes(b["start"]), to_minutes(b["end"])) for b in busy[k]],
+                hours, date.fromisoformat(k[1])
+            )
+            for k in keys
+        }
+
+    assert legacy() == engine(), "新舊結果不一致"
+    print("新舊結果一致")
+
+    for label, fn in (("before: 逐格字串比對", legacy), ("after:  整數區間合併", engine)):
+        timings = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f"{label:<28} median {timings[len(timings) // 2]:8.2f} ms  min {timings[0]:8.2f} ms")
+
+
+# ============================================================================
+# 實際 PostgREST
+# ============================================================================
+
+async def run_live(args):
+    from tools.booking_tools import booking_check_availability, booking_search_availability
+    from tools.postgrest_client import close_http_client, get_pool_stats
+    from tools.reference_cache import get_reference_rows
+
+    rooms = [r for r in await get_reference_rows("meeting_rooms") if r.get("is_active")]
+    start = date.today() + timedelta(days=1)
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(args.days)]
+    print(f"{len(rooms)} 會議室 × {args.days} 天")
+
+    async def legacy():
+        for room in rooms:
+            for d in dates:
+                await booking_check_availability(room["id"], d)
+
+    async def search():
+        await booking_search_availability(dates[0], dates[-1], room_ids=[r["id"] for r in rooms])
+
+    for label, fn in (("before: 每會議室每天各查一次", legacy), ("after:  區間一次查詢", search)):
+        await fn()  # 預熱
+        requests_before = get_pool_stats()["requests_total"]
+        started = time.perf_counter()
+        await fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        requests = get_pool_stats()["requests_total"] - requests_before
+        print(f"{label:<28} {elapsed:8.1f} ms  PostgREST requests {requests}")
+
+    await close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="會議室可用時段計算量測")
+    parser.add_argument("--rooms", type=int, default=12)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("--live", action="store_true", help="對 POSTGREST_URL 量測實際查詢")
+    args = parser.parse_args()
+
+    if args.live:
+        asyncio.run(run_live(args))
+    else:
+        run_offline(args)
+
+
+if __name__ == "__main__":
+    main()
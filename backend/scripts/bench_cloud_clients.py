@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+每次 PDF / 檔案下載省下的 client 建立與認證時間
+
+比較「每次重新建立」與「共用實例」：
+- R2 下載連結（file_storage.get_r2_client）：boto3.client() + generate_presigned_url
+  （不需連線，可在任何環境執行；未設定 R2 環境變數時以假金鑰量測）
+- Cloud Run ID Token（MCP 呼叫 PDF 服務前）：id_token.fetch_id_token vs cloud_clients.id_token_cache
+- GCS（PDF 服務上傳 + Signed URL）：storage.Client() + default() + metadata + refresh vs gcp_clients
+
+後兩項需要 GCP 認證（Cloud Run / VM 或 GOOGLE_APPLICATION_CREDENTIALS），沒有時略過：
+    cd backend
+    python scripts/bench_cloud_clients.py -n 20 \\
+        --audience https://pdf-generator-743652001579.asia-east1.run.app --gcs
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "mcp-server"))
+
+os.environ.setdefault("R2_ACCOUNT_ID", "bench")
+os.environ.setdefault("R2_ACCESS_KEY_ID", "bench-key")
+os.environ.setdefault("R2_SECRET_ACCESS_KEY", "bench-secret")
+
+from tools import file_storage  # noqa: E402
+from tools.cloud_clients import IdTokenCache, client_registry  # noqa: E402
+
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def report(label, before_ms, after_ms):
+    print(f"{label:<34}{before_ms:>12.2f}{after_ms:>12.2f}{before_ms - after_ms:>12.2f}")
+
+
+def bench_r2(n):
+    def presign(client):
+        client.generate_presigned_url(
+            "get_object", Params={"Bucket": file_storage.R2_BUCKET_NAME, "Key": "bench/file.pdf"}, ExpiresIn=3600
+        )
+
+    def before():
+        presign(file_storage._create_r2_client())
+
+    def after():
+        presign(file_storage.get_r2_client())
+
+    client_registry.reset("r2")
+    file_storage.get_r2_client()  # 第一次建立（只發生一次）
+    report("R2 下載連結（每次下載）", timed(before, n), timed(after, n))
+
+
+def bench_id_token(n, audience):
+    from google.auth.transport.requests import Request
+    from google.oauth2 import id_token
+
+    def before():
+        id_token.fetch_id_token(Request(), audience)
+
+    cache = IdTokenCache()
+    if cache.get(audience) is None:
+        print("ID Token：無法取得（沒有 GCP 認證），略過")
+        return
+    report("Cloud Run ID Token（每份 PDF）", timed(before, n), timed(lambda: cache.get(audience), n))
+
+
+def bench_gcs(n):
+    sys.path.insert(0, str(BACKEND_DIR / "services" / "pdf-generator"))
+    from google.auth import compute_engine, default
+    from google.auth.transport import requests
+    from google.cloud import storage
+
+    from gcp_clients import GcpClients, resolve_service_account_email
+
+    bucket_name = os.getenv("GCS_BUCKET", "hourjungle-contracts")
+
+    def before():
+        # 原本 GCSPdfStore / generate_signed_url_with_iam 每次的做法
+        storage.Client().bucket(bucket_name).blob("bench/file.pdf")
+        credentials, _ = default()
+        if isinstance(credentials, compute_engine.Credentials):
+            resolve_service_account_email(credentials)
+            credentials.refresh(requests.Request())
+
+    clients = GcpClients()
+
+    def after():
+        clients.bucket(bucket_name).blob("bench/file.pdf")
+        clients._signing_credentials()
+
+    try:
+        after()
+    except Exception as e:
+        print(f"GCS：無法取得認證（{e}），略過")
+        return
+    report("GCS client + 簽章憑證（每份 PDF）", timed(before, n), timed(after, n))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="client / 認證重用省下的時間")
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("--audience", help="Cloud Run 服務網址（量測 ID Token）")
+    parser.add_argument("--gcs", action="store_true", help="量測 GCS client 與簽章憑證")
+    args = parser.parse_args()
+
+    print(f"{'':<34}{'before (ms)':>12}{'after (ms)':>12}{'saved (ms)':>12}")
+    bench_r2(args.iterations)
+    if args.audience:
+        bench_id_token(args.iterations, args.audience)
+    if args.gcs:
+        bench_gcs(args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+組合查詢工具延遲量測
+
+對同一個 PostgREST 比較：
+- 舊做法：子查詢逐一 await（本檔內保留的對照實作）
+- 現行工具：crm_tools.get_customer_detail / booking_tools.booking_list_rooms /
+  crm_tools.search_customers
+
+每個工具輸出 p50 / p95 / 平均延遲，以及每次呼叫實際送出的 PostgREST 請求數
+
+用法：
+    POSTGREST_URL=http://localhost:3000 python bench_composite_tools.py \\
+        --customer-id 123 --line-user-id Uxxxx --query 陳 -n 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mcp-server"))
+
+from tools import booking_tools, crm_tools  # noqa: E402
+from tools.postgrest_client import close_http_client, get_pool_stats  # noqa: E402
+
+
+# ============================================================================
+# 舊做法（對照組）
+# ============================================================================
+
+async def sequential_customer_detail(customer_id=None, line_user_id=None):
+    params = {"limit": 1}
+    if customer_id:
+        params["id"] = f"eq.{customer_id}"
+    else:
+        params["line_user_id"] = f"eq.{line_user_id}"
+    customers = await crm_tools.postgrest_get("v_customer_summary", params)
+    if not customers:
+        return None
+    cid = customers[0]["id"]
+    await crm_tools.postgrest_get("contracts", {"customer_id": f"eq.{cid}", "order": "start_date.desc"})
+    await crm_tools.postgrest_get("payments", {"customer_id": f"eq.{cid}", "order": "due_date.desc", "limit": 10})
+
+
+async def sequential_list_rooms(branch_id=None):
+    params = {"is_active": "eq.true", "order": "branch_id,name"}
+    if branch_id:
+        params["branch_id"] = f"eq.{branch_id}"
+    await booking_tools.postgrest_get("meeting_rooms", params)
+    await booking_tools.postgrest_get("branches", {"select": "id,name"})
+
+
+# ============================================================================
+# 量測
+# ============================================================================
+
+async def measure(label, factory, iterations):
+    # 預熱（建立連線）
+    await factory()
+
+    latencies = []
+    requests_before = get_pool_stats()["requests_total"]
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await factory()
+        latencies.append((time.perf_counter() - started) * 1000)
+    requests = (get_pool_stats()["requests_total"] - requests_before) / iterations
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{label:<42} p50 {statistics.median(latencies):7.1f} ms  "
+        f"p95 {p95:7.1f} ms  avg {statistics.mean(latencies):7.1f} ms  "
+        f"requests/call {requests:.1f}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="組合查詢工具延遲量測")
+    parser.add_argument("--customer-id", type=int, required=True)
+    parser.add_argument("--line-user-id")
+    parser.add_argument("--branch-id", type=int)
+    parser.add_argument("--query", default="陳")
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    args = parser.parse_args()
+    n = args.iterations
+
+    print("=== get_customer_detail(customer_id) ===")
+    await measure("before: 逐一查詢", lambda: sequential_customer_detail(customer_id=args.customer_id), n)
+    await measure("after:  同時查詢", lambda: crm_tools.get_customer_detail(customer_id=args.customer_id), n)
+
+    if args.line_user_id:
+        print("=== get_customer_detail(line_user_id) ===")
+        await measure("before: 逐一查詢", lambda: sequential_customer_detail(line_user_id=args.line_user_id), n)
+        await measure("after:  客戶 → 合約 + 付款", lambda: crm_tools.get_customer_detail(line_user_id=args.line_user_id), n)
+
+    print("=== booking_list_rooms ===")
+    await measure("before: 會議室 → 場館", lambda: sequential_list_rooms(args.branch_id), n)
+    await measure("after:  參考資料快取", lambda: booking_tools.booking_list_rooms(args.branch_id), n)
+
+    print("=== search_customers ===")
+    await measure("search_customers RPC → 有效合約", lambda: crm_tools.search_customers(query=args.query), n)
+
+    await close_http_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
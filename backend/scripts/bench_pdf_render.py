@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+PDF 渲染吞吐量量測（N 個併發渲染）
+
+對同一份報價單 HTML 比較：
+- 舊做法：async endpoint 內直接呼叫 HTML().write_pdf()（本檔內保留的對照實作）
+- 新做法：render_pool（process pool，worker 已預熱）
+
+輸出總耗時、每秒份數、單次延遲 p50 / p95，以及期間 event loop 最長卡住時間
+（代表其他請求、/health 需要等多久）；最後送出超過 pool 容量的請求，確認超出部分被拒絕（429）
+
+需在 WeasyPrint 可執行的環境（pdf-generator 的 Docker image）執行：
+    cd backend/services/pdf-generator
+    PDF_RENDER_WORKERS=4 python ../../scripts/bench_pdf_render.py -n 16
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent / "services" / "pdf-generator"
+sys.path.insert(0, str(SERVICE_DIR))
+
+from jinja2 import Environment, FileSystemLoader  # noqa: E402
+
+from render_pool import RenderPool, RenderPoolFull  # noqa: E402
+
+
+def sample_quote_html() -> str:
+    """以報價單模板產生測試 HTML"""
+    env = Environment(loader=FileSystemLoader(str(SERVICE_DIR / "templates")))
+    items = [
+        {"name": f"營業登記服務 第 {i + 1} 期", "quantity": 1, "unit_price": 3000, "amount": 3000}
+        for i in range(12)
+    ]
+    return env.get_template("quote.html").render(
+        quote_id=1,
+        quote_number="Q-BENCH-0001",
+        quote_date="2026-01-05",
+        valid_until="2026-02-05",
+        branch_name="大忠館",
+        section_title="營業登記一年合約",
+        items=items,
+        deposit_amount=6000,
+        total_amount=36000,
+        bank_account_name="你的空間有限公司",
+        bank_name="永豐商業銀行(南台中分行)",
+        bank_code="807",
+        bank_account_number="03801800183399",
+        contact_email="wtxg@hourjungle.com",
+        contact_phone="04-23760282",
+        generated_at="2026-01-05 10:00:00",
+    )
+
+
+# ============================================================================
+# 舊做法（對照組）
+# ============================================================================
+
+async def inline_render(html_content: str) -> bytes:
+    from weasyprint import HTML
+    return HTML(string=html_content).write_pdf()
+
+
+# ============================================================================
+# 量測
+# ============================================================================
+
+async def watch_loop(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """回傳期間 event loop 最長延遲（毫秒）"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, (time.perf_counter() - started - interval) * 1000)
+    return worst
+
+
+async def measure(label: str, render, html_content: str, n: int):
+    await render(html_content)  # 預熱
+
+    # 延遲從整批送出時起算（含排隊時間），與請求方看到的等待時間一致
+    async def one():
+        await render(html_content)
+        return (time.perf_counter() - started) * 1000
+
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stop))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*[one() for _ in range(n)]))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    stall = await watcher
+
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{label:<26} total {elapsed * 1000:8.0f} ms  {n / elapsed:6.2f} PDF/s  "
+        f"p50 {statistics.median(latencies):7.0f} ms  p95 {p95:7.0f} ms  "
+        f"loop stall {stall:7.0f} ms"
+    )
+
+
+async def check_backpressure(pool: RenderPool, html_content: str):
+    """送出 capacity + workers 個併發請求，超出容量的應立即被拒絕"""
+    total = pool.capacity + pool.workers
+    results = await asyncio.gather(
+        *[pool.render(html_content) for _ in range(total)], return_exceptions=True
+    )
+    rejected = sum(1 for r in results if isinstance(r, RenderPoolFull))
+    print(f"backpressure: {total} 併發 → 完成 {total - rejected}，拒絕 {rejected}（容量 {pool.capacity}）")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="PDF 渲染吞吐量量測")
+    parser.add_argument("-n", "--concurrency", type=int, default=16, help="併發渲染數")
+    args = parser.parse_args()
+
+    html_content = sample_quote_html()
+    pool = RenderPool(queue_size=max(args.concurrency, 1))
+
+    started = time.perf_counter()
+    await pool.start()
+    print(f"pool: {pool.workers} workers，啟動 + 預熱 {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    await measure("before: endpoint 內直接渲染", inline_render, html_content, args.concurrency)
+    await measure("after:  render pool", pool.render, html_content, args.concurrency)
+
+    pool.queue_size = 0
+    await check_backpressure(pool, html_content)
+    print(pool.get_stats())
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
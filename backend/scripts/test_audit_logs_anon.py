@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+測試以 PostgREST 的 anon 角色寫入時審計日誌正常（migration 117 / 121）
+
+在單一交易內（結束時 ROLLBACK，不留資料）：
+1. 以 superuser 建立一位測試客戶
+2. SET ROLE anon 後 UPDATE / DELETE 該客戶：audit_statement_trigger 需以擁有者身分寫入 audit_logs
+3. 以 anon 直接 INSERT audit_logs（billing_tools / contract_tools 的 POST /audit_logs）
+4. 以 anon 讀回上述審計紀錄
+
+本機 anon 若沒有 customers 的寫入權限，測試時在交易內補上（僅用於觸發 trigger）
+
+用法：
+    cd backend
+    POSTGRES_HOST=localhost python scripts/test_audit_logs_anon.py
+"""
+
+import os
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+ROLE = os.getenv("PGRST_DB_ANON_ROLE", "anon")
+
+
+def connect():
+    return psycopg2.connect(
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        port=int(os.getenv("POSTGRES_PORT", "5432")),
+        dbname=os.getenv("POSTGRES_DB", "hourjungle"),
+        user=os.getenv("POSTGRES_USER", "hjadmin"),
+        password=os.getenv("POSTGRES_PASSWORD", ""),
+        cursor_factory=RealDictCursor,
+    )
+
+
+def main():
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM branches ORDER BY id LIMIT 1")
+            branch_id = cur.fetchone()["id"]
+            cur.execute(
+                "INSERT INTO customers (branch_id, name) VALUES (%s, '審計測試客戶') RETURNING id",
+                (branch_id,)
+            )
+            customer_id = cur.fetchone()["id"]
+
+            cur.execute(
+                "SELECT has_table_privilege(%(role)s, 'customers', 'UPDATE') "
+                "AND has_table_privilege(%(role)s, 'customers', 'DELETE') AS ok",
+                {"role": ROLE}
+            )
+            if not cur.fetchone()["ok"]:
+                cur.execute(f"GRANT UPDATE, DELETE ON customers TO {ROLE}")
+                cur.execute(
+                    f"CREATE POLICY test_audit_logs_anon ON customers FOR ALL TO {ROLE} USING (TRUE) WITH CHECK (TRUE)"
+                )
+
+            cur.execute(f"SET LOCAL ROLE {ROLE}")
+            cur.execute("UPDATE customers SET name = '審計測試客戶（改）' WHERE id = %s", (customer_id,))
+            cur.execute("DELETE FROM customers WHERE id = %s", (customer_id,))
+            cur.execute(
+                "INSERT INTO audit_logs (table_name, record_id, action, new_data) "
+                "VALUES ('customers', %s, 'UPDATE', '{\"source\": \"api\"}')",
+                (customer_id,)
+            )
+
+            cur.execute(
+                "SELECT action, changed_fields, new_data FROM audit_logs "
+                "WHERE table_name = 'customers' AND record_id = %s ORDER BY id",
+                (customer_id,)
+            )
+            rows = cur.fetchall()
+            for row in rows:
+                print(f"{ROLE}: {row['action']:<6} changed={row['changed_fields']} new={row['new_data']}")
+
+        actions = [row["action"] for row in rows]
+        # INSERT 由 superuser 執行，也會被記錄
+        assert actions == ["INSERT", "UPDATE", "DELETE", "UPDATE"], actions
+        assert rows[1]["changed_fields"] == ["name"]
+    finally:
+        conn.rollback()
+        conn.close()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
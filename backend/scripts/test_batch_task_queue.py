@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+測試背景 worker 與 run_bulk 同時執行時互不重複處理（migration 113 / 120）
+
+bulk_sender.run_bulk 建立的任務（項目為 pending，由建立者自行處理）與
+enqueue_batch_task 排入的任務同時存在時，BatchTaskWorker 只能領取後者：
+
+1. run_bulk 以 send_reminder（worker 也有註冊 handler）與 daily_reminders（沒有 handler）
+   各處理一批項目，期間 enqueue_batch_task 排入另一批 send_reminder，worker 同時輪詢
+2. 確認 worker 只處理排入的項目、每筆一次；run_bulk 的項目只被建立者處理一次，
+   沒有 UNKNOWN_TASK_TYPE 失敗，各任務的成功數與狀態正確
+
+本機假 PostgREST（另一個 thread）把 batch_tasks / batch_task_items 的寫入與 RPC
+轉給實際資料庫（需已套用 migration 113、120），結束後刪除測試建立的任務
+
+用法：
+    cd backend
+    POSTGRES_HOST=localhost python scripts/test_batch_task_queue.py
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import psycopg2
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from psycopg2.extras import Json, RealDictCursor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mcp-server"))
+
+CREATED_BY = "test_batch_task_queue"
+
+
+def connect():
+    conn = psycopg2.connect(
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        port=int(os.getenv("POSTGRES_PORT", "5432")),
+        dbname=os.getenv("POSTGRES_DB", "hourjungle"),
+        user=os.getenv("POSTGRES_USER", "hjadmin"),
+        password=os.getenv("POSTGRES_PASSWORD", ""),
+        cursor_factory=RealDictCursor,
+    )
+    conn.autocommit = True
+    return conn
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def execute(sql: str, params=None, fetch: bool = True):
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall() if fetch else None
+    finally:
+        conn.close()
+
+
+def build_stand_in() -> FastAPI:
+    """假 PostgREST：只實作 bulk_sender / batch_worker 用到的請求"""
+    app = FastAPI()
+
+    @app.post("/rpc/{function_name}")
+    def rpc(function_name: str, body: dict):
+        args = ", ".join(f"{name} => %({name})s" for name in body)
+        params = {name: Json(value) if isinstance(value, dict) else value for name, value in body.items()}
+        if function_name == "claim_batch_task_items":
+            return execute(f"SELECT * FROM {function_name}({args})", params)
+        return execute(f"SELECT {function_name}({args}) AS result", params)[0]["result"]
+
+    @app.post("/{table}")
+    async def insert(table: str, request: Request):
+        body = await request.json()
+        rows = body if isinstance(body, list) else [body]
+        columns = list(rows[0])
+        values = ", ".join(
+            "(" + ", ".join(f"%(r{i}_{c})s" for c in columns) + ")" for i in range(len(rows))
+        )
+        params = {f"r{i}_{c}": row[c] for i, row in enumerate(rows) for c in columns}
+        return execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values} RETURNING *", params
+        )
+
+    @app.patch("/{table}")
+    async def update(table: str, request: Request, id: str):
+        body = await request.json()
+        assignments = ", ".join(f"{column} = %({column})s" for column in body)
+        execute(
+            f"UPDATE {table} SET {assignments} WHERE id::text = %(_id)s",
+            {**body, "_id": id.removeprefix("eq.")},
+            fetch=False
+        )
+        return Response(status_code=204)
+
+    return app
+
+
+async def run_checks(args):
+    from tools import batch_worker, bulk_sender
+
+    inline_calls = Counter()
+    worker_calls = Counter()
+
+    async def inline_handler(target_id):
+        await asyncio.sleep(args.latency)
+        inline_calls[target_id] += 1
+        return {"success": True}
+
+    async def worker_handler(item):
+        await asyncio.sleep(args.latency)
+        worker_calls[item["target_id"]] += 1
+        return {"success": True}
+
+    # 與 billing_tools 相同：worker 有 send_reminder 的 handler
+    batch_worker.register_batch_handler("send_reminder", worker_handler)
+    worker = batch_worker.batch_worker
+    worker.poll_interval = 0.05
+    worker.start()
+
+    inline_ids = list(range(1, args.count + 1))
+    daily_ids = list(range(1001, 1001 + args.count))
+    queued_ids = list(range(2001, 2001 + args.count))
+
+    async def enqueue_while_inline_runs():
+        # run_bulk 的項目已建立、尚在處理時排入
+        await asyncio.sleep(args.latency)
+        return await batch_worker.enqueue_batch_task(
+            "send_reminder", "payment", queued_ids, created_by=CREATED_BY
+        )
+
+    try:
+        inline_result, daily_result, queued = await asyncio.gather(
+            bulk_sender.run_bulk(
+                inline_ids, inline_handler, concurrency=2, task_type="send_reminder",
+                target_of=lambda target_id: (target_id, "payment"), created_by=CREATED_BY
+            ),
+            bulk_sender.run_bulk(
+                daily_ids, inline_handler, concurrency=2, task_type="daily_reminders",
+                target_of=lambda target_id: (target_id, "payment"), created_by=CREATED_BY
+            ),
+            enqueue_while_inline_runs()
+        )
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            status = execute("SELECT status FROM batch_tasks WHERE id = %s", (queued["task_id"],))[0]["status"]
+            if status not in ("pending", "processing"):
+                break
+            await asyncio.sleep(0.1)
+    finally:
+        await worker.stop()
+
+    task_ids = [inline_result["task_id"], daily_result["task_id"], queued["task_id"]]
+    tasks = {
+        row["id"]: row for row in execute(
+            "SELECT t.id, t.task_type, t.status, t.queued, t.total_count, t.success_count, t.failed_count, "
+            "COUNT(*) FILTER (WHERE i.status = 'success') AS items_success, "
+            "COUNT(*) FILTER (WHERE i.error_code = 'UNKNOWN_TASK_TYPE') AS unknown_type, "
+            "COUNT(*) FILTER (WHERE i.locked_by IS NOT NULL OR i.attempts > 0) AS claimed "
+            "FROM batch_tasks t JOIN batch_task_items i ON i.task_id = t.id "
+            "WHERE t.id = ANY(%s) GROUP BY t.id", (task_ids,)
+        )
+    }
+    for label, task_id in zip(["run_bulk send_reminder", "run_bulk daily_reminders", "enqueue send_reminder"], task_ids):
+        t = tasks[task_id]
+        print(
+            f"{label:<26} queued={t['queued']!s:<5} {t['status']:<10} "
+            f"成功 {t['success_count']}/{t['total_count']}，項目成功 {t['items_success']}，"
+            f"被 worker 領取 {t['claimed']}，UNKNOWN_TASK_TYPE {t['unknown_type']}"
+        )
+    print(
+        f"建立者處理 {sum(inline_calls.values())} 次（{len(inline_calls)} 個目標），"
+        f"worker 處理 {sum(worker_calls.values())} 次（{len(worker_calls)} 個目標）"
+    )
+
+    assert set(worker_calls) == set(queued_ids), "worker 處理了非排入的項目"
+    assert all(n == 1 for n in worker_calls.values()), "worker 重複處理"
+    assert set(inline_calls) == set(inline_ids + daily_ids) and all(n == 1 for n in inline_calls.values())
+    for task_id in task_ids:
+        t = tasks[task_id]
+        assert t["status"] == "completed" and t["success_count"] == t["total_count"] == args.count, t
+        assert t["items_success"] == args.count and t["unknown_type"] == 0, t
+    assert tasks[inline_result["task_id"]]["claimed"] == 0 and tasks[daily_result["task_id"]]["claimed"] == 0
+    return task_ids
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="批量任務佇列與 run_bulk 重疊測試")
+    parser.add_argument("-n", "--count", type=int, default=20, help="每個任務的項目數")
+    parser.add_argument("--latency", type=float, default=0.05, help="每筆處理時間（秒）")
+    args = parser.parse_args()
+
+    port = free_port()
+    os.environ["POSTGREST_URL"] = f"http://127.0.0.1:{port}"
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    server = uvicorn.Server(uvicorn.Config(build_stand_in(), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    from tools.postgrest_client import close_http_client
+
+    try:
+        await run_checks(args)
+    finally:
+        await close_http_client()
+        server.should_exit = True
+        execute(
+            "DELETE FROM batch_task_items WHERE task_id IN (SELECT id FROM batch_tasks WHERE created_by = %s)",
+            (CREATED_BY,), fetch=False
+        )
+        execute("DELETE FROM batch_tasks WHERE created_by = %s", (CREATED_BY,), fetch=False)
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
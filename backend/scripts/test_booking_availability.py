@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+測試會議室可用時段查詢的日期格式（tools/booking_tools.py）
+
+booking_check_availability 接受未補零的日期（例：2027-1-5），
+忙碌時段仍要以 YYYY-MM-DD 對應：本機假 PostgREST（另一個 thread）提供
+meeting_rooms / branches / meeting_room_bookings，確認：
+
+1. 補零與未補零的日期得到相同的忙碌時段與可用時段
+2. 與既有預約重疊的時段回傳 is_available = False
+3. booking_search_availability 以未補零日期查詢時，結果與 check 一致
+4. booking_search_availability 的 room_ids 以字串傳入（AI 工具呼叫）時，
+   JSON 陣列與逗號分隔都能解析（"12" 是一間會議室，不是 1、2），格式錯誤回傳 error
+
+不需要外部連線：
+    cd backend
+    python scripts/test_booking_availability.py
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mcp-server"))
+
+# 使用明年的日期，可用時段不會因已過去而被濾掉
+BOOKING_DATE = date(date.today().year + 1, 1, 5)
+
+MEETING_ROOMS = [
+    {
+        "id": room_id, "branch_id": 1, "name": name, "is_active": True,
+        "open_time": "09:00", "close_time": "18:00", "slot_minutes": 30, "google_calendar_id": None
+    }
+    for room_id, name in [(1, "大會議室"), (2, "小會議室"), (12, "洽談室")]
+]
+BRANCHES = [{"id": 1, "name": "大忠"}]
+BOOKINGS = [{
+    "meeting_room_id": 1, "booking_date": BOOKING_DATE.isoformat(),
+    "start_time": "10:00:00", "end_time": "11:00:00"
+}]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stand_in(port: int) -> uvicorn.Server:
+    """假 PostgREST：回傳固定的會議室、場館與預約"""
+    app = FastAPI()
+
+    @app.get("/meeting_rooms")
+    async def meeting_rooms():
+        return MEETING_ROOMS
+
+    @app.get("/branches")
+    async def branches():
+        return BRANCHES
+
+    @app.get("/meeting_room_bookings")
+    async def meeting_room_bookings():
+        return BOOKINGS
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_checks():
+    from tools import booking_tools
+
+    padded = BOOKING_DATE.isoformat()
+    unpadded = f"{BOOKING_DATE.year}-{BOOKING_DATE.month}-{BOOKING_DATE.day}"
+
+    by_padded = await booking_tools.booking_check_availability(1, padded)
+    by_unpadded = await booking_tools.booking_check_availability(1, unpadded)
+    print(f"{padded}: 忙碌 {by_padded['busy_times']}，可用 {by_padded['total_available']} 格")
+    print(f"{unpadded}: 忙碌 {by_unpadded['busy_times']}，可用 {by_unpadded['total_available']} 格")
+    assert by_unpadded["busy_times"] == by_padded["busy_times"] != [], "未補零日期沒有對應到預約"
+    assert by_unpadded["available_slots"] == by_padded["available_slots"]
+    assert "10:00" not in [slot["start"] for slot in by_unpadded["available_slots"]]
+
+    conflict = await booking_tools.booking_check_availability(1, unpadded, "10:30", "11:30")
+    free = await booking_tools.booking_check_availability(1, unpadded, "11:00", "12:00")
+    print(f"{unpadded} 10:30-11:30 可預約: {conflict['is_available']}，11:00-12:00 可預約: {free['is_available']}")
+    assert conflict["is_available"] is False and len(conflict["conflicts"]) == 1
+    assert free["is_available"] is True
+
+    search = await booking_tools.booking_search_availability(unpadded)
+    slots = search["rooms"][0]["availability"][padded]
+    print(f"booking_search_availability({unpadded}): 可用 {len(slots)} 格")
+    assert slots == by_padded["available_slots"]
+
+    for room_ids, expected in [
+        (None, [1, 2, 12]),
+        ([1, 12], [1, 12]),
+        ("[1, 12]", [1, 12]),
+        ("1,12", [1, 12]),
+        (" 2 ,", [2]),
+        ("12", [12]),
+        (12, [12]),
+    ]:
+        search = await booking_tools.booking_search_availability(padded, room_ids=room_ids)
+        got = [room["room_id"] for room in search["rooms"]]
+        print(f"room_ids={room_ids!r:<10} → {got}")
+        assert got == expected, (room_ids, got)
+
+    for room_ids in ["大會議室", "1,x", "[1, 2"]:
+        search = await booking_tools.booking_search_availability(padded, room_ids=room_ids)
+        print(f"room_ids={room_ids!r:<10} → {search}")
+        assert search["success"] is False and search["error"], search
+
+
+async def main():
+    port = free_port()
+    os.environ["POSTGREST_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["REFERENCE_CACHE_REDIS"] = "false"
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    server = start_stand_in(port)
+
+    from tools.postgrest_client import close_http_client
+
+    try:
+        await run_checks()
+    finally:
+        await close_http_client()
+        server.should_exit = True
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
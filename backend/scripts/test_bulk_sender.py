@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+測試批次發送引擎（tools/bulk_sender.py）
+
+1. run_bulk：同時處理數不超過 concurrency，結果依輸入順序，單筆例外不影響其他項目
+2. TokenBucket：burst 之後的取得速率不超過 rate
+3. request_with_retry：429 依 Retry-After 等待後重試；不在 retry_on 的狀態碼不重試
+4. 本機假 LINE push API（另一個 thread）端對端：
+   send_line_push 經 run_bulk 發送，假 API 隨機回 429（Retry-After）/ 500、
+   依 X-Line-Retry-Key 去重；確認全部送達且不重複、速率不超過 LINE_PUSH_RATE、
+   假 API 同時處理的請求數不超過 concurrency，batch_tasks / batch_task_items 有寫入進度
+
+不需要外部連線：
+    cd backend
+    python scripts/test_bulk_sender.py -n 100 --rate 20 --burst 5
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mcp-server"))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ============================================================================
+# 1-3. 引擎本身
+# ============================================================================
+
+async def check_run_bulk_concurrency(bulk_sender):
+    in_flight = 0
+    peak = 0
+
+    async def handler(i):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(random.uniform(0.005, 0.02))
+        in_flight -= 1
+        if i % 10 == 3:
+            raise RuntimeError("boom")
+        return {"success": i % 10 != 7, "value": i}
+
+    result = await bulk_sender.run_bulk(list(range(50)), handler, concurrency=5)
+
+    assert peak == 5, f"同時處理 {peak} 筆（上限 5）"
+    assert [r.get("value") for r in result["results"] if "value" in r] == [
+        i for i in range(50) if i % 10 != 3
+    ], "結果順序與輸入不同"
+    assert result["failed_count"] == 10 and result["success_count"] == 40, result
+    assert result["status"] == "partial_success"
+    print(f"run_bulk：50 筆、concurrency=5，最大同時處理 {peak} 筆，成功 40 / 失敗 10（含例外 5 筆）")
+
+
+async def check_token_bucket(bulk_sender):
+    bucket = bulk_sender.TokenBucket(rate=20, capacity=5)
+    started = time.monotonic()
+    for _ in range(45):
+        await bucket.acquire()
+    elapsed = time.monotonic() - started
+
+    # burst 5 立即取得，其餘 40 個以 20/s 補充
+    expected = (45 - 5) / 20
+    assert expected * 0.95 <= elapsed <= expected * 1.2, f"{elapsed:.2f}s（預期約 {expected:.2f}s）"
+    print(f"TokenBucket：rate=20/s、burst=5，取得 45 個 token 花 {elapsed:.2f}s（預期 {expected:.2f}s）")
+
+
+async def check_retry_after(bulk_sender):
+    request = httpx.Request("POST", "http://line.test/push")
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0.3"}, request=request),
+        httpx.Response(429, headers={"Retry-After": "0.3"}, request=request),
+        httpx.Response(200, request=request),
+    ]
+    attempts = []
+
+    async def send():
+        attempts.append(time.monotonic())
+        return responses[len(attempts) - 1]
+
+    response = await bulk_sender.request_with_retry(send, max_retries=4)
+    gaps = [b - a for a, b in zip(attempts, attempts[1:])]
+    assert response.status_code == 200 and len(attempts) == 3
+    assert all(0.3 <= gap < 0.45 for gap in gaps), gaps
+
+    # 非冪等 API 只重試 429 / 503：500 直接回傳
+    attempts.clear()
+    responses[0] = httpx.Response(500, request=request)
+    response = await bulk_sender.request_with_retry(send, retry_on=frozenset({429, 503}))
+    assert response.status_code == 500 and len(attempts) == 1
+
+    print(f"request_with_retry：429 + Retry-After 0.3s 兩次後成功，重試間隔 {', '.join(f'{g:.2f}s' for g in gaps)}")
+
+
+# ============================================================================
+# 4. 假 LINE push API + PostgREST
+# ============================================================================
+
+class StandIn:
+    """假 LINE push API 與 batch_tasks 端點（獨立 thread 與 event loop）"""
+
+    def __init__(self, latency: float, rate_429: float, rate_500: float):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.requests = []          # (monotonic time, retry key)
+        self.delivered = {}         # retry key -> 收件者
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.batch_tasks = {}
+        self.item_updates = 0
+        self._next_item_id = 1
+        self._lock = threading.Lock()
+        self.app = self._build_app()
+
+    def _build_app(self):
+        app = FastAPI()
+
+        @app.post("/v2/bot/message/push")
+        async def push(request: Request):
+            body = await request.json()
+            key = request.headers.get("X-Line-Retry-Key")
+            with self._lock:
+                self.requests.append((time.monotonic(), key))
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self.latency)
+                if key in self.delivered:
+                    return Response(status_code=409)
+                roll = random.random()
+                if roll < self.rate_429:
+                    return Response(status_code=429, headers={"Retry-After": "0.2"})
+                if roll < self.rate_429 + self.rate_500:
+                    return Response(status_code=500)
+                self.delivered[key] = body["to"]
+                return {}
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+
+        @app.post("/batch_tasks")
+        async def create_task(request: Request):
+            body = await request.json()
+            self.batch_tasks[body["id"]] = body
+            return [body]
+
+        @app.patch("/batch_tasks")
+        async def update_task(request: Request, id: str):
+            self.batch_tasks[id.removeprefix("eq.")].update(await request.json())
+            return Response(status_code=204)
+
+        @app.post("/batch_task_items")
+        async def create_items(request: Request):
+            rows = await request.json()
+            for row in rows:
+                row["id"] = self._next_item_id
+                self._next_item_id += 1
+            return rows
+
+        @app.patch("/batch_task_items")
+        async def update_item():
+            self.item_updates += 1
+            return Response(status_code=204)
+
+        return app
+
+    def start(self, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=self.server.run, daemon=True).start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+
+
+async def check_line_stand_in(bulk_sender, stand_in, args):
+    from tools import line_tools
+
+    recipients = [f"U{i:032x}" for i in range(args.count)]
+
+    async def handler(line_user_id):
+        return await line_tools.send_line_push(
+            line_user_id, [{"type": "text", "text": "繳費提醒"}], log_to_brain_enabled=False
+        )
+
+    started = time.monotonic()
+    result = await bulk_sender.run_bulk(
+        recipients,
+        handler,
+        concurrency=args.concurrency,
+        task_type="send_reminder",
+        target_of=lambda line_user_id: (recipients.index(line_user_id) + 1, "line_user")
+    )
+    elapsed = time.monotonic() - started
+
+    times = [t for t, _ in stand_in.requests]
+    # 扣掉 burst 後的實際速率
+    steady = (len(times) - args.burst) / (times[-1] - times[0]) if len(times) > args.burst else 0
+    retries = len(stand_in.requests) - args.count
+    task = stand_in.batch_tasks[result["task_id"]]
+
+    print(
+        f"假 LINE API：{args.count} 則、concurrency={args.concurrency}、rate={args.rate}/s、burst={args.burst}，"
+        f"{elapsed:.2f}s"
+    )
+    print(
+        f"  成功 {result['success_count']}、重試 {retries} 次、實際速率 {steady:.1f} req/s、"
+        f"假 API 最大同時處理 {stand_in.peak_in_flight}"
+    )
+    print(
+        f"  送達 {len(stand_in.delivered)} 則（收件者不重複 {len(set(stand_in.delivered.values()))}），"
+        f"batch_tasks: {task['status']} {task['success_count']}/{task['total_count']}，"
+        f"batch_task_items 更新 {stand_in.item_updates} 次"
+    )
+
+    assert result["success_count"] == args.count, result["failed_count"]
+    assert sorted(stand_in.delivered.values()) == sorted(recipients), "有收件者未送達或重複送達"
+    assert steady <= args.rate * 1.05, f"速率 {steady:.1f} 超過 {args.rate}"
+    assert stand_in.peak_in_flight <= args.concurrency
+    assert task["status"] == "completed" and task["success_count"] == args.count
+    assert stand_in.item_updates == args.count
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="批次發送引擎測試")
+    parser.add_argument("-n", "--count", type=int, default=100, help="假 LINE API 發送則數")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=20, help="LINE_PUSH_RATE")
+    parser.add_argument("--burst", type=float, default=5, help="LINE_PUSH_BURST")
+    parser.add_argument("--latency", type=float, default=0.05, help="假 API 回應延遲（秒）")
+    parser.add_argument("--rate-429", type=float, default=0.15)
+    parser.add_argument("--rate-500", type=float, default=0.10)
+    args = parser.parse_args()
+
+    port = free_port()
+    stand_in_url = f"http://127.0.0.1:{port}"
+    os.environ["LINE_CHANNEL_ACCESS_TOKEN"] = "test"
+    os.environ["LINE_PUSH_API_URL"] = f"{stand_in_url}/v2/bot/message/push"
+    os.environ["POSTGREST_URL"] = stand_in_url
+    os.environ["LINE_PUSH_RATE"] = str(args.rate)
+    os.environ["LINE_PUSH_BURST"] = str(args.burst)
+    os.environ["SEND_RETRY_BASE_DELAY"] = "0.1"
+
+    # 預期中的失敗 / 重試不輸出 log，結果由本腳本列出
+    logging.getLogger("tools").setLevel(logging.CRITICAL)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    stand_in = StandIn(args.latency, args.rate_429, args.rate_500)
+    stand_in.start(port)
+
+    from tools import bulk_sender
+    from tools.postgrest_client import close_http_client
+
+    try:
+        await check_run_bulk_concurrency(bulk_sender)
+        await check_token_bucket(bulk_sender)
+        await check_retry_after(bulk_sender)
+        await check_line_stand_in(bulk_sender, stand_in, args)
+    finally:
+        await close_http_client()
+        stand_in.stop()
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
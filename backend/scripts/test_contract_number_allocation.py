@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+測試合約編號併發取號（allocate_contract_number，migration 112）
+
+同時發出 N 次取號，確認編號不重複且連續（last_value + 1 ... last_value + N）：
+- 預設：N 個 thread 各自一條資料庫連線，barrier 後同時呼叫 allocate_contract_number()
+- --postgrest：經 POSTGREST_URL 併發呼叫 quote_tools.generate_contract_number()
+  （convert_quote_to_contract 轉換報價單時取號的同一路徑）
+
+結束後若期間沒有其他取號，計數器還原為測試前的值（--keep 則保留）
+
+用法：
+    cd backend
+    POSTGRES_HOST=localhost python scripts/test_contract_number_allocation.py --branch-id 1 -n 100
+    POSTGREST_URL=http://localhost:3000 python scripts/test_contract_number_allocation.py --postgrest
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+import psycopg2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mcp-server"))
+
+
+def connect():
+    conn = psycopg2.connect(
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        port=int(os.getenv("POSTGRES_PORT", "5432")),
+        dbname=os.getenv("POSTGRES_DB", "hourjungle"),
+        user=os.getenv("POSTGRES_USER", "hjadmin"),
+        password=os.getenv("POSTGRES_PASSWORD", ""),
+    )
+    conn.autocommit = True
+    return conn
+
+
+def read_counter(branch_id):
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT number_pattern, last_value FROM contract_number_counters WHERE branch_id = %s",
+                (branch_id,)
+            )
+            return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def allocate_via_db(branch_id, n):
+    connections = [connect() for _ in range(n)]
+    barrier = threading.Barrier(n)
+    numbers = [None] * n
+
+    def worker(i):
+        with connections[i].cursor() as cur:
+            barrier.wait()
+            cur.execute("SELECT allocate_contract_number(%s)", (branch_id,))
+            numbers[i] = cur.fetchone()[0]
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for conn in connections:
+        conn.close()
+    return numbers
+
+
+async def allocate_via_postgrest(branch_id, n):
+    from tools import quote_tools
+    from tools.postgrest_client import close_http_client
+
+    try:
+        return await asyncio.gather(*(quote_tools.generate_contract_number(branch_id) for _ in range(n)))
+    finally:
+        await close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合約編號併發取號測試")
+    parser.add_argument("--branch-id", type=int, default=1)
+    parser.add_argument("-n", "--count", type=int, default=100, help="同時取號數")
+    parser.add_argument("--postgrest", action="store_true", help="經 PostgREST 呼叫 generate_contract_number")
+    parser.add_argument("--keep", action="store_true", help="不還原計數器")
+    args = parser.parse_args()
+
+    counter = read_counter(args.branch_id)
+    if counter is None:
+        sys.exit(f"分館 {args.branch_id} 沒有設定 contract_number_counters")
+    pattern, before = counter
+
+    started = time.perf_counter()
+    if args.postgrest:
+        numbers = asyncio.run(allocate_via_postgrest(args.branch_id, args.count))
+    else:
+        numbers = allocate_via_db(args.branch_id, args.count)
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(numbers, key=lambda number: int(re.match(pattern, number).group(1)))
+    values = [int(re.match(pattern, number).group(1)) for number in ordered]
+    expected = list(range(before + 1, before + args.count + 1))
+    print(f"{args.count} 次併發取號（{'PostgREST' if args.postgrest else '資料庫連線'}），{elapsed:.2f}s")
+    print(f"編號: {ordered[0]} ... {ordered[-1]}，不重複 {len(set(numbers))} 個")
+
+    after = read_counter(args.branch_id)[1]
+    if not args.keep and after == before + args.count:
+        conn = connect()
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE contract_number_counters SET last_value = %s WHERE branch_id = %s AND last_value = %s",
+                (before, args.branch_id, after)
+            )
+        conn.close()
+        print(f"計數器已還原為 {before}")
+
+    assert len(set(numbers)) == args.count, "取得重複編號"
+    assert values == expected, f"編號不連續: {values[:5]} ..."
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+測試 Dashboard 載入不再觸發每日維護寫入（migration 114 / 122）
+
+1. 先寫入 N 筆已過期但仍為 pending 的付款（測試用 contract_id 區段，結束後刪除）
+2. 同時送出 --loads 次 Dashboard 載入（前端實際執行的查詢：v_dashboard_stats +
+   v_maintenance_last_run），確認資料表沒有任何寫入，測試付款仍為 pending
+3. 同時呼叫 --scheduler-calls 次 run_scheduled_maintenance()（排程入口），
+   確認只有一個呼叫取得鎖執行、其餘回傳 running，之後的呼叫回傳 already_ran，
+   本時段在 maintenance_runs 只有一筆紀錄，且測試付款已更新為 overdue
+4. 以 anon（PostgREST）呼叫：排程入口可用，強制重跑的 run_scheduled_maintenance_admin() 被拒絕
+5. --legacy：另外量測舊做法（每次載入呼叫 run_daily_maintenance()）的寫入數
+
+寫入測試資料需略過外鍵與 trigger（session_replication_role），需以 superuser 執行；
+步驟 3 會實際執行一次每日維護（與排程相同）
+
+用法：
+    cd backend
+    POSTGRES_HOST=localhost python scripts/test_dashboard_maintenance.py --loads 30 --legacy
+"""
+
+import argparse
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import errors
+from psycopg2.extras import RealDictCursor
+
+ROLE = os.getenv("PGRST_DB_ANON_ROLE", "anon")
+TEST_CONTRACT_ID_START = 900000
+TRIGGERED_BY = "test_dashboard_maintenance"
+
+DASHBOARD_QUERIES = [
+    "SELECT * FROM v_dashboard_stats",
+    "SELECT * FROM v_maintenance_last_run WHERE job_name = 'daily_maintenance'",
+]
+LEGACY_DASHBOARD_QUERIES = ["SELECT run_daily_maintenance()"] + DASHBOARD_QUERIES[:1]
+
+
+def connect():
+    conn = psycopg2.connect(
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        port=int(os.getenv("POSTGRES_PORT", "5432")),
+        dbname=os.getenv("POSTGRES_DB", "hourjungle"),
+        user=os.getenv("POSTGRES_USER", "hjadmin"),
+        password=os.getenv("POSTGRES_PASSWORD", ""),
+        cursor_factory=RealDictCursor,
+    )
+    conn.autocommit = True
+    return conn
+
+
+def flush_stats(cur):
+    """讓本 session 的統計立即可見（PostgreSQL 15+；舊版等待統計定期回報）"""
+    try:
+        cur.execute("SELECT pg_stat_force_next_flush()")
+    except psycopg2.Error:
+        time.sleep(1)
+
+
+def row_writes(cur) -> int:
+    flush_stats(cur)
+    cur.execute(
+        "SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0) AS writes FROM pg_stat_user_tables"
+    )
+    return int(cur.fetchone()["writes"])
+
+
+def seed_pending(cur, count: int):
+    cur.execute("SET session_replication_role = replica")
+    cur.execute(
+        """
+        INSERT INTO payments (contract_id, customer_id, branch_id, payment_type, payment_period,
+                              amount, payment_status, due_date)
+        SELECT %(start)s + g, %(start)s + g, 1, 'rent', TO_CHAR(CURRENT_DATE - 30, 'YYYY-MM'),
+               1000, 'pending', CURRENT_DATE - 30
+        FROM generate_series(1, %(count)s) g
+        """,
+        {"start": TEST_CONTRACT_ID_START, "count": count}
+    )
+    cur.execute("SET session_replication_role = origin")
+
+
+def reset_pending(cur):
+    cur.execute("SET session_replication_role = replica")
+    cur.execute(
+        "UPDATE payments SET payment_status = 'pending', overdue_days = 0 WHERE contract_id > %s",
+        (TEST_CONTRACT_ID_START,)
+    )
+    cur.execute("SET session_replication_role = origin")
+
+
+def count_status(cur, status: str) -> int:
+    cur.execute(
+        "SELECT COUNT(*) AS n FROM payments WHERE contract_id > %s AND payment_status = %s",
+        (TEST_CONTRACT_ID_START, status)
+    )
+    return cur.fetchone()["n"]
+
+
+def run_concurrently(n: int, work):
+    """n 個 thread 各自一條連線，barrier 後同時執行 work(cursor)"""
+    connections = [connect() for _ in range(n)]
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def worker(i):
+        with connections[i].cursor() as cur:
+            barrier.wait()
+            results[i] = work(cur)
+            flush_stats(cur)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    for conn in connections:
+        conn.close()
+    return results, elapsed
+
+
+def dashboard_load(queries):
+    def work(cur):
+        for sql in queries:
+            cur.execute(sql)
+            cur.fetchall()
+    return work
+
+
+def scheduler_call(cur):
+    cur.execute("SELECT run_scheduled_maintenance_admin(24, %s, true) AS r", (TRIGGERED_BY,))
+    return cur.fetchone()["r"]
+
+
+def anon_calls(cur) -> dict:
+    """以 anon 呼叫排程入口與強制重跑（交易內 SET LOCAL ROLE，結束時 ROLLBACK）"""
+    cur.execute("BEGIN")
+    try:
+        cur.execute(f"SET LOCAL ROLE {ROLE}")
+        cur.execute("SELECT run_scheduled_maintenance(24, %s) AS r", (TRIGGERED_BY,))
+        scheduled = cur.fetchone()["r"]
+        cur.execute("SAVEPOINT force")
+        try:
+            cur.execute("SELECT run_scheduled_maintenance_admin(24, %s, true) AS r", (TRIGGERED_BY,))
+            forced = "executed"
+        except errors.InsufficientPrivilege:
+            forced = "permission denied"
+            cur.execute("ROLLBACK TO SAVEPOINT force")
+    finally:
+        cur.execute("ROLLBACK")
+    return {"scheduled": scheduled, "forced": forced}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard 載入與每日維護測試")
+    parser.add_argument("--payments", type=int, default=500, help="測試用逾期 pending 付款筆數")
+    parser.add_argument("--loads", type=int, default=30, help="同時載入 Dashboard 次數")
+    parser.add_argument("--scheduler-calls", type=int, default=10, help="同時呼叫排程入口次數")
+    parser.add_argument("--legacy", action="store_true", help="量測舊做法（載入時執行維護）")
+    args = parser.parse_args()
+
+    conn = connect()
+    cur = conn.cursor()
+    seed_pending(cur, args.payments)
+    try:
+        # 2. Dashboard 載入只讀取
+        before = row_writes(cur)
+        _, elapsed = run_concurrently(args.loads, dashboard_load(DASHBOARD_QUERIES))
+        writes = row_writes(cur) - before
+        still_pending = count_status(cur, "pending")
+        print(f"Dashboard 同時載入 {args.loads} 次：{elapsed:.2f}s，資料表寫入 {writes} 列，"
+              f"測試付款仍為 pending {still_pending}/{args.payments}")
+        assert writes == 0, f"Dashboard 載入寫入了 {writes} 列"
+        assert still_pending == args.payments
+
+        if args.legacy:
+            before = row_writes(cur)
+            _, elapsed = run_concurrently(args.loads, dashboard_load(LEGACY_DASHBOARD_QUERIES))
+            print(f"舊做法同時載入 {args.loads} 次：{elapsed:.2f}s，資料表寫入 {row_writes(cur) - before} 列")
+            reset_pending(cur)
+
+        # 3. 排程入口：同時只有一個執行，同一時段只留一筆紀錄
+        results, elapsed = run_concurrently(args.scheduler_calls, scheduler_call)
+        executed = [r for r in results if r["executed"]]
+        skipped = sorted(r["reason"] for r in results if not r["executed"])
+        run_key = results[0]["run_key"]
+
+        cur.execute("SELECT run_scheduled_maintenance(24, %s) AS r", (TRIGGERED_BY,))
+        later = cur.fetchone()["r"]
+        cur.execute(
+            "SELECT COUNT(*) AS n FROM maintenance_runs WHERE job_name = 'daily_maintenance' AND run_key = %s",
+            (run_key,)
+        )
+        ledger_rows = cur.fetchone()["n"]
+        overdue = count_status(cur, "overdue")
+        anon = anon_calls(cur)
+
+        print(f"排程入口同時呼叫 {args.scheduler_calls} 次：{elapsed:.2f}s，執行 {len(executed)} 次，"
+              f"略過 {skipped}；之後的呼叫：{later['reason']}；"
+              f"maintenance_runs({run_key}) {ledger_rows} 筆；測試付款轉為 overdue {overdue}/{args.payments}")
+        print(f"{ROLE} 呼叫排程入口：{anon['scheduled']['reason']}；強制重跑：{anon['forced']}")
+        assert executed and all(r["success"] for r in executed), executed
+        assert set(skipped) <= {"running"}
+        assert later["reason"] == "already_ran"
+        assert ledger_rows == 1
+        assert overdue == args.payments
+        assert anon["scheduled"]["reason"] == "already_ran"
+        assert anon["forced"] == "permission denied", f"{ROLE} 可以強制重跑維護"
+    finally:
+        cur.execute("SET session_replication_role = replica")
+        cur.execute("DELETE FROM payments WHERE contract_id > %s", (TEST_CONTRACT_ID_START,))
+        cur.execute("SET session_replication_role = origin")
+        conn.close()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
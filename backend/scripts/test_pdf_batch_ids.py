@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+測試批次生成 PDF 的文件ID解析（tools/pdf_batch_tools.py）
+
+AI 工具呼叫時 array 參數以字串傳入（main._convert_tool_for_openai），
+pdf_generate_batch 的 ids 需與 REST API 相同方式解析：本機假 PostgREST / PDF 服務
+（另一個 thread）提供 v_quotes、branches 與 /generate-batch，確認：
+
+1. 列表、JSON 陣列字串、逗號分隔字串得到相同的文件（"12" 是一份文件，不是 1、2）
+2. 重複的ID只生成一次，依請求順序回傳
+3. 格式錯誤的ID回傳 success = False 與 error，不拋出例外、不呼叫 PDF 服務
+
+不需要外部連線：
+    cd backend
+    python scripts/test_pdf_batch_ids.py
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mcp-server"))
+
+QUOTES = {
+    quote_id: {
+        "id": quote_id, "branch_id": 1, "quote_number": f"Q-{quote_id:03d}",
+        "customer_name": "測試客戶", "items": [], "total_amount": 0
+    }
+    for quote_id in (1, 2, 3, 12)
+}
+BRANCHES = [{"id": 1, "name": "大忠"}]
+
+# /generate-batch 收到的請求
+batch_requests = []
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stand_in(port: int) -> uvicorn.Server:
+    """假 PostgREST 與 PDF 服務"""
+    app = FastAPI()
+
+    @app.get("/v_quotes")
+    async def v_quotes(id: str):
+        ids = [int(x) for x in id.removeprefix("in.(").removesuffix(")").split(",")]
+        return [QUOTES[i] for i in ids if i in QUOTES]
+
+    @app.get("/branches")
+    async def branches():
+        return BRANCHES
+
+    @app.post("/generate-batch")
+    async def generate_batch(request: Request):
+        body = await request.json()
+        batch_requests.append(body)
+        return {"success": True, "items": [
+            {"success": True, "pdf_url": f"https://example.com/{item['quote_data']['quote_number']}.pdf"}
+            for item in body["items"]
+        ]}
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_checks():
+    from tools.pdf_batch_tools import pdf_generate_batch
+
+    for ids, expected in [
+        ([1, 2, 3], [1, 2, 3]),
+        ("[1, 2, 3]", [1, 2, 3]),
+        ("1,2,3", [1, 2, 3]),
+        (" 3, 1 ,3,", [3, 1]),
+        ("12", [12]),
+        (12, [12]),
+    ]:
+        result = await pdf_generate_batch("quote", ids)
+        got = [doc["id"] for doc in result.get("documents", [])]
+        print(f"ids={ids!r:<14} → {got}")
+        assert result["success"] is True, result
+        assert got == expected, (ids, got)
+
+    requests_before = len(batch_requests)
+    for ids in ["abc", "1,x", "[1, \"a\"]", "[1, 2", [None]]:
+        result = await pdf_generate_batch("quote", ids)
+        print(f"ids={ids!r:<14} → {result}")
+        assert result["success"] is False and result.get("error"), result
+
+    result = await pdf_generate_batch("quote", "")
+    assert result["success"] is False, result
+    assert len(batch_requests) == requests_before, "格式錯誤時不應呼叫 PDF 服務"
+
+
+async def main():
+    port = free_port()
+    os.environ["POSTGREST_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["PDF_GENERATOR_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["REFERENCE_CACHE_REDIS"] = "false"
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    server = start_stand_in(port)
+
+    from tools.postgrest_client import close_http_client
+
+    try:
+        await run_checks()
+    finally:
+        await close_http_client()
+        server.should_exit = True
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
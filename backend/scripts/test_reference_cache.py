@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+測試參考資料快取失效後不回傳舊資料（tools/reference_cache.py）
+
+本機假 PostgREST（另一個 thread）提供 system_settings，每次查詢延遲 --latency 秒，
+回傳查詢「開始時」的資料：
+
+1. A 讀取中（查詢已送出、尚未回應）時寫入新設定並 invalidate
+2. invalidate 之後才開始的讀取 B 必須拿到新設定，不能共用 A 的查詢
+3. A 的結果不寫回快取：之後的讀取命中 B 寫入的新資料
+4. 相同 generation 的併發讀取仍共用同一次查詢
+
+不需要外部連線：
+    cd backend
+    python scripts/test_reference_cache.py
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mcp-server"))
+
+settings = {"value": "old"}
+queries = []
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stand_in(port: int, latency: float) -> uvicorn.Server:
+    """假 PostgREST：回傳查詢開始時的 system_settings"""
+    app = FastAPI()
+
+    @app.get("/system_settings")
+    async def system_settings():
+        value = settings["value"]
+        queries.append(value)
+        await asyncio.sleep(latency)
+        return [{"id": 1, "setting_key": "greeting", "setting_value": value}]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_checks(latency: float):
+    from tools.reference_cache import ReferenceDataCache
+
+    cache = ReferenceDataCache(ttl=300, use_redis=False)
+
+    def value_of(rows):
+        return rows[0]["setting_value"]
+
+    # 1. A 查詢進行中時更新設定並 invalidate
+    reader_a = asyncio.ensure_future(cache.get("system_settings"))
+    await asyncio.sleep(latency / 2)
+    settings["value"] = "new"
+    await cache.invalidate("system_settings")
+
+    # 2. invalidate 之後的讀取
+    reader_b = await cache.get("system_settings")
+    rows_a = await reader_a
+    print(f"A（invalidate 前開始）: {value_of(rows_a)}，B（invalidate 後開始）: {value_of(reader_b)}，查詢 {queries}")
+    assert value_of(rows_a) == "old"
+    assert value_of(reader_b) == "new", "invalidate 後的讀取共用了舊查詢"
+
+    # 3. 快取內是新資料
+    hits_before = cache.stats["hits"]
+    cached = await cache.get("system_settings")
+    print(f"之後讀取: {value_of(cached)}（命中 {cache.stats['hits'] - hits_before}）")
+    assert value_of(cached) == "new" and cache.stats["hits"] == hits_before + 1
+
+    # 4. 相同 generation 的併發讀取共用一次查詢
+    await cache.invalidate("system_settings")
+    count_before = len(queries)
+    results = await asyncio.gather(*[cache.get("system_settings") for _ in range(5)])
+    print(f"併發 5 次讀取: 查詢 {len(queries) - count_before} 次")
+    assert len(queries) - count_before == 1
+    assert all(value_of(rows) == "new" for rows in results)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="參考資料快取失效測試")
+    parser.add_argument("--latency", type=float, default=0.3, help="假 PostgREST 回應延遲（秒）")
+    args = parser.parse_args()
+
+    port = free_port()
+    os.environ["POSTGREST_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["REFERENCE_CACHE_REDIS"] = "false"
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    server = start_stand_in(port, args.latency)
+
+    from tools.postgrest_client import close_http_client
+
+    try:
+        await run_checks(args.latency)
+    finally:
+        await close_http_client()
+        server.should_exit = True
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,170 @@
+"""
+Hour Jungle CRM - GCP Clients
+GCS client 與 Signed URL 簽章憑證（process 內共用）
+
+原本每次上傳、查檔、產生 Signed URL 都會：
+- 建立新的 storage.Client()（重新載入認證、建立新的 HTTP session / 連線）
+- 呼叫 default() 取得認證；Compute Engine 認證再查詢 metadata server 取得服務帳戶 email，
+  並 refresh 一次 access token
+
+- storage.Client 與 bucket：第一次使用時建立，之後共用
+- 簽章憑證：default() 與服務帳戶 email 只解析一次；
+  access token 在到期前 SIGNING_TOKEN_REFRESH_MARGIN 秒內才 refresh
+- 方法皆為 blocking 且 thread-safe（由 asyncio.to_thread 同時呼叫）
+"""
+
+import logging
+import os
+import threading
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from google.auth import compute_engine, default
+from google.auth.transport import requests
+from google.cloud import storage
+
+logger = logging.getLogger(__name__)
+
+SIGNED_URL_EXPIRATION = 604800  # 7天
+SIGNING_TOKEN_REFRESH_MARGIN = float(os.getenv("SIGNING_TOKEN_REFRESH_MARGIN", "300"))  # 秒
+
+METADATA_EMAIL_URL = (
+    "http://metadata.google.internal/computeMetadata/v1/instance/service-accounts/default/email"
+)
+
+
+def resolve_service_account_email(credentials) -> str:
+    """取得當前服務帳戶的 email"""
+    # 先嘗試從 credentials 取得
+    if hasattr(credentials, 'service_account_email') and credentials.service_account_email:
+        email = credentials.service_account_email
+        if email and email != 'default' and '@' in email:
+            logger.info(f"Got service account from credentials: {email}")
+            return email
+
+    # Cloud Run 環境下從 metadata server 取得
+    try:
+        req = urllib.request.Request(METADATA_EMAIL_URL, headers={'Metadata-Flavor': 'Google'})
+        email = urllib.request.urlopen(req, timeout=5).read().decode().strip()
+        if email and '@' in email:
+            logger.info(f"Got service account from metadata: {email}")
+            return email
+    except Exception as e:
+        logger.warning(f"Failed to get service account from metadata: {e}")
+
+    # 嘗試從專案號碼推導 (Cloud Run 預設使用 compute engine default service account)
+    project_number = os.getenv("GOOGLE_CLOUD_PROJECT_NUMBER", "743652001579")
+    fallback_email = f"{project_number}-compute@developer.gserviceaccount.com"
+    logger.info(f"Using fallback service account: {fallback_email}")
+    return fallback_email
+
+
+def _token_expiring(credentials, margin: float) -> bool:
+    """access token 不存在或將在 margin 秒內到期"""
+    if not credentials.token or credentials.expiry is None:
+        return True
+    expiry = credentials.expiry
+    if expiry.tzinfo is None:
+        # google-auth 的 expiry 為 naive UTC
+        expiry = expiry.replace(tzinfo=timezone.utc)
+    return expiry - timedelta(seconds=margin) <= datetime.now(timezone.utc)
+
+
+class GcpClients:
+    """storage.Client、bucket 與簽章憑證的共用實例"""
+
+    def __init__(self, refresh_margin: float = SIGNING_TOKEN_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._storage_client: Optional[storage.Client] = None
+        self._buckets: Dict[str, storage.Bucket] = {}
+
+        # 簽章憑證（default() 的結果；Compute Engine 認證另需服務帳戶 email 與 access token）
+        self._credentials = None
+        self._service_account_email: Optional[str] = None
+
+        self.stats = {
+            "storage_clients_created": 0,
+            "credentials_loaded": 0,
+            "token_refreshes": 0,
+            "signed_urls": 0,
+        }
+
+    def storage_client(self) -> storage.Client:
+        """共用的 storage.Client"""
+        if self._storage_client is None:
+            with self._lock:
+                if self._storage_client is None:
+                    self._storage_client = storage.Client()
+                    self.stats["storage_clients_created"] += 1
+        return self._storage_client
+
+    def bucket(self, name: str) -> storage.Bucket:
+        """共用的 bucket 物件"""
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets.setdefault(name, self.storage_client().bucket(name))
+        return bucket
+
+    def _signing_credentials(self):
+        """
+        取得簽章用認證
+
+        Returns:
+            (credentials, service_account_email)；非 Compute Engine 認證（有私鑰）時 email 為 None
+        """
+        with self._lock:
+            if self._credentials is None:
+                credentials, _ = default()
+                self.stats["credentials_loaded"] += 1
+                if isinstance(credentials, compute_engine.Credentials):
+                    self._service_account_email = resolve_service_account_email(credentials)
+                    if not self._service_account_email:
+                        raise Exception("無法取得服務帳戶 email")
+                self._credentials = credentials
+
+            if self._service_account_email and _token_expiring(self._credentials, self.refresh_margin):
+                # IAM signing 需要有效的 access token
+                self._credentials.refresh(requests.Request())
+                self.stats["token_refreshes"] += 1
+
+            return self._credentials, self._service_account_email
+
+    def generate_signed_url(self, blob, expiration_seconds: int = SIGNED_URL_EXPIRATION) -> str:
+        """
+        產生 v4 Signed URL
+
+        Compute Engine 認證（Cloud Run 預設）沒有私鑰，改用 IAM signing
+        （service_account_email + access_token）
+        """
+        credentials, service_account_email = self._signing_credentials()
+        self.stats["signed_urls"] += 1
+
+        if service_account_email:
+            return blob.generate_signed_url(
+                version="v4",
+                expiration=timedelta(seconds=expiration_seconds),
+                method="GET",
+                service_account_email=service_account_email,
+                access_token=credentials.token
+            )
+        # 如果有私鑰的認證（如本機開發），直接使用
+        return blob.generate_signed_url(
+            version="v4",
+            expiration=timedelta(seconds=expiration_seconds),
+            method="GET"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得建立 / refresh 次數"""
+        return {
+            **self.stats,
+            "service_account_email": self._service_account_email,
+            "token_expiry": self._credentials.expiry.isoformat()
+            if self._credentials is not None and self._credentials.expiry else None
+        }
+
+
+# 全域實例
+gcp_clients = GcpClients()
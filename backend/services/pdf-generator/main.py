@@ -3,25 +3,39 @@ Hour Jungle CRM - PDF Generator Service
 Cloud Run 微服務：HTML → PDF → GCS
 """
 
+import asyncio
+import mimetypes
 import os
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from weasyprint import HTML
-from google.cloud import storage
-from google.auth import default
-from google.auth.transport import requests
-from jinja2 import Environment, FileSystemLoader
+from pydantic import BaseModel, ValidationError
+from gcp_clients import SIGNED_URL_EXPIRATION, gcp_clients
+from pdf_batch import BATCH_EXTENSIONS, batch_key, merge_pdfs, zip_pdfs
+from pdf_cache import PDF_CACHE_BACKEND, LocalPdfStore, PdfCache, cache_key
+from render_assets import TEMPLATE_DIR, create_jinja_env, precompile_templates
+from render_pool import RenderPoolFull, render_pool
 
 # 設定 logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="PDF Generator", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """啟動時編譯模板、建立並預熱渲染 worker，結束時關閉"""
+    template_status.update(precompile_templates(jinja_env))
+    logger.info(f"Precompiled {len(template_status['compiled'])} templates")
+    await render_pool.start()
+    yield
+    render_pool.shutdown()
+
+
+app = FastAPI(title="PDF Generator", version="1.0.0", lifespan=lifespan)
 
 # CORS 設定（Cloud Run 內部通訊）
 app.add_middleware(
@@ -34,81 +48,87 @@ app.add_middleware(
 
 # GCS 設定
 GCS_BUCKET = os.getenv("GCS_BUCKET", "hourjungle-contracts")
-SIGNED_URL_EXPIRATION = 604800  # 7天
 
-# 取得服務帳戶認證（用於 IAM signing）
-def get_service_account_email():
-    """取得當前服務帳戶的 email"""
-    credentials, project = default()
+# 批次生成上限（單次請求的文件數）
+PDF_BATCH_MAX_ITEMS = int(os.getenv("PDF_BATCH_MAX_ITEMS", "100"))
+
+
+class GCSPdfStore:
+    """PDF 存放於 GCS（pdf_cache 的 store，方法皆為 blocking）"""
+
+    def _bucket(self):
+        # 共用 storage.Client（見 gcp_clients）
+        return gcp_clients.bucket(GCS_BUCKET)
+
+    def stat(self, path: str) -> Optional[float]:
+        blob = self._bucket().get_blob(path)
+        return blob.time_created.timestamp() if blob is not None else None
+
+    def save(self, path: str, pdf_bytes: bytes) -> None:
+        blob = self._bucket().blob(path)
+        content_type = mimetypes.guess_type(path)[0] or "application/pdf"
+        blob.upload_from_string(pdf_bytes, content_type=content_type)
+        logger.info(f"Uploaded {content_type} to gs://{GCS_BUCKET}/{path}")
 
-    # 先嘗試從 credentials 取得
-    if hasattr(credentials, 'service_account_email') and credentials.service_account_email:
-        email = credentials.service_account_email
-        if email and email != 'default' and '@' in email:
-            logger.info(f"Got service account from credentials: {email}")
-            return email
+    def load(self, path: str) -> bytes:
+        return self._bucket().blob(path).download_as_bytes()
 
-    # Cloud Run 環境下從 metadata server 取得
+    def signed_url(self, path: str) -> str:
+        # 使用 IAM signing（簽章憑證共用，token 快到期才 refresh）
+        return gcp_clients.generate_signed_url(self._bucket().blob(path))
+
+    def uri(self, path: str) -> str:
+        return f"gs://{GCS_BUCKET}/{path}"
+
+    def evict(self, path: str) -> None:
+        # pdf_path 可能已存進資料庫（/regenerate-url 會再用到），不刪除
+        pass
+
+
+pdf_cache = PdfCache(LocalPdfStore() if PDF_CACHE_BACKEND == "local" else GCSPdfStore())
+
+
+async def render_pdf(html_content: str) -> bytes:
+    """在渲染 pool 中生成 PDF；佇列已滿回 429，逾時回 504"""
     try:
-        import urllib.request
-        req = urllib.request.Request(
-            'http://metadata.google.internal/computeMetadata/v1/instance/service-accounts/default/email',
-            headers={'Metadata-Flavor': 'Google'}
-        )
-        email = urllib.request.urlopen(req, timeout=5).read().decode().strip()
-        if email and '@' in email:
-            logger.info(f"Got service account from metadata: {email}")
-            return email
-    except Exception as e:
-        logger.warning(f"Failed to get service account from metadata: {e}")
+        return await render_pool.render(html_content)
+    except RenderPoolFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="PDF 渲染逾時")
+
+# Jinja2 模板
+jinja_env = create_jinja_env(TEMPLATE_DIR)
+template_status: Dict[str, Any] = {}
 
-    # 嘗試從專案號碼推導 (Cloud Run 預設使用 compute engine default service account)
-    project_number = os.getenv("GOOGLE_CLOUD_PROJECT_NUMBER", "743652001579")
-    fallback_email = f"{project_number}-compute@developer.gserviceaccount.com"
-    logger.info(f"Using fallback service account: {fallback_email}")
-    return fallback_email
 
-def generate_signed_url_with_iam(blob, expiration_seconds: int = SIGNED_URL_EXPIRATION):
+async def generate_document(
+    template,
+    template_data: Dict[str, Any],
+    path_prefix: str,
+    with_bytes: bool = False
+) -> Dict[str, Any]:
     """
-    使用 IAM signing 生成 signed URL
-    這可以在沒有私鑰的情況下運作（如 Cloud Run 預設認證）
+    渲染模板為 PDF 並存檔，內容與既有檔案相同時直接重用（不渲染、不上傳）
+
+    Args:
+        template: Jinja2 模板
+        template_data: 模板資料
+        path_prefix: 存放路徑前綴（例如 quotes/12/），檔名為內容 hash
+        with_bytes: 是否一併回傳 PDF 內容（批次合併用）
+
+    Returns:
+        {"pdf_url", "pdf_path", "cached"}，with_bytes 時另含 "pdf_bytes"
     """
-    from google.auth import compute_engine
-    from datetime import timedelta
-
-    # 取得當前認證
-    credentials, project = default()
-
-    # 如果是 Compute Engine 認證，需要使用 IAM signing
-    if isinstance(credentials, compute_engine.Credentials):
-        # 取得 signing credentials
-        service_account_email = get_service_account_email()
-        if not service_account_email:
-            raise Exception("無法取得服務帳戶 email")
-
-        # 重要：refresh credentials 以取得 access token
-        auth_request = requests.Request()
-        credentials.refresh(auth_request)
-
-        # 使用 service_account_email 和 access_token 參數進行 IAM signing
-        return blob.generate_signed_url(
-            version="v4",
-            expiration=timedelta(seconds=expiration_seconds),
-            method="GET",
-            service_account_email=service_account_email,
-            access_token=credentials.token
-        )
-    else:
-        # 如果有私鑰的認證（如本機開發），直接使用
-        return blob.generate_signed_url(
-            version="v4",
-            expiration=timedelta(seconds=expiration_seconds),
-            method="GET"
-        )
+    key = cache_key(template.name, template.filename, template_data)
 
-# Jinja2 模板
-TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
-jinja_env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+    async def produce() -> bytes:
+        return await render_pdf(template.render(**template_data))
+
+    result = await pdf_cache.get_or_create(key, f"{path_prefix}{key[:32]}.pdf", produce, with_bytes)
+    if result["cached"]:
+        logger.info(f"PDF cache hit: {result['pdf_path']}")
+    return result
 
 
 class ContractData(BaseModel):
@@ -273,6 +293,47 @@ class GenerateResponse(BaseModel):
     pdf_url: Optional[str] = None
     pdf_path: Optional[str] = None
     expires_at: Optional[str] = None
+    cached: bool = False
+
+
+class BatchItem(BaseModel):
+    """批次中的單份文件（contract_data / quote_data / legal_letter_data 擇一）"""
+    contract_data: Optional[ContractData] = None
+    quote_data: Optional[QuoteData] = None
+    legal_letter_data: Optional[LegalLetterData] = None
+    template: str = "contract_coworking"
+
+
+class BatchRequest(BaseModel):
+    """批次 PDF 生成請求（items 逐份以 BatchItem 驗證，單份資料有誤不影響其他文件）"""
+    items: List[Dict[str, Any]]
+    # urls：每份各自的連結；merged：另合併為一份 PDF；zip：另打包為 ZIP
+    output: Literal["urls", "merged", "zip"] = "urls"
+
+
+class BatchItemResult(BaseModel):
+    """批次中單份文件的結果"""
+    index: int
+    success: bool
+    doc_type: Optional[str] = None
+    doc_id: Optional[int] = None
+    doc_number: Optional[str] = None
+    pdf_url: Optional[str] = None
+    pdf_path: Optional[str] = None
+    cached: bool = False
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    """批次 PDF 生成回應（pdf_url / pdf_path 為合併檔，output=urls 時為空）"""
+    success: bool
+    message: str
+    output: str
+    items: List[BatchItemResult]
+    pdf_url: Optional[str] = None
+    pdf_path: Optional[str] = None
+    expires_at: Optional[str] = None
+    cached: bool = False
 
 
 def format_currency(amount: float) -> str:
@@ -317,10 +378,168 @@ def format_date_roc(date_str: str) -> str:
         return date_str
 
 
+# ============================================================================
+# 文件準備（單份 endpoint 與 /generate-batch 共用）
+# ============================================================================
+
+def prepare_document(request: GenerateRequest) -> Dict[str, Any]:
+    """
+    準備合約或報價單的模板與資料
+
+    Returns:
+        {"template", "template_data", "path_prefix", "doc_type", "doc_id", "doc_number", "message"}
+    """
+    template_name = f"{request.template}.html"
+
+    # 根據類型準備資料
+    if request.quote_data:
+        # 報價單
+        data = request.quote_data
+        template_data = {
+            **data.model_dump(),
+            "items": [item.model_dump() for item in data.items],
+        }
+        doc_type = "quote"
+        doc_id = data.quote_id
+        doc_number = data.quote_number
+        gcs_folder = "quotes"
+        template_name = "quote.html"
+        success_msg = "報價單 PDF 生成成功"
+
+    elif request.contract_data:
+        # 合約
+        data = request.contract_data
+
+        # 處理新舊欄位兼容
+        monthly_rent = data.monthly_rent or data.monthly_fee or 0
+        deposit = data.deposit_amount or data.deposit or 0
+        original_price = data.original_price or data.list_price or monthly_rent
+        party_b_name = data.company_name or data.representative_name or data.customer_name or ""
+        phone = data.phone or data.contact_phone or ""
+        email_addr = data.email or data.contact_email or ""
+        tax_id = data.company_tax_id or data.tax_id or ""
+        address = data.representative_address or data.company_address or ""
+
+        template_data = {
+            **data.model_dump(),
+            # 格式化金額
+            "monthly_rent_formatted": format_currency(monthly_rent),
+            "monthly_fee_formatted": format_currency(monthly_rent),  # 向後兼容
+            "deposit_formatted": format_currency(deposit),
+            "deposit_amount_formatted": format_currency(deposit),
+            "original_price_formatted": format_currency(original_price),
+            "list_price_formatted": format_currency(original_price),  # 向後兼容
+            # 格式化日期
+            "start_date_formatted": format_date_chinese(data.start_date),
+            "start_date_roc": format_date_roc(data.start_date),
+            "end_date_formatted": format_date_chinese(data.end_date) if data.end_date else "",
+            "end_date_roc": format_date_roc(data.end_date) if data.end_date else "",
+            # 當天日期
+            "today": datetime.now().strftime("%Y年%m月%d日"),
+            "today_roc_year": str(datetime.now().year - 1911),
+            "today_month": str(datetime.now().month).zfill(2),
+            "today_day": str(datetime.now().day).zfill(2),
+            # 乙方（承租人）合併欄位
+            "party_b_name": party_b_name,
+            "party_b_phone": phone,
+            "party_b_email": email_addr,
+            "party_b_tax_id": tax_id,
+            "party_b_address": address,
+        }
+
+        # 根據合約類型選擇模板
+        template_map = {
+            "virtual_office": "contract_virtual_office.html",
+            "office": "contract_office.html",
+            "flex_seat": "contract_flex_seat.html",
+            "coworking_fixed": "contract_coworking.html",
+            "coworking_flexible": "contract_coworking.html",
+        }
+        template_name = template_map.get(data.contract_type, "contract_coworking.html")
+
+        doc_type = "contract"
+        doc_id = data.contract_id
+        doc_number = data.contract_number
+        gcs_folder = "contracts"
+        success_msg = "合約 PDF 生成成功"
+
+    else:
+        raise HTTPException(status_code=400, detail="需要提供 contract_data 或 quote_data")
+
+    template_data["generated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # 2. 取得模板
+    try:
+        template = jinja_env.get_template(template_name)
+    except Exception:
+        # 如果指定模板不存在，使用預設模板
+        logger.warning(f"Template {template_name} not found, using default")
+        template = jinja_env.get_template("contract_coworking.html")
+
+    return {
+        "template": template,
+        "template_data": template_data,
+        "path_prefix": f"{gcs_folder}/{doc_id}/",
+        "doc_type": doc_type,
+        "doc_id": doc_id,
+        "doc_number": doc_number,
+        "message": success_msg,
+    }
+
+
+def prepare_legal_letter(data: LegalLetterData) -> Dict[str, Any]:
+    """準備存證信函的模板與資料（回傳格式同 prepare_document）"""
+    template_data = {
+        **data.model_dump(),
+        "overdue_amount_formatted": format_currency(data.overdue_amount),
+        "today": datetime.now().strftime("%Y年%m月%d日"),
+        "today_roc_year": str(datetime.now().year - 1911),
+        "today_month": str(datetime.now().month),
+        "today_day": str(datetime.now().day),
+        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    try:
+        template = jinja_env.get_template("legal_letter.html")
+    except Exception as e:
+        logger.error(f"Template not found: {e}")
+        raise HTTPException(status_code=500, detail="存證信函模板不存在")
+
+    return {
+        "template": template,
+        "template_data": template_data,
+        "path_prefix": f"legal_letters/{data.letter_id}/",
+        "doc_type": "legal_letter",
+        "doc_id": data.letter_id,
+        "doc_number": data.letter_number,
+        "message": "存證信函 PDF 生成成功",
+    }
+
+
+def prepare_batch_item(item: BatchItem) -> Dict[str, Any]:
+    """準備批次中的單份文件"""
+    if item.legal_letter_data:
+        return prepare_legal_letter(item.legal_letter_data)
+    if item.contract_data or item.quote_data:
+        return prepare_document(GenerateRequest(
+            contract_data=item.contract_data,
+            quote_data=item.quote_data,
+            template=item.template
+        ))
+    raise HTTPException(status_code=400, detail="需要提供 contract_data、quote_data 或 legal_letter_data")
+
+
 @app.get("/health")
 async def health_check():
     """健康檢查"""
-    return {"status": "healthy", "service": "pdf-generator"}
+    return {
+        "status": "healthy",
+        "service": "pdf-generator",
+        "templates": template_status,
+        "render_pool": render_pool.get_stats(),
+        "pdf_cache": pdf_cache.get_stats(),
+        "gcp_clients": gcp_clients.get_stats()
+    }
 
 
 @app.post("/generate", response_model=GenerateResponse)
@@ -334,122 +553,23 @@ async def generate_pdf(request: GenerateRequest):
     4. 生成 Signed URL
     """
     try:
-        template_name = f"{request.template}.html"
-
-        # 根據類型準備資料
-        if request.quote_data:
-            # 報價單
-            data = request.quote_data
-            template_data = {
-                **data.model_dump(),
-                "items": [item.model_dump() for item in data.items],
-            }
-            doc_type = "quote"
-            doc_id = data.quote_id
-            doc_number = data.quote_number
-            gcs_folder = "quotes"
-            template_name = "quote.html"
-            success_msg = "報價單 PDF 生成成功"
-
-        elif request.contract_data:
-            # 合約
-            data = request.contract_data
-
-            # 處理新舊欄位兼容
-            monthly_rent = data.monthly_rent or data.monthly_fee or 0
-            deposit = data.deposit_amount or data.deposit or 0
-            original_price = data.original_price or data.list_price or monthly_rent
-            party_b_name = data.company_name or data.representative_name or data.customer_name or ""
-            phone = data.phone or data.contact_phone or ""
-            email_addr = data.email or data.contact_email or ""
-            tax_id = data.company_tax_id or data.tax_id or ""
-            address = data.representative_address or data.company_address or ""
-
-            template_data = {
-                **data.model_dump(),
-                # 格式化金額
-                "monthly_rent_formatted": format_currency(monthly_rent),
-                "monthly_fee_formatted": format_currency(monthly_rent),  # 向後兼容
-                "deposit_formatted": format_currency(deposit),
-                "deposit_amount_formatted": format_currency(deposit),
-                "original_price_formatted": format_currency(original_price),
-                "list_price_formatted": format_currency(original_price),  # 向後兼容
-                # 格式化日期
-                "start_date_formatted": format_date_chinese(data.start_date),
-                "start_date_roc": format_date_roc(data.start_date),
-                "end_date_formatted": format_date_chinese(data.end_date) if data.end_date else "",
-                "end_date_roc": format_date_roc(data.end_date) if data.end_date else "",
-                # 當天日期
-                "today": datetime.now().strftime("%Y年%m月%d日"),
-                "today_roc_year": str(datetime.now().year - 1911),
-                "today_month": str(datetime.now().month).zfill(2),
-                "today_day": str(datetime.now().day).zfill(2),
-                # 乙方（承租人）合併欄位
-                "party_b_name": party_b_name,
-                "party_b_phone": phone,
-                "party_b_email": email_addr,
-                "party_b_tax_id": tax_id,
-                "party_b_address": address,
-            }
-
-            # 根據合約類型選擇模板
-            template_map = {
-                "virtual_office": "contract_virtual_office.html",
-                "office": "contract_office.html",
-                "flex_seat": "contract_flex_seat.html",
-                "coworking_fixed": "contract_coworking.html",
-                "coworking_flexible": "contract_coworking.html",
-            }
-            template_name = template_map.get(data.contract_type, "contract_coworking.html")
-
-            doc_type = "contract"
-            doc_id = data.contract_id
-            doc_number = data.contract_number
-            gcs_folder = "contracts"
-            success_msg = "合約 PDF 生成成功"
-
-        else:
-            raise HTTPException(status_code=400, detail="需要提供 contract_data 或 quote_data")
+        # 1-2. 準備模板資料、取得模板
+        doc = prepare_document(request)
 
-        template_data["generated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        # 2. 渲染 HTML
-        try:
-            template = jinja_env.get_template(template_name)
-        except Exception:
-            # 如果指定模板不存在，使用預設模板
-            logger.warning(f"Template {template_name} not found, using default")
-            template = jinja_env.get_template("contract_coworking.html")
-
-        html_content = template.render(**template_data)
-
-        # 3. 生成 PDF
-        logger.info(f"Generating PDF for {doc_type} {doc_number}")
-        pdf_bytes = HTML(string=html_content).write_pdf()
-
-        # 4. 上傳到 GCS
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        blob_path = f"{gcs_folder}/{doc_id}/{timestamp}.pdf"
-
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(GCS_BUCKET)
-        blob = bucket.blob(blob_path)
-
-        blob.upload_from_string(pdf_bytes, content_type="application/pdf")
-        logger.info(f"Uploaded PDF to gs://{GCS_BUCKET}/{blob_path}")
-
-        # 5. 生成 Signed URL (使用 IAM signing)
-        signed_url = generate_signed_url_with_iam(blob)
+        # 3. 生成 PDF 並上傳到 GCS、生成 Signed URL（內容未變時重用既有檔案）
+        logger.info(f"Generating PDF for {doc['doc_type']} {doc['doc_number']}")
+        result = await generate_document(doc["template"], doc["template_data"], doc["path_prefix"])
         expires_at = (datetime.now() + timedelta(seconds=SIGNED_URL_EXPIRATION)).isoformat()
 
         return GenerateResponse(
             success=True,
-            message=success_msg,
-            pdf_url=signed_url,
-            pdf_path=f"gs://{GCS_BUCKET}/{blob_path}",
-            expires_at=expires_at
+            message=doc["message"],
+            expires_at=expires_at,
+            **result
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"PDF generation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -466,58 +586,117 @@ async def generate_legal_letter(request: LegalLetterRequest):
     4. 生成 Signed URL
     """
     try:
-        data = request.legal_letter_data
+        doc = prepare_legal_letter(request.legal_letter_data)
 
-        # 準備模板資料
-        template_data = {
-            **data.model_dump(),
-            "overdue_amount_formatted": format_currency(data.overdue_amount),
-            "today": datetime.now().strftime("%Y年%m月%d日"),
-            "today_roc_year": str(datetime.now().year - 1911),
-            "today_month": str(datetime.now().month),
-            "today_day": str(datetime.now().day),
-            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        }
+        # 生成 PDF 並上傳到 GCS、生成 Signed URL（內容未變時重用既有檔案）
+        logger.info(f"Generating legal letter PDF for {doc['doc_number']}")
+        result = await generate_document(doc["template"], doc["template_data"], doc["path_prefix"])
+        expires_at = (datetime.now() + timedelta(seconds=SIGNED_URL_EXPIRATION)).isoformat()
 
-        # 渲染 HTML
-        try:
-            template = jinja_env.get_template("legal_letter.html")
-        except Exception as e:
-            logger.error(f"Template not found: {e}")
-            raise HTTPException(status_code=500, detail="存證信函模板不存在")
+        return GenerateResponse(
+            success=True,
+            message=doc["message"],
+            expires_at=expires_at,
+            **result
+        )
 
-        html_content = template.render(**template_data)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Legal letter PDF generation failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # 生成 PDF
-        logger.info(f"Generating legal letter PDF for {data.letter_number}")
-        pdf_bytes = HTML(string=html_content).write_pdf()
 
-        # 上傳到 GCS
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        blob_path = f"legal_letters/{data.letter_id}/{timestamp}.pdf"
+@app.post("/generate-batch", response_model=BatchResponse)
+async def generate_batch(request: BatchRequest):
+    """
+    批次生成合約 / 報價單 / 存證信函 PDF
 
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(GCS_BUCKET)
-        blob = bucket.blob(blob_path)
+    1. 各份文件同時交給渲染 pool（同時進行數以 pool 容量為限，不會把佇列佔滿）
+    2. 每份各自經過 pdf_cache，內容未變的文件不重新渲染
+    3. output=merged / zip 時另將全部文件依序合併為一份 PDF / 打包為 ZIP，存到 batches/
+       （任一份失敗時不產生合併檔；相同文件組合重複請求時重用）
 
-        blob.upload_from_string(pdf_bytes, content_type="application/pdf")
-        logger.info(f"Uploaded legal letter PDF to gs://{GCS_BUCKET}/{blob_path}")
+    單份失敗不影響其他文件，錯誤記錄在 items[].error
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items 不可為空")
+    if len(request.items) > PDF_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"單次最多 {PDF_BATCH_MAX_ITEMS} 份文件")
 
-        # 生成 Signed URL (使用 IAM signing)
-        signed_url = generate_signed_url_with_iam(blob)
-        expires_at = (datetime.now() + timedelta(seconds=SIGNED_URL_EXPIRATION)).isoformat()
+    with_bytes = request.output != "urls"
+    # 上傳 / 產生 Signed URL 期間 worker 不閒置：同時進行 workers * 2 份
+    semaphore = asyncio.Semaphore(min(render_pool.workers * 2, render_pool.capacity))
 
-        return GenerateResponse(
-            success=True,
-            message="存證信函 PDF 生成成功",
-            pdf_url=signed_url,
-            pdf_path=f"gs://{GCS_BUCKET}/{blob_path}",
-            expires_at=expires_at
-        )
+    async def generate_item(index: int, raw: Dict[str, Any]):
+        result = BatchItemResult(index=index, success=False)
+        try:
+            doc = prepare_batch_item(BatchItem.model_validate(raw))
+            result.doc_type, result.doc_id, result.doc_number = doc["doc_type"], doc["doc_id"], doc["doc_number"]
+            async with semaphore:
+                generated = await generate_document(
+                    doc["template"], doc["template_data"], doc["path_prefix"], with_bytes
+                )
+        except HTTPException as e:
+            result.error = str(e.detail)
+            return result, None
+        except ValidationError as e:
+            result.error = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            )
+            return result, None
+        except Exception as e:
+            logger.error(f"Batch item {index} failed: {e}")
+            result.error = str(e)
+            return result, None
+
+        pdf_bytes = generated.pop("pdf_bytes", None)
+        for field, value in generated.items():
+            setattr(result, field, value)
+        result.success = True
+        return result, pdf_bytes
+
+    logger.info(f"Generating batch of {len(request.items)} PDFs (output={request.output})")
+    outcomes = await asyncio.gather(*[generate_item(i, item) for i, item in enumerate(request.items)])
+    items = [result for result, _ in outcomes]
+    failed = sum(1 for result in items if not result.success)
+    expires_at = (datetime.now() + timedelta(seconds=SIGNED_URL_EXPIRATION)).isoformat()
+    response = BatchResponse(
+        success=failed == 0,
+        message=f"批次 PDF 生成完成：成功 {len(items) - failed} 份，失敗 {failed} 份",
+        output=request.output,
+        items=items,
+        expires_at=expires_at
+    )
+    if not with_bytes or failed:
+        return response
+
+    # 合併 / 打包（內容由各份 pdf_path 決定，已存在時直接重用）
+    key = batch_key(request.output, [result.pdf_path for result in items])
+
+    async def produce() -> bytes:
+        if request.output == "merged":
+            return await asyncio.to_thread(merge_pdfs, [pdf_bytes for _, pdf_bytes in outcomes])
+        files = [
+            (f"{result.doc_number or f'{result.doc_type}_{result.doc_id}'}.pdf", pdf_bytes)
+            for result, pdf_bytes in outcomes
+        ]
+        return await asyncio.to_thread(zip_pdfs, files)
 
+    try:
+        artifact = await pdf_cache.get_or_create(
+            key, f"batches/{key[:32]}{BATCH_EXTENSIONS[request.output]}", produce
+        )
     except Exception as e:
-        logger.error(f"Legal letter PDF generation failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.error(f"Batch {request.output} failed: {e}")
+        response.success = False
+        response.message = f"{response.message}；合併檔產生失敗：{e}"
+        return response
+
+    response.pdf_url = artifact["pdf_url"]
+    response.pdf_path = artifact["pdf_path"]
+    response.cached = artifact["cached"]
+    return response
 
 
 @app.post("/generate-floor-plan", response_model=GenerateResponse)
@@ -541,42 +720,29 @@ async def generate_floor_plan(request: FloorPlanRequest):
             "generated_at": request.generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         }
 
-        # 渲染 HTML
+        # 取得模板
         try:
             template = jinja_env.get_template("floor_plan.html")
         except Exception as e:
             logger.error(f"Template not found: {e}")
             raise HTTPException(status_code=500, detail="平面圖模板不存在")
 
-        html_content = template.render(**template_data)
-
-        # 生成 PDF
+        # 生成 PDF 並上傳到 GCS、生成 Signed URL（內容未變時重用既有檔案）
         logger.info(f"Generating floor plan PDF for {request.floor_plan.name}")
-        pdf_bytes = HTML(string=html_content).write_pdf()
-
-        # 上傳到 GCS
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        blob_path = f"floor_plans/{request.floor_plan.id}/{request.output_date}_{timestamp}.pdf"
-
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(GCS_BUCKET)
-        blob = bucket.blob(blob_path)
-
-        blob.upload_from_string(pdf_bytes, content_type="application/pdf")
-        logger.info(f"Uploaded floor plan PDF to gs://{GCS_BUCKET}/{blob_path}")
-
-        # 生成 Signed URL (使用 IAM signing)
-        signed_url = generate_signed_url_with_iam(blob)
+        result = await generate_document(
+            template, template_data, f"floor_plans/{request.floor_plan.id}/{request.output_date}_"
+        )
         expires_at = (datetime.now() + timedelta(seconds=SIGNED_URL_EXPIRATION)).isoformat()
 
         return GenerateResponse(
             success=True,
             message=f"{request.floor_plan.name} 平面圖 PDF 生成成功",
-            pdf_url=signed_url,
-            pdf_path=f"gs://{GCS_BUCKET}/{blob_path}",
-            expires_at=expires_at
+            expires_at=expires_at,
+            **result
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Floor plan PDF generation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -594,15 +760,13 @@ async def regenerate_signed_url(pdf_path: str):
         else:
             path = pdf_path
 
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(GCS_BUCKET)
-        blob = bucket.blob(path)
+        blob = gcp_clients.bucket(GCS_BUCKET).blob(path)
 
-        if not blob.exists():
+        if not await asyncio.to_thread(blob.exists):
             raise HTTPException(status_code=404, detail="PDF not found")
 
         # 使用 IAM signing
-        signed_url = generate_signed_url_with_iam(blob)
+        signed_url = await asyncio.to_thread(gcp_clients.generate_signed_url, blob)
 
         return {
             "success": True,
@@ -610,6 +774,8 @@ async def regenerate_signed_url(pdf_path: str):
             "expires_at": (datetime.now() + timedelta(seconds=SIGNED_URL_EXPIRATION)).isoformat()
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to regenerate URL: {e}")
         raise HTTPException(status_code=500, detail=str(e))
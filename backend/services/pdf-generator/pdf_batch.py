@@ -0,0 +1,57 @@
+"""
+Hour Jungle CRM - PDF Batch
+批次文件的合併 / 打包
+
+/generate-batch 將多份合約、報價單、存證信函同時交給渲染 pool，
+output=merged 時合併為一份 PDF（依請求順序），output=zip 時打包為 ZIP；
+合併檔以各份文件的 pdf_path（已含內容 hash）決定 key，同一批內容重複請求時直接重用
+"""
+
+import hashlib
+import io
+import zipfile
+from typing import Iterable, List, Tuple
+
+BATCH_EXTENSIONS = {
+    "merged": ".pdf",
+    "zip": ".zip",
+}
+
+
+def batch_key(output: str, pdf_paths: Iterable[str]) -> str:
+    """批次合併檔的 key（相同輸出格式 + 相同文件與順序 → 相同 key）"""
+    payload = "\n".join([output, *pdf_paths])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def merge_pdfs(parts: List[bytes]) -> bytes:
+    """依序合併多份 PDF（blocking，請以 asyncio.to_thread 呼叫）"""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for pdf_bytes in parts:
+        writer.append(io.BytesIO(pdf_bytes))
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def zip_pdfs(files: List[Tuple[str, bytes]]) -> bytes:
+    """
+    打包多份 PDF（blocking，請以 asyncio.to_thread 呼叫）
+
+    Args:
+        files: [(檔名, PDF bytes)]，重複檔名自動加上序號
+    """
+    output = io.BytesIO()
+    used = set()
+    # PDF 已壓縮，再壓縮效益很低，直接存入
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as archive:
+        for filename, pdf_bytes in files:
+            stem, name, n = filename.rsplit(".", 1)[0], filename, 1
+            while name in used:
+                n += 1
+                name = f"{stem}_{n}.pdf"
+            used.add(name)
+            archive.writestr(name, pdf_bytes)
+    return output.getvalue()
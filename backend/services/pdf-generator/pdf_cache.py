@@ -0,0 +1,270 @@
+"""
+Hour Jungle CRM - PDF Cache
+內容定址 PDF 快取
+
+同一份報價單 / 合約資料重複生成（員工連點、MCP 工具重試）時，不重新渲染也不重新上傳，
+只對既有檔案產生新的 Signed URL
+
+- key = sha256(模板名稱 + 模板檔內容 hash + 正規化後的模板資料)
+  - 正規化：JSON 排序鍵值，排除每次都不同的欄位（generated_at）
+  - 模板檔修改後 hash 改變，舊快取自然失效
+- 檔名由 key 決定（{folder}/{doc_id}/{key}.pdf），重新啟動後仍可用 store.stat() 找回
+- 索引：process 內 LRU（PDF_CACHE_MAX_ENTRIES）+ TTL（PDF_CACHE_TTL），超過 TTL 重新渲染覆寫
+- 淘汰：LocalPdfStore 刪除檔案；GCS 不刪除（pdf_path 會存進資料庫，/regenerate-url 仍需要）
+- 相同 key 的併發請求共用同一次渲染
+- with_bytes=True 時一併回傳 PDF 內容（批次合併用；命中快取時由 store.load() 讀回）
+- PDF_CACHE_BACKEND=local 時改存本機目錄（測試、本機開發用）
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Protocol, Tuple
+
+logger = logging.getLogger(__name__)
+
+PDF_CACHE_ENABLED = os.getenv("PDF_CACHE_ENABLED", "true").lower() == "true"
+PDF_CACHE_BACKEND = os.getenv("PDF_CACHE_BACKEND", "gcs")  # gcs / local
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "/tmp/pdf-cache")
+PDF_CACHE_MAX_ENTRIES = int(os.getenv("PDF_CACHE_MAX_ENTRIES", "1000"))
+PDF_CACHE_TTL = float(os.getenv("PDF_CACHE_TTL", str(30 * 86400)))  # 秒
+
+# 不影響 PDF 實質內容、每次呼叫都不同的欄位
+VOLATILE_KEYS = frozenset({"generated_at"})
+
+Producer = Callable[[], Awaitable[bytes]]
+
+
+# ============================================================================
+# Key
+# ============================================================================
+
+_template_versions: Dict[str, Tuple[int, str]] = {}
+
+
+def template_version(path: str) -> str:
+    """模板檔內容 hash（依 mtime 快取，檔案修改後重新計算）"""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _template_versions.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _template_versions[path] = (mtime, digest)
+    return digest
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def cache_key(template_name: str, template_path: str, template_data: Dict[str, Any]) -> str:
+    """PDF 內容的 key（相同模板版本 + 相同資料 → 相同 key）"""
+    payload = json.dumps(
+        {
+            "template": template_name,
+            "version": template_version(template_path),
+            "data": _normalize(template_data),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ============================================================================
+# Store
+# ============================================================================
+
+class PdfStore(Protocol):
+    """PDF 存放位置（方法皆為 blocking，由 PdfCache 以 asyncio.to_thread 呼叫）"""
+
+    def stat(self, path: str) -> Optional[float]:
+        """檔案建立時間（epoch 秒），不存在回傳 None"""
+
+    def save(self, path: str, pdf_bytes: bytes) -> None:
+        """寫入檔案"""
+
+    def load(self, path: str) -> bytes:
+        """讀取檔案"""
+
+    def signed_url(self, path: str) -> str:
+        """下載連結"""
+
+    def uri(self, path: str) -> str:
+        """回傳給呼叫端保存的位置（pdf_path）"""
+
+    def evict(self, path: str) -> None:
+        """快取淘汰時呼叫"""
+
+
+class LocalPdfStore:
+    """本機目錄（測試、本機開發用）"""
+
+    def __init__(self, root: str = PDF_CACHE_DIR):
+        self.root = Path(root)
+
+    def _file(self, path: str) -> Path:
+        return self.root / path
+
+    def stat(self, path: str) -> Optional[float]:
+        try:
+            return self._file(path).stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def save(self, path: str, pdf_bytes: bytes) -> None:
+        file = self._file(path)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = file.with_suffix(".tmp")
+        tmp.write_bytes(pdf_bytes)
+        tmp.replace(file)
+
+    def load(self, path: str) -> bytes:
+        return self._file(path).read_bytes()
+
+    def signed_url(self, path: str) -> str:
+        return self._file(path).resolve().as_uri()
+
+    def uri(self, path: str) -> str:
+        return self.signed_url(path)
+
+    def evict(self, path: str) -> None:
+        self._file(path).unlink(missing_ok=True)
+
+
+# ============================================================================
+# Cache
+# ============================================================================
+
+class PdfCache:
+    """內容定址 PDF 快取"""
+
+    def __init__(
+        self,
+        store: PdfStore,
+        max_entries: int = PDF_CACHE_MAX_ENTRIES,
+        ttl: float = PDF_CACHE_TTL,
+        enabled: bool = PDF_CACHE_ENABLED
+    ):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+
+        # key -> (path, stored_at)
+        self._index: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.stats = {
+            "hits": 0,
+            "store_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "errors": 0,
+        }
+
+    def _remember(self, key: str, path: str, stored_at: float):
+        self._index[key] = (path, stored_at)
+        self._index.move_to_end(key)
+        while len(self._index) > self.max_entries:
+            _, (old_path, _) = self._index.popitem(last=False)
+            self.stats["evictions"] += 1
+            try:
+                self.store.evict(old_path)
+            except Exception as e:
+                logger.warning(f"PDF cache evict failed: {e}")
+
+    async def _lookup(self, key: str, path: str) -> bool:
+        entry = self._index.get(key)
+        if entry is not None:
+            if entry[0] == path and time.time() - entry[1] < self.ttl:
+                self._index.move_to_end(key)
+                self.stats["hits"] += 1
+                return True
+            del self._index[key]
+
+        # 索引沒有（重新啟動、其他 instance 產生）：查檔案是否存在
+        try:
+            stored_at = await asyncio.to_thread(self.store.stat, path)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"PDF cache stat failed: {e}")
+            return False
+        if stored_at is not None and time.time() - stored_at < self.ttl:
+            self._remember(key, path, stored_at)
+            self.stats["store_hits"] += 1
+            return True
+        return False
+
+    async def _produce_and_store(self, key: str, path: str, produce: Producer) -> bytes:
+        pdf_bytes = await produce()
+        await asyncio.to_thread(self.store.save, path, pdf_bytes)
+        if self.enabled:
+            self._remember(key, path, time.time())
+        return pdf_bytes
+
+    async def get_or_create(
+        self,
+        key: str,
+        path: str,
+        produce: Producer,
+        with_bytes: bool = False
+    ) -> Dict[str, Any]:
+        """
+        取得 PDF 下載連結，快取未命中時呼叫 produce 渲染並存檔
+
+        Args:
+            key: cache_key() 的結果
+            path: 存放路徑（應包含 key，相同內容對應相同路徑）
+            produce: 渲染函數，回傳 PDF bytes
+            with_bytes: 是否一併回傳 PDF 內容（pdf_bytes）
+
+        Returns:
+            {"pdf_url", "pdf_path", "cached"}，with_bytes 時另含 "pdf_bytes"
+        """
+        pdf_bytes = None
+        cached = self.enabled and await self._lookup(key, path)
+        if cached:
+            if with_bytes:
+                pdf_bytes = await asyncio.to_thread(self.store.load, path)
+        else:
+            self.stats["misses"] += 1
+            future = self._inflight.get(path)
+            if future is None:
+                future = asyncio.ensure_future(self._produce_and_store(key, path, produce))
+                self._inflight[path] = future
+                future.add_done_callback(lambda _: self._inflight.pop(path, None))
+            pdf_bytes = await asyncio.shield(future)
+
+        signed_url = await asyncio.to_thread(self.store.signed_url, path)
+        result = {"pdf_url": signed_url, "pdf_path": self.store.uri(path), "cached": bool(cached)}
+        if with_bytes:
+            result["pdf_bytes"] = pdf_bytes
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得命中率統計"""
+        served = self.stats["hits"] + self.stats["store_hits"]
+        lookups = served + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._index),
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "enabled": self.enabled,
+            "backend": type(self.store).__name__
+        }
@@ -0,0 +1,43 @@
+"""
+Hour Jungle CRM - Render Assets
+模板預先編譯
+
+- 啟動時編譯 templates/*.html（Jinja2 Environment 內快取），編譯失敗在啟動 log 與 /health 就看得到，
+  不會等到請求時才靜默改用預設模板
+- 模板使用的自訂 filter 統一在 create_jinja_env 註冊
+"""
+
+import logging
+import os
+from typing import Any, Dict
+
+from jinja2 import Environment, FileSystemLoader
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
+
+def create_jinja_env(template_dir: str = TEMPLATE_DIR) -> Environment:
+    """建立 Jinja2 環境（含模板使用的自訂 filter）"""
+    env = Environment(loader=FileSystemLoader(template_dir))
+    env.filters["zfill"] = lambda value, width=2: str(value).zfill(width)
+    return env
+
+
+def precompile_templates(env: Environment) -> Dict[str, Any]:
+    """
+    編譯所有 .html 模板（結果快取在 env 內）
+
+    Returns:
+        {"compiled": [...], "failed": {name: error}}
+    """
+    compiled, failed = [], {}
+    for name in env.list_templates(extensions=["html"]):
+        try:
+            env.get_template(name)
+            compiled.append(name)
+        except Exception as e:
+            failed[name] = str(e)
+            logger.error(f"Template {name} failed to compile: {e}")
+    return {"compiled": compiled, "failed": failed}
@@ -0,0 +1,228 @@
+"""
+Hour Jungle CRM - PDF Render Pool
+WeasyPrint 渲染 process pool
+
+WeasyPrint 是 CPU-bound（一份合約數百毫秒），直接在 async endpoint 內呼叫
+write_pdf() 會卡住整個 Uvicorn worker，其他請求（含 /health）全部排隊
+
+- 渲染交給 PDF_RENDER_WORKERS 個 worker，每個 worker 是只有一個 process 的
+  ProcessPoolExecutor（spawn），閒置的 worker 放在佇列中，渲染時取出一個使用
+- 每個 worker 啟動時先渲染一份含中文字型的小文件，載入 Pango / fontconfig 與字型快取，
+  第一個真正的請求不必付這個成本；服務啟動時即建立所有 worker
+- 有界佇列：執行中 + 等待中超過 workers + PDF_RENDER_QUEUE_SIZE 時直接拒絕（RenderPoolFull → HTTP 429）
+- worker 開始執行後超過 PDF_RENDER_TIMEOUT 秒視為失敗（排隊等待閒置 worker 的時間不計）；
+  逾時或異常結束時只結束並重建該 worker，其他 worker 上進行中的渲染不受影響
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))  # 建議等於 Cloud Run vCPU 數
+PDF_RENDER_QUEUE_SIZE = int(os.getenv("PDF_RENDER_QUEUE_SIZE", str(PDF_RENDER_WORKERS * 4)))
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "60"))  # 秒
+
+# 預熱用文件：與模板相同的字型，讓 fontconfig 先掃描並快取 CJK 字型
+WARMUP_HTML = """<!DOCTYPE html>
+<html><head><meta charset="UTF-8"><style>
+@page { size: A4; margin: 20mm; }
+body { font-family: "Noto Sans CJK TC", "Microsoft JhengHei", sans-serif; font-size: 12pt; }
+th, td { border: 1px solid #333; padding: 4px; }
+</style></head>
+<body><h1>預熱 Warm-up</h1><table><tr><th>項目</th><td>1,234</td></tr></table></body></html>"""
+
+
+class RenderPoolFull(Exception):
+    """渲染佇列已滿"""
+
+
+# ============================================================================
+# Worker process
+# ============================================================================
+
+def _init_worker():
+    """worker 啟動時執行：載入 WeasyPrint 並渲染一次預熱文件"""
+    from weasyprint import HTML
+    HTML(string=WARMUP_HTML).write_pdf()
+
+
+def _render(html_content: str) -> bytes:
+    """在 worker 內渲染 PDF"""
+    from weasyprint import HTML
+    return HTML(string=html_content).write_pdf()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# ============================================================================
+# Pool
+# ============================================================================
+
+class RenderPool:
+    """WeasyPrint 渲染 process pool（有界佇列）"""
+
+    def __init__(
+        self,
+        workers: int = PDF_RENDER_WORKERS,
+        queue_size: int = PDF_RENDER_QUEUE_SIZE,
+        timeout: float = PDF_RENDER_TIMEOUT
+    ):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        # 每個 worker 一個單 process 的 executor；_idle 為閒置中的 worker（start 時建立）
+        self._executors: List[ProcessPoolExecutor] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._warming: Set[asyncio.Task] = set()
+        self._pending = 0
+
+        self.stats = {
+            "rendered": 0,
+            "rejected": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "restarts": 0,
+            "render_ms_total": 0.0,
+        }
+
+    @property
+    def capacity(self) -> int:
+        """同時接受的渲染數（執行中 + 等待中）"""
+        return self.workers + self.queue_size
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    async def _warm_up(self, executor: ProcessPoolExecutor) -> Optional[int]:
+        """啟動 worker process（執行 initializer），完成後放入閒置佇列"""
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, _ping)
+        except Exception as e:
+            logger.error(f"PDF render worker warm-up failed: {e}")
+            return None
+        finally:
+            self._release(executor)
+
+    def _release(self, executor: ProcessPoolExecutor):
+        """worker 執行完畢，放回閒置佇列（已被替換或 pool 已關閉則略過）"""
+        if self._idle is not None and executor in self._executors:
+            self._idle.put_nowait(executor)
+
+    def _job_done(self, executor: ProcessPoolExecutor, job: Future):
+        """渲染結束：worker 放回閒置佇列；process 異常結束（含逾時被終止）則替換該 worker"""
+        if not job.cancelled() and isinstance(job.exception(), BrokenProcessPool):
+            self._recycle(executor)
+        else:
+            self._release(executor)
+
+    async def start(self):
+        """建立所有 worker 並等待預熱完成（lifespan 呼叫）"""
+        if self._idle is not None:
+            return
+        started = time.perf_counter()
+        self._idle = asyncio.Queue()
+        self._executors = [self._create_executor() for _ in range(self.workers)]
+        pids = await asyncio.gather(*[self._warm_up(executor) for executor in self._executors])
+        logger.info(
+            f"PDF render pool ready: {len(set(filter(None, pids)))} workers, queue {self.queue_size}, "
+            f"warm-up {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+
+    def shutdown(self):
+        """關閉所有 worker（lifespan 結束時呼叫）"""
+        for task in list(self._warming):
+            task.cancel()
+        executors, self._executors, self._idle = self._executors, [], None
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _recycle(self, executor: ProcessPoolExecutor, terminate: bool = False):
+        """只替換這個 worker：結束舊 process，新 worker 預熱完成後放入閒置佇列"""
+        if terminate:
+            # 逾時的 worker 仍在執行，shutdown 不會停止它，直接結束該 process
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        if executor not in self._executors:
+            return
+
+        logger.warning("PDF render worker stuck or exited, replacing it")
+        self.stats["restarts"] += 1
+        replacement = self._create_executor()
+        self._executors[self._executors.index(executor)] = replacement
+        task = asyncio.ensure_future(self._warm_up(replacement))
+        self._warming.add(task)
+        task.add_done_callback(self._warming.discard)
+
+    async def render(self, html_content: str) -> bytes:
+        """
+        渲染 HTML 為 PDF
+
+        Raises:
+            RenderPoolFull: 執行中 + 等待中的渲染已達上限
+            asyncio.TimeoutError: worker 開始執行後超過 PDF_RENDER_TIMEOUT
+        """
+        if self._pending >= self.capacity:
+            self.stats["rejected"] += 1
+            raise RenderPoolFull(f"PDF 渲染佇列已滿（{self.capacity}），請稍後再試")
+        if self._idle is None:
+            await self.start()
+
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            # 等待閒置 worker 的時間不計入逾時
+            executor = await self._idle.get()
+            loop = asyncio.get_running_loop()
+            job: Future = executor.submit(_render, html_content)
+            # 渲染真正結束後才放回閒置佇列（呼叫端取消時 worker 可能仍在執行）
+            job.add_done_callback(lambda _: loop.call_soon_threadsafe(self._job_done, executor, job))
+            pdf_bytes = await asyncio.wait_for(asyncio.wrap_future(job), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self._recycle(executor, terminate=True)
+            raise
+        except BrokenProcessPool:
+            self.stats["failed"] += 1
+            self._recycle(executor)
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self._pending -= 1
+
+        self.stats["rendered"] += 1
+        self.stats["render_ms_total"] += (time.perf_counter() - started) * 1000
+        return pdf_bytes
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得 pool 狀態"""
+        rendered = self.stats["rendered"]
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "capacity": self.capacity,
+            "in_flight": self._pending,
+            "idle_workers": self._idle.qsize() if self._idle is not None else 0,
+            "running": self._idle is not None,
+            **{k: v for k, v in self.stats.items() if k != "render_ms_total"},
+            "avg_render_ms": round(self.stats["render_ms_total"] / rendered, 1) if rendered else 0.0
+        }
+
+
+# 全域 pool
+render_pool = RenderPool()
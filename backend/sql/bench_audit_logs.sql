@@ -0,0 +1,155 @@
+-- ============================================================================
+-- 審計日誌寫入放大比較（Migration 117）
+--
+-- 在交易內以 payments 模擬兩種批次作業（各 2 萬筆）：
+--   - INSERT：每月產生應收（generate_monthly_payments）
+--   - UPDATE：批次更新逾期（batch_update_overdue_status，只改 payment_status）
+-- 分別在「不審計」、「舊版逐列 audit_trigger_function」、「新版 statement-level」下
+-- 量測執行時間、WAL 量、audit_logs 筆數與資料量
+-- 結束時 ROLLBACK，不留任何資料
+--
+-- 用法：psql -d <db> -f bench_audit_logs.sql
+-- 注意：session_replication_role = replica 會略過 FK 與觸發器，需 superuser
+-- ============================================================================
+
+\timing on
+BEGIN;
+
+SET LOCAL session_replication_role = replica;
+
+INSERT INTO customers (id, branch_id, name, phone, status)
+SELECT 1000000 + g, 1 + (g % 2), '客戶' || g, '09' || LPAD(g::TEXT, 8, '0'), 'active'
+FROM generate_series(1, 20000) AS g;
+
+INSERT INTO contracts (id, contract_number, customer_id, branch_id, contract_type, start_date, end_date, monthly_rent, status)
+SELECT 1000000 + g, 'BENCH-' || g, 1000000 + g, 1 + (g % 2), 'virtual_office',
+       DATE '2025-01-01', DATE '2026-12-31', 2000, 'active'
+FROM generate_series(1, 20000) AS g;
+
+SET LOCAL session_replication_role = origin;
+
+-- 舊版逐列審計（03_functions.sql 原定義，僅加上 variable_conflict 讓它能執行）
+CREATE FUNCTION pg_temp.audit_row_legacy()
+RETURNS TRIGGER AS $$
+#variable_conflict use_column
+DECLARE
+    old_data JSONB;
+    new_data JSONB;
+    changed_fields TEXT[];
+    key TEXT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        old_data := to_jsonb(OLD);
+        INSERT INTO audit_logs (table_name, record_id, action, old_data, new_data, changed_fields)
+        VALUES (TG_TABLE_NAME, OLD.id, 'DELETE', old_data, NULL, NULL);
+        RETURN OLD;
+    ELSIF TG_OP = 'UPDATE' THEN
+        old_data := to_jsonb(OLD);
+        new_data := to_jsonb(NEW);
+        SELECT array_agg(key) INTO changed_fields
+        FROM (
+            SELECT key
+            FROM jsonb_each(old_data) AS o(key, value)
+            WHERE old_data->key IS DISTINCT FROM new_data->key
+            AND key NOT IN ('updated_at')
+        ) AS changed;
+        IF changed_fields IS NOT NULL AND array_length(changed_fields, 1) > 0 THEN
+            INSERT INTO audit_logs (table_name, record_id, action, old_data, new_data, changed_fields)
+            VALUES (TG_TABLE_NAME, NEW.id, 'UPDATE', old_data, new_data, changed_fields);
+        END IF;
+        RETURN NEW;
+    ELSIF TG_OP = 'INSERT' THEN
+        new_data := to_jsonb(NEW);
+        INSERT INTO audit_logs (table_name, record_id, action, old_data, new_data, changed_fields)
+        VALUES (TG_TABLE_NAME, NEW.id, 'INSERT', NULL, new_data, NULL);
+        RETURN NEW;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 只留待測的審計 trigger（其餘 payments trigger 三組都停用）
+ALTER TABLE payments DISABLE TRIGGER USER;
+
+CREATE TEMP TABLE bench_result (
+    mode TEXT,
+    operation TEXT,
+    wal_bytes NUMERIC,
+    audit_rows BIGINT,
+    audit_bytes BIGINT
+);
+
+-- 每組：INSERT 2 萬筆應收，再把同一批改為逾期（payments id 區段不重疊）
+
+\echo '=== 1. 不審計（基準） ==='
+\set mode 'none'
+\set base 2000000
+SELECT pg_current_wal_insert_lsn() AS lsn0, (SELECT COALESCE(MAX(id), 0) FROM audit_logs) AS audit0 \gset
+INSERT INTO payments (id, contract_id, customer_id, branch_id, payment_type, payment_period, amount, payment_status, due_date)
+SELECT :base + g, 1000000 + g, 1000000 + g, 1 + (g % 2), 'rent', '2026-11', 2000, 'pending', DATE '2026-11-05'
+FROM generate_series(1, 20000) AS g;
+INSERT INTO bench_result
+SELECT :'mode', 'INSERT', pg_wal_lsn_diff(pg_current_wal_insert_lsn(), :'lsn0'),
+       COUNT(*), COALESCE(SUM(pg_column_size(a.*)), 0)
+FROM audit_logs a WHERE a.id > :audit0;
+
+SELECT pg_current_wal_insert_lsn() AS lsn0, (SELECT COALESCE(MAX(id), 0) FROM audit_logs) AS audit0 \gset
+UPDATE payments SET payment_status = 'overdue' WHERE id > :base AND id <= :base + 20000;
+INSERT INTO bench_result
+SELECT :'mode', 'UPDATE', pg_wal_lsn_diff(pg_current_wal_insert_lsn(), :'lsn0'),
+       COUNT(*), COALESCE(SUM(pg_column_size(a.*)), 0)
+FROM audit_logs a WHERE a.id > :audit0;
+
+\echo '=== 2. 舊版：逐列 audit_trigger_function ==='
+CREATE TRIGGER audit_payments_legacy
+    AFTER INSERT OR UPDATE OR DELETE ON payments
+    FOR EACH ROW EXECUTE FUNCTION pg_temp.audit_row_legacy();
+\set mode 'row (legacy)'
+\set base 3000000
+SELECT pg_current_wal_insert_lsn() AS lsn0, (SELECT COALESCE(MAX(id), 0) FROM audit_logs) AS audit0 \gset
+INSERT INTO payments (id, contract_id, customer_id, branch_id, payment_type, payment_period, amount, payment_status, due_date)
+SELECT :base + g, 1000000 + g, 1000000 + g, 1 + (g % 2), 'rent', '2026-11', 2000, 'pending', DATE '2026-11-05'
+FROM generate_series(1, 20000) AS g;
+INSERT INTO bench_result
+SELECT :'mode', 'INSERT', pg_wal_lsn_diff(pg_current_wal_insert_lsn(), :'lsn0'),
+       COUNT(*), COALESCE(SUM(pg_column_size(a.*)), 0)
+FROM audit_logs a WHERE a.id > :audit0;
+
+SELECT pg_current_wal_insert_lsn() AS lsn0, (SELECT COALESCE(MAX(id), 0) FROM audit_logs) AS audit0 \gset
+UPDATE payments SET payment_status = 'overdue' WHERE id > :base AND id <= :base + 20000;
+INSERT INTO bench_result
+SELECT :'mode', 'UPDATE', pg_wal_lsn_diff(pg_current_wal_insert_lsn(), :'lsn0'),
+       COUNT(*), COALESCE(SUM(pg_column_size(a.*)), 0)
+FROM audit_logs a WHERE a.id > :audit0;
+DROP TRIGGER audit_payments_legacy ON payments;
+
+\echo '=== 3. 新版：statement-level，只記錄變動欄位 ==='
+ALTER TABLE payments ENABLE TRIGGER audit_payments_insert;
+ALTER TABLE payments ENABLE TRIGGER audit_payments_update;
+\set mode 'statement'
+\set base 4000000
+SELECT pg_current_wal_insert_lsn() AS lsn0, (SELECT COALESCE(MAX(id), 0) FROM audit_logs) AS audit0 \gset
+INSERT INTO payments (id, contract_id, customer_id, branch_id, payment_type, payment_period, amount, payment_status, due_date)
+SELECT :base + g, 1000000 + g, 1000000 + g, 1 + (g % 2), 'rent', '2026-11', 2000, 'pending', DATE '2026-11-05'
+FROM generate_series(1, 20000) AS g;
+INSERT INTO bench_result
+SELECT :'mode', 'INSERT', pg_wal_lsn_diff(pg_current_wal_insert_lsn(), :'lsn0'),
+       COUNT(*), COALESCE(SUM(pg_column_size(a.*)), 0)
+FROM audit_logs a WHERE a.id > :audit0;
+
+SELECT pg_current_wal_insert_lsn() AS lsn0, (SELECT COALESCE(MAX(id), 0) FROM audit_logs) AS audit0 \gset
+UPDATE payments SET payment_status = 'overdue' WHERE id > :base AND id <= :base + 20000;
+INSERT INTO bench_result
+SELECT :'mode', 'UPDATE', pg_wal_lsn_diff(pg_current_wal_insert_lsn(), :'lsn0'),
+       COUNT(*), COALESCE(SUM(pg_column_size(a.*)), 0)
+FROM audit_logs a WHERE a.id > :audit0;
+
+\echo '=== 結果 ==='
+SELECT mode, operation,
+       pg_size_pretty(wal_bytes) AS wal,
+       audit_rows,
+       pg_size_pretty(audit_bytes) AS audit_data
+FROM bench_result
+ORDER BY operation, mode;
+
+ROLLBACK;
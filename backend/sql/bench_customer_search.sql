@@ -0,0 +1,95 @@
+-- ============================================================================
+-- 客戶搜尋效能比較（Migration 115）
+--
+-- 在交易內灌入 10 萬筆模擬客戶（含合約、繳費），比較：
+--   A. 舊做法：v_customer_summary + or=(name.ilike,phone.ilike,company_name.ilike)
+--   B. search_customers()：trigram 索引 + 只計算當頁統計
+-- 結束時 ROLLBACK，不留任何資料
+--
+-- 用法：psql -d <db> -f bench_customer_search.sql
+-- 注意：session_replication_role = replica 會略過 FK 與觸發器，需 superuser
+--
+-- 尚無量測結果：目前只在沒有 pg_trgm 的環境跑過（similarity() 以空函式代替、
+-- 沒有 trigram 索引），那組數字不代表 B 的實際效能。
+-- B 是否比 A 快、快多少，需在已安裝 pg_trgm 的資料庫執行本腳本後才能下結論
+-- （在此之前 crm_tools / 前端預設使用 A，CUSTOMER_SEARCH_RPC=true 才改用 B）；
+-- 沒有 pg_trgm 時本腳本直接中止，避免再量到替代實作
+-- ============================================================================
+
+\set ON_ERROR_STOP on
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        RAISE EXCEPTION '未安裝 pg_trgm（migration 115），量測結果不具參考價值';
+    END IF;
+END $$;
+
+\timing on
+BEGIN;
+
+SET LOCAL session_replication_role = replica;
+
+INSERT INTO customers (id, branch_id, name, company_name, company_tax_id, phone, status, created_at)
+SELECT
+    1000000 + g,
+    1 + (g % 2),
+    (ARRAY['陳','林','黃','張','李','王','吳','劉','蔡','楊','許','鄭','謝','洪','郭'])[1 + (g % 15)]
+        || (ARRAY['志','雅','俊','怡','建','淑','家','美','宗','佳','明','文','冠','婷','承'])[1 + ((g / 15) % 15)]
+        || (ARRAY['豪','玲','宏','君','華','芬','瑋','慧','翰','蓉','哲','琪','廷','萱','恩'])[1 + ((g / 225) % 15)],
+    CASE WHEN g % 3 = 0 THEN NULL ELSE
+        (ARRAY['和盛','宏達','永豐','大立','信義','聯成','富邦','台新','遠東','國泰'])[1 + (g % 10)]
+        || (ARRAY['國際','科技','實業','貿易','顧問','設計','開發','企業'])[1 + ((g / 10) % 8)]
+        || g::TEXT || '有限公司'
+    END,
+    CASE WHEN g % 3 = 0 THEN NULL ELSE LPAD((10000000 + g * 37 % 89999999)::TEXT, 8, '0') END,
+    '09' || SUBSTR(LPAD((g * 7919 % 100000000)::TEXT, 8, '0'), 1, 2) || '-'
+         || SUBSTR(LPAD((g * 7919 % 100000000)::TEXT, 8, '0'), 3, 3) || '-'
+         || SUBSTR(LPAD((g * 7919 % 100000000)::TEXT, 8, '0'), 6, 3),
+    (ARRAY['active','active','active','prospect','churned'])[1 + (g % 5)],
+    NOW() - (g || ' minutes')::INTERVAL
+FROM generate_series(1, 100000) AS g;
+
+INSERT INTO contracts (id, contract_number, customer_id, branch_id, contract_type, start_date, end_date, monthly_rent, status)
+SELECT 1000000 + g, 'BENCH-' || g, 1000000 + g, 1 + (g % 2), 'virtual_office',
+       DATE '2025-01-01', DATE '2026-12-31', 2000, 'active'
+FROM generate_series(1, 100000) AS g;
+
+INSERT INTO payments (contract_id, customer_id, branch_id, payment_type, payment_period, amount, payment_status, due_date)
+SELECT 1000000 + g, 1000000 + g, 1 + (g % 2), 'rent', TO_CHAR(DATE '2025-01-01' + (m || ' months')::INTERVAL, 'YYYY-MM'),
+       2000, (ARRAY['paid','paid','pending','overdue'])[1 + ((g + m) % 4)], DATE '2025-01-05' + (m || ' months')::INTERVAL
+FROM generate_series(1, 100000) AS g, generate_series(0, 5) AS m;
+
+ANALYZE customers;
+ANALYZE contracts;
+ANALYZE payments;
+
+-- A. 舊做法（PostgREST 對 v_customer_summary 的查詢）
+\o /dev/null
+SELECT * FROM v_customer_summary
+WHERE name ILIKE '%張雅%' OR phone ILIKE '%張雅%' OR company_name ILIKE '%張雅%'
+LIMIT 20;
+
+SELECT * FROM v_customer_summary
+WHERE name ILIKE '%和盛國際12%' OR phone ILIKE '%和盛國際12%' OR company_name ILIKE '%和盛國際12%'
+LIMIT 20;
+
+SELECT * FROM v_customer_summary
+WHERE name ILIKE '%0912%' OR phone ILIKE '%0912%' OR company_name ILIKE '%0912%'
+LIMIT 20;
+\o
+
+-- B. search_customers()
+SELECT id, name, company_name, phone, match_score, total_paid FROM search_customers('張雅', NULL, NULL, 20);
+SELECT id, name, company_name, phone, match_score, total_paid FROM search_customers('和盛國際12', NULL, NULL, 20);
+SELECT id, name, company_name, phone, match_score, total_paid FROM search_customers('0912', NULL, NULL, 20);
+-- 錯字（和勝 → 和盛）
+SELECT id, name, company_name, match_score FROM search_customers('和勝國際12', NULL, NULL, 5);
+
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT c.id FROM customers c
+WHERE c.name ILIKE '%和盛國際12%'
+   OR c.company_name ILIKE '%和盛國際12%'
+   OR c.name % '和盛國際12'
+   OR c.company_name % '和盛國際12';
+
+ROLLBACK;
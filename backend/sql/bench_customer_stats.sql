@@ -0,0 +1,118 @@
+-- ============================================================================
+-- 客戶統計效能比較（Migration 116）
+--
+-- 在交易內灌入 10 萬筆模擬客戶（10 萬合約、60 萬繳費），比較：
+--   A. 舊 v_customer_summary（每位客戶兩個 LATERAL 聚合）
+--   B. 新 v_customer_summary（JOIN customer_stats）
+-- 並量測 trigger 對批次更新的額外成本，最後以 reconcile_customer_stats() 確認無誤差
+-- 結束時 ROLLBACK，不留任何資料
+--
+-- 用法：psql -d <db> -f bench_customer_stats.sql
+-- 注意：session_replication_role = replica 會略過 FK 與觸發器，需 superuser
+-- ============================================================================
+
+\timing on
+BEGIN;
+
+SET LOCAL session_replication_role = replica;
+
+INSERT INTO customers (id, branch_id, name, phone, status, created_at)
+SELECT 1000000 + g, 1 + (g % 2), '客戶' || g, '09' || LPAD(g::TEXT, 8, '0'),
+       (ARRAY['active','active','active','prospect','churned'])[1 + (g % 5)],
+       NOW() - (g || ' minutes')::INTERVAL
+FROM generate_series(1, 100000) AS g;
+
+INSERT INTO contracts (id, contract_number, customer_id, branch_id, contract_type, start_date, end_date, monthly_rent, status)
+SELECT 1000000 + g, 'BENCH-' || g, 1000000 + g, 1 + (g % 2), 'virtual_office',
+       DATE '2025-01-01', DATE '2026-12-31', 2000, 'active'
+FROM generate_series(1, 100000) AS g;
+
+INSERT INTO payments (id, contract_id, customer_id, branch_id, payment_type, payment_period, amount, payment_status, due_date)
+SELECT 1000000 + g * 6 + m, 1000000 + g, 1000000 + g, 1 + (g % 2), 'rent',
+       TO_CHAR(DATE '2025-01-01' + (m || ' months')::INTERVAL, 'YYYY-MM'),
+       2000, (ARRAY['paid','paid','pending','pending'])[1 + ((g + m) % 4)],
+       DATE '2025-01-05' + (m || ' months')::INTERVAL
+FROM generate_series(1, 100000) AS g, generate_series(0, 5) AS m;
+
+SET LOCAL session_replication_role = origin;
+
+-- 舊定義（對照組）
+CREATE TEMP VIEW v_customer_summary_lateral AS
+SELECT
+    c.id, c.legacy_id, c.name, c.company_name, c.customer_type, c.phone, c.email,
+    c.line_user_id, c.status, c.risk_level, c.source_channel, c.created_at,
+    b.id AS branch_id, b.code AS branch_code, b.name AS branch_name,
+    COALESCE(cs.total_contracts, 0) AS total_contracts,
+    COALESCE(cs.active_contracts, 0) AS active_contracts,
+    cs.latest_contract_end,
+    COALESCE(ps.total_paid, 0) AS total_paid,
+    COALESCE(ps.pending_amount, 0) AS pending_amount,
+    COALESCE(ps.overdue_count, 0) AS overdue_count,
+    COALESCE(ps.overdue_amount, 0) AS overdue_amount,
+    af.id AS accounting_firm_id, af.name AS accounting_firm_name
+FROM customers c
+LEFT JOIN branches b ON c.branch_id = b.id
+LEFT JOIN accounting_firms af ON c.accounting_firm_id = af.id
+LEFT JOIN LATERAL (
+    SELECT COUNT(*) AS total_contracts,
+           COUNT(*) FILTER (WHERE status = 'active') AS active_contracts,
+           MAX(end_date) AS latest_contract_end
+    FROM contracts WHERE customer_id = c.id
+) cs ON true
+LEFT JOIN LATERAL (
+    SELECT COALESCE(SUM(amount) FILTER (WHERE payment_status = 'paid'), 0) AS total_paid,
+           COALESCE(SUM(amount) FILTER (WHERE payment_status = 'pending'), 0) AS pending_amount,
+           COUNT(*) FILTER (WHERE payment_status = 'overdue') AS overdue_count,
+           COALESCE(SUM(amount) FILTER (WHERE payment_status = 'overdue'), 0) AS overdue_amount
+    FROM payments WHERE customer_id = c.id
+) ps ON true;
+
+-- 建立 customer_stats（整批）
+SELECT reconcile_customer_stats();
+
+ANALYZE customers;
+ANALYZE contracts;
+ANALYZE payments;
+ANALYZE customer_stats;
+
+\echo '=== A. 舊 view ==='
+\o /dev/null
+SELECT * FROM v_customer_summary_lateral ORDER BY created_at DESC LIMIT 100;
+SELECT * FROM v_customer_summary_lateral WHERE status = 'active' ORDER BY pending_amount DESC LIMIT 50;
+SELECT * FROM v_customer_summary_lateral WHERE overdue_count > 0 LIMIT 50;
+\o
+
+\echo '=== B. 新 view（customer_stats） ==='
+\o /dev/null
+SELECT * FROM v_customer_summary ORDER BY created_at DESC LIMIT 100;
+SELECT * FROM v_customer_summary WHERE status = 'active' ORDER BY pending_amount DESC LIMIT 50;
+SELECT * FROM v_customer_summary WHERE overdue_count > 0 LIMIT 50;
+\o
+
+\echo '=== 批次更新逾期（2 萬筆）：含 customer_stats trigger ==='
+-- 只量 customer_stats 的成本：逐列 audit 與逐列風險等級 trigger 兩次都停用
+ALTER TABLE payments DISABLE TRIGGER audit_payments;
+ALTER TABLE payments DISABLE TRIGGER auto_update_customer_risk;
+UPDATE payments SET payment_status = 'overdue'
+WHERE id IN (SELECT id FROM payments WHERE id >= 1000000 AND payment_status = 'pending' LIMIT 20000);
+
+\echo '=== 同樣更新，停用 customer_stats trigger（對照） ==='
+ALTER TABLE payments DISABLE TRIGGER trg_customer_stats_payments_update;
+UPDATE payments SET payment_status = 'overdue'
+WHERE id IN (SELECT id FROM payments WHERE id >= 1000000 AND payment_status = 'pending' LIMIT 20000);
+ALTER TABLE payments ENABLE TRIGGER trg_customer_stats_payments_update;
+
+\echo '=== 對帳：只有停用 trigger 的那批客戶需要修正 ==='
+SELECT reconcile_customer_stats();
+SELECT reconcile_customer_stats();
+
+\echo '=== 新舊 view 結果一致（應為 0） ==='
+SELECT COUNT(*) FROM v_customer_summary n
+JOIN v_customer_summary_lateral o ON o.id = n.id
+WHERE (n.total_contracts, n.active_contracts, n.latest_contract_end, n.total_paid,
+       n.pending_amount, n.overdue_count, n.overdue_amount)
+      IS DISTINCT FROM
+      (o.total_contracts, o.active_contracts, o.latest_contract_end, o.total_paid,
+       o.pending_amount, o.overdue_count, o.overdue_amount);
+
+ROLLBACK;
@@ -0,0 +1,60 @@
+-- ============================================================================
+-- 報表聚合效能比較（Migration 110）
+--
+-- 在交易內灌入 50 萬筆模擬 payments，比較：
+--   A. 舊做法：拉回整段期間的原始資料（Python 端加總）
+--   B. report_payment_aggregates() 資料庫端彙總
+-- 結束時 ROLLBACK，不留任何資料
+--
+-- 用法：psql -d <db> -f bench_report_aggregates.sql
+-- 注意：session_replication_role = replica 會略過 FK 與觸發器，需 superuser
+-- ============================================================================
+
+\timing on
+BEGIN;
+
+SET LOCAL session_replication_role = replica;
+
+INSERT INTO payments (
+    contract_id, customer_id, branch_id, payment_type, payment_period,
+    amount, payment_status, due_date
+)
+SELECT
+    1 + (g % 5000),
+    1 + (g % 5000),
+    1 + (g % 2),
+    'rent',
+    to_char(d, 'YYYY-MM'),
+    1000 + (g % 50) * 100,
+    (ARRAY['paid', 'paid', 'paid', 'pending', 'overdue', 'waived'])[1 + (g % 6)],
+    d
+FROM generate_series(1, 500000) AS g,
+     LATERAL (SELECT DATE '2021-01-01' + (g % 2190) AS d) AS dd;
+
+ANALYZE payments;
+
+-- A. 舊做法：取回一年份原始資料（PostgREST 會把這些列全部序列化成 JSON）
+\o /dev/null
+SELECT id, amount, payment_status, due_date
+FROM payments
+WHERE due_date BETWEEN DATE '2024-01-01' AND DATE '2024-12-31';
+
+SELECT json_agg(t) FROM (
+    SELECT id, amount, payment_status, due_date
+    FROM payments
+    WHERE due_date BETWEEN DATE '2024-01-01' AND DATE '2024-12-31'
+) t;
+\o
+
+-- B. 資料庫端彙總
+SELECT * FROM report_payment_aggregates(DATE '2024-01-01', DATE '2024-12-31');
+
+SELECT * FROM report_payment_aggregates(DATE '2021-01-01', DATE '2026-12-31', NULL, 'year');
+
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT branch_id, date_trunc('month', due_date), payment_status, COUNT(*), SUM(amount)
+FROM payments
+WHERE due_date BETWEEN DATE '2024-01-01' AND DATE '2024-12-31'
+GROUP BY 1, 2, 3;
+
+ROLLBACK;
@@ -0,0 +1,153 @@
+-- ============================================================================
+-- Migration 110: 報表聚合函數（資料庫端彙總）
+--
+-- 解決問題：
+-- 1. report_tools.get_revenue_summary 下載整段期間的 payments 原始資料，
+--    在 Python 用多個 list comprehension 加總
+-- 2. 其 params 重複設定 due_date，下限被覆蓋，實際拉回全部付款歷史
+-- 3. get_overdue_list / get_commission_due 同樣在 Python 端計算統計
+--
+-- 解法：
+-- - report_payment_aggregates()：依場館 × 期間 × 狀態一次彙總（筆數 + 金額）
+-- - report_overdue_summary()：逾期統計（總額、客戶數、逾期等級分布）
+-- - report_commission_summary()：依介紹所彙總佣金
+-- - 複合索引 (due_date, branch_id, payment_status) INCLUDE (amount)，
+--   讓期間彙總可走 index-only scan
+--
+-- Date: 2026-01-05
+-- ============================================================================
+
+-- ============================================================================
+-- 1. 索引
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_payments_due_branch_status
+    ON payments (due_date, branch_id, payment_status)
+    INCLUDE (amount);
+
+-- ============================================================================
+-- 2. report_payment_aggregates() - 付款彙總（場館 × 期間 × 狀態）
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION report_payment_aggregates(
+    p_start_date DATE,
+    p_end_date DATE,
+    p_branch_id INTEGER DEFAULT NULL,
+    p_period_grain TEXT DEFAULT 'month'
+)
+RETURNS TABLE (
+    branch_id INTEGER,
+    period_start DATE,
+    payment_status VARCHAR,
+    payment_count BIGINT,
+    total_amount NUMERIC
+) AS $$
+BEGIN
+    IF p_period_grain NOT IN ('day', 'week', 'month', 'quarter', 'year') THEN
+        RAISE EXCEPTION '不支援的期間粒度: %（可用 day/week/month/quarter/year）', p_period_grain;
+    END IF;
+
+    RETURN QUERY
+    SELECT
+        p.branch_id,
+        date_trunc(p_period_grain, p.due_date)::DATE AS period_start,
+        p.payment_status,
+        COUNT(*) AS payment_count,
+        COALESCE(SUM(p.amount), 0) AS total_amount
+    FROM payments p
+    WHERE p.due_date BETWEEN p_start_date AND p_end_date
+      AND (p_branch_id IS NULL OR p.branch_id = p_branch_id)
+    GROUP BY p.branch_id, date_trunc(p_period_grain, p.due_date), p.payment_status
+    ORDER BY p.branch_id, period_start, p.payment_status;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+COMMENT ON FUNCTION report_payment_aggregates(DATE, DATE, INTEGER, TEXT) IS
+'付款彙總：依場館、期間（day/week/month/quarter/year）、付款狀態回傳筆數與金額';
+
+-- ============================================================================
+-- 3. report_overdue_summary() - 逾期統計
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION report_overdue_summary(
+    p_branch_id INTEGER DEFAULT NULL,
+    p_min_days INTEGER DEFAULT 0
+)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'total_count', COUNT(*),
+        'total_amount', COALESCE(SUM(od.total_due), 0),
+        'customer_count', COUNT(DISTINCT od.customer_id),
+        'by_level', jsonb_build_object(
+            'severe', COUNT(*) FILTER (WHERE od.days_overdue > 60),
+            'high', COUNT(*) FILTER (WHERE od.days_overdue BETWEEN 31 AND 60),
+            'medium', COUNT(*) FILTER (WHERE od.days_overdue BETWEEN 15 AND 30),
+            'low', COUNT(*) FILTER (WHERE od.days_overdue < 15)
+        )
+    )
+    FROM v_overdue_details od
+    WHERE (p_branch_id IS NULL OR od.branch_id = p_branch_id)
+      AND od.days_overdue >= COALESCE(p_min_days, 0);
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION report_overdue_summary(INTEGER, INTEGER) IS
+'逾期統計：總筆數、總金額、客戶數、逾期等級分布（>60/31-60/15-30/<15 天）';
+
+-- ============================================================================
+-- 4. report_commission_summary() - 佣金依介紹所彙總
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION report_commission_summary(
+    p_status TEXT DEFAULT 'eligible'
+)
+RETURNS TABLE (
+    firm_name TEXT,
+    firm_contact TEXT,
+    firm_phone TEXT,
+    commission_count BIGINT,
+    total_amount NUMERIC,
+    eligible_now_count BIGINT,
+    eligible_now_amount NUMERIC
+) AS $$
+    SELECT
+        COALESCE(ct.firm_name, '無介紹所')::TEXT AS firm_name,
+        MAX(ct.firm_contact)::TEXT AS firm_contact,
+        MAX(ct.firm_phone)::TEXT AS firm_phone,
+        COUNT(*) AS commission_count,
+        COALESCE(SUM(ct.commission_amount), 0) AS total_amount,
+        COUNT(*) FILTER (WHERE ct.is_eligible_now) AS eligible_now_count,
+        COALESCE(SUM(ct.commission_amount) FILTER (WHERE ct.is_eligible_now), 0) AS eligible_now_amount
+    FROM v_commission_tracker ct
+    -- 與 get_commission_due 一致：只有 eligible / pending 會篩選，其他值視為 all
+    WHERE p_status NOT IN ('eligible', 'pending')
+       OR ct.commission_status = p_status
+    GROUP BY COALESCE(ct.firm_name, '無介紹所')
+    ORDER BY total_amount DESC;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION report_commission_summary(TEXT) IS
+'佣金彙總：依介紹所回傳筆數、金額與目前可付款的筆數/金額';
+
+-- 授權
+GRANT EXECUTE ON FUNCTION report_payment_aggregates(DATE, DATE, INTEGER, TEXT) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION report_overdue_summary(INTEGER, INTEGER) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION report_commission_summary(TEXT) TO anon, authenticated;
+
+-- ============================================================================
+-- 5. 驗證
+-- ============================================================================
+
+DO $$
+DECLARE
+    v_rows INTEGER;
+    v_overdue JSONB;
+BEGIN
+    SELECT COUNT(*) INTO v_rows
+    FROM report_payment_aggregates(date_trunc('year', CURRENT_DATE)::DATE, CURRENT_DATE);
+
+    SELECT report_overdue_summary() INTO v_overdue;
+
+    RAISE NOTICE '=== Migration 110 完成 ===';
+    RAISE NOTICE '今年付款彙總列數: %', v_rows;
+    RAISE NOTICE '逾期統計: %', v_overdue;
+END $$;
@@ -0,0 +1,519 @@
+-- ============================================================================
+-- Migration 111: 營收快照（增量更新）
+--
+-- 問題：
+-- v_monthly_revenue / v_quarterly_revenue / v_yearly_revenue / v_company_* 與
+-- v_branch_revenue_summary 都是一般視圖，每次 Dashboard 載入都重掃全部 payments
+--
+-- 解法：
+-- - revenue_monthly_snapshot：月 × 場館的預先彙總表
+-- - payments 上的 statement-level trigger 只記錄「哪些月份被異動」（dirty months）
+-- - refresh_revenue_snapshot() 只重算 dirty months，以及上次 refresh 後
+--   因日期推進而改變逾期判斷的月份（pending 過了 due_date 會變成逾期）
+-- - 季 / 年 / 全公司視圖都從月快照加總，不再碰 payments
+-- - 由 MCP Server 的 APScheduler 定期呼叫（見 main.lifespan）
+--
+-- 不使用 MATERIALIZED VIEW：REFRESH MATERIALIZED VIEW 只能整張重算，無法只更新部分月份
+--
+-- 讀取：
+-- - 即時：v_monthly_revenue 等原視圖（不變）
+-- - 快照：v_monthly_revenue_snapshot 等 *_snapshot 視圖（欄位相同，另加 refreshed_at）
+--
+-- Date: 2026-01-05
+-- ============================================================================
+
+-- ============================================================================
+-- 1. 快照表
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS revenue_monthly_snapshot (
+    period_start DATE NOT NULL,
+    branch_id INTEGER,
+    revenue NUMERIC,
+    pending NUMERIC,
+    overdue NUMERIC,
+    total_due NUMERIC,
+    paid_count BIGINT NOT NULL DEFAULT 0,
+    pending_count BIGINT NOT NULL DEFAULT 0,
+    overdue_count BIGINT NOT NULL DEFAULT 0,
+    total_count BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_revenue_monthly_snapshot_period
+    ON revenue_monthly_snapshot (period_start, branch_id);
+
+COMMENT ON TABLE revenue_monthly_snapshot IS '月 × 場館營收快照（由 refresh_revenue_snapshot 維護）';
+
+-- 待重算月份（不設唯一鍵，避免同月份併發寫入互相等待；refresh 時 DISTINCT）
+CREATE TABLE IF NOT EXISTS revenue_snapshot_dirty_months (
+    period_start DATE NOT NULL,
+    marked_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE revenue_snapshot_dirty_months IS 'payments 異動過、尚未重算快照的月份';
+
+-- refresh 狀態（單列）
+CREATE TABLE IF NOT EXISTS revenue_snapshot_state (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    last_refreshed_at TIMESTAMPTZ,
+    last_refresh_date DATE,
+    last_full_refresh_at TIMESTAMPTZ,
+    last_months_refreshed INTEGER,
+    last_duration_ms INTEGER
+);
+
+INSERT INTO revenue_snapshot_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+-- ============================================================================
+-- 2. payments 異動 → 標記 dirty months
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION mark_revenue_months_dirty()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO revenue_snapshot_dirty_months (period_start)
+        SELECT DISTINCT DATE_TRUNC('month', n.due_date)::DATE FROM new_rows n;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO revenue_snapshot_dirty_months (period_start)
+        SELECT DISTINCT DATE_TRUNC('month', o.due_date)::DATE FROM old_rows o;
+
+    ELSE
+        -- 只有影響營收的欄位變動才需要重算（提醒次數、發票號碼等不算）
+        INSERT INTO revenue_snapshot_dirty_months (period_start)
+        SELECT DISTINCT m.period_start
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        CROSS JOIN LATERAL (VALUES
+            (DATE_TRUNC('month', n.due_date)::DATE),
+            (DATE_TRUNC('month', o.due_date)::DATE)
+        ) AS m(period_start)
+        WHERE (n.amount, n.payment_status, n.due_date, n.branch_id)
+              IS DISTINCT FROM (o.amount, o.payment_status, o.due_date, o.branch_id);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- transition table 不能用在多事件 trigger，分三個
+DROP TRIGGER IF EXISTS trg_revenue_dirty_insert ON payments;
+CREATE TRIGGER trg_revenue_dirty_insert
+    AFTER INSERT ON payments
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_revenue_months_dirty();
+
+DROP TRIGGER IF EXISTS trg_revenue_dirty_update ON payments;
+CREATE TRIGGER trg_revenue_dirty_update
+    AFTER UPDATE ON payments
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_revenue_months_dirty();
+
+DROP TRIGGER IF EXISTS trg_revenue_dirty_delete ON payments;
+CREATE TRIGGER trg_revenue_dirty_delete
+    AFTER DELETE ON payments
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_revenue_months_dirty();
+
+-- ============================================================================
+-- 3. refresh_revenue_snapshot() - 增量重算
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION refresh_revenue_snapshot(p_full BOOLEAN DEFAULT FALSE)
+RETURNS JSONB AS $$
+DECLARE
+    v_started_at TIMESTAMPTZ := clock_timestamp();
+    v_last_date DATE;
+    v_full BOOLEAN;
+    v_months DATE[];
+    v_rows INTEGER := 0;
+    v_duration_ms INTEGER;
+BEGIN
+    -- 同一時間只允許一個 refresh（多個 MCP instance 時其餘直接略過）
+    IF NOT pg_try_advisory_xact_lock(hashtext('refresh_revenue_snapshot')) THEN
+        RETURN jsonb_build_object(
+            'success', true,
+            'skipped', true,
+            'message', '已有其他 refresh 進行中'
+        );
+    END IF;
+
+    SELECT last_refresh_date INTO v_last_date
+    FROM revenue_snapshot_state
+    WHERE id = 1;
+
+    v_full := p_full OR v_last_date IS NULL;
+
+    IF v_full THEN
+        DELETE FROM revenue_snapshot_dirty_months;
+        DELETE FROM revenue_monthly_snapshot;
+
+        SELECT ARRAY(
+            SELECT DISTINCT DATE_TRUNC('month', due_date)::DATE FROM payments
+        ) INTO v_months;
+    ELSE
+        -- dirty months + 上次 refresh 到今天之間的月份（逾期判斷隨日期改變）
+        WITH dirty AS (
+            DELETE FROM revenue_snapshot_dirty_months
+            RETURNING period_start
+        )
+        SELECT ARRAY(
+            SELECT period_start FROM dirty
+            UNION
+            SELECT generate_series(
+                DATE_TRUNC('month', v_last_date),
+                DATE_TRUNC('month', CURRENT_DATE),
+                INTERVAL '1 month'
+            )::DATE
+        ) INTO v_months;
+
+        DELETE FROM revenue_monthly_snapshot
+        WHERE period_start = ANY(v_months);
+    END IF;
+
+    -- 與 v_monthly_revenue 相同的計算邏輯
+    INSERT INTO revenue_monthly_snapshot (
+        period_start, branch_id,
+        revenue, pending, overdue, total_due,
+        paid_count, pending_count, overdue_count, total_count,
+        refreshed_at
+    )
+    SELECT
+        m.period_start,
+        p.branch_id,
+        SUM(p.amount) FILTER (WHERE p.payment_status = 'paid'),
+        SUM(p.amount) FILTER (WHERE p.payment_status = 'pending' AND p.due_date >= CURRENT_DATE),
+        SUM(p.amount) FILTER (WHERE p.payment_status = 'overdue' OR (p.payment_status = 'pending' AND p.due_date < CURRENT_DATE)),
+        SUM(p.amount),
+        COUNT(*) FILTER (WHERE p.payment_status = 'paid'),
+        COUNT(*) FILTER (WHERE p.payment_status = 'pending' AND p.due_date >= CURRENT_DATE),
+        COUNT(*) FILTER (WHERE p.payment_status = 'overdue' OR (p.payment_status = 'pending' AND p.due_date < CURRENT_DATE)),
+        COUNT(*),
+        NOW()
+    FROM unnest(v_months) AS m(period_start)
+    JOIN payments p
+      ON p.due_date >= m.period_start
+     AND p.due_date < (m.period_start + INTERVAL '1 month')
+    GROUP BY m.period_start, p.branch_id;
+
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+    v_duration_ms := (EXTRACT(EPOCH FROM clock_timestamp() - v_started_at) * 1000)::INTEGER;
+
+    UPDATE revenue_snapshot_state SET
+        last_refreshed_at = NOW(),
+        last_refresh_date = CURRENT_DATE,
+        last_full_refresh_at = CASE WHEN v_full THEN NOW() ELSE last_full_refresh_at END,
+        last_months_refreshed = COALESCE(array_length(v_months, 1), 0),
+        last_duration_ms = v_duration_ms
+    WHERE id = 1;
+
+    RETURN jsonb_build_object(
+        'success', true,
+        'skipped', false,
+        'full', v_full,
+        'months_refreshed', COALESCE(array_length(v_months, 1), 0),
+        'rows_written', v_rows,
+        'duration_ms', v_duration_ms,
+        'refreshed_at', NOW()
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION refresh_revenue_snapshot(BOOLEAN) IS
+'增量重算營收快照：只處理 dirty months 與日期推進影響的月份；p_full = true 時全部重算';
+
+-- ============================================================================
+-- 4. 快照視圖（欄位與即時視圖相同，另加 refreshed_at）
+-- ============================================================================
+
+CREATE OR REPLACE VIEW v_monthly_revenue_snapshot AS
+SELECT
+    s.period_start,
+    TO_CHAR(s.period_start, 'YYYY-MM') AS period,
+    EXTRACT(YEAR FROM s.period_start)::int AS year,
+    EXTRACT(MONTH FROM s.period_start)::int AS month,
+    b.id AS branch_id,
+    b.name AS branch_name,
+    s.revenue,
+    s.pending,
+    s.overdue,
+    s.total_due,
+    s.paid_count,
+    s.pending_count,
+    s.overdue_count,
+    s.total_count,
+    ROUND(COALESCE(s.revenue / NULLIF(s.total_due, 0) * 100, 0), 1) AS collection_rate,
+    s.refreshed_at
+FROM revenue_monthly_snapshot s
+LEFT JOIN branches b ON s.branch_id = b.id
+ORDER BY s.period_start DESC, b.name;
+
+COMMENT ON VIEW v_monthly_revenue_snapshot IS '月度營收統計（快照版，對應 v_monthly_revenue）';
+
+CREATE OR REPLACE VIEW v_quarterly_revenue_snapshot AS
+SELECT
+    DATE_TRUNC('quarter', s.period_start)::date AS period_start,
+    TO_CHAR(s.period_start, 'YYYY') || '-Q' || EXTRACT(QUARTER FROM s.period_start) AS period,
+    EXTRACT(YEAR FROM s.period_start)::int AS year,
+    EXTRACT(QUARTER FROM s.period_start)::int AS quarter,
+    b.id AS branch_id,
+    b.name AS branch_name,
+    SUM(s.revenue) AS revenue,
+    SUM(s.pending) AS pending,
+    SUM(s.overdue) AS overdue,
+    SUM(s.total_due) AS total_due,
+    SUM(s.paid_count)::bigint AS paid_count,
+    SUM(s.total_count)::bigint AS total_count,
+    ROUND(COALESCE(SUM(s.revenue) / NULLIF(SUM(s.total_due), 0) * 100, 0), 1) AS collection_rate,
+    MIN(s.refreshed_at) AS refreshed_at
+FROM revenue_monthly_snapshot s
+LEFT JOIN branches b ON s.branch_id = b.id
+GROUP BY DATE_TRUNC('quarter', s.period_start),
+         TO_CHAR(s.period_start, 'YYYY') || '-Q' || EXTRACT(QUARTER FROM s.period_start),
+         EXTRACT(YEAR FROM s.period_start), EXTRACT(QUARTER FROM s.period_start),
+         b.id, b.name
+ORDER BY period_start DESC, branch_name;
+
+COMMENT ON VIEW v_quarterly_revenue_snapshot IS '季度營收統計（快照版，對應 v_quarterly_revenue）';
+
+CREATE OR REPLACE VIEW v_yearly_revenue_snapshot AS
+SELECT
+    DATE_TRUNC('year', s.period_start)::date AS period_start,
+    TO_CHAR(s.period_start, 'YYYY') AS period,
+    EXTRACT(YEAR FROM s.period_start)::int AS year,
+    b.id AS branch_id,
+    b.name AS branch_name,
+    SUM(s.revenue) AS revenue,
+    SUM(s.pending) AS pending,
+    SUM(s.overdue) AS overdue,
+    SUM(s.total_due) AS total_due,
+    SUM(s.paid_count)::bigint AS paid_count,
+    SUM(s.total_count)::bigint AS total_count,
+    ROUND(COALESCE(SUM(s.revenue) / NULLIF(SUM(s.total_due), 0) * 100, 0), 1) AS collection_rate,
+    MIN(s.refreshed_at) AS refreshed_at
+FROM revenue_monthly_snapshot s
+LEFT JOIN branches b ON s.branch_id = b.id
+GROUP BY DATE_TRUNC('year', s.period_start), TO_CHAR(s.period_start, 'YYYY'),
+         EXTRACT(YEAR FROM s.period_start), b.id, b.name
+ORDER BY period_start DESC, branch_name;
+
+COMMENT ON VIEW v_yearly_revenue_snapshot IS '年度營收統計（快照版，對應 v_yearly_revenue）';
+
+CREATE OR REPLACE VIEW v_company_monthly_revenue_snapshot AS
+WITH monthly_totals AS (
+    SELECT
+        s.period_start,
+        TO_CHAR(s.period_start, 'YYYY-MM') AS period,
+        EXTRACT(YEAR FROM s.period_start)::int AS year,
+        EXTRACT(MONTH FROM s.period_start)::int AS month,
+        SUM(s.revenue) AS revenue,
+        SUM(s.total_due) AS total_due,
+        SUM(s.paid_count)::bigint AS paid_count,
+        SUM(s.total_count)::bigint AS total_count,
+        MIN(s.refreshed_at) AS refreshed_at
+    FROM revenue_monthly_snapshot s
+    GROUP BY s.period_start
+)
+SELECT
+    m.period_start,
+    m.period,
+    m.year,
+    m.month,
+    COALESCE(m.revenue, 0) AS revenue,
+    COALESCE(m.total_due, 0) AS total_due,
+    COALESCE(m.paid_count, 0) AS paid_count,
+    COALESCE(m.total_count, 0) AS total_count,
+    COALESCE(prev.revenue, 0) AS prev_month_revenue,
+    CASE
+        WHEN COALESCE(prev.revenue, 0) = 0 THEN NULL
+        ELSE ROUND((COALESCE(m.revenue, 0) - COALESCE(prev.revenue, 0)) / prev.revenue * 100, 1)
+    END AS mom_change,
+    COALESCE(yoy.revenue, 0) AS prev_year_revenue,
+    CASE
+        WHEN COALESCE(yoy.revenue, 0) = 0 THEN NULL
+        ELSE ROUND((COALESCE(m.revenue, 0) - COALESCE(yoy.revenue, 0)) / yoy.revenue * 100, 1)
+    END AS yoy_change,
+    m.refreshed_at
+FROM monthly_totals m
+LEFT JOIN monthly_totals prev ON prev.period_start = m.period_start - INTERVAL '1 month'
+LEFT JOIN monthly_totals yoy ON yoy.year = m.year - 1 AND yoy.month = m.month
+ORDER BY m.period_start DESC;
+
+COMMENT ON VIEW v_company_monthly_revenue_snapshot IS '全公司月度營收匯總（快照版，對應 v_company_monthly_revenue）';
+
+CREATE OR REPLACE VIEW v_company_quarterly_revenue_snapshot AS
+WITH quarterly_totals AS (
+    SELECT
+        DATE_TRUNC('quarter', s.period_start)::date AS period_start,
+        TO_CHAR(s.period_start, 'YYYY') || '-Q' || EXTRACT(QUARTER FROM s.period_start) AS period,
+        EXTRACT(YEAR FROM s.period_start)::int AS year,
+        EXTRACT(QUARTER FROM s.period_start)::int AS quarter,
+        SUM(s.revenue) AS revenue,
+        SUM(s.total_due) AS total_due,
+        SUM(s.paid_count)::bigint AS paid_count,
+        SUM(s.total_count)::bigint AS total_count,
+        MIN(s.refreshed_at) AS refreshed_at
+    FROM revenue_monthly_snapshot s
+    GROUP BY DATE_TRUNC('quarter', s.period_start),
+             TO_CHAR(s.period_start, 'YYYY') || '-Q' || EXTRACT(QUARTER FROM s.period_start),
+             EXTRACT(YEAR FROM s.period_start), EXTRACT(QUARTER FROM s.period_start)
+)
+SELECT
+    q.period_start,
+    q.period,
+    q.year,
+    q.quarter,
+    COALESCE(q.revenue, 0) AS revenue,
+    COALESCE(q.total_due, 0) AS total_due,
+    COALESCE(q.paid_count, 0) AS paid_count,
+    COALESCE(q.total_count, 0) AS total_count,
+    COALESCE(prev.revenue, 0) AS prev_quarter_revenue,
+    CASE
+        WHEN COALESCE(prev.revenue, 0) = 0 THEN NULL
+        ELSE ROUND((COALESCE(q.revenue, 0) - COALESCE(prev.revenue, 0)) / prev.revenue * 100, 1)
+    END AS qoq_change,
+    COALESCE(yoy.revenue, 0) AS prev_year_revenue,
+    CASE
+        WHEN COALESCE(yoy.revenue, 0) = 0 THEN NULL
+        ELSE ROUND((COALESCE(q.revenue, 0) - COALESCE(yoy.revenue, 0)) / yoy.revenue * 100, 1)
+    END AS yoy_change,
+    q.refreshed_at
+FROM quarterly_totals q
+LEFT JOIN quarterly_totals prev ON prev.period_start = q.period_start - INTERVAL '3 months'
+LEFT JOIN quarterly_totals yoy ON yoy.year = q.year - 1 AND yoy.quarter = q.quarter
+ORDER BY q.period_start DESC;
+
+COMMENT ON VIEW v_company_quarterly_revenue_snapshot IS '全公司季度營收匯總（快照版，對應 v_company_quarterly_revenue）';
+
+CREATE OR REPLACE VIEW v_company_yearly_revenue_snapshot AS
+WITH yearly_totals AS (
+    SELECT
+        DATE_TRUNC('year', s.period_start)::date AS period_start,
+        TO_CHAR(s.period_start, 'YYYY') AS period,
+        EXTRACT(YEAR FROM s.period_start)::int AS year,
+        SUM(s.revenue) AS revenue,
+        SUM(s.total_due) AS total_due,
+        SUM(s.paid_count)::bigint AS paid_count,
+        SUM(s.total_count)::bigint AS total_count,
+        MIN(s.refreshed_at) AS refreshed_at
+    FROM revenue_monthly_snapshot s
+    GROUP BY DATE_TRUNC('year', s.period_start), TO_CHAR(s.period_start, 'YYYY'),
+             EXTRACT(YEAR FROM s.period_start)
+)
+SELECT
+    y.period_start,
+    y.period,
+    y.year,
+    COALESCE(y.revenue, 0) AS revenue,
+    COALESCE(y.total_due, 0) AS total_due,
+    COALESCE(y.paid_count, 0) AS paid_count,
+    COALESCE(y.total_count, 0) AS total_count,
+    COALESCE(prev.revenue, 0) AS prev_year_revenue,
+    CASE
+        WHEN COALESCE(prev.revenue, 0) = 0 THEN NULL
+        ELSE ROUND((COALESCE(y.revenue, 0) - COALESCE(prev.revenue, 0)) / prev.revenue * 100, 1)
+    END AS yoy_change,
+    y.refreshed_at
+FROM yearly_totals y
+LEFT JOIN yearly_totals prev ON prev.year = y.year - 1
+ORDER BY y.period_start DESC;
+
+COMMENT ON VIEW v_company_yearly_revenue_snapshot IS '全公司年度營收匯總（快照版，對應 v_company_yearly_revenue）';
+
+-- 場館摘要：本月金額取快照，客戶 / 合約數量仍即時計算（走 branch_id 索引，成本低）
+CREATE OR REPLACE VIEW v_branch_revenue_summary_snapshot AS
+SELECT
+    b.id AS branch_id,
+    b.code AS branch_code,
+    b.name AS branch_name,
+    COALESCE(monthly.revenue, 0) AS current_month_revenue,
+    COALESCE(monthly.pending, 0) AS current_month_pending,
+    COALESCE(monthly.overdue, 0) AS current_month_overdue,
+    COALESCE(monthly.paid_count, 0) AS current_month_paid_count,
+    COALESCE(monthly.pending_count, 0) AS current_month_pending_count,
+    COALESCE(monthly.overdue_count, 0) AS current_month_overdue_count,
+    COALESCE(customer_stats.total_customers, 0) AS total_customers,
+    COALESCE(customer_stats.active_customers, 0) AS active_customers,
+    COALESCE(contract_stats.total_contracts, 0) AS total_contracts,
+    COALESCE(contract_stats.active_contracts, 0) AS active_contracts,
+    COALESCE(contract_stats.expiring_soon, 0) AS contracts_expiring_30days,
+    monthly.refreshed_at
+FROM branches b
+LEFT JOIN revenue_monthly_snapshot monthly
+    ON monthly.branch_id = b.id
+   AND monthly.period_start = DATE_TRUNC('month', CURRENT_DATE)::date
+LEFT JOIN LATERAL (
+    SELECT
+        COUNT(*) AS total_customers,
+        COUNT(*) FILTER (WHERE status = 'active') AS active_customers
+    FROM customers
+    WHERE branch_id = b.id
+) customer_stats ON TRUE
+LEFT JOIN LATERAL (
+    SELECT
+        COUNT(*) AS total_contracts,
+        COUNT(*) FILTER (WHERE status = 'active') AS active_contracts,
+        COUNT(*) FILTER (WHERE status = 'active' AND end_date <= CURRENT_DATE + INTERVAL '30 days') AS expiring_soon
+    FROM contracts
+    WHERE branch_id = b.id
+) contract_stats ON TRUE
+WHERE b.status = 'active';
+
+COMMENT ON VIEW v_branch_revenue_summary_snapshot IS '場館營收摘要（快照版，對應 v_branch_revenue_summary）';
+
+-- 快照狀態
+CREATE OR REPLACE VIEW v_revenue_snapshot_status AS
+SELECT
+    st.last_refreshed_at,
+    st.last_refresh_date,
+    st.last_full_refresh_at,
+    st.last_months_refreshed,
+    st.last_duration_ms,
+    (SELECT COUNT(DISTINCT period_start) FROM revenue_snapshot_dirty_months) AS pending_dirty_months,
+    (SELECT COUNT(*) FROM revenue_monthly_snapshot) AS snapshot_rows
+FROM revenue_snapshot_state st
+WHERE st.id = 1;
+
+COMMENT ON VIEW v_revenue_snapshot_status IS '營收快照 refresh 狀態';
+
+-- ============================================================================
+-- 5. 授權
+-- ============================================================================
+
+GRANT SELECT ON revenue_monthly_snapshot TO anon, authenticated;
+GRANT SELECT ON v_monthly_revenue_snapshot TO anon, authenticated;
+GRANT SELECT ON v_quarterly_revenue_snapshot TO anon, authenticated;
+GRANT SELECT ON v_yearly_revenue_snapshot TO anon, authenticated;
+GRANT SELECT ON v_company_monthly_revenue_snapshot TO anon, authenticated;
+GRANT SELECT ON v_company_quarterly_revenue_snapshot TO anon, authenticated;
+GRANT SELECT ON v_company_yearly_revenue_snapshot TO anon, authenticated;
+GRANT SELECT ON v_branch_revenue_summary_snapshot TO anon, authenticated;
+GRANT SELECT ON v_revenue_snapshot_status TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION refresh_revenue_snapshot(BOOLEAN) TO anon, authenticated;
+
+-- ============================================================================
+-- 6. 初次全量建立 + 驗證
+-- ============================================================================
+
+DO $$
+DECLARE
+    v_result JSONB;
+    v_live_total NUMERIC;
+    v_snapshot_total NUMERIC;
+BEGIN
+    SELECT refresh_revenue_snapshot(TRUE) INTO v_result;
+
+    SELECT COALESCE(SUM(total_due), 0) INTO v_live_total FROM v_monthly_revenue;
+    SELECT COALESCE(SUM(total_due), 0) INTO v_snapshot_total FROM v_monthly_revenue_snapshot;
+
+    RAISE NOTICE '=== Migration 111 完成 ===';
+    RAISE NOTICE '初次 refresh: %', v_result;
+    RAISE NOTICE '即時 total_due: %, 快照 total_due: %', v_live_total, v_snapshot_total;
+
+    IF v_live_total <> v_snapshot_total THEN
+        RAISE WARNING '快照與即時視圖金額不一致，請檢查';
+    END IF;
+END $$;
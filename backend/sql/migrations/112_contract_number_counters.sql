@@ -0,0 +1,179 @@
+-- ============================================================================
+-- Migration 112: 合約編號計數器（每分館）
+--
+-- 問題：
+-- quote_tools / crm_tools 的 generate_contract_number() 先撈出所有
+-- DZ-% / HR-V% 合約編號（最多 2000 筆），在 Python 用 regex 找最大值 + 1
+-- - 隨歷史資料增加越來越慢
+-- - 兩個報價單同時轉合約會拿到相同編號（race condition）
+--
+-- 解法：
+-- - contract_number_counters：每分館一列，記錄前綴、位數、目前最大序號
+-- - allocate_contract_number(branch_id)：UPDATE ... RETURNING 原子遞增
+--   （row lock 只持有到 RPC 交易結束），回傳格式化後的編號
+-- - 手動輸入較大編號時，trigger 自動把計數器往上推，避免之後重號
+-- - 依現有合約編號回填計數器
+--
+-- 注意：合約建立失敗時該編號會被跳過（與 sequence 相同，不回收）
+--
+-- Date: 2026-01-05
+-- ============================================================================
+
+-- ============================================================================
+-- 1. 計數器表
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS contract_number_counters (
+    branch_id INTEGER PRIMARY KEY REFERENCES branches(id),
+    prefix VARCHAR(10) NOT NULL,
+    pad_width INTEGER NOT NULL DEFAULT 3,
+    -- 解析既有編號用的 regex（第一個 group 為序號），例如 DZ-E005 為已結束合約
+    number_pattern TEXT NOT NULL,
+    last_value INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+COMMENT ON TABLE contract_number_counters IS '合約編號計數器（每分館一列，由 allocate_contract_number 遞增）';
+
+-- ============================================================================
+-- 2. 回填：依現有合約編號設定起始值
+-- ============================================================================
+
+INSERT INTO contract_number_counters (branch_id, prefix, pad_width, number_pattern)
+SELECT v.branch_id, v.prefix, v.pad_width, v.number_pattern
+FROM (VALUES
+    (1, 'DZ-', 3, '^DZ-E?(\d+)'),   -- 大忠館：DZ-XXX
+    (2, 'HR-V', 2, '^HR-V(\d+)')    -- 環瑞館：HR-VXX
+) AS v(branch_id, prefix, pad_width, number_pattern)
+WHERE EXISTS (SELECT 1 FROM branches b WHERE b.id = v.branch_id)
+ON CONFLICT (branch_id) DO NOTHING;
+
+UPDATE contract_number_counters cnc
+SET last_value = GREATEST(cnc.last_value, COALESCE((
+        SELECT MAX(SUBSTRING(c.contract_number FROM cnc.number_pattern)::INTEGER)
+        FROM contracts c
+        WHERE c.contract_number ~ cnc.number_pattern
+    ), 0)),
+    updated_at = NOW();
+
+-- ============================================================================
+-- 3. allocate_contract_number() - 取號
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION allocate_contract_number(p_branch_id INTEGER)
+RETURNS TEXT AS $$
+DECLARE
+    v_prefix VARCHAR(10);
+    v_pad_width INTEGER;
+    v_value INTEGER;
+BEGIN
+    UPDATE contract_number_counters
+    SET last_value = last_value + 1,
+        updated_at = NOW()
+    WHERE branch_id = p_branch_id
+    RETURNING prefix, pad_width, last_value
+    INTO v_prefix, v_pad_width, v_value;
+
+    IF NOT FOUND THEN
+        -- 未設定計數器的分館，使用通用格式（與舊版 Python 相同）
+        RETURN 'HJ-' || TO_CHAR(CURRENT_DATE, 'YYYYMMDD') || '-' || p_branch_id;
+    END IF;
+
+    -- LPAD 會截斷超過位數的字串，只在不足位數時補零
+    RETURN v_prefix || CASE
+        WHEN LENGTH(v_value::TEXT) >= v_pad_width THEN v_value::TEXT
+        ELSE LPAD(v_value::TEXT, v_pad_width, '0')
+    END;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION allocate_contract_number(INTEGER) IS
+'原子取得分館下一個合約編號（DZ-XXX / HR-VXX），併發呼叫不會重號';
+
+-- ============================================================================
+-- 4. 手動輸入編號時同步計數器
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION sync_contract_number_counter()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.contract_number IS NULL THEN
+        RETURN NEW;
+    END IF;
+
+    -- 只有編號大於目前計數時才會鎖定並更新該列
+    UPDATE contract_number_counters cnc
+    SET last_value = SUBSTRING(NEW.contract_number FROM cnc.number_pattern)::INTEGER,
+        updated_at = NOW()
+    WHERE NEW.contract_number ~ cnc.number_pattern
+      AND SUBSTRING(NEW.contract_number FROM cnc.number_pattern)::INTEGER > cnc.last_value;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS trg_sync_contract_number_counter ON contracts;
+CREATE TRIGGER trg_sync_contract_number_counter
+    AFTER INSERT OR UPDATE OF contract_number ON contracts
+    FOR EACH ROW EXECUTE FUNCTION sync_contract_number_counter();
+
+-- ============================================================================
+-- 5. 未帶編號新增合約時，改用計數器（取代原本掃描 MAX 的 DZ-2025-001 格式）
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION generate_contract_number()
+RETURNS TRIGGER AS $$
+DECLARE
+    branch_code VARCHAR(10);
+    year_str VARCHAR(4);
+    seq_num INTEGER;
+BEGIN
+    -- 如果已有合約編號，跳過
+    IF NEW.contract_number IS NOT NULL THEN
+        RETURN NEW;
+    END IF;
+
+    -- 有計數器的分館直接取號
+    IF EXISTS (SELECT 1 FROM contract_number_counters WHERE branch_id = NEW.branch_id) THEN
+        NEW.contract_number := allocate_contract_number(NEW.branch_id);
+        RETURN NEW;
+    END IF;
+
+    -- 其他分館維持原本格式: XX-2025-001
+    SELECT code INTO branch_code FROM branches WHERE id = NEW.branch_id;
+    year_str := TO_CHAR(CURRENT_DATE, 'YYYY');
+
+    SELECT COALESCE(MAX(
+        NULLIF(
+            REGEXP_REPLACE(contract_number, '^[A-Z]+-[0-9]+-', ''),
+            ''
+        )::INTEGER
+    ), 0) + 1
+    INTO seq_num
+    FROM contracts
+    WHERE branch_id = NEW.branch_id
+      AND contract_number LIKE branch_code || '-' || year_str || '-%';
+
+    NEW.contract_number := branch_code || '-' || year_str || '-' || LPAD(seq_num::TEXT, 3, '0');
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 授權
+GRANT SELECT ON contract_number_counters TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION allocate_contract_number(INTEGER) TO anon, authenticated;
+
+-- ============================================================================
+-- 6. 驗證
+-- ============================================================================
+
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    RAISE NOTICE '=== Migration 112 完成 ===';
+    FOR r IN SELECT branch_id, prefix, pad_width, last_value FROM contract_number_counters ORDER BY branch_id LOOP
+        RAISE NOTICE '分館 %: 前綴 %, 目前序號 %', r.branch_id, r.prefix, r.last_value;
+    END LOOP;
+END $$;
@@ -0,0 +1,296 @@
+-- ============================================================================
+-- Migration 113: batch_tasks 背景任務佇列
+--
+-- 問題：
+-- billing_batch_remind 逐筆 POST batch_task_items，然後在 HTTP 請求內處理全部項目
+-- （程式註解：「背景執行（同步處理，實際應用應改為非同步）」）
+-- - 請求要等到全部發送完才回應
+-- - 服務重啟時處理到一半的任務就此中斷
+--
+-- 解法：batch_task_items 當作工作佇列
+-- - enqueue_batch_task()：一個 RPC 建立任務 + 全部項目（單一 INSERT ... SELECT）
+-- - claim_batch_task_items()：SELECT ... FOR UPDATE SKIP LOCKED 領取項目，
+--   多個 worker / instance 同時領取不會重複
+-- - 領取後逾時未完成（worker 當機、重啟）的項目會被重新領取，超過次數上限則標記失敗
+-- - complete_batch_task_item()：回報結果，同時更新任務統計與最終狀態
+-- - release_batch_task_items()：worker 正常關閉時歸還未完成的項目
+--
+-- Date: 2026-01-05
+-- ============================================================================
+
+-- ============================================================================
+-- 1. 欄位擴充
+-- ============================================================================
+
+ALTER TABLE batch_tasks ADD COLUMN IF NOT EXISTS payload JSONB DEFAULT '{}'::jsonb;
+
+ALTER TABLE batch_task_items ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE batch_task_items ADD COLUMN IF NOT EXISTS locked_by TEXT;
+ALTER TABLE batch_task_items ADD COLUMN IF NOT EXISTS locked_at TIMESTAMPTZ;
+
+-- 項目新增 processing 狀態（已被 worker 領取）
+ALTER TABLE batch_task_items DROP CONSTRAINT IF EXISTS batch_task_items_status_check;
+ALTER TABLE batch_task_items ADD CONSTRAINT batch_task_items_status_check
+    CHECK (status IN ('pending', 'processing', 'success', 'failed'));
+
+COMMENT ON COLUMN batch_tasks.payload IS '任務參數（傳給 worker handler）';
+COMMENT ON COLUMN batch_task_items.attempts IS '已被領取次數';
+COMMENT ON COLUMN batch_task_items.locked_by IS '領取的 worker ID';
+COMMENT ON COLUMN batch_task_items.locked_at IS '領取時間（逾時可被重新領取）';
+
+-- 佇列查詢用：只索引未完成項目
+CREATE INDEX IF NOT EXISTS idx_batch_task_items_queue
+    ON batch_task_items (id)
+    WHERE status IN ('pending', 'processing');
+
+-- ============================================================================
+-- 2. 任務統計（依項目重算，避免併發回報時計數漂移）
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION refresh_batch_task_status(p_task_id VARCHAR)
+RETURNS VOID AS $$
+DECLARE
+    v_success INTEGER;
+    v_failed INTEGER;
+    v_remaining INTEGER;
+BEGIN
+    -- 先鎖任務列：同一任務的回報依序重算，避免兩個交易各自看不到對方的結果而漏掉最終狀態
+    PERFORM 1 FROM batch_tasks WHERE id = p_task_id FOR UPDATE;
+
+    SELECT
+        COUNT(*) FILTER (WHERE status = 'success'),
+        COUNT(*) FILTER (WHERE status = 'failed'),
+        COUNT(*) FILTER (WHERE status IN ('pending', 'processing'))
+    INTO v_success, v_failed, v_remaining
+    FROM batch_task_items
+    WHERE task_id = p_task_id;
+
+    UPDATE batch_tasks SET
+        success_count = v_success,
+        failed_count = v_failed,
+        status = CASE
+            WHEN v_remaining > 0 THEN 'processing'
+            WHEN v_failed = 0 THEN 'completed'
+            WHEN v_success > 0 THEN 'partial_success'
+            ELSE 'failed'
+        END,
+        completed_at = CASE WHEN v_remaining = 0 THEN COALESCE(completed_at, NOW()) ELSE NULL END
+    WHERE id = p_task_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- ============================================================================
+-- 3. enqueue_batch_task() - 建立任務 + 項目
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION enqueue_batch_task(
+    p_task_type VARCHAR,
+    p_target_type VARCHAR,
+    p_target_ids INTEGER[],
+    p_payload JSONB DEFAULT '{}'::jsonb,
+    p_created_by TEXT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_task_id VARCHAR(36) := gen_random_uuid()::text;
+    v_count INTEGER := COALESCE(array_length(p_target_ids, 1), 0);
+BEGIN
+    INSERT INTO batch_tasks (id, task_type, status, total_count, payload, created_by)
+    VALUES (
+        v_task_id,
+        p_task_type,
+        CASE WHEN v_count = 0 THEN 'completed' ELSE 'pending' END,
+        v_count,
+        COALESCE(p_payload, '{}'::jsonb),
+        p_created_by
+    );
+
+    INSERT INTO batch_task_items (task_id, target_id, target_type, status)
+    SELECT v_task_id, t.target_id, p_target_type, 'pending'
+    FROM unnest(p_target_ids) WITH ORDINALITY AS t(target_id, ord)
+    ORDER BY t.ord;
+
+    RETURN jsonb_build_object(
+        'task_id', v_task_id,
+        'task_type', p_task_type,
+        'status', CASE WHEN v_count = 0 THEN 'completed' ELSE 'pending' END,
+        'total_count', v_count
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION enqueue_batch_task(VARCHAR, VARCHAR, INTEGER[], JSONB, TEXT) IS
+'建立批量任務與全部項目（單一交易），回傳 task_id，由背景 worker 處理';
+
+-- ============================================================================
+-- 4. claim_batch_task_items() - 領取項目（SKIP LOCKED）
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION claim_batch_task_items(
+    p_worker_id TEXT,
+    p_limit INTEGER DEFAULT 10,
+    p_lock_timeout_seconds INTEGER DEFAULT 300,
+    p_max_attempts INTEGER DEFAULT 3
+)
+RETURNS TABLE (
+    item_id INTEGER,
+    task_id VARCHAR,
+    task_type VARCHAR,
+    target_id INTEGER,
+    target_type VARCHAR,
+    attempts INTEGER,
+    payload JSONB
+) AS $$
+DECLARE
+    v_task_id VARCHAR;
+BEGIN
+    -- 逾時且已達重試上限的項目直接標記失敗
+    FOR v_task_id IN
+        WITH exhausted AS (
+            SELECT i.id
+            FROM batch_task_items i
+            WHERE i.status = 'processing'
+              AND i.locked_at < NOW() - make_interval(secs => p_lock_timeout_seconds)
+              AND i.attempts >= p_max_attempts
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE batch_task_items i SET
+            status = 'failed',
+            error_code = 'MAX_ATTEMPTS',
+            error_message = '處理逾時，已達重試上限',
+            processed_at = NOW(),
+            locked_by = NULL,
+            locked_at = NULL
+        FROM exhausted e
+        WHERE i.id = e.id
+        RETURNING i.task_id
+    LOOP
+        PERFORM refresh_batch_task_status(v_task_id);
+    END LOOP;
+
+    RETURN QUERY
+    WITH claimable AS (
+        SELECT i.id
+        FROM batch_task_items i
+        WHERE i.status = 'pending'
+           OR (i.status = 'processing'
+               AND i.locked_at < NOW() - make_interval(secs => p_lock_timeout_seconds)
+               AND i.attempts < p_max_attempts)
+        ORDER BY i.id
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ),
+    claimed AS (
+        UPDATE batch_task_items i SET
+            status = 'processing',
+            locked_by = p_worker_id,
+            locked_at = NOW(),
+            attempts = i.attempts + 1
+        FROM claimable c
+        WHERE i.id = c.id
+        RETURNING i.id, i.task_id, i.target_id, i.target_type, i.attempts
+    ),
+    started AS (
+        UPDATE batch_tasks t SET
+            status = 'processing',
+            started_at = COALESCE(t.started_at, NOW())
+        WHERE t.id IN (SELECT DISTINCT c.task_id FROM claimed c)
+          AND t.status = 'pending'
+    )
+    SELECT c.id, c.task_id, t.task_type, c.target_id, c.target_type, c.attempts, t.payload
+    FROM claimed c
+    JOIN batch_tasks t ON t.id = c.task_id
+    ORDER BY c.id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION claim_batch_task_items(TEXT, INTEGER, INTEGER, INTEGER) IS
+'worker 領取待處理項目（FOR UPDATE SKIP LOCKED），逾時項目會被重新領取';
+
+-- ============================================================================
+-- 5. complete_batch_task_item() - 回報結果
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION complete_batch_task_item(
+    p_item_id INTEGER,
+    p_worker_id TEXT,
+    p_success BOOLEAN,
+    p_error_code VARCHAR DEFAULT NULL,
+    p_error_message TEXT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_task_id VARCHAR;
+BEGIN
+    -- 只接受目前持有鎖的 worker 回報（逾時被別人重新領取後，舊 worker 的結果忽略）
+    UPDATE batch_task_items SET
+        status = CASE WHEN p_success THEN 'success' ELSE 'failed' END,
+        error_code = CASE WHEN p_success THEN NULL ELSE COALESCE(p_error_code, 'UNKNOWN') END,
+        error_message = CASE WHEN p_success THEN NULL ELSE p_error_message END,
+        processed_at = NOW(),
+        locked_by = NULL,
+        locked_at = NULL
+    WHERE id = p_item_id
+      AND status = 'processing'
+      AND locked_by = p_worker_id
+    RETURNING task_id INTO v_task_id;
+
+    IF v_task_id IS NULL THEN
+        RETURN jsonb_build_object('success', false, 'message', '項目不存在或已被其他 worker 領取');
+    END IF;
+
+    PERFORM refresh_batch_task_status(v_task_id);
+
+    RETURN jsonb_build_object('success', true, 'task_id', v_task_id);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION complete_batch_task_item(INTEGER, TEXT, BOOLEAN, VARCHAR, TEXT) IS
+'回報項目處理結果並更新任務統計 / 最終狀態';
+
+-- ============================================================================
+-- 6. release_batch_task_items() - worker 關閉時歸還項目
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION release_batch_task_items(p_worker_id TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    UPDATE batch_task_items SET
+        status = 'pending',
+        attempts = GREATEST(attempts - 1, 0),
+        locked_by = NULL,
+        locked_at = NULL
+    WHERE status = 'processing'
+      AND locked_by = p_worker_id;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION release_batch_task_items(TEXT) IS
+'worker 正常關閉時把尚未完成的項目放回佇列（不計入重試次數）';
+
+-- 授權
+GRANT EXECUTE ON FUNCTION enqueue_batch_task(VARCHAR, VARCHAR, INTEGER[], JSONB, TEXT) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION claim_batch_task_items(TEXT, INTEGER, INTEGER, INTEGER) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION complete_batch_task_item(INTEGER, TEXT, BOOLEAN, VARCHAR, TEXT) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION release_batch_task_items(TEXT) TO anon, authenticated;
+
+-- ============================================================================
+-- 7. 驗證
+-- ============================================================================
+
+DO $$
+DECLARE
+    v_pending INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO v_pending
+    FROM batch_task_items
+    WHERE status IN ('pending', 'processing');
+
+    RAISE NOTICE '=== Migration 113 完成 ===';
+    RAISE NOTICE '佇列中未完成項目: %', v_pending;
+END $$;
@@ -0,0 +1,174 @@
+-- ============================================================================
+-- Migration 114: 每日維護改由排程執行（執行紀錄 + 防重複）
+--
+-- 問題：
+-- Migration 109 的 run_daily_maintenance() 由前端 Dashboard 每次載入時呼叫
+-- - 每次瀏覽都跑 generate_monthly_payments / batch_update_overdue_status /
+--   auto_expire_contracts，全部是寫入（鎖 payments / contracts）
+-- - 多人同時開 Dashboard 就同時跑多次
+--
+-- 解法：
+-- - maintenance_runs：執行紀錄，(job_name, run_key) 唯一，同一時段只會成功執行一次
+-- - run_scheduled_maintenance()：由 MCP Server 的 APScheduler 呼叫
+--   advisory lock 防止併發；已執行過的時段直接略過；失敗的時段下次可重跑
+-- - v_maintenance_last_run：Dashboard 只讀取最近一次結果（純 SELECT）
+--
+-- Date: 2026-01-05
+-- ============================================================================
+
+-- ============================================================================
+-- 1. 執行紀錄表
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS maintenance_runs (
+    id SERIAL PRIMARY KEY,
+    job_name VARCHAR(50) NOT NULL,
+    -- 執行時段（每日為 YYYY-MM-DD，間隔小於一天時為時段起點）
+    run_key VARCHAR(30) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'running'
+        CHECK (status IN ('running', 'completed', 'failed')),
+    triggered_by VARCHAR(50),
+    started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMPTZ,
+    duration_ms INTEGER,
+    result JSONB,
+    error_message TEXT,
+    UNIQUE (job_name, run_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_maintenance_runs_job_started
+    ON maintenance_runs (job_name, started_at DESC);
+
+COMMENT ON TABLE maintenance_runs IS '排程維護執行紀錄（同一 job + 時段只執行一次）';
+
+-- ============================================================================
+-- 2. run_scheduled_maintenance() - 排程入口
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION run_scheduled_maintenance(
+    p_interval_hours INTEGER DEFAULT 24,
+    p_triggered_by TEXT DEFAULT 'scheduler',
+    p_force BOOLEAN DEFAULT false
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_job_name CONSTANT VARCHAR := 'daily_maintenance';
+    v_run_key VARCHAR(30);
+    v_run_id INTEGER;
+    v_started TIMESTAMPTZ := clock_timestamp();
+    v_result JSONB;
+    v_duration INTEGER;
+BEGIN
+    -- 時段：每日以日期為 key，否則以時段起點為 key
+    IF p_interval_hours >= 24 THEN
+        v_run_key := TO_CHAR(CURRENT_DATE, 'YYYY-MM-DD');
+    ELSE
+        v_run_key := TO_CHAR(
+            date_bin(make_interval(hours => GREATEST(p_interval_hours, 1)), LOCALTIMESTAMP, TIMESTAMP '2000-01-01'),
+            'YYYY-MM-DD"T"HH24:MI'
+        );
+    END IF;
+
+    -- 同時只允許一個維護在跑（其他呼叫直接略過，不等待）
+    IF NOT pg_try_advisory_xact_lock(hashtext('run_scheduled_maintenance')) THEN
+        RETURN jsonb_build_object('executed', false, 'reason', 'running', 'run_key', v_run_key);
+    END IF;
+
+    -- 登記本時段；已完成的時段略過（p_force 或上次失敗才重跑）
+    INSERT INTO maintenance_runs (job_name, run_key, status, triggered_by, started_at)
+    VALUES (v_job_name, v_run_key, 'running', p_triggered_by, v_started)
+    ON CONFLICT (job_name, run_key) DO UPDATE SET
+        status = 'running',
+        triggered_by = EXCLUDED.triggered_by,
+        started_at = EXCLUDED.started_at,
+        finished_at = NULL,
+        duration_ms = NULL,
+        result = NULL,
+        error_message = NULL
+    WHERE maintenance_runs.status = 'failed' OR p_force
+    RETURNING id INTO v_run_id;
+
+    IF v_run_id IS NULL THEN
+        RETURN jsonb_build_object('executed', false, 'reason', 'already_ran', 'run_key', v_run_key);
+    END IF;
+
+    BEGIN
+        v_result := run_daily_maintenance();
+    EXCEPTION WHEN OTHERS THEN
+        -- 維護本身的寫入已回滾，只留下失敗紀錄，下次排程會重跑
+        v_duration := (EXTRACT(EPOCH FROM clock_timestamp() - v_started) * 1000)::INTEGER;
+        UPDATE maintenance_runs SET
+            status = 'failed',
+            finished_at = clock_timestamp(),
+            duration_ms = v_duration,
+            error_message = SQLERRM
+        WHERE id = v_run_id;
+
+        RETURN jsonb_build_object(
+            'executed', true,
+            'success', false,
+            'run_key', v_run_key,
+            'error', SQLERRM
+        );
+    END;
+
+    v_duration := (EXTRACT(EPOCH FROM clock_timestamp() - v_started) * 1000)::INTEGER;
+    UPDATE maintenance_runs SET
+        status = 'completed',
+        finished_at = clock_timestamp(),
+        duration_ms = v_duration,
+        result = v_result
+    WHERE id = v_run_id;
+
+    RETURN jsonb_build_object(
+        'executed', true,
+        'success', true,
+        'run_key', v_run_key,
+        'duration_ms', v_duration,
+        'result', v_result
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION run_scheduled_maintenance(INTEGER, TEXT, BOOLEAN) IS
+'排程維護入口：同一時段只執行一次 run_daily_maintenance()，結果寫入 maintenance_runs';
+
+COMMENT ON FUNCTION run_daily_maintenance() IS
+'每日維護函數：產生應收、更新逾期、更新過期合約（由 run_scheduled_maintenance 排程呼叫）';
+
+-- ============================================================================
+-- 3. v_maintenance_last_run - Dashboard 讀取最近一次結果
+-- ============================================================================
+
+CREATE OR REPLACE VIEW v_maintenance_last_run AS
+SELECT DISTINCT ON (job_name)
+    job_name,
+    run_key,
+    status,
+    triggered_by,
+    started_at,
+    finished_at,
+    duration_ms,
+    result,
+    error_message
+FROM maintenance_runs
+WHERE status <> 'running'
+ORDER BY job_name, started_at DESC;
+
+COMMENT ON VIEW v_maintenance_last_run IS '各維護 job 最近一次執行結果（唯讀）';
+
+-- 授權
+GRANT SELECT ON maintenance_runs TO anon, authenticated;
+GRANT SELECT ON v_maintenance_last_run TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION run_scheduled_maintenance(INTEGER, TEXT, BOOLEAN) TO anon, authenticated;
+
+-- ============================================================================
+-- 4. 驗證
+-- ============================================================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '=== Migration 114 完成 ===';
+    RAISE NOTICE '每日維護改由 MCP Server 排程執行（run_scheduled_maintenance）';
+    RAISE NOTICE 'Dashboard 改讀 v_maintenance_last_run';
+END $$;
@@ -0,0 +1,234 @@
+-- ============================================================================
+-- Migration 115: 客戶模糊搜尋（pg_trgm）
+--
+-- 問題：
+-- crm_tools.search_customers 與前端 crm.searchCustomers 對 v_customer_summary 下
+-- or=(name.ilike.*q*,phone.ilike.*q*,company_name.ilike.*q*)
+-- - ILIKE '%q%' 無法使用 btree 索引，每次搜尋都全表掃描
+-- - v_customer_summary 每位客戶都要算兩個 LATERAL 聚合（contracts / payments），
+--   篩選前就先聚合全部客戶
+-- - 打錯字（例：「和盛」打成「和勝」）完全搜不到
+--
+-- 解法：
+-- - pg_trgm GIN 索引：姓名、公司名、電話（只留數字）、統一編號
+-- - search_customers()：先在 customers 上以索引找出候選並依相似度排序，
+--   分頁後才計算該頁客戶的合約 / 繳費統計
+--
+-- 狀態：尚未在有 pg_trgm 的資料庫量測（bench_customer_search.sql）。
+-- 唯一的數據來自沒有 pg_trgm 的環境，search_customers() 比舊查詢慢；
+-- 少於 3 個字的查詢（常見的中文姓名）用不到 trigram 索引，排序也要先列出全部相符客戶。
+-- crm_tools.search_customers 與前端預設仍查詢 v_customer_summary，
+-- 量測確認較快後再以 CUSTOMER_SEARCH_RPC=true 切換
+--
+-- Date: 2026-01-05
+-- ============================================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- ============================================================================
+-- 1. 索引
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_customers_name_trgm
+    ON customers USING gin (name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_customers_company_name_trgm
+    ON customers USING gin (company_name gin_trgm_ops);
+
+-- 電話只比對數字（0912-345-678 / 0912345678 都能搜到）
+CREATE INDEX IF NOT EXISTS idx_customers_phone_digits_trgm
+    ON customers USING gin ((regexp_replace(phone, '\D', '', 'g')) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_customers_company_tax_id_trgm
+    ON customers USING gin (company_tax_id gin_trgm_ops);
+
+-- 分頁後統計用
+CREATE INDEX IF NOT EXISTS idx_payments_customer_status
+    ON payments (customer_id, payment_status) INCLUDE (amount);
+
+-- ============================================================================
+-- 2. search_customers() - 搜尋 + 排序 + 當頁統計
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION search_customers(
+    p_query TEXT DEFAULT NULL,
+    p_branch_id INTEGER DEFAULT NULL,
+    p_status TEXT DEFAULT NULL,
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id INTEGER,
+    legacy_id VARCHAR,
+    name VARCHAR,
+    company_name VARCHAR,
+    company_tax_id VARCHAR,
+    customer_type VARCHAR,
+    phone VARCHAR,
+    email VARCHAR,
+    line_user_id VARCHAR,
+    status VARCHAR,
+    risk_level VARCHAR,
+    source_channel VARCHAR,
+    created_at TIMESTAMPTZ,
+    branch_id INTEGER,
+    branch_code VARCHAR,
+    branch_name VARCHAR,
+    total_contracts BIGINT,
+    active_contracts BIGINT,
+    latest_contract_end DATE,
+    total_paid NUMERIC,
+    pending_amount NUMERIC,
+    overdue_count BIGINT,
+    overdue_amount NUMERIC,
+    accounting_firm_id INTEGER,
+    accounting_firm_name VARCHAR,
+    match_score REAL
+) AS $$
+DECLARE
+    v_text TEXT := NULLIF(btrim(p_query), '');
+    v_digits TEXT := NULLIF(regexp_replace(COALESCE(p_query, ''), '\D', '', 'g'), '');
+    v_limit INTEGER := LEAST(GREATEST(COALESCE(p_limit, 20), 1), 200);
+    v_offset INTEGER := GREATEST(COALESCE(p_offset, 0), 0);
+    v_ids INTEGER[];
+    v_scores REAL[];
+BEGIN
+    -- 數字少於 3 碼不比對電話 / 統編（NULL 讓條件不成立）
+    IF length(v_digits) < 3 THEN
+        v_digits := NULL;
+    END IF;
+
+    -- 1. 找出當頁客戶（只查 customers，條件皆為參數，可走 trigram 索引）
+    IF v_text IS NULL THEN
+        SELECT array_agg(m.id ORDER BY m.created_at DESC, m.id DESC),
+               array_agg(0::REAL)
+        INTO v_ids, v_scores
+        FROM (
+            SELECT c.id, c.created_at
+            FROM customers c
+            WHERE (p_branch_id IS NULL OR c.branch_id = p_branch_id)
+              AND (p_status IS NULL OR c.status = p_status)
+            ORDER BY c.created_at DESC, c.id DESC
+            LIMIT v_limit OFFSET v_offset
+        ) m;
+    ELSE
+        SELECT array_agg(m.id ORDER BY m.score DESC, m.created_at DESC, m.id DESC),
+               array_agg(m.score ORDER BY m.score DESC, m.created_at DESC, m.id DESC)
+        INTO v_ids, v_scores
+        FROM (
+            SELECT
+                c.id,
+                c.created_at,
+                GREATEST(
+                    -- 完全相同 > 開頭相同 > 包含 > 相似（錯字）
+                    CASE
+                        WHEN c.name = v_text OR c.company_name = v_text THEN 1.0
+                        WHEN c.name ILIKE v_text || '%' OR c.company_name ILIKE v_text || '%' THEN 0.9
+                        WHEN c.name ILIKE '%' || v_text || '%' OR c.company_name ILIKE '%' || v_text || '%' THEN 0.8
+                        ELSE 0
+                    END,
+                    CASE
+                        WHEN c.company_tax_id = v_digits
+                          OR regexp_replace(c.phone, '\D', '', 'g') = v_digits THEN 1.0
+                        WHEN c.company_tax_id LIKE '%' || v_digits || '%'
+                          OR regexp_replace(c.phone, '\D', '', 'g') LIKE '%' || v_digits || '%' THEN 0.85
+                        ELSE 0
+                    END,
+                    similarity(c.name, v_text) * 0.7,
+                    COALESCE(similarity(c.company_name, v_text), 0) * 0.7
+                )::REAL AS score
+            FROM customers c
+            WHERE (p_branch_id IS NULL OR c.branch_id = p_branch_id)
+              AND (p_status IS NULL OR c.status = p_status)
+              AND (
+                  c.name ILIKE '%' || v_text || '%'
+                  OR c.company_name ILIKE '%' || v_text || '%'
+                  OR c.name % v_text
+                  OR c.company_name % v_text
+                  OR regexp_replace(c.phone, '\D', '', 'g') LIKE '%' || v_digits || '%'
+                  OR c.company_tax_id LIKE '%' || v_digits || '%'
+              )
+            ORDER BY score DESC, c.created_at DESC, c.id DESC
+            LIMIT v_limit OFFSET v_offset
+        ) m;
+    END IF;
+
+    IF v_ids IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- 2. 只對當頁客戶計算統計（與 v_customer_summary 相同定義）
+    RETURN QUERY
+    SELECT
+        c.id,
+        c.legacy_id,
+        c.name,
+        c.company_name,
+        c.company_tax_id,
+        c.customer_type,
+        c.phone,
+        c.email,
+        c.line_user_id,
+        c.status,
+        c.risk_level,
+        c.source_channel,
+        c.created_at,
+        b.id,
+        b.code,
+        b.name,
+        COALESCE(cs.total_contracts, 0),
+        COALESCE(cs.active_contracts, 0),
+        cs.latest_contract_end,
+        COALESCE(ps.total_paid, 0),
+        COALESCE(ps.pending_amount, 0),
+        COALESCE(ps.overdue_count, 0),
+        COALESCE(ps.overdue_amount, 0),
+        af.id,
+        af.name,
+        p.score
+    FROM unnest(v_ids, v_scores) WITH ORDINALITY AS p(customer_id, score, ord)
+    JOIN customers c ON c.id = p.customer_id
+    LEFT JOIN branches b ON b.id = c.branch_id
+    LEFT JOIN accounting_firms af ON af.id = c.accounting_firm_id
+    LEFT JOIN LATERAL (
+        SELECT
+            COUNT(*) AS total_contracts,
+            COUNT(*) FILTER (WHERE ct.status = 'active') AS active_contracts,
+            MAX(ct.end_date) AS latest_contract_end
+        FROM contracts ct
+        WHERE ct.customer_id = c.id
+    ) cs ON true
+    LEFT JOIN LATERAL (
+        SELECT
+            COALESCE(SUM(pm.amount) FILTER (WHERE pm.payment_status = 'paid'), 0) AS total_paid,
+            COALESCE(SUM(pm.amount) FILTER (WHERE pm.payment_status = 'pending'), 0) AS pending_amount,
+            COUNT(*) FILTER (WHERE pm.payment_status = 'overdue') AS overdue_count,
+            COALESCE(SUM(pm.amount) FILTER (WHERE pm.payment_status = 'overdue'), 0) AS overdue_amount
+        FROM payments pm
+        WHERE pm.customer_id = c.id
+    ) ps ON true
+    ORDER BY p.ord;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+COMMENT ON FUNCTION search_customers(TEXT, INTEGER, TEXT, INTEGER, INTEGER) IS
+'客戶模糊搜尋（姓名/公司名/電話/統編，pg_trgm 索引），依相似度排序，只計算當頁統計';
+
+-- 授權
+GRANT EXECUTE ON FUNCTION search_customers(TEXT, INTEGER, TEXT, INTEGER, INTEGER) TO anon, authenticated;
+
+-- ============================================================================
+-- 3. 驗證
+-- ============================================================================
+
+DO $$
+DECLARE
+    v_index_count INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO v_index_count
+    FROM pg_indexes
+    WHERE tablename = 'customers' AND indexname LIKE '%_trgm';
+
+    RAISE NOTICE '=== Migration 115 完成 ===';
+    RAISE NOTICE 'customers trigram 索引: % 個', v_index_count;
+END $$;
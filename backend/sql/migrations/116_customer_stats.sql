@@ -0,0 +1,550 @@
+-- ============================================================================
+-- Migration 116: 客戶統計預先彙總（customer_stats）
+--
+-- 問題：
+-- v_customer_summary 每次讀取都對每位客戶跑兩個 LATERAL 聚合
+-- （contracts：合約數 / 有效合約 / 最晚到期；payments：已付 / 待付 / 逾期）
+-- 客戶列表、crm_search_customers、get_customer_detail、/api/customers 都讀這個 view，
+-- 列表頁排序或篩選時要先聚合全部客戶，成本約為 客戶數 × 繳費筆數
+--
+-- 解法：
+-- - customer_stats：每位客戶一列，存放上述統計
+-- - contracts / payments 上的 statement-level trigger（transition table）
+--   只重算該 statement 影響到的客戶（批次更新逾期時一次重算，而非每列一次）
+-- - reconcile_customer_stats()：整批重建並回傳修正筆數，併入每日維護
+-- - v_customer_summary 改為 customers JOIN customer_stats（欄位不變）
+--
+-- Date: 2026-01-05
+-- ============================================================================
+
+-- ============================================================================
+-- 1. customer_stats 表
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS customer_stats (
+    customer_id INTEGER PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
+    total_contracts BIGINT NOT NULL DEFAULT 0,
+    active_contracts BIGINT NOT NULL DEFAULT 0,
+    latest_contract_end DATE,
+    total_paid NUMERIC NOT NULL DEFAULT 0,
+    pending_amount NUMERIC NOT NULL DEFAULT 0,
+    overdue_count BIGINT NOT NULL DEFAULT 0,
+    overdue_amount NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+COMMENT ON TABLE customer_stats IS '客戶合約 / 繳費統計（由 contracts / payments trigger 維護）';
+
+-- 客戶列表預設依建立時間排序（分頁時只 JOIN 當頁的 customer_stats）
+CREATE INDEX IF NOT EXISTS idx_customers_created_at
+    ON customers (created_at DESC);
+
+-- 列表依逾期排序 / 篩選用
+CREATE INDEX IF NOT EXISTS idx_customer_stats_overdue
+    ON customer_stats (overdue_amount DESC)
+    WHERE overdue_count > 0;
+
+-- 重算時依 customer_id 查 contracts / payments：
+-- 使用既有的 idx_contracts_customer_id 與 Migration 115 的 idx_payments_customer_status
+
+-- ============================================================================
+-- 2. refresh_customer_stats() - 重算指定客戶
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION refresh_customer_stats(p_customer_ids INTEGER[])
+RETURNS INTEGER AS $$
+DECLARE
+    v_ids INTEGER[];
+    v_count INTEGER;
+BEGIN
+    SELECT array_agg(DISTINCT x ORDER BY x) INTO v_ids
+    FROM unnest(p_customer_ids) AS x
+    WHERE x IS NOT NULL;
+
+    IF v_ids IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    -- 先確保列存在並依 ID 順序上鎖：同一客戶的併發交易在此排隊，
+    -- 取得鎖後才聚合（新 snapshot 看得到先提交的交易），避免互相覆蓋成舊值
+    INSERT INTO customer_stats (customer_id)
+    SELECT c.id FROM customers c WHERE c.id = ANY(v_ids)
+    ON CONFLICT (customer_id) DO NOTHING;
+
+    PERFORM 1 FROM customer_stats
+    WHERE customer_id = ANY(v_ids)
+    ORDER BY customer_id
+    FOR UPDATE;
+
+    UPDATE customer_stats s SET
+        total_contracts = COALESCE(ct.total_contracts, 0),
+        active_contracts = COALESCE(ct.active_contracts, 0),
+        latest_contract_end = ct.latest_contract_end,
+        total_paid = COALESCE(pm.total_paid, 0),
+        pending_amount = COALESCE(pm.pending_amount, 0),
+        overdue_count = COALESCE(pm.overdue_count, 0),
+        overdue_amount = COALESCE(pm.overdue_amount, 0),
+        updated_at = NOW()
+    FROM unnest(v_ids) AS ids(customer_id)
+    LEFT JOIN LATERAL (
+        SELECT
+            COUNT(*) AS total_contracts,
+            COUNT(*) FILTER (WHERE c.status = 'active') AS active_contracts,
+            MAX(c.end_date) AS latest_contract_end
+        FROM contracts c
+        WHERE c.customer_id = ids.customer_id
+    ) ct ON true
+    LEFT JOIN LATERAL (
+        SELECT
+            SUM(p.amount) FILTER (WHERE p.payment_status = 'paid') AS total_paid,
+            SUM(p.amount) FILTER (WHERE p.payment_status = 'pending') AS pending_amount,
+            COUNT(*) FILTER (WHERE p.payment_status = 'overdue') AS overdue_count,
+            SUM(p.amount) FILTER (WHERE p.payment_status = 'overdue') AS overdue_amount
+        FROM payments p
+        WHERE p.customer_id = ids.customer_id
+    ) pm ON true
+    WHERE s.customer_id = ids.customer_id;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION refresh_customer_stats(INTEGER[]) IS
+'重算指定客戶的 customer_stats（trigger 呼叫）';
+
+-- ============================================================================
+-- 3. contracts / payments trigger
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION customer_stats_contracts_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_customer_stats(ARRAY(SELECT n.customer_id FROM new_rows n));
+
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_customer_stats(ARRAY(SELECT o.customer_id FROM old_rows o));
+
+    ELSE
+        -- 只有影響統計的欄位變動才重算
+        PERFORM refresh_customer_stats(ARRAY(
+            SELECT x.customer_id
+            FROM new_rows n
+            JOIN old_rows o ON o.id = n.id
+            CROSS JOIN LATERAL (VALUES (n.customer_id), (o.customer_id)) AS x(customer_id)
+            WHERE (n.customer_id, n.status, n.end_date)
+                  IS DISTINCT FROM (o.customer_id, o.status, o.end_date)
+        ));
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION customer_stats_payments_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_customer_stats(ARRAY(SELECT n.customer_id FROM new_rows n));
+
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_customer_stats(ARRAY(SELECT o.customer_id FROM old_rows o));
+
+    ELSE
+        -- 提醒次數、發票號碼等變動不影響統計
+        PERFORM refresh_customer_stats(ARRAY(
+            SELECT x.customer_id
+            FROM new_rows n
+            JOIN old_rows o ON o.id = n.id
+            CROSS JOIN LATERAL (VALUES (n.customer_id), (o.customer_id)) AS x(customer_id)
+            WHERE (n.customer_id, n.amount, n.payment_status)
+                  IS DISTINCT FROM (o.customer_id, o.amount, o.payment_status)
+        ));
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- transition table 不能用在多事件 trigger，分三個
+DROP TRIGGER IF EXISTS trg_customer_stats_contracts_insert ON contracts;
+CREATE TRIGGER trg_customer_stats_contracts_insert
+    AFTER INSERT ON contracts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION customer_stats_contracts_changed();
+
+DROP TRIGGER IF EXISTS trg_customer_stats_contracts_update ON contracts;
+CREATE TRIGGER trg_customer_stats_contracts_update
+    AFTER UPDATE ON contracts
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION customer_stats_contracts_changed();
+
+DROP TRIGGER IF EXISTS trg_customer_stats_contracts_delete ON contracts;
+CREATE TRIGGER trg_customer_stats_contracts_delete
+    AFTER DELETE ON contracts
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION customer_stats_contracts_changed();
+
+DROP TRIGGER IF EXISTS trg_customer_stats_payments_insert ON payments;
+CREATE TRIGGER trg_customer_stats_payments_insert
+    AFTER INSERT ON payments
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION customer_stats_payments_changed();
+
+DROP TRIGGER IF EXISTS trg_customer_stats_payments_update ON payments;
+CREATE TRIGGER trg_customer_stats_payments_update
+    AFTER UPDATE ON payments
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION customer_stats_payments_changed();
+
+DROP TRIGGER IF EXISTS trg_customer_stats_payments_delete ON payments;
+CREATE TRIGGER trg_customer_stats_payments_delete
+    AFTER DELETE ON payments
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION customer_stats_payments_changed();
+
+-- ============================================================================
+-- 4. reconcile_customer_stats() - 整批重建
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION reconcile_customer_stats()
+RETURNS JSONB AS $$
+DECLARE
+    v_started TIMESTAMPTZ := clock_timestamp();
+    v_fixed INTEGER;
+    v_removed INTEGER;
+BEGIN
+    -- 與 trigger 互斥：重建期間的異動等重建完成後再寫入
+    LOCK TABLE customer_stats IN SHARE ROW EXCLUSIVE MODE;
+
+    -- 一次 GROUP BY 算出全部客戶，只寫入有差異的列
+    WITH ct AS (
+        SELECT
+            customer_id,
+            COUNT(*) AS total_contracts,
+            COUNT(*) FILTER (WHERE status = 'active') AS active_contracts,
+            MAX(end_date) AS latest_contract_end
+        FROM contracts
+        GROUP BY customer_id
+    ),
+    pm AS (
+        SELECT
+            customer_id,
+            COALESCE(SUM(amount) FILTER (WHERE payment_status = 'paid'), 0) AS total_paid,
+            COALESCE(SUM(amount) FILTER (WHERE payment_status = 'pending'), 0) AS pending_amount,
+            COUNT(*) FILTER (WHERE payment_status = 'overdue') AS overdue_count,
+            COALESCE(SUM(amount) FILTER (WHERE payment_status = 'overdue'), 0) AS overdue_amount
+        FROM payments
+        GROUP BY customer_id
+    ),
+    expected AS (
+        SELECT
+            c.id AS customer_id,
+            COALESCE(ct.total_contracts, 0) AS total_contracts,
+            COALESCE(ct.active_contracts, 0) AS active_contracts,
+            ct.latest_contract_end,
+            COALESCE(pm.total_paid, 0) AS total_paid,
+            COALESCE(pm.pending_amount, 0) AS pending_amount,
+            COALESCE(pm.overdue_count, 0) AS overdue_count,
+            COALESCE(pm.overdue_amount, 0) AS overdue_amount
+        FROM customers c
+        LEFT JOIN ct ON ct.customer_id = c.id
+        LEFT JOIN pm ON pm.customer_id = c.id
+    )
+    INSERT INTO customer_stats AS s (
+        customer_id, total_contracts, active_contracts, latest_contract_end,
+        total_paid, pending_amount, overdue_count, overdue_amount, updated_at
+    )
+    SELECT e.*, NOW()
+    FROM expected e
+    LEFT JOIN customer_stats cur ON cur.customer_id = e.customer_id
+    WHERE cur.customer_id IS NULL
+       OR (cur.total_contracts, cur.active_contracts, cur.latest_contract_end,
+           cur.total_paid, cur.pending_amount, cur.overdue_count, cur.overdue_amount)
+          IS DISTINCT FROM
+          (e.total_contracts, e.active_contracts, e.latest_contract_end,
+           e.total_paid, e.pending_amount, e.overdue_count, e.overdue_amount)
+    ON CONFLICT (customer_id) DO UPDATE SET
+        total_contracts = EXCLUDED.total_contracts,
+        active_contracts = EXCLUDED.active_contracts,
+        latest_contract_end = EXCLUDED.latest_contract_end,
+        total_paid = EXCLUDED.total_paid,
+        pending_amount = EXCLUDED.pending_amount,
+        overdue_count = EXCLUDED.overdue_count,
+        overdue_amount = EXCLUDED.overdue_amount,
+        updated_at = EXCLUDED.updated_at;
+
+    GET DIAGNOSTICS v_fixed = ROW_COUNT;
+
+    DELETE FROM customer_stats s
+    WHERE NOT EXISTS (SELECT 1 FROM customers c WHERE c.id = s.customer_id);
+
+    GET DIAGNOSTICS v_removed = ROW_COUNT;
+
+    RETURN jsonb_build_object(
+        'rows_fixed', v_fixed,
+        'rows_removed', v_removed,
+        'duration_ms', (EXTRACT(EPOCH FROM clock_timestamp() - v_started) * 1000)::INTEGER
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION reconcile_customer_stats() IS
+'整批重建 customer_stats，回傳修正筆數（正常情況應為 0）';
+
+-- 首次建立
+SELECT reconcile_customer_stats();
+
+-- ============================================================================
+-- 5. v_customer_summary 改為 JOIN（欄位與順序不變）
+-- ============================================================================
+
+CREATE OR REPLACE VIEW v_customer_summary AS
+SELECT
+    c.id,
+    c.legacy_id,
+    c.name,
+    c.company_name,
+    c.customer_type,
+    c.phone,
+    c.email,
+    c.line_user_id,
+    c.status,
+    c.risk_level,
+    c.source_channel,
+    c.created_at,
+    b.id AS branch_id,
+    b.code AS branch_code,
+    b.name AS branch_name,
+    COALESCE(s.total_contracts, 0::bigint) AS total_contracts,
+    COALESCE(s.active_contracts, 0::bigint) AS active_contracts,
+    s.latest_contract_end,
+    COALESCE(s.total_paid, 0::numeric) AS total_paid,
+    COALESCE(s.pending_amount, 0::numeric) AS pending_amount,
+    COALESCE(s.overdue_count, 0::bigint) AS overdue_count,
+    COALESCE(s.overdue_amount, 0::numeric) AS overdue_amount,
+    af.id AS accounting_firm_id,
+    af.name AS accounting_firm_name
+FROM customers c
+LEFT JOIN branches b ON c.branch_id = b.id
+LEFT JOIN accounting_firms af ON c.accounting_firm_id = af.id
+LEFT JOIN customer_stats s ON s.customer_id = c.id;
+
+COMMENT ON VIEW v_customer_summary IS '客戶摘要（統計來自 customer_stats）';
+
+-- ============================================================================
+-- 6. search_customers() 當頁統計改讀 customer_stats
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION search_customers(
+    p_query TEXT DEFAULT NULL,
+    p_branch_id INTEGER DEFAULT NULL,
+    p_status TEXT DEFAULT NULL,
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id INTEGER,
+    legacy_id VARCHAR,
+    name VARCHAR,
+    company_name VARCHAR,
+    company_tax_id VARCHAR,
+    customer_type VARCHAR,
+    phone VARCHAR,
+    email VARCHAR,
+    line_user_id VARCHAR,
+    status VARCHAR,
+    risk_level VARCHAR,
+    source_channel VARCHAR,
+    created_at TIMESTAMPTZ,
+    branch_id INTEGER,
+    branch_code VARCHAR,
+    branch_name VARCHAR,
+    total_contracts BIGINT,
+    active_contracts BIGINT,
+    latest_contract_end DATE,
+    total_paid NUMERIC,
+    pending_amount NUMERIC,
+    overdue_count BIGINT,
+    overdue_amount NUMERIC,
+    accounting_firm_id INTEGER,
+    accounting_firm_name VARCHAR,
+    match_score REAL
+) AS $$
+DECLARE
+    v_text TEXT := NULLIF(btrim(p_query), '');
+    v_digits TEXT := NULLIF(regexp_replace(COALESCE(p_query, ''), '\D', '', 'g'), '');
+    v_limit INTEGER := LEAST(GREATEST(COALESCE(p_limit, 20), 1), 200);
+    v_offset INTEGER := GREATEST(COALESCE(p_offset, 0), 0);
+    v_ids INTEGER[];
+    v_scores REAL[];
+BEGIN
+    -- 數字少於 3 碼不比對電話 / 統編（NULL 讓條件不成立）
+    IF length(v_digits) < 3 THEN
+        v_digits := NULL;
+    END IF;
+
+    -- 1. 找出當頁客戶（只查 customers，條件皆為參數，可走 trigram 索引）
+    IF v_text IS NULL THEN
+        SELECT array_agg(m.id ORDER BY m.created_at DESC, m.id DESC),
+               array_agg(0::REAL)
+        INTO v_ids, v_scores
+        FROM (
+            SELECT c.id, c.created_at
+            FROM customers c
+            WHERE (p_branch_id IS NULL OR c.branch_id = p_branch_id)
+              AND (p_status IS NULL OR c.status = p_status)
+            ORDER BY c.created_at DESC, c.id DESC
+            LIMIT v_limit OFFSET v_offset
+        ) m;
+    ELSE
+        SELECT array_agg(m.id ORDER BY m.score DESC, m.created_at DESC, m.id DESC),
+               array_agg(m.score ORDER BY m.score DESC, m.created_at DESC, m.id DESC)
+        INTO v_ids, v_scores
+        FROM (
+            SELECT
+                c.id,
+                c.created_at,
+                GREATEST(
+                    -- 完全相同 > 開頭相同 > 包含 > 相似（錯字）
+                    CASE
+                        WHEN c.name = v_text OR c.company_name = v_text THEN 1.0
+                        WHEN c.name ILIKE v_text || '%' OR c.company_name ILIKE v_text || '%' THEN 0.9
+                        WHEN c.name ILIKE '%' || v_text || '%' OR c.company_name ILIKE '%' || v_text || '%' THEN 0.8
+                        ELSE 0
+                    END,
+                    CASE
+                        WHEN c.company_tax_id = v_digits
+                          OR regexp_replace(c.phone, '\D', '', 'g') = v_digits THEN 1.0
+                        WHEN c.company_tax_id LIKE '%' || v_digits || '%'
+                          OR regexp_replace(c.phone, '\D', '', 'g') LIKE '%' || v_digits || '%' THEN 0.85
+                        ELSE 0
+                    END,
+                    similarity(c.name, v_text) * 0.7,
+                    COALESCE(similarity(c.company_name, v_text), 0) * 0.7
+                )::REAL AS score
+            FROM customers c
+            WHERE (p_branch_id IS NULL OR c.branch_id = p_branch_id)
+              AND (p_status IS NULL OR c.status = p_status)
+              AND (
+                  c.name ILIKE '%' || v_text || '%'
+                  OR c.company_name ILIKE '%' || v_text || '%'
+                  OR c.name % v_text
+                  OR c.company_name % v_text
+                  OR regexp_replace(c.phone, '\D', '', 'g') LIKE '%' || v_digits || '%'
+                  OR c.company_tax_id LIKE '%' || v_digits || '%'
+              )
+            ORDER BY score DESC, c.created_at DESC, c.id DESC
+            LIMIT v_limit OFFSET v_offset
+        ) m;
+    END IF;
+
+    IF v_ids IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- 2. 當頁客戶的統計（customer_stats）
+    RETURN QUERY
+    SELECT
+        c.id,
+        c.legacy_id,
+        c.name,
+        c.company_name,
+        c.company_tax_id,
+        c.customer_type,
+        c.phone,
+        c.email,
+        c.line_user_id,
+        c.status,
+        c.risk_level,
+        c.source_channel,
+        c.created_at,
+        b.id,
+        b.code,
+        b.name,
+        COALESCE(s.total_contracts, 0),
+        COALESCE(s.active_contracts, 0),
+        s.latest_contract_end,
+        COALESCE(s.total_paid, 0),
+        COALESCE(s.pending_amount, 0),
+        COALESCE(s.overdue_count, 0),
+        COALESCE(s.overdue_amount, 0),
+        af.id,
+        af.name,
+        p.score
+    FROM unnest(v_ids, v_scores) WITH ORDINALITY AS p(customer_id, score, ord)
+    JOIN customers c ON c.id = p.customer_id
+    LEFT JOIN branches b ON b.id = c.branch_id
+    LEFT JOIN accounting_firms af ON af.id = c.accounting_firm_id
+    LEFT JOIN customer_stats s ON s.customer_id = c.id
+    ORDER BY p.ord;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- 授權
+GRANT SELECT ON customer_stats TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION reconcile_customer_stats() TO anon, authenticated;
+
+-- ============================================================================
+-- 7. 每日維護加入對帳
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION run_daily_maintenance()
+RETURNS JSONB AS $$
+DECLARE
+    v_payments_result RECORD;
+    v_overdue_result RECORD;
+    v_expired_result RECORD;
+    v_stats_result JSONB;
+    v_result JSONB;
+BEGIN
+    -- 1. 產生當月應收（冪等）
+    SELECT * INTO v_payments_result FROM generate_monthly_payments();
+
+    -- 2. 更新逾期狀態
+    SELECT * INTO v_overdue_result FROM batch_update_overdue_status();
+
+    -- 3. 更新過期合約
+    SELECT * INTO v_expired_result FROM auto_expire_contracts();
+
+    -- 4. customer_stats 對帳（trigger 正常運作時應為 0）
+    v_stats_result := reconcile_customer_stats();
+
+    -- 組合結果
+    v_result := jsonb_build_object(
+        'executed_at', NOW(),
+        'payments_generated', jsonb_build_object(
+            'count', COALESCE(v_payments_result.payments_created, 0),
+            'amount', COALESCE(v_payments_result.total_amount, 0)
+        ),
+        'overdue_updated', jsonb_build_object(
+            'count', COALESCE(v_overdue_result.updated_count, 0),
+            'amount', COALESCE(v_overdue_result.total_overdue_amount, 0)
+        ),
+        'contracts_expired', jsonb_build_object(
+            'count', COALESCE(v_expired_result.expired_count, 0),
+            'contracts', COALESCE(v_expired_result.contract_numbers, ARRAY[]::TEXT[])
+        ),
+        'customer_stats_fixed', COALESCE((v_stats_result->>'rows_fixed')::INTEGER, 0)
+    );
+
+    RETURN v_result;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- ============================================================================
+-- 8. 驗證
+-- ============================================================================
+
+DO $$
+DECLARE
+    v_customers INTEGER;
+    v_stats INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO v_customers FROM customers;
+    SELECT COUNT(*) INTO v_stats FROM customer_stats;
+
+    RAISE NOTICE '=== Migration 116 完成 ===';
+    RAISE NOTICE 'customers: %, customer_stats: %', v_customers, v_stats;
+END $$;
@@ -0,0 +1,363 @@
+-- ============================================================================
+-- Migration 117: 審計日誌改為 statement-level 寫入 + 按月分區
+--
+-- 問題：
+-- 03_functions.sql 的 audit_trigger_function() 在 customers / contracts /
+-- payments / commissions 上逐列觸發
+-- - UPDATE 時把整列新舊資料各轉一次 JSONB，再用 jsonb_each 比對每個欄位
+-- - batch_update_overdue_status、generate_monthly_payments 一次改數千列，
+--   就在同一個交易內寫入數千筆「整列 × 2」的審計資料
+-- - audit_logs 只增不減，舊資料無法便宜地清除
+-- - 另外函數內宣告的變數 key 與 jsonb_each 的欄位同名，
+--   在預設 plpgsql.variable_conflict = error 下 UPDATE 會失敗
+--
+-- 解法：
+-- - audit_statement_trigger()：statement-level trigger（transition table），
+--   每個 statement 只執行一次 INSERT ... SELECT
+--   UPDATE 只記錄有變動的欄位（old_data / new_data 只含 changed_fields），
+--   INSERT 省略 NULL 欄位，DELETE 保留整列（供還原）
+-- - audit_logs 改為依 created_at 按月分區（audit_logs_YYYYMM + default）
+--   ensure_audit_log_partitions()：預先建立分區（併入每日維護）
+--   detach_audit_log_partitions()：卸離過舊分區（卸離後為一般表，可封存或 DROP）
+-- - 既有資料搬入分區表，欄位與 API（POST /audit_logs）不變
+--
+-- Date: 2026-01-05
+-- ============================================================================
+
+-- ============================================================================
+-- 1. 分區管理函數
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION ensure_audit_log_partitions(
+    p_start DATE DEFAULT NULL,
+    p_months_ahead INTEGER DEFAULT 2
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_month DATE := date_trunc('month', COALESCE(p_start, CURRENT_DATE))::DATE;
+    v_last DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => GREATEST(p_months_ahead, 0)))::DATE;
+    v_next DATE;
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    WHILE v_month <= v_last LOOP
+        v_next := (v_month + INTERVAL '1 month')::DATE;
+        v_name := 'audit_logs_' || TO_CHAR(v_month, 'YYYYMM');
+
+        IF to_regclass(v_name) IS NULL THEN
+            IF EXISTS (
+                SELECT 1 FROM audit_logs_default
+                WHERE created_at >= v_month AND created_at < v_next
+            ) THEN
+                -- default 分區已有該月資料：先搬出再掛上，否則 CREATE ... PARTITION OF 會失敗
+                EXECUTE format('CREATE TABLE %I (LIKE audit_logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+                EXECUTE format(
+                    'WITH moved AS (
+                         DELETE FROM audit_logs_default
+                         WHERE created_at >= %L AND created_at < %L
+                         RETURNING *
+                     )
+                     INSERT INTO %I SELECT * FROM moved',
+                    v_month, v_next, v_name
+                );
+                EXECUTE format(
+                    'ALTER TABLE audit_logs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    v_name, v_month, v_next
+                );
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF audit_logs FOR VALUES FROM (%L) TO (%L)',
+                    v_name, v_month, v_next
+                );
+            END IF;
+            v_created := v_created + 1;
+        END IF;
+
+        v_month := v_next;
+    END LOOP;
+
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION ensure_audit_log_partitions(DATE, INTEGER) IS
+'建立 audit_logs 月分區（從 p_start 所在月份到本月 + p_months_ahead），回傳新建數量';
+
+CREATE OR REPLACE FUNCTION detach_audit_log_partitions(p_keep_months INTEGER DEFAULT 12)
+RETURNS JSONB AS $$
+DECLARE
+    v_cutoff DATE := (date_trunc('month', CURRENT_DATE)
+                      - make_interval(months => GREATEST(p_keep_months, 1)))::DATE;
+    v_name TEXT;
+    v_detached TEXT[] := ARRAY[]::TEXT[];
+BEGIN
+    FOR v_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'audit_logs'::regclass
+          AND c.relname ~ '^audit_logs_\d{6}$'
+          AND to_date(substring(c.relname FROM 12), 'YYYYMM') < v_cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE audit_logs DETACH PARTITION %I', v_name);
+        v_detached := v_detached || v_name;
+    END LOOP;
+
+    RETURN jsonb_build_object(
+        'cutoff', v_cutoff,
+        'detached', to_jsonb(v_detached)
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION detach_audit_log_partitions(INTEGER) IS
+'卸離早於 p_keep_months 個月的 audit_logs 分區（資料仍保留在卸離後的表，可另行封存或 DROP）';
+
+-- ============================================================================
+-- 2. audit_logs 改為分區表（搬移既有資料）
+-- ============================================================================
+
+DO $$
+DECLARE
+    v_min_created TIMESTAMPTZ;
+BEGIN
+    -- 已是分區表則略過
+    IF (SELECT relkind FROM pg_class WHERE oid = 'audit_logs'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE audit_logs RENAME TO audit_logs_legacy;
+    ALTER INDEX audit_logs_pkey RENAME TO audit_logs_legacy_pkey;
+    ALTER INDEX idx_audit_logs_table RENAME TO idx_audit_logs_legacy_table;
+    ALTER INDEX idx_audit_logs_created_at RENAME TO idx_audit_logs_legacy_created_at;
+
+    -- 欄位與原表相同；分區鍵必須在主鍵內
+    CREATE TABLE audit_logs (
+        id              BIGINT NOT NULL DEFAULT nextval('audit_logs_id_seq'),
+        table_name      VARCHAR(50) NOT NULL,
+        record_id       INTEGER NOT NULL,
+        action          VARCHAR(10) NOT NULL
+                        CHECK (action IN ('INSERT', 'UPDATE', 'DELETE')),
+        old_data        JSONB,
+        new_data        JSONB,
+        changed_fields  TEXT[],
+        user_id         INTEGER,
+        user_role       VARCHAR(20),
+        ip_address      INET,
+        created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+
+    ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id;
+
+    CREATE INDEX idx_audit_logs_table ON audit_logs (table_name, record_id);
+    CREATE INDEX idx_audit_logs_created_at ON audit_logs (created_at);
+
+    -- 沒有對應月分區的資料落在 default，不會寫入失敗
+    CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT;
+
+    SELECT MIN(created_at) INTO v_min_created FROM audit_logs_legacy;
+    PERFORM ensure_audit_log_partitions(COALESCE(v_min_created, NOW())::DATE);
+
+    INSERT INTO audit_logs (id, table_name, record_id, action, old_data, new_data,
+                            changed_fields, user_id, user_role, ip_address, created_at)
+    SELECT id, table_name, record_id, action, old_data, new_data,
+           changed_fields, user_id, user_role, ip_address, COALESCE(created_at, NOW())
+    FROM audit_logs_legacy;
+
+    DROP TABLE audit_logs_legacy;
+END $$;
+
+COMMENT ON TABLE audit_logs IS '審計日誌（依 created_at 按月分區；UPDATE 只記錄變動欄位）';
+
+-- 權限與 RLS（同 04_rls.sql）
+GRANT SELECT ON audit_logs TO staff;
+GRANT ALL ON audit_logs TO admin;
+
+ALTER TABLE audit_logs ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS staff_audit_select ON audit_logs;
+CREATE POLICY staff_audit_select ON audit_logs
+    FOR SELECT TO staff
+    USING (TRUE);
+
+DROP POLICY IF EXISTS admin_audit_all ON audit_logs;
+CREATE POLICY admin_audit_all ON audit_logs
+    FOR ALL TO admin
+    USING (TRUE)
+    WITH CHECK (TRUE);
+
+-- ============================================================================
+-- 3. audit_statement_trigger() - 每個 statement 寫一次
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION audit_statement_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_changed TEXT;
+    v_old TEXT;
+    v_new TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO audit_logs (table_name, record_id, action, new_data)
+        SELECT TG_TABLE_NAME, n.id, 'INSERT', jsonb_strip_nulls(to_jsonb(n))
+        FROM new_rows n;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO audit_logs (table_name, record_id, action, old_data)
+        SELECT TG_TABLE_NAME, o.id, 'DELETE', to_jsonb(o)
+        FROM old_rows o;
+
+    ELSE
+        -- 逐欄位以原型別比較（不把整列轉 JSONB 再 jsonb_each），只有變動的欄位才轉 JSONB
+        -- 只有 updated_at 變動的列不記錄
+        SELECT
+            string_agg(format('CASE WHEN o.%1$I IS DISTINCT FROM n.%1$I THEN %1$L END', a.attname),
+                       ', ' ORDER BY a.attnum),
+            string_agg(format('CASE WHEN o.%1$I IS DISTINCT FROM n.%1$I THEN jsonb_build_object(%1$L, o.%1$I) ELSE %2$L END', a.attname, '{}'),
+                       ' || ' ORDER BY a.attnum),
+            string_agg(format('CASE WHEN o.%1$I IS DISTINCT FROM n.%1$I THEN jsonb_build_object(%1$L, n.%1$I) ELSE %2$L END', a.attname, '{}'),
+                       ' || ' ORDER BY a.attnum)
+        INTO v_changed, v_old, v_new
+        FROM pg_attribute a
+        WHERE a.attrelid = TG_RELID
+          AND a.attnum > 0
+          AND NOT a.attisdropped
+          AND a.attname <> 'updated_at';
+
+        EXECUTE format($sql$
+            INSERT INTO audit_logs (table_name, record_id, action, old_data, new_data, changed_fields)
+            SELECT %L, d.id, 'UPDATE', d.old_data, d.new_data, d.changed_fields
+            FROM (
+                SELECT
+                    n.id,
+                    '{}'::JSONB || %s AS old_data,
+                    '{}'::JSONB || %s AS new_data,
+                    array_remove(ARRAY[%s]::TEXT[], NULL) AS changed_fields
+                FROM new_rows n
+                JOIN old_rows o ON o.id = n.id
+            ) d
+            WHERE d.changed_fields <> '{}'
+        $sql$, TG_TABLE_NAME, v_old, v_new, v_changed);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION audit_statement_trigger() IS
+'審計 trigger（statement-level）：UPDATE 只記錄變動欄位，整個 statement 一次寫入';
+
+-- 換掉逐列 trigger；transition table 不能用在多事件 trigger，每表分三個
+DO $$
+DECLARE
+    v_table TEXT;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['customers', 'contracts', 'payments', 'commissions'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'audit_' || v_table, v_table);
+
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'audit_' || v_table || '_insert', v_table);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT ON %I
+                 REFERENCING NEW TABLE AS new_rows
+                 FOR EACH STATEMENT EXECUTE FUNCTION audit_statement_trigger()',
+            'audit_' || v_table || '_insert', v_table
+        );
+
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'audit_' || v_table || '_update', v_table);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER UPDATE ON %I
+                 REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                 FOR EACH STATEMENT EXECUTE FUNCTION audit_statement_trigger()',
+            'audit_' || v_table || '_update', v_table
+        );
+
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'audit_' || v_table || '_delete', v_table);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER DELETE ON %I
+                 REFERENCING OLD TABLE AS old_rows
+                 FOR EACH STATEMENT EXECUTE FUNCTION audit_statement_trigger()',
+            'audit_' || v_table || '_delete', v_table
+        );
+    END LOOP;
+END $$;
+
+-- 逐列版本已無 trigger 使用
+DROP FUNCTION IF EXISTS audit_trigger_function();
+
+-- ============================================================================
+-- 4. 每日維護：預先建立下個月分區
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION run_daily_maintenance()
+RETURNS JSONB AS $$
+DECLARE
+    v_payments_result RECORD;
+    v_overdue_result RECORD;
+    v_expired_result RECORD;
+    v_stats_result JSONB;
+    v_partitions_created INTEGER;
+    v_result JSONB;
+BEGIN
+    -- 1. 產生當月應收（冪等）
+    SELECT * INTO v_payments_result FROM generate_monthly_payments();
+
+    -- 2. 更新逾期狀態
+    SELECT * INTO v_overdue_result FROM batch_update_overdue_status();
+
+    -- 3. 更新過期合約
+    SELECT * INTO v_expired_result FROM auto_expire_contracts();
+
+    -- 4. customer_stats 對帳（trigger 正常運作時應為 0）
+    v_stats_result := reconcile_customer_stats();
+
+    -- 5. audit_logs 月分區（保持領先兩個月）
+    v_partitions_created := ensure_audit_log_partitions();
+
+    -- 組合結果
+    v_result := jsonb_build_object(
+        'executed_at', NOW(),
+        'payments_generated', jsonb_build_object(
+            'count', COALESCE(v_payments_result.payments_created, 0),
+            'amount', COALESCE(v_payments_result.total_amount, 0)
+        ),
+        'overdue_updated', jsonb_build_object(
+            'count', COALESCE(v_overdue_result.updated_count, 0),
+            'amount', COALESCE(v_overdue_result.total_overdue_amount, 0)
+        ),
+        'contracts_expired', jsonb_build_object(
+            'count', COALESCE(v_expired_result.expired_count, 0),
+            'contracts', COALESCE(v_expired_result.contract_numbers, ARRAY[]::TEXT[])
+        ),
+        'customer_stats_fixed', COALESCE((v_stats_result->>'rows_fixed')::INTEGER, 0),
+        'audit_partitions_created', v_partitions_created
+    );
+
+    RETURN v_result;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- ============================================================================
+-- 5. 驗證
+-- ============================================================================
+
+DO $$
+DECLARE
+    v_partitions INTEGER;
+    v_rows BIGINT;
+    v_triggers INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO v_partitions
+    FROM pg_inherits WHERE inhparent = 'audit_logs'::regclass;
+
+    SELECT COUNT(*) INTO v_rows FROM audit_logs;
+
+    SELECT COUNT(*) INTO v_triggers
+    FROM pg_trigger
+    WHERE tgname ~ '^audit_(customers|contracts|payments|commissions)_(insert|update|delete)$';
+
+    RAISE NOTICE '=== Migration 117 完成 ===';
+    RAISE NOTICE 'audit_logs 分區: % 個，資料: % 筆', v_partitions, v_rows;
+    RAISE NOTICE 'statement-level 審計 trigger: % 個', v_triggers;
+END $$;
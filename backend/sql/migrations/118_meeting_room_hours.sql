@@ -0,0 +1,60 @@
+-- ============================================================================
+-- Migration 118: 會議室營業時間與時段長度
+--
+-- 問題：
+-- 可用時段固定為 09:00–18:00、每 30 分鐘一格（寫死在 booking_check_availability
+-- 與 LINE 預約流程），無法依會議室設定；查詢多天可用時段時每天各查一次預約
+--
+-- 解法：
+-- - meeting_rooms 新增 open_time / close_time / slot_minutes（預設同現行 09:00–18:00、30 分鐘）
+-- - meeting_room_bookings 新增「會議室 + 日期」部分索引（只含 confirmed），
+--   一次查詢多個會議室 × 日期區間的預約
+--
+-- Date: 2026-01-05
+-- ============================================================================
+
+-- ============================================================================
+-- 1. 會議室營業時間
+-- ============================================================================
+
+ALTER TABLE meeting_rooms
+    ADD COLUMN IF NOT EXISTS open_time TIME NOT NULL DEFAULT '09:00',
+    ADD COLUMN IF NOT EXISTS close_time TIME NOT NULL DEFAULT '18:00',
+    ADD COLUMN IF NOT EXISTS slot_minutes INTEGER NOT NULL DEFAULT 30;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'meeting_rooms_hours_check'
+    ) THEN
+        ALTER TABLE meeting_rooms
+            ADD CONSTRAINT meeting_rooms_hours_check
+            CHECK (close_time > open_time AND slot_minutes BETWEEN 5 AND 240);
+    END IF;
+END $$;
+
+COMMENT ON COLUMN meeting_rooms.open_time IS '開放預約開始時間';
+COMMENT ON COLUMN meeting_rooms.close_time IS '開放預約結束時間';
+COMMENT ON COLUMN meeting_rooms.slot_minutes IS '時段長度（分鐘）';
+
+-- ============================================================================
+-- 2. 區間查詢索引
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_bookings_room_date_confirmed
+    ON meeting_room_bookings (meeting_room_id, booking_date, start_time)
+    WHERE status = 'confirmed';
+
+-- ============================================================================
+-- 3. 驗證
+-- ============================================================================
+
+DO $$
+DECLARE
+    v_rooms INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO v_rooms FROM meeting_rooms;
+
+    RAISE NOTICE '=== Migration 118 完成 ===';
+    RAISE NOTICE 'meeting_rooms: %（預設 09:00–18:00，每 30 分鐘）', v_rooms;
+END $$;
@@ -0,0 +1,66 @@
+-- ============================================================================
+-- Migration 119: 付款彙總的逾期判斷與 v_monthly_revenue 一致
+--
+-- 問題：
+-- report_payment_aggregates()（migration 110）依 payments.payment_status 原值分組，
+-- 已過 due_date 但狀態仍為 pending 的付款算在 pending；
+-- v_monthly_revenue 與營收快照（migration 111）則把這些付款算為 overdue，
+-- report_revenue_summary 的 source=live / source=snapshot 因此得到不同的待收與逾期金額
+--
+-- 解法：
+-- - report_payment_aggregates() 回傳的 payment_status 改為與 v_monthly_revenue 相同的分類：
+--   pending 且 due_date < CURRENT_DATE 視為 overdue，其餘狀態不變
+--
+-- Date: 2026-01-06
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION report_payment_aggregates(
+    p_start_date DATE,
+    p_end_date DATE,
+    p_branch_id INTEGER DEFAULT NULL,
+    p_period_grain TEXT DEFAULT 'month'
+)
+RETURNS TABLE (
+    branch_id INTEGER,
+    period_start DATE,
+    payment_status VARCHAR,
+    payment_count BIGINT,
+    total_amount NUMERIC
+) AS $$
+BEGIN
+    IF p_period_grain NOT IN ('day', 'week', 'month', 'quarter', 'year') THEN
+        RAISE EXCEPTION '不支援的期間粒度: %（可用 day/week/month/quarter/year）', p_period_grain;
+    END IF;
+
+    RETURN QUERY
+    SELECT
+        p.branch_id,
+        date_trunc(p_period_grain, p.due_date)::DATE AS period_start,
+        -- 與 v_monthly_revenue 相同：pending 且已過 due_date 也算逾期
+        (CASE
+            WHEN p.payment_status = 'pending' AND p.due_date < CURRENT_DATE THEN 'overdue'
+            ELSE p.payment_status
+        END)::VARCHAR AS status,
+        COUNT(*) AS payment_count,
+        COALESCE(SUM(p.amount), 0) AS total_amount
+    FROM payments p
+    WHERE p.due_date BETWEEN p_start_date AND p_end_date
+      AND (p_branch_id IS NULL OR p.branch_id = p_branch_id)
+    GROUP BY p.branch_id, date_trunc(p_period_grain, p.due_date), status
+    ORDER BY p.branch_id, period_start, status;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+COMMENT ON FUNCTION report_payment_aggregates(DATE, DATE, INTEGER, TEXT) IS
+'付款彙總：依場館、期間（day/week/month/quarter/year）、付款狀態回傳筆數與金額（逾期判斷同 v_monthly_revenue）';
+
+DO $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO v_rows
+    FROM report_payment_aggregates(date_trunc('year', CURRENT_DATE)::DATE, CURRENT_DATE);
+
+    RAISE NOTICE '=== Migration 119 完成 ===';
+    RAISE NOTICE '今年付款彙總列數: %', v_rows;
+END $$;
@@ -0,0 +1,179 @@
+-- ============================================================================
+-- Migration 120: 背景 worker 只領取 enqueue_batch_task() 建立的任務
+--
+-- 問題：
+-- claim_batch_task_items()（migration 113）領取所有 status = 'pending' 的項目，
+-- 但 bulk_sender.create_batch_task 建立的項目也是 pending，由建立者在同一個請求內
+-- 以 run_bulk 直接處理：
+-- - send_reminder（line_tools.send_bulk_payment_reminders）：worker 的 handler 再呼叫
+--   billing_send_reminder，客戶收到兩次 LINE 催繳
+-- - 沒有註冊 handler 的類型（daily_reminders 等）被 worker 標記 UNKNOWN_TASK_TYPE 失敗，
+--   任務的成功 / 失敗數被改錯
+--
+-- 解法：
+-- - batch_tasks.queued：enqueue_batch_task() 建立的任務為 true，其他方式建立的維持 false
+-- - claim_batch_task_items() 只領取 queued 任務的項目（含逾時重新領取 / 標記失敗）
+-- - 既有資料：任務仍為 pending（尚未被領取）或有項目正被 worker 持有的，視為 queued
+--
+-- Date: 2026-01-07
+-- ============================================================================
+
+ALTER TABLE batch_tasks ADD COLUMN IF NOT EXISTS queued BOOLEAN NOT NULL DEFAULT false;
+
+COMMENT ON COLUMN batch_tasks.queued IS '由背景 worker 處理（enqueue_batch_task 建立）；false 表示建立者自行處理';
+
+UPDATE batch_tasks t SET queued = true
+WHERE NOT t.queued
+  AND (t.status = 'pending'
+       OR EXISTS (
+           SELECT 1 FROM batch_task_items i
+           WHERE i.task_id = t.id AND i.status = 'processing' AND i.locked_by IS NOT NULL
+       ));
+
+-- ============================================================================
+-- 1. enqueue_batch_task() - 建立的任務標記 queued
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION enqueue_batch_task(
+    p_task_type VARCHAR,
+    p_target_type VARCHAR,
+    p_target_ids INTEGER[],
+    p_payload JSONB DEFAULT '{}'::jsonb,
+    p_created_by TEXT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_task_id VARCHAR(36) := gen_random_uuid()::text;
+    v_count INTEGER := COALESCE(array_length(p_target_ids, 1), 0);
+BEGIN
+    INSERT INTO batch_tasks (id, task_type, status, total_count, payload, created_by, queued)
+    VALUES (
+        v_task_id,
+        p_task_type,
+        CASE WHEN v_count = 0 THEN 'completed' ELSE 'pending' END,
+        v_count,
+        COALESCE(p_payload, '{}'::jsonb),
+        p_created_by,
+        true
+    );
+
+    INSERT INTO batch_task_items (task_id, target_id, target_type, status)
+    SELECT v_task_id, t.target_id, p_target_type, 'pending'
+    FROM unnest(p_target_ids) WITH ORDINALITY AS t(target_id, ord)
+    ORDER BY t.ord;
+
+    RETURN jsonb_build_object(
+        'task_id', v_task_id,
+        'task_type', p_task_type,
+        'status', CASE WHEN v_count = 0 THEN 'completed' ELSE 'pending' END,
+        'total_count', v_count
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- ============================================================================
+-- 2. claim_batch_task_items() - 只領取 queued 任務的項目
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION claim_batch_task_items(
+    p_worker_id TEXT,
+    p_limit INTEGER DEFAULT 10,
+    p_lock_timeout_seconds INTEGER DEFAULT 300,
+    p_max_attempts INTEGER DEFAULT 3
+)
+RETURNS TABLE (
+    item_id INTEGER,
+    task_id VARCHAR,
+    task_type VARCHAR,
+    target_id INTEGER,
+    target_type VARCHAR,
+    attempts INTEGER,
+    payload JSONB
+) AS $$
+DECLARE
+    v_task_id VARCHAR;
+BEGIN
+    -- 逾時且已達重試上限的項目直接標記失敗
+    FOR v_task_id IN
+        WITH exhausted AS (
+            SELECT i.id
+            FROM batch_task_items i
+            WHERE i.status = 'processing'
+              AND i.locked_at < NOW() - make_interval(secs => p_lock_timeout_seconds)
+              AND i.attempts >= p_max_attempts
+              AND EXISTS (SELECT 1 FROM batch_tasks q WHERE q.id = i.task_id AND q.queued)
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE batch_task_items i SET
+            status = 'failed',
+            error_code = 'MAX_ATTEMPTS',
+            error_message = '處理逾時，已達重試上限',
+            processed_at = NOW(),
+            locked_by = NULL,
+            locked_at = NULL
+        FROM exhausted e
+        WHERE i.id = e.id
+        RETURNING i.task_id
+    LOOP
+        PERFORM refresh_batch_task_status(v_task_id);
+    END LOOP;
+
+    RETURN QUERY
+    WITH claimable AS (
+        SELECT i.id
+        FROM batch_task_items i
+        WHERE (i.status = 'pending'
+               OR (i.status = 'processing'
+                   AND i.locked_at < NOW() - make_interval(secs => p_lock_timeout_seconds)
+                   AND i.attempts < p_max_attempts))
+          -- 建立者自行處理的任務（bulk_sender.run_bulk）不領取
+          AND EXISTS (SELECT 1 FROM batch_tasks q WHERE q.id = i.task_id AND q.queued)
+        ORDER BY i.id
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ),
+    claimed AS (
+        UPDATE batch_task_items i SET
+            status = 'processing',
+            locked_by = p_worker_id,
+            locked_at = NOW(),
+            attempts = i.attempts + 1
+        FROM claimable c
+        WHERE i.id = c.id
+        RETURNING i.id, i.task_id, i.target_id, i.target_type, i.attempts
+    ),
+    started AS (
+        UPDATE batch_tasks t SET
+            status = 'processing',
+            started_at = COALESCE(t.started_at, NOW())
+        WHERE t.id IN (SELECT DISTINCT c.task_id FROM claimed c)
+          AND t.status = 'pending'
+    )
+    SELECT c.id, c.task_id, t.task_type, c.target_id, c.target_type, c.attempts, t.payload
+    FROM claimed c
+    JOIN batch_tasks t ON t.id = c.task_id
+    ORDER BY c.id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION claim_batch_task_items(TEXT, INTEGER, INTEGER, INTEGER) IS
+'worker 領取 queued 任務的待處理項目（FOR UPDATE SKIP LOCKED），逾時項目會被重新領取';
+
+-- ============================================================================
+-- 3. 驗證
+-- ============================================================================
+
+DO $$
+DECLARE
+    v_queued INTEGER;
+    v_inline INTEGER;
+BEGIN
+    SELECT COUNT(*) FILTER (WHERE t.queued), COUNT(*) FILTER (WHERE NOT t.queued)
+    INTO v_queued, v_inline
+    FROM batch_task_items i
+    JOIN batch_tasks t ON t.id = i.task_id
+    WHERE i.status IN ('pending', 'processing');
+
+    RAISE NOTICE '=== Migration 120 完成 ===';
+    RAISE NOTICE '未完成項目: worker 處理 %，建立者自行處理 %', v_queued, v_inline;
+END $$;
@@ -0,0 +1,47 @@
+-- ============================================================================
+-- Migration 121: audit_logs 分區表的寫入權限
+--
+-- 問題：
+-- migration 117 重建的 audit_logs 只授權 staff（SELECT）/ admin（ALL），
+-- RLS policy 也只有這兩個角色；PostgREST 以 anon（PGRST_DB_ANON_ROLE）執行：
+-- - audit_statement_trigger() 以呼叫者身分執行，customers / contracts / payments /
+--   commissions 的每次 INSERT / UPDATE / DELETE 都因 audit_logs 權限 / RLS 失敗
+-- - billing_tools / contract_tools 直接 POST /audit_logs 也被拒絕
+--
+-- 解法：
+-- - audit_statement_trigger() 改為 SECURITY DEFINER（以表擁有者寫入，不受 RLS 限制），
+--   固定 search_path
+-- - anon / authenticated：SELECT、INSERT 與對應 RLS policy（審計日誌只增不改，不給 UPDATE / DELETE）
+--
+-- Date: 2026-01-07
+-- ============================================================================
+
+ALTER FUNCTION audit_statement_trigger() SECURITY DEFINER SET search_path = public, pg_temp;
+
+GRANT SELECT, INSERT ON audit_logs TO anon, authenticated;
+GRANT USAGE, SELECT ON SEQUENCE audit_logs_id_seq TO anon, authenticated;
+
+DROP POLICY IF EXISTS anon_audit_select ON audit_logs;
+CREATE POLICY anon_audit_select ON audit_logs
+    FOR SELECT TO anon, authenticated
+    USING (TRUE);
+
+DROP POLICY IF EXISTS anon_audit_insert ON audit_logs;
+CREATE POLICY anon_audit_insert ON audit_logs
+    FOR INSERT TO anon, authenticated
+    WITH CHECK (TRUE);
+
+-- ============================================================================
+-- 驗證
+-- ============================================================================
+
+DO $$
+DECLARE
+    v_definer BOOLEAN;
+BEGIN
+    SELECT prosecdef INTO v_definer FROM pg_proc WHERE oid = 'audit_statement_trigger()'::regprocedure;
+
+    RAISE NOTICE '=== Migration 121 完成 ===';
+    RAISE NOTICE 'audit_statement_trigger SECURITY DEFINER: %', v_definer;
+    RAISE NOTICE 'anon 可寫入 audit_logs: %', has_table_privilege('anon', 'audit_logs', 'INSERT');
+END $$;
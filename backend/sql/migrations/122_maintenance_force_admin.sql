@@ -0,0 +1,66 @@
+-- ============================================================================
+-- Migration 122: 強制重跑每日維護只開放給 admin
+--
+-- 問題：
+-- migration 114 將 run_scheduled_maintenance(p_interval_hours, p_triggered_by, p_force)
+-- 整個授權給 anon / authenticated（函數預設也對 PUBLIC 開放）：
+-- 任何人都能透過 PostgREST /rpc 帶 p_force = true，略過「同一時段只執行一次」，
+-- 重複執行 generate_monthly_payments / batch_update_overdue_status / auto_expire_contracts
+--
+-- 解法：
+-- - 原函數（含 p_force）改名為 run_scheduled_maintenance_admin()，只授權 admin
+-- - run_scheduled_maintenance(p_interval_hours, p_triggered_by)：排程入口，固定不強制，
+--   維持授權 anon / authenticated（MCP Server 排程以 PostgREST 呼叫，不帶 p_force）
+--
+-- Date: 2026-01-07
+-- ============================================================================
+
+-- ============================================================================
+-- 1. 含 p_force 的版本改名，只授權 admin
+-- ============================================================================
+
+DO $$
+BEGIN
+    IF to_regprocedure('run_scheduled_maintenance(integer, text, boolean)') IS NOT NULL THEN
+        DROP FUNCTION IF EXISTS run_scheduled_maintenance_admin(INTEGER, TEXT, BOOLEAN);
+        ALTER FUNCTION run_scheduled_maintenance(INTEGER, TEXT, BOOLEAN)
+            RENAME TO run_scheduled_maintenance_admin;
+    END IF;
+END $$;
+
+REVOKE ALL ON FUNCTION run_scheduled_maintenance_admin(INTEGER, TEXT, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION run_scheduled_maintenance_admin(INTEGER, TEXT, BOOLEAN) TO admin;
+
+COMMENT ON FUNCTION run_scheduled_maintenance_admin(INTEGER, TEXT, BOOLEAN) IS
+'維護入口（僅 admin）：p_force = true 時重跑已完成的時段';
+
+-- ============================================================================
+-- 2. run_scheduled_maintenance() - 排程入口（不可強制）
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION run_scheduled_maintenance(
+    p_interval_hours INTEGER DEFAULT 24,
+    p_triggered_by TEXT DEFAULT 'scheduler'
+)
+RETURNS JSONB AS $$
+    SELECT run_scheduled_maintenance_admin(p_interval_hours, p_triggered_by, false);
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public, pg_temp;
+
+COMMENT ON FUNCTION run_scheduled_maintenance(INTEGER, TEXT) IS
+'排程維護入口：同一時段只執行一次 run_daily_maintenance()，結果寫入 maintenance_runs';
+
+REVOKE ALL ON FUNCTION run_scheduled_maintenance(INTEGER, TEXT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION run_scheduled_maintenance(INTEGER, TEXT) TO anon, authenticated, admin;
+
+-- ============================================================================
+-- 3. 驗證
+-- ============================================================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '=== Migration 122 完成 ===';
+    RAISE NOTICE 'anon 可強制重跑: %',
+        has_function_privilege('anon', 'run_scheduled_maintenance_admin(integer, text, boolean)', 'EXECUTE');
+    RAISE NOTICE 'anon 可呼叫排程入口: %',
+        has_function_privilege('anon', 'run_scheduled_maintenance(integer, text)', 'EXECUTE');
+END $$;
@@ -312,7 +312,7 @@ export function useBillingBatchRemind() {
         queryClient.invalidateQueries({ queryKey: ['overdue'] })
         addNotification({
           type: 'success',
-          message: `批次催繳完成：成功 ${data.sent_count || 0} 筆`
+          message: `批次催繳已排入背景處理：共 ${data.total_count || 0} 筆`
         })
       } else {
         addNotification({ type: 'error', message: data.message || '批次催繳失敗' })
@@ -408,19 +408,26 @@ export function useBranchRevenue() {
 }
 
 // 儀表板統計（聚合所有場館，取代前端 reduce）
-// ★ 2026-01-02：載入時執行每日維護（產生應收、更新逾期、更新過期合約）
+// 每日維護（產生應收、更新逾期、更新過期合約）改由 MCP Server 排程執行，載入時不再寫入
 export function useDashboardStats() {
   return useQuery({
     queryKey: ['dashboard-stats'],
     queryFn: async () => {
-      // 執行每日維護（冪等，可重複呼叫）
-      await db.runDailyMaintenance()
       const data = await db.getDashboardStats()
       return data
     }
   })
 }
 
+// 每日維護最近一次結果
+export function useLastMaintenance() {
+  return useQuery({
+    queryKey: ['last-maintenance'],
+    queryFn: () => db.getLastMaintenance(),
+    staleTime: 5 * 60 * 1000
+  })
+}
+
 export function useTodayTasks() {
   const selectedBranch = useStore((state) => state.selectedBranch)
 
@@ -1,5 +1,5 @@
 import { useState } from 'react'
-import { useBranchRevenue, useDashboardStats, useTodayTasks, useOverdueDetails, useRenewalReminders, usePaymentsDue, useTodayBookings, useTerminationCases, usePendingSignContracts, useTerminationWorkspace } from '../hooks/useApi'
+import { useBranchRevenue, useDashboardStats, useTodayTasks, useOverdueDetails, useRenewalReminders, usePaymentsDue, useTodayBookings, useTerminationCases, usePendingSignContracts, useTerminationWorkspace, useLastMaintenance } from '../hooks/useApi'
 import { useNavigate } from 'react-router-dom'
 import {
   Users,
@@ -55,6 +55,7 @@ export default function Dashboard() {
   const { data: terminationCases } = useTerminationCases()
   const { data: pendingSignContracts } = usePendingSignContracts()
   const { data: terminationWorkspace } = useTerminationWorkspace()
+  const { data: lastMaintenance } = useLastMaintenance()
 
   // 催繳狀態
   const [sendingReminder, setSendingReminder] = useState({})
@@ -126,6 +127,12 @@ export default function Dashboard() {
             <div>
               <h3 className="font-semibold text-gray-900">自動通知系統</h3>
               <p className="text-sm text-gray-500">自動發送繳費提醒與續約通知</p>
+              {lastMaintenance && (
+                <p className="text-xs text-gray-400 mt-0.5">
+                  每日維護：{new Date(lastMaintenance.finished_at).toLocaleString('zh-TW')}
+                  {lastMaintenance.status === 'failed' ? '（失敗）' : ''}
+                </p>
+              )}
             </div>
           </div>
           <button
@@ -49,6 +49,16 @@ export const callTool = async (toolName, parameters = {}, config = {}) => {
   return response
 }
 
+// 一次調用多個工具（例如一個畫面需要的客戶、續約、帳務資料），結果依 calls 順序回傳
+// calls: [{ tool, parameters }]；stopOnError: 第一個失敗後其餘不執行
+export const callTools = async (calls, { stopOnError = false, ...config } = {}) => {
+  const response = await api.post('/tools/batch', {
+    calls: calls.map(({ tool, parameters = {} }) => ({ tool, parameters })),
+    stop_on_error: stopOnError
+  }, config)
+  return response
+}
+
 // ============================================================================
 // AI Chat API (內部 AI 助手)
 // ============================================================================
@@ -229,14 +239,15 @@ export const db = {
     return arr[0] || null
   },
 
-  // 每日維護：產生應收、更新逾期、更新過期合約（冪等，可重複呼叫）
-  // ★ 2026-01-02：整合三個維護任務到單一函數
-  async runDailyMaintenance() {
+  // 每日維護最近一次結果（維護本身由 MCP Server 排程執行，這裡只讀取）
+  async getLastMaintenance() {
     try {
-      const data = await api.post('/api/db/rpc/run_daily_maintenance', {})
-      return data?.[0] || data
+      const data = await api.get('/api/db/v_maintenance_last_run', {
+        params: { job_name: 'eq.daily_maintenance' }
+      })
+      return ensureArray(data)[0] || null
     } catch (error) {
-      console.warn('runDailyMaintenance failed:', error)
+      console.warn('getLastMaintenance failed:', error)
       return null
     }
   },
@@ -297,6 +308,10 @@ export const crm = {
     return callTool(toolName, parameters)
   },
 
+  async callTools(calls, options = {}) {
+    return callTools(calls, options)
+  },
+
   async searchCustomers(query, branchId, status, limit = 50) {
     // 直接使用資料庫查詢
     const params = { limit, order: 'created_at.desc' }